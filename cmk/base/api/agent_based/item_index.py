@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Index the entries of a section by the items they belong to
+
+Check plugins with many items usually search the whole section for the entries
+of their item. The index is built once per section and check cycle of the host,
+looking up an item is done in constant time.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+_TEntry = TypeVar("_TEntry")
+
+ItemKeys = Callable[[_TEntry], Iterable[str]]
+
+# Sections of clusters are usually assembled for every check function call, do not keep them all
+_MAX_CACHED_INDEXES = 16
+
+
+class ItemIndex(Generic[_TEntry]):
+    """The entries of a section by their item keys"""
+    def __init__(
+        self,
+        entries: Iterable[_TEntry],
+        item_keys: Callable[[_TEntry], Iterable[str]],
+    ) -> None:
+        super().__init__()
+        self._entries: Sequence[_TEntry] = list(entries)
+        self._positions: Dict[str, List[int]] = {}
+        for position, entry in enumerate(self._entries):
+            for key in set(item_keys(entry)):
+                self._positions.setdefault(key, []).append(position)
+
+    def lookup(self, *keys: str) -> List[_TEntry]:
+        """The entries having at least one of the keys, in the order of the section"""
+        if len(keys) == 1:
+            return [self._entries[position] for position in self._positions.get(keys[0], [])]
+        positions = {position for key in keys for position in self._positions.get(key, [])}
+        return [self._entries[position] for position in sorted(positions)]
+
+
+# The sections are kept with their indexes: Their IDs must not be reused during the cycle.
+_cache: "Optional[OrderedDict[Tuple[int, ItemKeys], Tuple[object, ItemIndex]]]" = None
+
+
+@contextmanager
+def check_cycle() -> Iterator[None]:
+    """Cache the indexes while checking a host
+
+    The sections must not change during the cycle.
+    """
+    global _cache
+    saved_cache = _cache
+    _cache = OrderedDict()
+    try:
+        yield
+    finally:
+        _cache = saved_cache
+
+
+def get_item_index(
+    section: Iterable[_TEntry],
+    item_keys: Callable[[_TEntry], Iterable[str]],
+) -> ItemIndex[_TEntry]:
+    """Get the index of the section entries by their items
+
+    The function item_keys returns the strings identifying an entry. Usually
+    these are the items that the entry belongs to, there may be more of them,
+    like the index, alias and description of an interface. The index is
+    created once per check cycle for each section and item_keys function, so
+    the same function object has to be used for every lookup.
+
+    Example:
+
+        >>> def item_keys(entry):
+        ...     return [entry["mountpoint"]]
+        ...
+        >>> section = [{"mountpoint": "/"}, {"mountpoint": "/boot"}]
+        >>> get_item_index(section, item_keys).lookup("/boot")
+        [{'mountpoint': '/boot'}]
+
+    """
+    if _cache is None:
+        # Not checking a host (e.g. discovery or tests): Nothing to reuse
+        return ItemIndex(section, item_keys)
+
+    cache_key = (id(section), item_keys)
+    cached = _cache.get(cache_key)
+    if cached is not None and cached[0] is section:
+        _cache.move_to_end(cache_key)
+        return cached[1]
+
+    index = ItemIndex(section, item_keys)
+    _cache[cache_key] = (section, index)
+    if len(_cache) > _MAX_CACHED_INDEXES:
+        _cache.popitem(last=False)
+    return index
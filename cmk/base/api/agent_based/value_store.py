@@ -18,7 +18,7 @@ from cmk.base.api.agent_based.type_defs import ValueStore
 from cmk.base.item_state import (  # pylint: disable=cmk-module-layer-violation
     set_item_state,  # for __setitem__
     clear_item_state,  # for __delitem__
-    get_all_item_states,  # for __len__, __iter__
+    get_service_item_states,  # for __getitem__, __len__, __iter__
     get_item_state_prefix,  # for __repr__, context
     set_item_state_prefix,  # for context
 )
@@ -33,8 +33,7 @@ class _ValueStore(ValueStore):
 
     def __getitem__(self, key: str) -> Any:
         self._raise_for_scope_violation()
-        unique_key = get_item_state_prefix() + (key,)
-        return get_all_item_states()[unique_key]
+        return get_service_item_states()[key]
 
     def __setitem__(self, key: str, value: Any) -> None:
         self._raise_for_scope_violation()
@@ -44,21 +43,17 @@ class _ValueStore(ValueStore):
 
     def __delitem__(self, key: str) -> None:
         self._raise_for_scope_violation()
-        unique_key = get_item_state_prefix() + (key,)
-        if unique_key not in get_all_item_states():
+        if key not in get_service_item_states():
             raise KeyError(key)
         clear_item_state(key)
 
     def __len__(self) -> int:
         self._raise_for_scope_violation()
-        prefix = get_item_state_prefix()
-        return sum(unique_key[:2] == prefix for unique_key in get_all_item_states())
+        return len(get_service_item_states())
 
     def __iter__(self) -> Iterator:
         self._raise_for_scope_violation()
-        prefix = get_item_state_prefix()
-        return iter(
-            unique_key[-1] for unique_key in get_all_item_states() if unique_key[:2] == prefix)
+        return iter(get_service_item_states())
 
     @staticmethod
     def __repr__() -> str:
@@ -58,6 +58,7 @@ import cmk.base.core_config as core_config
 import cmk.base.checkers as checkers
 import cmk.base.discovery as discovery
 import cmk.base.ip_lookup as ip_lookup
+import cmk.base.item_state as item_state
 import cmk.base.nagios_utils
 import cmk.base.notify as notify
 import cmk.base.parent_scan
@@ -142,16 +143,14 @@ class AutomationDiscovery(DiscoveryAutomation):
         counts = {}
         failed_hosts = {}
 
-        for hostname in hostnames:
-            host_config = config_cache.get_host_config(hostname)
-            result, error = discovery.discover_on_host(
+        for hostname, result, error in discovery.discover_on_hosts(
                 config_cache,
-                host_config,
+                hostnames,
                 mode,
                 use_caches,
                 service_filters,
                 on_error=on_error,
-            )
+        ):
             counts[hostname] = [
                 result["self_new"],
                 result["self_removed"],
@@ -164,7 +163,7 @@ class AutomationDiscovery(DiscoveryAutomation):
             if error is not None:
                 failed_hosts[hostname] = error
             else:
-                self._trigger_discovery_check(config_cache, host_config)
+                self._trigger_discovery_check(config_cache, config_cache.get_host_config(hostname))
 
         return counts, failed_hosts
 
@@ -348,6 +347,10 @@ class AutomationRenameHosts(Automation):
             if self._rename_host_file(cmk.utils.paths.tmp_dir + "/" + d + "/", oldname, newname):
                 actions.append(d)
 
+        item_state_db = item_state.get_item_state_db(config.item_state_shards)
+        if item_state_db is not None and item_state_db.rename(oldname, newname):
+            actions.append("counters")
+
         if self._rename_host_dir(cmk.utils.paths.tmp_dir + "/piggyback/", oldname, newname):
             actions.append("piggyback-load")
 
@@ -730,8 +733,11 @@ class AutomationDeleteHosts(Automation):
     needs_checks = True  # TODO: Can we change this?
 
     def execute(self, args: List[str]) -> None:
+        item_state_db = item_state.get_item_state_db(config.item_state_shards)
         for hostname in args:
             self._delete_host_files(hostname)
+            if item_state_db is not None:
+                item_state_db.remove(hostname)
 
     def _delete_host_files(self, hostname: HostName) -> None:
 
@@ -32,6 +32,7 @@ def backup_paths() -> List[BackupPath]:
         ('check_mk_configdir',  cmk.utils.paths.check_mk_config_dir, "",              "Configuration sub files",           True,  ),
         ('autochecksdir',       cmk.utils.paths.autochecks_dir,      "",              "Automatically inventorized checks", True,  ),
         ('counters_directory',  cmk.utils.paths.counters_dir,        "",              "Performance counters",              True,  ),
+        ('counter_shards_dir',  cmk.utils.paths.counter_shards_dir,  "",              "Performance counters (sharded)",    True,  ),
         ('tcp_cache_dir',       cmk.utils.paths.tcp_cache_dir,       "",              "Agent cache",                       True,  ),
         ('logwatch_dir',        cmk.utils.paths.logwatch_dir,        "",              "Logwatch",                          True,  ),
     ]
@@ -112,12 +113,14 @@ def do_restore(tarname: str) -> None:
         console.verbose("  Extracting %s (%s)\n", descr, absdir)
         tar = tarfile.open(tarname, "r:gz")
         if is_dir:
-            subtar = tarfile.open(fileobj=tar.extractfile(name + ".tar"))
-            if filename == ".":
-                subtar.extractall(basedir)
-            elif filename in subtar.getnames():
-                subtar.extract(filename, basedir)
-            subtar.close()
+            # Not existing directories are not backed up, e.g. the counter shards
+            if name + ".tar" in tar.getnames():
+                subtar = tarfile.open(fileobj=tar.extractfile(name + ".tar"))
+                if filename == ".":
+                    subtar.extractall(basedir)
+                elif filename in subtar.getnames():
+                    subtar.extract(filename, basedir)
+                subtar.close()
         elif filename in tar.getnames():
             tar.extract(filename, basedir)
         tar.close()
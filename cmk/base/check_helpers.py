@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Persistent check helpers for the Nagios core
+
+With the Nagios core every execution of a "Check_MK" service starts a fresh
+Python interpreter which imports cmk.base, loads the needed check plugins and
+the packed configuration before a single check is executed. The check helper
+pool does this work once: A master process loads all agent based plugins and the
+packed config of the latest config serial, opens a UNIX socket and forks a
+number of helper processes which serve "check host X" requests on that socket.
+
+The protocol is as simple as possible, so that the client shim
+(bin/cmk-check-helper) does not need to import anything from Checkmk:
+
+    request:  "<hostname>\\n"
+    response: "<exit code>\\n<check output>"
+
+Once the core configuration has been activated, the serial of the helper config
+changes. The master then terminates the helpers and restarts itself to load the
+new configuration.
+"""
+
+import errno
+import io
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import FrameType
+from typing import NoReturn, Optional, Set
+
+import cmk.utils.cleanup
+import cmk.utils.debug
+from cmk.utils.exceptions import MKGeneralException, MKTerminate, MKTimeout
+from cmk.utils.log import console
+from cmk.utils.type_defs import ConfigSerial, HostName, LATEST_SERIAL
+
+import cmk.base.config as config
+
+# Seconds between two checks of the master for a changed config serial
+_SERIAL_CHECK_INTERVAL = 1.0
+
+# Upper limit of a single request (a host name)
+_MAX_REQUEST_SIZE = 4096
+
+
+def current_serial() -> ConfigSerial:
+    """Return the serial the "latest" helper config link points to"""
+    latest_path = config.make_helper_config_path(LATEST_SERIAL)
+    try:
+        return ConfigSerial(os.readlink(latest_path))
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return ConfigSerial("")
+        raise
+
+
+def parse_request(request: bytes) -> HostName:
+    hostname = request.decode("utf-8").strip()
+    if not hostname or "\n" in hostname or "/" in hostname:
+        raise MKGeneralException("Invalid check helper request: %r" % request)
+    return hostname
+
+
+def format_response(exit_code: int, output: str) -> bytes:
+    return b"%d\n%s" % (exit_code, output.encode("utf-8"))
+
+
+def check_host(hostname: HostName) -> int:
+    """Execute the Check_MK service of the host just like the precompiled host check does"""
+    import cmk.base.checking as checking  # pylint: disable=import-outside-toplevel
+    try:
+        return checking.do_check(hostname, None)
+    except (MKTerminate, MKTimeout):
+        raise
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 3
+    except Exception as e:
+        if cmk.utils.debug.enabled():
+            raise
+        sys.stdout.write("UNKNOWN - Exception in check helper: %s (details in long output)\n" % e)
+        sys.stdout.write("Traceback: %s\n" % traceback.format_exc())
+        return 3
+    finally:
+        cmk.utils.cleanup.cleanup_globals()
+
+
+class _CheckHelper:
+    """A single forked helper process serving requests from the shared socket"""
+    def __init__(self, listen_socket: socket.socket, timeout: int) -> None:
+        self._listen_socket = listen_socket
+        self._timeout = timeout
+        self._busy = False
+        self._terminate = False
+
+    def serve(self) -> NoReturn:
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
+        signal.signal(signal.SIGALRM, self._handle_timeout)
+        exit_code = 0
+        try:
+            while not self._terminate:
+                connection, _address = self._listen_socket.accept()
+                self._busy = True
+                try:
+                    self._handle_connection(connection)
+                finally:
+                    self._busy = False
+        except MKTerminate:
+            pass
+        except Exception:
+            console.error("Check helper %d crashed: %s\n" % (os.getpid(), traceback.format_exc()))
+            exit_code = 1
+        os._exit(exit_code)
+
+    def _handle_sigterm(self, signum: int, stack_frame: Optional[FrameType]) -> None:
+        # Finish the current request before terminating. An idle helper can
+        # terminate immediately.
+        if not self._busy:
+            raise MKTerminate()
+        self._terminate = True
+
+    def _handle_timeout(self, signum: int, stack_frame: Optional[FrameType]) -> NoReturn:
+        raise MKTimeout("Check helper timed out after %d seconds" % self._timeout)
+
+    def _handle_connection(self, connection: socket.socket) -> None:
+        with connection:
+            try:
+                response = self._handle_request(connection.recv(_MAX_REQUEST_SIZE))
+            except MKTerminate:
+                raise
+            except Exception as e:
+                # A broken request must only fail its own connection, not the helper
+                console.error("Check helper %d failed to handle a request: %s\n" %
+                              (os.getpid(), traceback.format_exc()))
+                response = format_response(3, "UNKNOWN - Check helper error: %s\n" % e)
+
+            try:
+                connection.sendall(response)
+            except socket.error as e:
+                console.error("Check helper %d failed to send the response: %s\n" %
+                              (os.getpid(), e))
+
+    def _handle_request(self, request: bytes) -> bytes:
+        hostname = parse_request(request)
+
+        output = io.StringIO()
+        signal.alarm(self._timeout)
+        try:
+            with redirect_stdout(output):
+                exit_code = check_host(hostname)
+        except MKTimeout as e:
+            output.write("UNKNOWN - %s\n" % e)
+            exit_code = 3
+        finally:
+            signal.alarm(0)
+
+        return format_response(exit_code, output.getvalue())
+
+
+class CheckHelperPool:
+    """The master process of the check helpers"""
+    def __init__(self, num_helpers: int, socket_path: Path, timeout: int) -> None:
+        super(CheckHelperPool, self).__init__()
+        self._num_helpers = num_helpers
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._helpers: Set[int] = set()
+
+    def run(self) -> None:
+        serial = current_serial()
+        config.load_packed_config(LATEST_SERIAL)
+
+        listen_socket = self._open_socket()
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
+        try:
+            console.verbose("Starting %d check helpers for config serial %s\n" %
+                            (self._num_helpers, serial))
+            while True:
+                self._reap_helpers()
+                self._start_helpers(listen_socket)
+
+                if current_serial() != serial:
+                    console.verbose("Configuration has changed. Restarting myself.\n")
+                    break
+
+                time.sleep(_SERIAL_CHECK_INTERVAL)
+        finally:
+            self._stop_helpers()
+            listen_socket.close()
+            self._remove_socket()
+
+        sys.stdout.flush()
+        os.execvp(sys.argv[0], sys.argv)
+
+    def _handle_sigterm(self, signum: int, stack_frame: Optional[FrameType]) -> NoReturn:
+        raise MKTerminate()
+
+    def _open_socket(self) -> socket.socket:
+        self._remove_socket()
+        self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+        listen_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listen_socket.bind(str(self._socket_path))
+        listen_socket.listen(self._num_helpers * 4)
+        return listen_socket
+
+    def _remove_socket(self) -> None:
+        try:
+            self._socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _start_helpers(self, listen_socket: socket.socket) -> None:
+        while len(self._helpers) < self._num_helpers:
+            pid = os.fork()
+            if pid == 0:
+                _CheckHelper(listen_socket, self._timeout).serve()
+            self._helpers.add(pid)
+
+    def _reap_helpers(self) -> None:
+        while self._helpers:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            self._helpers.discard(pid)
+
+    def _stop_helpers(self) -> None:
+        for pid in self._helpers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        for pid in list(self._helpers):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self._helpers.discard(pid)
@@ -14,6 +14,16 @@
 #                cache info and piggyback lines that is used to process the
 #                data within Checkmk.
 
-from . import agent, fetcher_configuration, host_sections, ipmi, piggyback, programs, snmp, tcp
+from . import (
+    agent,
+    fetcher_configuration,
+    host_sections,
+    ipmi,
+    parsed_sections_cache,
+    piggyback,
+    programs,
+    snmp,
+    tcp,
+)
 from ._abstract import *
 from ._checkers import *
@@ -9,7 +9,8 @@
 # - Checking doesn't work - as it was before. Maybe we can handle this in the future.
 
 import itertools
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import cmk.utils.debug
 import cmk.utils.paths
@@ -18,7 +19,8 @@ import cmk.utils.tty as tty
 from cmk.utils.log import console
 from cmk.utils.type_defs import HostAddress, HostName, result, SourceType
 
-from cmk.fetchers.controller import FetcherMessage
+from cmk.fetchers.controller import FetcherMessage, L3Stats
+from cmk.fetchers.engine import FetcherEngine, FetchJob
 
 import cmk.base.api.agent_based.register as agent_based_register
 import cmk.base.check_table as check_table
@@ -29,13 +31,20 @@ from cmk.base.config import HostConfig, SelectedRawSections
 from ._abstract import ABCSource, Mode, ABCHostSections
 from .agent import AgentHostSections
 from .host_sections import HostKey, MultiHostSections
+from .parsed_sections_cache import ParsedSectionsCache
 from .ipmi import IPMISource
 from .piggyback import PiggybackSource
 from .programs import DSProgramSource, SpecialAgentSource
 from .snmp import SNMPSource
 from .tcp import TCPSource
 
-__all__ = ["update_host_sections", "make_sources", "make_nodes", "SourceResult"]
+__all__ = [
+    "fetch_concurrently",
+    "update_host_sections",
+    "make_sources",
+    "make_nodes",
+    "SourceResult",
+]
 
 SourceResult = Tuple[ABCSource, result.Result[ABCHostSections, Exception]]
 
@@ -234,6 +243,12 @@ def update_host_sections(
     else:
         console.verbose("%s+%s %s\n", tty.yellow, tty.normal, "Parse fetcher results".upper())
 
+    if config.parsed_sections_cache_max_age:
+        multi_host_sections.parsed_sections_cache = ParsedSectionsCache(
+            Path(cmk.utils.paths.parsed_sections_cache_dir),
+            config.parsed_sections_cache_max_age,
+        )
+
     # Special agents can produce data for the same check_plugin_name on the same host, in this case
     # the section lines need to be extended
     data: List[SourceResult] = []
@@ -288,6 +303,71 @@ def update_host_sections(
     return data
 
 
+def fetch_concurrently(
+    hosts: Iterable[Tuple[HostConfig, Sequence[ABCSource]]],
+    *,
+    max_cachefile_age: Optional[int],
+    selected_raw_sections: Optional[SelectedRawSections],
+) -> Iterator[Tuple[HostName, Sequence[FetcherMessage]]]:
+    """Fetch the data of the sources of many hosts at the same time
+
+    The fetcher messages of a host are yielded as soon as all its sources are done.
+    Hand them over to `update_host_sections()` together with the same sources.
+    This does not work for clusters, fetch the data of their nodes instead.
+
+    Without `max_cachefile_age`, the maximum cache age of each host is used.
+    """
+    jobs: List[FetchJob] = []
+    for host_config, sources in hosts:
+        try:
+            jobs.append(
+                _make_fetch_job(
+                    host_config,
+                    sources,
+                    max_cachefile_age=(host_config.max_cachefile_age
+                                       if max_cachefile_age is None else max_cachefile_age),
+                    selected_raw_sections=selected_raw_sections,
+                ))
+        except Exception as exc:
+            if cmk.utils.debug.enabled():
+                raise
+            yield host_config.hostname, [
+                FetcherMessage.from_raw_data(result.Error(exc), L3Stats({}), source.fetcher_type)
+                for source in sources
+            ]
+
+    yield from FetcherEngine(
+        max_concurrency=config.max_concurrent_fetches,
+        timeout=config.concurrent_fetch_timeout,
+        snmp_sockets=config.snmp_poller_sockets,
+        snmp_max_parallel_requests=config.snmp_max_parallel_requests_per_device,
+        snmp_max_request_rate=config.snmp_max_request_rate_per_device,
+    ).fetch(jobs)
+
+
+def _make_fetch_job(
+    host_config: HostConfig,
+    sources: Sequence[ABCSource],
+    *,
+    max_cachefile_age: int,
+    selected_raw_sections: Optional[SelectedRawSections],
+) -> FetchJob:
+    assert host_config.nodes is None, "cannot fetch the data of a cluster"
+    # Same source configuration as in update_host_sections()
+    for source in sources:
+        source.selected_raw_sections = selected_raw_sections
+        source.file_cache_max_age = max_cachefile_age
+
+    return FetchJob(
+        host_config.hostname,
+        [{
+            "fetcher_type": source.fetcher_type.name,
+            "fetcher_params": source.fetcher_configuration,
+        } for source in sources],
+        sources[0].mode if sources else Mode.NONE,
+    )
+
+
 def _make_piggyback_nodes(
     mode: Mode,
     config_cache: config.ConfigCache,
@@ -7,7 +7,7 @@
 import logging
 import time
 from pathlib import Path
-from typing import cast, Dict, Final, List, Optional, Tuple
+from typing import cast, Dict, Final, Iterator, List, Optional, Set, Tuple
 
 from six import ensure_binary, ensure_str
 
@@ -123,14 +123,27 @@ class AgentSource(ABCSource[AgentRawData, AgentHostSections]):
         # TODO: We should cleanup these old directories one day.
         #       Then we can remove this special case
         self.main_data_source: Final[bool] = main_data_source
+        # The raw sections delivered by the agent that have been skipped by the last
+        # parse() because no plugin of the host consumes them.
+        self.skipped_raw_sections: Set[SectionName] = set()
 
     def _make_parser(self) -> "AgentParser":
-        return AgentParser(
+        parser = AgentParser(
             self.hostname,
             self.persisted_sections_file_path,
             self.use_outdated_persisted_sections,
             self._logger,
+            selected_sections=self._selected_sections(),
         )
+        self.skipped_raw_sections = parser.skipped_sections
+        return parser
+
+    def _selected_sections(self) -> Optional[Set[SectionName]]:
+        # Only the checking knows exactly which plugins are going to be executed. Discovery
+        # and inventory need all sections (e.g. for the host labels).
+        if self.mode is not Mode.CHECKING or self.selected_raw_sections is None:
+            return None
+        return set(self.selected_raw_sections)
 
 
 class AgentSummarizer(ABCSummarizer[AgentHostSections]):
@@ -324,19 +337,24 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
         persisted_sections_file_path: Path,
         use_outdated_persisted_sections: bool,
         logger: logging.Logger,
+        selected_sections: Optional[Set[SectionName]] = None,
     ) -> None:
         super().__init__()
         self.hostname: Final[HostName] = hostname
         self.host_config = config.HostConfig.make_host_config(self.hostname)
         self.persisted_sections_file_path: Final[Path] = persisted_sections_file_path
         self.use_outdated_persisted_sections: Final[bool] = use_outdated_persisted_sections
+        # Only these sections are split into lines and words, all others are skipped. The
+        # "check_mk" section (needed for the summary) and persisted sections are always parsed.
+        self.selected_sections: Final[Optional[Set[SectionName]]] = selected_sections
+        self.skipped_sections: Set[SectionName] = set()
         self._logger = logger
 
     # TODO(ml): Refactor, we should structure the code so that we have one
     #   function per attribute in AgentHostSections (AgentHostSections.sections,
     #   AgentHostSections.cache_info, AgentHostSections.piggybacked_raw_data,
     #   and AgentHostSections.persisted_sections) and a few simple helper functions.
-    #   Moreover, the main loop of the parser (at `for line in raw_data.split(b"\n")`)
+    #   Moreover, the main loop of the parser (at `for header, lines in ...`)
     #   is an FSM and shoule be written as such.  (See CMK-5004)
     def parse(self, raw_data: AgentRawData) -> AgentHostSections:
         if config.agent_simulator:
@@ -377,71 +395,85 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
         agent_cache_info: SectionCacheInfo = {}
         separator: Optional[str] = None
         encoding = None
-        for line in raw_data.split(b"\n"):
-            line = line.rstrip(b"\r")
-            stripped_line = line.strip()
-            if stripped_line[:4] == b'<<<<' and stripped_line[-4:] == b'>>>>':
+        self.skipped_sections.clear()
+        for header, chunk in AgentParser._iter_chunks(raw_data):
+            if header is None:
+                pass
+
+            elif header[:4] == b'<<<<' and header[-4:] == b'>>>>':
                 piggybacked_hostname =\
-                    AgentParser._get_sanitized_and_translated_piggybacked_hostname(stripped_line, hostname)
+                    AgentParser._get_sanitized_and_translated_piggybacked_hostname(header, hostname)
 
             elif piggybacked_hostname:  # processing data for an other host
-                if stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
-                    line = AgentParser._add_cached_info_to_piggybacked_section_header(
-                        stripped_line, piggybacked_cached_at, piggybacked_cache_age)
-                piggybacked_raw_data.setdefault(piggybacked_hostname, []).append(line)
+                piggybacked_raw_data.setdefault(piggybacked_hostname, []).append(
+                    AgentParser._add_cached_info_to_piggybacked_section_header(
+                        header, piggybacked_cached_at, piggybacked_cache_age))
 
             # Found normal section header
             # section header format: <<<name:opt1(args):opt2:opt3(args)>>>
             # *) empty sections <<<>>> are allowed and will be skipped
-            elif stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
-                if stripped_line == b'<<<>>>':
-                    # Special case b'<<<>>>' is accepted: no data to process, skip it
-                    section_content = None
-                    continue
+            elif header == b'<<<>>>':
+                # Special case b'<<<>>>' is accepted: no data to process, skip it
+                section_content = None
 
-                section_name, section_options = AgentParser._parse_section_header(
-                    stripped_line[3:-3])
+            else:
+                section_name, section_options = AgentParser._parse_section_header(header[3:-3])
 
                 if section_name is None:
-                    self._logger.warning("Ignoring invalid raw section: %r" % stripped_line)
+                    self._logger.warning("Ignoring invalid raw section: %r" % header)
+                    section_content = None
+
+                elif not self._is_selected(section_name, section_options):
+                    # Don't even split the lines of sections no plugin is interested in
+                    self.skipped_sections.add(section_name)
                     section_content = None
-                    continue
-                section_content = sections.setdefault(section_name, [])
 
-                raw_separator = section_options.get("sep")
-                if raw_separator is None:
-                    separator = None
                 else:
-                    separator = chr(int(raw_separator))
-
-                # Split of persisted section for server-side caching
-                raw_persist = section_options.get("persist")
-                if raw_persist is not None:
-                    until = int(raw_persist)
-                    cached_at = int(time.time())  # Estimate age of the data
-                    cache_interval = int(until - cached_at)
-                    agent_cache_info[section_name] = (cached_at, cache_interval)
-                    persisted_sections[section_name] = (cached_at, until, section_content)
-
-                raw_cached = section_options.get("cached")
-                if raw_cached is not None:
-                    cache_times = list(map(int, raw_cached.split(",")))
-                    agent_cache_info[section_name] = cache_times[0], cache_times[1]
-
-                # The section data might have a different encoding
-                encoding = section_options.get("encoding")
-
-            elif stripped_line != b'':
-                if section_content is None:
+                    section_content = sections.setdefault(section_name, [])
+
+                    raw_separator = section_options.get("sep")
+                    if raw_separator is None:
+                        separator = None
+                    else:
+                        separator = chr(int(raw_separator))
+
+                    # Split of persisted section for server-side caching
+                    raw_persist = section_options.get("persist")
+                    if raw_persist is not None:
+                        until = int(raw_persist)
+                        cached_at = int(time.time())  # Estimate age of the data
+                        cache_interval = int(until - cached_at)
+                        agent_cache_info[section_name] = (cached_at, cache_interval)
+                        persisted_sections[section_name] = (cached_at, until, section_content)
+
+                    raw_cached = section_options.get("cached")
+                    if raw_cached is not None:
+                        cache_times = list(map(int, raw_cached.split(",")))
+                        agent_cache_info[section_name] = cache_times[0], cache_times[1]
+
+                    # The section data might have a different encoding
+                    encoding = section_options.get("encoding")
+
+            if piggybacked_hostname:
+                if chunk is not None:
+                    piggybacked_raw_data.setdefault(piggybacked_hostname, []).extend(
+                        line.rstrip(b"\r") for line in AgentParser._split_lines(chunk))
+                continue
+
+            if section_content is None:
+                continue
+
+            nostrip = section_options.get("nostrip") is not None
+            for line in AgentParser._split_lines(chunk):
+                stripped_line = line.strip()
+                if stripped_line == b'':
                     continue
 
-                raw_nostrip = section_options.get("nostrip")
-                if raw_nostrip is None:
-                    line = stripped_line
-
                 decoded_line = ensure_str_with_fallback(
-                    line, encoding=("utf-8" if encoding is None else encoding), fallback="latin-1")
-
+                    line.rstrip(b"\r") if nostrip else stripped_line,
+                    encoding=("utf-8" if encoding is None else encoding),
+                    fallback="latin-1",
+                )
                 section_content.append(decoded_line.split(separator))
 
         return AgentHostSections(
@@ -451,6 +483,47 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
             persisted_sections,
         )
 
+    def _is_selected(self, section_name: SectionName, section_options: Dict[str,
+                                                                            Optional[str]]) -> bool:
+        return (self.selected_sections is None or section_name in self.selected_sections or
+                section_name == SectionName("check_mk") or "persist" in section_options)
+
+    @staticmethod
+    def _iter_chunks(raw_data: bytes) -> Iterator[Tuple[Optional[bytes], Optional[memoryview]]]:
+        """Split the raw data at the header lines without copying it
+
+        Yields the stripped header line and a view of the lines up to the next header line. The
+        first chunk has no header line, chunks without lines have no view. Header lines are
+        lines starting with "<<<" and ending with ">>>", ignoring surrounding whitespace."""
+        data = memoryview(raw_data)
+        header: Optional[bytes] = None
+        chunk_start = 0
+        pos = raw_data.find(b"<<<")
+        while pos != -1:
+            line_start = raw_data.rfind(b"\n", 0, pos) + 1
+            line_end = raw_data.find(b"\n", pos)
+            if line_end == -1:
+                line_end = len(raw_data)
+
+            if not raw_data[line_start:pos].strip():
+                line = raw_data[pos:line_end].strip()
+                if line[-3:] == b">>>":
+                    # Exclude the newline terminating the last line of the chunk
+                    yield header, data[chunk_start:line_start -
+                                       1] if line_start > chunk_start else None
+                    header = line
+                    chunk_start = line_end + 1
+
+            pos = raw_data.find(b"<<<", line_end)
+
+        yield header, data[chunk_start:] if chunk_start <= len(raw_data) else None
+
+    @staticmethod
+    def _split_lines(chunk: Optional[memoryview]) -> List[bytes]:
+        if chunk is None:
+            return []
+        return chunk.tobytes().split(b"\n")
+
     @staticmethod
     def _parse_section_header(
         headerline: bytes,) -> Tuple[Optional[SectionName], Dict[str, Optional[str]]]:
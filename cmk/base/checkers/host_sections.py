@@ -43,6 +43,7 @@ from cmk.base.check_utils import AbstractSectionContent, FinalSectionContent, Pa
 from cmk.base.exceptions import MKParseFunctionError
 
 from ._abstract import ABCHostSections
+from .parsed_sections_cache import ParsedSectionsCache
 
 
 class MultiHostSections(MutableMapping[HostKey, ABCHostSections]):
@@ -58,6 +59,8 @@ class MultiHostSections(MutableMapping[HostKey, ABCHostSections]):
         # to 'agent_based' plugins.
         # This hodls the result of the parsing of individual raw sections
         self._parsing_results = caching.DictCache()
+        # Shares the parsing results with other runs on the same raw data
+        self.parsed_sections_cache: Optional[ParsedSectionsCache] = None
         # This hodls the result of the superseding section along with the
         # cache info of the raw section that was used.
         self._parsed_sections = caching.DictCache()
@@ -240,6 +243,11 @@ class MultiHostSections(MutableMapping[HostKey, ABCHostSections]):
         except KeyError:
             return self._parsing_results.setdefault(cache_key, None)
 
+        if self.parsed_sections_cache is not None:
+            return self._parsing_results.setdefault(
+                cache_key,
+                self.parsed_sections_cache.parse(host_key, section, data),
+            )
         return self._parsing_results.setdefault(cache_key, section.parse_function(data))
 
     # DEPRECATED
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Cache of parsed sections, shared by the checking, discovery and inventory of a host
+
+The modes often process the same raw data, e.g. the agent output of the cache
+file. The parsed sections are stored per host, source type and section
+together with a key computed from the raw section and the version of the parse
+function. A section is only parsed again in case one of them changed.
+
+Only sections that take some time to parse are stored, loading other ones would
+not be faster than parsing them.
+"""
+
+import functools
+import hashlib
+import logging
+import marshal
+import os
+import pickle
+import time
+import types
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+import cmk.utils.store as store
+import cmk.utils.version as cmk_version
+from cmk.utils.type_defs import HostKey
+
+from cmk.base.api.agent_based.type_defs import SectionPlugin
+
+__all__ = ["ParsedSectionsCache"]
+
+# Parsing faster than this is not worth writing the result
+_MIN_PARSE_TIME = 0.002  # secs
+
+
+class ParsedSectionsCache:
+    def __init__(self, base_dir: Path, max_age: int) -> None:
+        super().__init__()
+        self.base_dir = base_dir
+        self.max_age = max_age
+        self._logger = logging.getLogger("cmk.base.checkers.parsed_sections_cache")
+
+    def parse(self, host_key: HostKey, section: SectionPlugin, data: Any) -> Any:
+        """Parse the raw section, the result is taken from the cache if possible"""
+        key = _cache_key(section, data)
+        if key is None:
+            return section.parse_function(data)
+
+        path = self.base_dir / host_key.hostname / ("%s.%s" %
+                                                    (host_key.source_type.name, section.name))
+        cached = self._load(path, key)
+        if cached is not None:
+            self._logger.debug("Using cached parsed section %s", section.name)
+            return cached[0]
+
+        start = time.perf_counter()
+        parsed = section.parse_function(data)
+        if time.perf_counter() - start >= _MIN_PARSE_TIME:
+            self._save(path, key, parsed)
+        return parsed
+
+    def _load(self, path: Path, key: bytes) -> Optional[Tuple[Any]]:
+        try:
+            with path.open("rb") as f:
+                if time.time() - os.fstat(f.fileno()).st_mtime > self.max_age:
+                    return None
+                if f.read(len(key)) != key:
+                    return None
+                return (pickle.load(f),)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # E.g. the classes of the parsed section have changed
+            self._logger.debug("Cannot load the parsed section %s: %s", path, e)
+            return None
+
+    def _save(self, path: Path, key: bytes, parsed: Any) -> None:
+        try:
+            content = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self._logger.debug("Cannot store the parsed section %s: %s", path, e)
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        store.save_bytes_to_file(path, key + content)
+
+
+def _cache_key(section: SectionPlugin, data: Any) -> Optional[bytes]:
+    """The hash of the raw section and the version of the parse function"""
+    version = _parse_function_version(section.parse_function)
+    if version is None:
+        return None
+    try:
+        raw = marshal.dumps(data)
+    except ValueError:
+        return None
+    return hashlib.sha256(version + str(section.name).encode("utf-8") + raw).digest()
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_function_version(parse_function: Callable) -> Optional[bytes]:
+    """Identifies the code of the parse function and the functions it wraps
+
+    The functions called by the parse function are not considered. The
+    modification time of the file defining it and the Checkmk version change in
+    case of updates.
+    """
+    digest = hashlib.sha256(cmk_version.__version__.encode("utf-8"))
+    if not _update_with_function(digest, parse_function, depth=3):
+        return None
+    return digest.digest()
+
+
+def _update_with_function(digest: Any, function: Callable, depth: int) -> bool:
+    code = getattr(function, "__code__", None)
+    if not isinstance(code, types.CodeType):
+        return False
+
+    try:
+        digest.update(b"%d" % os.stat(code.co_filename).st_mtime_ns)
+    except OSError:
+        pass
+    _update_with_code(digest, code)
+
+    for cell in getattr(function, "__closure__", None) or ():
+        try:
+            contents = cell.cell_contents
+        except ValueError:
+            continue  # empty cell
+        if depth and isinstance(contents, types.FunctionType):
+            _update_with_function(digest, contents, depth - 1)
+    return True
+
+
+def _update_with_code(digest: Any, code: types.CodeType) -> None:
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode("utf-8"))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _update_with_code(digest, const)
+        elif isinstance(const, frozenset):
+            # The order of the elements depends on the hash seed of the process
+            digest.update(repr(sorted(repr(e) for e in const)).encode("utf-8"))
+        else:
+            digest.update(repr(const).encode("utf-8"))
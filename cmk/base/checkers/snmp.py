@@ -154,9 +154,18 @@ class SNMPSource(ABCSource[SNMPRawData, SNMPHostSections]):
                 config.snmp_without_sys_descr,
             ),
             use_snmpwalk_cache=self.use_snmpwalk_cache,
+            scan_cache_max_age=self._make_scan_cache_max_age(),
             snmp_config=self.snmp_config,
         )
 
+    def _make_scan_cache_max_age(self) -> int:
+        # Reuse the result of an earlier SNMP scan only where cached data is welcome anyway.
+        # A full scan ("@scan", "--no-cache", periodic discovery with scan) probes again.
+        if (not self.file_cache_max_age or FileCacheFactory.disabled or
+                FileCacheFactory.snmp_disabled):
+            return 0
+        return config.snmp_scan_cache_max_age
+
     def _make_parser(self) -> "SNMPParser":
         return SNMPParser(
             self.hostname,
@@ -225,6 +234,8 @@ class SNMPSource(ABCSource[SNMPRawData, SNMPHostSections]):
             backend = "Inline"
         elif snmp_config.snmp_backend == "pysnmp":
             backend = "PySNMP"
+        elif snmp_config.snmp_backend == "native":
+            backend = "Native"
         else:
             backend = "Classic"
 
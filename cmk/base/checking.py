@@ -7,7 +7,10 @@
 
 import copy
 import errno
+import functools
+import multiprocessing
 import os
+import select
 import signal
 import time
 from random import Random
@@ -17,10 +20,13 @@ from typing import (
     AnyStr,
     Callable,
     cast,
+    Counter,
     Dict,
     IO,
     Iterable,
+    Iterator,
     List,
+    NamedTuple,
     Optional,
     Sequence,
     Set,
@@ -67,7 +73,7 @@ import cmk.base.ip_lookup as ip_lookup
 import cmk.base.item_state as item_state
 import cmk.base.license_usage as license_usage
 import cmk.base.utils
-from cmk.base.api.agent_based import checking_classes, value_store
+from cmk.base.api.agent_based import checking_classes, item_index, value_store
 from cmk.base.api.agent_based.register.check_plugins_legacy import wrap_parameters
 from cmk.base.api.agent_based.type_defs import Parameters
 from cmk.base.check_api_utils import MGMT_ONLY as LEGACY_MGMT_ONLY
@@ -91,6 +97,10 @@ _checkresult_file_path = None
 _submit_to_core = True
 _show_perfdata = False
 
+# Counts per host how often the raw sections have been skipped by the parsers because no
+# plugin of the host consumes them. Kept over the lifetime of a keepalive process.
+_skipped_raw_sections: Dict[HostName, Counter[SectionName]] = {}
+
 ServiceCheckResultWithOptionalDetails = Tuple[ServiceState, ServiceDetails, List[MetricTuple]]
 
 #.
@@ -130,6 +140,7 @@ def do_check(
     infotexts: List[ServiceDetails] = []
     long_infotexts: List[ServiceAdditionalDetails] = []
     perfdata: List[str] = []
+    _reset_submission_counters()
     try:
         with cpu_tracking.execute(), cpu_tracking.phase("busy"):
             license_usage.try_history_update()
@@ -140,7 +151,7 @@ def do_check(
             if ipaddress is None and not host_config.is_cluster:
                 ipaddress = ip_lookup.lookup_ip_address(host_config)
 
-            item_state.load(hostname)
+            item_state.load(hostname, config.item_state_shards)
 
             # When monitoring Checkmk clusters, the cluster nodes are responsible for fetching all
             # information from the monitored host and cache the result for the cluster checks to be
@@ -194,15 +205,17 @@ def do_check(
                 host_config=host_config,
                 fetcher_messages=fetcher_messages,
             )
+            _count_skipped_raw_sections(hostname, (source for source, _result in result))
 
-            num_success, plugins_missing_data = _do_all_checks_on_host(
-                config_cache,
-                host_config,
-                ipaddress,
-                multi_host_sections=mhs,
-                services=services_to_check,
-                only_check_plugins=only_check_plugin_names,
-            )
+            with item_index.check_cycle():
+                num_success, plugins_missing_data = _do_all_checks_on_host(
+                    config_cache,
+                    host_config,
+                    ipaddress,
+                    multi_host_sections=mhs,
+                    services=services_to_check,
+                    only_check_plugins=only_check_plugin_names,
+                )
             inventory.do_inventory_actions_during_checking_for(
                 config_cache,
                 host_config,
@@ -255,6 +268,13 @@ def do_check(
 
         return status, infotexts, long_infotexts, perfdata
     finally:
+        try:
+            _flush_check_results()
+        except Exception as e:
+            # Don't hide the exception of the check itself and close the check result file
+            if cmk.utils.debug.enabled():
+                raise
+            console.error("Failed to submit the check results: %s\n" % e)
         if _checkresult_file_fd is not None:
             _close_checkresult_file()
 
@@ -320,8 +340,7 @@ def _do_all_checks_on_host(
     plugins_missing_data: Set[CheckPluginName] = set()
 
     check_api_utils.set_hostname(hostname)
-    for service in services:
-        success = execute_check(multi_host_sections, host_config, ipaddress, service)
+    for service, success in _execute_checks(multi_host_sections, host_config, ipaddress, services):
         if success:
             num_success += 1
         else:
@@ -330,6 +349,144 @@ def _do_all_checks_on_host(
     return num_success, sorted(plugins_missing_data)
 
 
+def _execute_checks(
+    multi_host_sections: MultiHostSections,
+    host_config: config.HostConfig,
+    ipaddress: Optional[HostAddress],
+    services: List[Service],
+) -> Iterator[Tuple[Service, bool]]:
+    """Execute the checks of the services, in parallel if configured
+
+    Hosts with at least check_worker_min_services services are checked by
+    check_worker_processes forked worker processes. The sections are parsed
+    before forking, so the workers share the parsed sections of the host. The
+    results and the modified item states of the services are taken over in the
+    order of the services, independent of the worker that checked them.
+    Legacy mode cluster checks are always executed by this process.
+    """
+    if (config.check_worker_processes <= 1 or len(services) < config.check_worker_min_services):
+        for service in services:
+            yield service, execute_check(multi_host_sections, host_config, ipaddress, service)
+        return
+
+    plugins = {
+        service.check_plugin_name: agent_based_register.get_check_plugin(service.check_plugin_name)
+        for service in services
+    }
+    parallel_services = [
+        service for service in services
+        if not _uses_legacy_mode(host_config, plugins[service.check_plugin_name])
+    ]
+    _parse_sections(multi_host_sections, plugins.values())
+    # Each worker gets several chunks, which balances services that take longer
+    processes = min(config.check_worker_processes, len(parallel_services)) or 1
+    chunk_size = -(-len(parallel_services) // (processes * 4))
+    chunks = [(start, min(start + chunk_size, len(parallel_services)))
+              for start in range(0, len(parallel_services), chunk_size or 1)]
+
+    # The workers are forked and inherit the parsed sections and the item states, the
+    # initializer arguments are not pickled.
+    with multiprocessing.get_context("fork").Pool(
+            processes=processes,
+            initializer=_init_check_worker,
+            initargs=(multi_host_sections, host_config, ipaddress, parallel_services),
+    ) as pool:
+        results = (result for chunk_results in pool.imap(_check_services_chunk, chunks)
+                   for result in chunk_results)
+        for service in services:
+            plugin = plugins[service.check_plugin_name]
+            if _uses_legacy_mode(host_config, plugin):
+                yield service, execute_check(multi_host_sections, host_config, ipaddress, service)
+                continue
+
+            aggregated_result, modified_item_states = next(results)
+            item_state.update_item_states(modified_item_states)
+            check_api_utils.set_service(str(service.check_plugin_name), service.description)
+            yield service, _handle_aggregated_result(
+                multi_host_sections,
+                host_config,
+                service,
+                plugin,
+                aggregated_result,
+            )
+
+
+def _parse_sections(
+    multi_host_sections: MultiHostSections,
+    plugins: Iterable[Optional[checking_classes.CheckPlugin]],
+) -> None:
+    """Parse the sections of the plugins for all hosts"""
+    for plugin in plugins:
+        if plugin is None:
+            continue
+        try:
+            # Parses the sections of all hosts as a side effect
+            multi_host_sections.get_cache_info(plugin.sections)
+        except Exception:
+            # A crash dump is created by the worker checking the service
+            pass
+
+
+class _CheckWorkerConfig(NamedTuple):
+    multi_host_sections: MultiHostSections
+    host_config: config.HostConfig
+    ipaddress: Optional[HostAddress]
+    services: List[Service]
+
+
+_check_worker_config: Optional[_CheckWorkerConfig] = None
+
+
+def _init_check_worker(*args: Any) -> None:
+    global _check_worker_config
+    _check_worker_config = _CheckWorkerConfig(*args)
+    # The item states modified by the parent are saved by the parent
+    item_state.pop_modified_item_states()
+
+
+def _check_services_chunk(
+    chunk: Tuple[int, int]
+) -> List[Tuple[Tuple[bool, bool, ServiceCheckResult], item_state.ModifiedItemStates]]:
+    assert _check_worker_config is not None
+    worker_config = _check_worker_config
+
+    results = []
+    for service in worker_config.services[chunk[0]:chunk[1]]:
+        check_api_utils.set_service(str(service.check_plugin_name), service.description)
+        aggregated_result = get_aggregated_result(
+            worker_config.multi_host_sections,
+            worker_config.host_config,
+            worker_config.ipaddress,
+            service,
+            agent_based_register.get_check_plugin(service.check_plugin_name),
+            functools.partial(determine_check_params, service.parameters),
+        )
+        results.append((aggregated_result, item_state.pop_modified_item_states()))
+    return results
+
+
+def _count_skipped_raw_sections(
+    hostname: HostName,
+    sources: Iterable[checkers.ABCSource],
+) -> None:
+    skipped: Set[SectionName] = set()
+    for source in sources:
+        if isinstance(source, checkers.agent.AgentSource):
+            skipped.update(source.skipped_raw_sections)
+
+    if not skipped:
+        return
+
+    console.vverbose("Skipped raw sections not needed by any plugin: %s\n" %
+                     ", ".join(sorted(str(s) for s in skipped)))
+    _skipped_raw_sections.setdefault(hostname, Counter()).update(skipped)
+
+
+def get_skipped_raw_sections_stats(hostname: HostName) -> Counter[SectionName]:
+    """Tells how often each raw section of the host has been skipped while checking"""
+    return _skipped_raw_sections.get(hostname, Counter())
+
+
 def _get_services_to_fetch(
     host_name: HostName,
     belongs_to_cluster: bool,
@@ -403,8 +560,7 @@ def execute_check(multi_host_sections: MultiHostSections, host_config: config.Ho
     check_api_utils.set_service(str(service.check_plugin_name), service.description)
 
     # check if we must use legacy mode. remove this block entirely one day
-    if (plugin is not None and host_config.is_cluster and
-            plugin.cluster_check_function.__name__ == "cluster_legacy_mode_from_hell"):
+    if _uses_legacy_mode(host_config, plugin):
         return _execute_check_legacy_mode(
             multi_host_sections,
             host_config.hostname,
@@ -412,15 +568,36 @@ def execute_check(multi_host_sections: MultiHostSections, host_config: config.Ho
             service,
         )
 
-    submit, data_received, result = get_aggregated_result(
+    return _handle_aggregated_result(
         multi_host_sections,
         host_config,
-        ipaddress,
         service,
         plugin,
-        lambda: determine_check_params(service.parameters),
+        get_aggregated_result(
+            multi_host_sections,
+            host_config,
+            ipaddress,
+            service,
+            plugin,
+            lambda: determine_check_params(service.parameters),
+        ),
     )
 
+
+def _uses_legacy_mode(host_config: config.HostConfig,
+                      plugin: Optional[checking_classes.CheckPlugin]) -> bool:
+    return (plugin is not None and host_config.is_cluster and
+            plugin.cluster_check_function.__name__ == "cluster_legacy_mode_from_hell")
+
+
+def _handle_aggregated_result(
+    multi_host_sections: MultiHostSections,
+    host_config: config.HostConfig,
+    service: Service,
+    plugin: Optional[checking_classes.CheckPlugin],
+    aggregated_result: Tuple[bool, bool, ServiceCheckResult],
+) -> bool:
+    submit, data_received, result = aggregated_result
     if submit:
         _submit_check_result(
             host_config.hostname,
@@ -970,15 +1147,155 @@ def _do_submit_to_core(
                                  "Must be 'pipe' or 'file'" % config.check_submission)
 
 
+class _CheckResultBuffer:
+    """Collects the formatted check results for the core, they are written in batches
+
+    Each batch is written with a single writev() call. A batch is limited to
+    max_write_size bytes, unless a single record is larger.
+
+    The counters are kept until they are reset, i.e. for the current host:
+
+    * results: Number of check results written
+    * writes: Number of write system calls
+    * bytes: Number of bytes written
+    * blocked_time: Time spent in the write system calls, e.g. waiting for the core to
+      read from the command pipe
+    """
+    # The maximum number of records of a writev() call (IOV_MAX of Linux)
+    _MAX_RECORDS = 1024
+
+    def __init__(self, max_write_size: Optional[int] = None) -> None:
+        super().__init__()
+        self._max_write_size = max_write_size
+        self._records: List[bytes] = []
+        self._size = 0
+        self._first_added = 0.0
+        self.results = 0
+        self.writes = 0
+        self.bytes = 0
+        self.blocked_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def reset_counters(self) -> None:
+        self.results = 0
+        self.writes = 0
+        self.bytes = 0
+        self.blocked_time = 0.0
+
+    def add(self, record: bytes) -> None:
+        if not self._records:
+            self._first_added = time.monotonic()
+        self._records.append(record)
+        self._size += len(record)
+
+    def is_due(self, max_size: int, max_delay: float) -> bool:
+        return bool(self._records) and (self._size >= max_size or
+                                        time.monotonic() - self._first_added >= max_delay)
+
+    def discard(self) -> None:
+        self._records, self._size = [], 0
+
+    def write(self, fd: int) -> None:
+        records = self._records
+        self.discard()
+        for batch in self._batches(records):
+            start = time.monotonic()
+            try:
+                self._write_batch(fd, batch)
+            finally:
+                self.blocked_time += time.monotonic() - start
+            self.results += len(batch)
+
+    def _batches(self, records: List[bytes]) -> Iterator[List[bytes]]:
+        batch: List[bytes] = []
+        batch_size = 0
+        for record in records:
+            if batch and (len(batch) == self._MAX_RECORDS or
+                          (self._max_write_size is not None and
+                           batch_size + len(record) > self._max_write_size)):
+                yield batch
+                batch, batch_size = [], 0
+            batch.append(record)
+            batch_size += len(record)
+        if batch:
+            yield batch
+
+    def _write_batch(self, fd: int, batch: List[bytes]) -> None:
+        while batch:
+            written = os.writev(fd, batch)
+            self.writes += 1
+            self.bytes += written
+            # Continue after a partial write, e.g. interrupted by a signal
+            while batch and written >= len(batch[0]):
+                written -= len(batch[0])
+                batch = batch[1:]
+            if written:
+                batch = [batch[0][written:]] + batch[1:]
+
+
+# Writes to a pipe are only atomic up to PIPE_BUF bytes, larger writes may be interleaved
+# with the commands of other processes.
+_command_pipe_buffer = _CheckResultBuffer(max_write_size=select.PIPE_BUF)
+_checkresult_file_buffer = _CheckResultBuffer()
+
+
+def get_submission_counters() -> Dict[str, float]:
+    """Tells how the check results of the current host were written to the core"""
+    buffers = (_command_pipe_buffer, _checkresult_file_buffer)
+    return {
+        "results": sum(b.results for b in buffers),
+        "writes": sum(b.writes for b in buffers),
+        "bytes": sum(b.bytes for b in buffers),
+        "blocked_time": sum(b.blocked_time for b in buffers),
+    }
+
+
+def _reset_submission_counters() -> None:
+    # A check helper checks many hosts, the counters are shown per host
+    for buf in (_command_pipe_buffer, _checkresult_file_buffer):
+        buf.reset_counters()
+
+
+def _flush_check_results_if_due() -> None:
+    if any(
+            b.is_due(config.check_submission_buffer_size, config.check_submission_max_delay)
+            for b in (_command_pipe_buffer, _checkresult_file_buffer)):
+        _flush_check_results()
+
+
+def _flush_check_results() -> None:
+    if _command_pipe_buffer:
+        try:
+            _open_command_pipe()
+        finally:
+            if _nagios_command_pipe is not None and not isinstance(_nagios_command_pipe, bool):
+                _command_pipe_buffer.write(_nagios_command_pipe.fileno())
+            else:
+                _command_pipe_buffer.discard()
+
+    if _checkresult_file_buffer:
+        try:
+            _open_checkresult_file()
+        finally:
+            if _checkresult_file_fd:
+                _checkresult_file_buffer.write(_checkresult_file_fd)
+            else:
+                _checkresult_file_buffer.discard()
+
+    counters = get_submission_counters()
+    console.vverbose("Submitted %d check results with %d writes (%d bytes, blocked %.3f sec)\n",
+                     counters["results"], counters["writes"], counters["bytes"],
+                     counters["blocked_time"])
+
+
 def _submit_via_check_result_file(host: HostName, service: ServiceName, state: ServiceState,
                                   output: ServiceDetails) -> None:
     output = output.replace("\n", "\\n")
-    _open_checkresult_file()
-    if _checkresult_file_fd:
-        now = time.time()
-        os.write(
-            _checkresult_file_fd,
-            ensure_binary("""host_name=%s
+    now = time.time()
+    _checkresult_file_buffer.add(
+        ensure_binary("""host_name=%s
 service_description=%s
 check_type=1
 check_options=0
@@ -990,6 +1307,7 @@ return_code=%d
 output=%s
 
 """ % (ensure_str(host), ensure_str(service), now, now, state, ensure_str(output))))
+    _flush_check_results_if_due()
 
 
 def _open_checkresult_file() -> None:
@@ -1079,15 +1397,13 @@ def _close_checkresult_file() -> None:
 def _submit_via_command_pipe(host: HostName, service: ServiceName, state: ServiceState,
                              output: ServiceDetails) -> None:
     output = output.replace("\n", "\\n")
-    _open_command_pipe()
-    if _nagios_command_pipe is not None and not isinstance(_nagios_command_pipe, bool):
-        # [<timestamp>] PROCESS_SERVICE_CHECK_RESULT;<host_name>;<svc_description>;<return_code>;<plugin_output>
-        msg = "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s\n" % (time.time(), host, service,
-                                                                   state, output)
-        _nagios_command_pipe.write(ensure_binary(msg))
-        # Important: Nagios needs the complete command in one single write() block!
-        # Python buffers and sends chunks of 4096 bytes, if we do not flush.
-        _nagios_command_pipe.flush()
+    # [<timestamp>] PROCESS_SERVICE_CHECK_RESULT;<host_name>;<svc_description>;<return_code>;<plugin_output>
+    msg = "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s\n" % (time.time(), host, service, state,
+                                                               output)
+    # Important: Nagios needs the complete command in one single write() block! The commands
+    # are written unbuffered with writev(), which also keeps each command in one piece.
+    _command_pipe_buffer.add(ensure_binary(msg))
+    _flush_check_results_if_due()
 
 
 def _open_command_pipe() -> None:
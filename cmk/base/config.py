@@ -2596,12 +2596,16 @@ class HostConfig:
                 return "pysnmp"
             if host_backend in ["classic", True]:
                 return "classic"
+            if host_backend == "native":
+                return "native"
             raise MKGeneralException("Bad Host SNMP Backend configuration: %s" % host_backend)
 
         if has_inline_snmp and snmp_backend_default in ["inline", True]:
             return "inline"
         if has_pysnmp and snmp_backend_default == "pysnmp":
             return "pysnmp"
+        if snmp_backend_default == "native":
+            return "native"
         return "classic"
 
     def _is_cluster(self) -> bool:
@@ -3189,6 +3193,8 @@ class ConfigCache:
             clusters_of=self._clusters_of_cache,
             nodes_of=self._nodes_of_cache,
             all_configured_hosts=self._all_configured_hosts,
+            matching_hosts_cache_path=Path(cmk.utils.paths.tmp_dir, "ruleset_matcher",
+                                           "matching_hosts"),
         )
 
         # Warning: do not change call order. all_active_hosts relies on the other values
@@ -3450,10 +3456,29 @@ class ConfigCache:
         """Returns the list of servicegroups of this services"""
         return self.service_extra_conf(hostname, description, service_groups)
 
+    def servicegroups_of_services(
+            self, hostname: HostName,
+            descriptions: Sequence[ServiceName]) -> Dict[ServiceName, List[ServicegroupName]]:
+        """Returns the servicegroups of many services of a host"""
+        return self.service_extra_conf_of_services(hostname, descriptions, service_groups)
+
     def contactgroups_of_service(self, hostname: HostName, description: ServiceName) -> List[str]:
         """Returns the list of contactgroups of this service"""
-        cgrs: Set[str] = set()
-        cgrs.update(self.service_extra_conf(hostname, description, service_contactgroups))
+        return self._service_contactgroups(
+            self.service_extra_conf(hostname, description, service_contactgroups))
+
+    def contactgroups_of_services(
+            self, hostname: HostName,
+            descriptions: Sequence[ServiceName]) -> Dict[ServiceName, List[str]]:
+        """Returns the contactgroups of many services of a host"""
+        return {
+            description: self._service_contactgroups(contactgroups)
+            for description, contactgroups in self.service_extra_conf_of_services(
+                hostname, descriptions, service_contactgroups).items()
+        }
+
+    def _service_contactgroups(self, contactgroups: List[str]) -> List[str]:
+        cgrs: Set[str] = set(contactgroups)
 
         if monitoring_core == "nagios" and enable_rulebased_notifications:
             cgrs.add("check-mk-notify")
@@ -3600,6 +3625,20 @@ class ConfigCache:
                 is_binary=False,
             ))
 
+    def service_extra_conf_of_services(self, hostname: HostName,
+                                       descriptions: Sequence[ServiceName],
+                                       ruleset: Ruleset) -> Dict[ServiceName, List]:
+        """Compute outcome of a service rule set for many services of a host at once"""
+        match_objects = [
+            self.ruleset_match_object_of_service(hostname, description)
+            for description in descriptions
+        ]
+        values = self.ruleset_matcher.get_service_ruleset_values_of_services(hostname,
+                                                                             match_objects,
+                                                                             ruleset,
+                                                                             is_binary=False)
+        return dict(zip(descriptions, values))
+
     def get_service_ruleset_value(self, hostname: HostName, description: ServiceName,
                                   ruleset: Ruleset, deflt: Any) -> Any:
         """Compute first match service ruleset outcome with fallback to a default value"""
@@ -401,6 +401,9 @@ def _create_core_config(core: MonitoringCore) -> ConfigurationWarnings:
 
     cmk.utils.password_store.save(config.stored_passwords)
 
+    # All rulesets have been evaluated for all hosts. Keep the results for the next run.
+    config.get_config_cache().ruleset_matcher.ruleset_optimizer.save_matching_hosts_cache()
+
     return get_configuration_warnings()
 
 
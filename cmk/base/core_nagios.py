@@ -309,7 +309,12 @@ def _create_nagios_servicedefs(cfg: NagiosConfig, config_cache: ConfigCache, hos
     host_check_table = get_check_table(hostname)
     have_at_least_one_service = False
     used_descriptions: Dict[ServiceName, AbstractServiceID] = {}
-    for service in sorted(host_check_table.values(), key=lambda s: (s.check_plugin_name, s.item)):
+    services = sorted(host_check_table.values(), key=lambda s: (s.check_plugin_name, s.item))
+    # Match the group rulesets against all services of the host in one go
+    descriptions = [service.description for service in services if service.description]
+    contactgroups = config_cache.contactgroups_of_services(hostname, descriptions)
+    servicegroups = config_cache.servicegroups_of_services(hostname, descriptions)
+    for service in services:
 
         # TODO (mo): This should be done by the service object, much earlier.
         if not service.description:
@@ -352,8 +357,9 @@ def _create_nagios_servicedefs(cfg: NagiosConfig, config_cache: ConfigCache, hos
         service_spec.update(
             core_config.get_cmk_passive_service_attributes(config_cache, host_config, service,
                                                            check_mk_attrs))
-        service_spec.update(_extra_service_conf_of(cfg, config_cache, hostname,
-                                                   service.description))
+        service_spec.update(
+            _extra_service_conf(cfg, contactgroups[service.description],
+                                servicegroups[service.description]))
 
         cfg.write(_format_nagios_object("service", service_spec))
 
@@ -860,18 +866,22 @@ def _quote_nagios_string(s: str) -> str:
 def _extra_service_conf_of(cfg: NagiosConfig, config_cache: ConfigCache, hostname: HostName,
                            description: ServiceName) -> ObjectSpec:
     """Collect all extra configuration data for a service"""
+    return _extra_service_conf(cfg, config_cache.contactgroups_of_service(hostname, description),
+                               config_cache.servicegroups_of_service(hostname, description))
+
+
+def _extra_service_conf(cfg: NagiosConfig, sercgr: List[str],
+                        sergr: List[ServicegroupName]) -> ObjectSpec:
     service_spec: ObjectSpec = {}
 
     # Add contact groups to the config only if the user has defined them.
     # Otherwise inherit the contact groups from the host.
     # "check-mk-notify" is always returned for rulebased notifications and
     # the Nagios core and not defined by the user.
-    sercgr = config_cache.contactgroups_of_service(hostname, description)
     if sercgr != ['check-mk-notify']:
         service_spec["contact_groups"] = ",".join(sercgr)
         cfg.contactgroups_to_define.update(sercgr)
 
-    sergr = config_cache.servicegroups_of_service(hostname, description)
     if sergr:
         service_spec["service_groups"] = ",".join(sergr)
         if config.define_servicegroups:
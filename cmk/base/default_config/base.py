@@ -30,6 +30,35 @@ use_dns_cache = True  # prevent DNS by using own cache file
 delay_precompile = False  # delay Python compilation to Nagios execution
 restart_locking = "abort"  # also possible: "wait", None
 check_submission = "file"  # alternative: "pipe"
+# The check results are written to the command pipe or check result file in batches, at
+# the latest when this number of bytes is collected, after this delay and after each host
+check_submission_buffer_size = 65536  # bytes
+check_submission_max_delay = 1.0  # secs
+# Number of shard files of the site wide item state database (0: one file per host)
+item_state_shards = 0
+# Fetch the data of up to this number of hosts at the same time when discovering
+# or inventorizing multiple hosts at once (e.g. "cmk -II", "cmk --inventory")
+max_concurrent_fetches = 50
+concurrent_fetch_timeout = 120.0  # secs per host
+# SNMP devices using the native backend are polled by the process fetching
+# concurrently, their requests share this number of UDP sockets
+snmp_poller_sockets = 4
+snmp_max_parallel_requests_per_device = 1
+snmp_max_request_rate_per_device = 0.0  # requests per second (0: no limit)
+# Reuse the sections found by the SNMP scan of a device with unchanged system
+# description and object for this long, when cached data may be used (0: never)
+snmp_scan_cache_max_age = 86400  # secs
+# Share the parsed sections between the checking, discovery and inventory of a host
+# processing the same raw data, e.g. the agent output of the cache file (0: disabled)
+parsed_sections_cache_max_age = 0  # secs
+# Number of processes discovering the hosts of a bulk discovery in parallel
+# (1: discover one host after another)
+discovery_worker_processes = 1
+discovery_host_timeout = 300  # secs per host, only used by the worker processes
+# Number of processes executing the checks of a host in parallel, only used for hosts
+# with at least check_worker_min_services services (1: one service after another)
+check_worker_processes = 1
+check_worker_min_services = 200
 agent_min_version = 0  # warn, if plugin has not at least version
 default_host_group = 'check_mk'
 
@@ -4,10 +4,12 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import multiprocessing
 import os
 import signal
 import socket
 import time
+from contextlib import contextmanager
 from enum import Enum
 from types import FrameType
 from typing import (
@@ -20,7 +22,6 @@ from typing import (
     Iterator,
     List,
     NamedTuple,
-    NoReturn,
     Optional,
     Pattern,
     Sequence,
@@ -42,7 +43,7 @@ from cmk.utils.check_utils import (
     unwrap_parameters,
     wrap_parameters,
 )
-from cmk.utils.exceptions import MKException, MKGeneralException, MKTimeout
+from cmk.utils.exceptions import MKGeneralException, MKTimeout
 from cmk.utils.labels import DiscoveredHostLabelsStore
 from cmk.utils.log import console
 from cmk.utils.regex import regex
@@ -331,20 +332,19 @@ def do_discovery(arg_hostnames: Set[HostName], check_plugin_names: Optional[Set[
 
     host_names = _preprocess_hostnames(arg_hostnames, config_cache)
 
-    # Now loop through all hosts
+    # If check plugins are specified via command line,
+    # see which raw sections we may need
+    selected_raw_sections: Optional[SelectedRawSections] = None
+    if check_plugin_names is not None:
+        selected_raw_sections = agent_based_register.get_relevant_raw_sections(
+            check_plugin_names=check_plugin_names, consider_inventory_plugins=False)
+
+    host_sources: Dict[HostName, Tuple[config.HostConfig, Optional[HostAddress],
+                                       Sequence[checkers.ABCSource]]] = {}
     for hostname in sorted(host_names):
-        host_config = config_cache.get_host_config(hostname)
-        section.section_begin(hostname)
         try:
+            host_config = config_cache.get_host_config(hostname)
             ipaddress = ip_lookup.lookup_ip_address(host_config)
-
-            # If check plugins are specified via command line,
-            # see which raw sections we may need
-            selected_raw_sections: Optional[SelectedRawSections] = None
-            if check_plugin_names is not None:
-                selected_raw_sections = agent_based_register.get_relevant_raw_sections(
-                    check_plugin_names=check_plugin_names, consider_inventory_plugins=False)
-
             sources = checkers.make_sources(
                 host_config,
                 ipaddress,
@@ -352,7 +352,24 @@ def do_discovery(arg_hostnames: Set[HostName], check_plugin_names: Optional[Set[
             )
             for source in sources:
                 _configure_sources(source, discovery_parameters=discovery_parameters)
+        except Exception as e:
+            if cmk.utils.debug.enabled():
+                raise
+            section.section_begin(hostname)
+            section.section_error("%s" % e)
+            continue
+        host_sources[hostname] = host_config, ipaddress, sources
 
+    # Fetch the data of all hosts at once and process the hosts in the order their data arrives
+    fetched = checkers.fetch_concurrently(
+        ((host_config, sources) for host_config, _ipaddress, sources in host_sources.values()),
+        max_cachefile_age=config.discovery_max_cachefile_age(use_caches),
+        selected_raw_sections=selected_raw_sections,
+    )
+    for hostname, fetcher_messages in fetched:
+        host_config, ipaddress, sources = host_sources.pop(hostname)
+        section.section_begin(hostname)
+        try:
             multi_host_sections = MultiHostSections()
             checkers.update_host_sections(
                 multi_host_sections,
@@ -366,6 +383,7 @@ def do_discovery(arg_hostnames: Set[HostName], check_plugin_names: Optional[Set[
                 selected_raw_sections=selected_raw_sections,
                 max_cachefile_age=config.discovery_max_cachefile_age(use_caches),
                 host_config=host_config,
+                fetcher_messages=fetcher_messages,
             )
 
             _do_discovery_for(
@@ -511,12 +529,6 @@ def discover_on_host(
     )
 
     try:
-        # in "refresh" mode we first need to remove all previously discovered
-        # checks of the host, so that _get_host_services() does show us the
-        # new discovered check parameters.
-        if mode == "refresh":
-            counts["self_removed"] += host_config.remove_autochecks()  # this is cluster-aware!
-
         if host_config.is_cluster:
             ipaddress = None
         else:
@@ -545,18 +557,26 @@ def discover_on_host(
             host_config=host_config,
         )
 
-        # Compute current state of new and existing checks
+        # Compute current state of new and existing checks. In "refresh" mode the previously
+        # discovered checks of the host are removed, so that _get_host_services() does show us the
+        # new discovered check parameters.
         services, host_label_discovery_result = _get_host_services(
             host_config,
             ipaddress,
             multi_host_sections,
             discovery_parameters,
+            refreshed_host=hostname if mode == "refresh" else None,
         )
 
         # Create new list of checks
         new_services = _get_post_discovery_services(hostname, services, service_filters, counts,
                                                     mode)
-        host_config.set_autochecks(new_services)
+
+        # A timeout must not leave the host with only a part of the changes
+        with _deferred_discovery_timeout():
+            if mode == "refresh":
+                counts["self_removed"] += host_config.remove_autochecks()  # this is cluster-aware!
+            host_config.set_autochecks(new_services)
 
     except MKTimeout:
         raise  # let general timeout through
@@ -574,6 +594,128 @@ def discover_on_host(
     return counts, err
 
 
+def discover_on_hosts(
+    config_cache: config.ConfigCache,
+    hostnames: Sequence[HostName],
+    mode: str,
+    use_caches: bool,
+    service_filters: ServiceFilters,
+    on_error: str = "ignore",
+) -> Iterator[Tuple[HostName, Counter[str], Optional[str]]]:
+    """Do the discovery of multiple hosts, in parallel if configured
+
+    With discovery_worker_processes > 1 the hosts are discovered by a pool of
+    worker processes and the results are yielded in the order they are ready.
+    Each host is limited to discovery_host_timeout seconds. Clusters and their
+    nodes share the autochecks files of the nodes, so they are always discovered
+    one after another by the same worker.
+    """
+    if config.discovery_worker_processes <= 1 or len(hostnames) <= 1:
+        for hostname in hostnames:
+            counts, error = discover_on_host(
+                config_cache,
+                config_cache.get_host_config(hostname),
+                mode,
+                use_caches,
+                service_filters,
+                on_error=on_error,
+            )
+            yield hostname, counts, error
+        return
+
+    groups = _group_by_autochecks_files(
+        [config_cache.get_host_config(hostname) for hostname in hostnames])
+
+    # The workers are forked and inherit the loaded configuration, the initializer
+    # arguments are not pickled.
+    with multiprocessing.get_context("fork").Pool(
+            processes=min(config.discovery_worker_processes, len(groups)),
+            initializer=_init_discovery_worker,
+            initargs=(config_cache, mode, use_caches, service_filters, on_error),
+    ) as pool:
+        for results in pool.imap_unordered(_discover_on_host_group, groups):
+            yield from results
+
+
+def _group_by_autochecks_files(host_configs: Sequence[config.HostConfig]) -> List[List[HostName]]:
+    """Group the hosts that write to the same autochecks files
+
+    >>> class Host(NamedTuple):
+    ...     hostname: str
+    ...     nodes: Optional[List[str]]
+    >>> _group_by_autochecks_files([
+    ...     Host("node1", None),
+    ...     Host("host", None),
+    ...     Host("cluster1", ["node1", "node2"]),
+    ...     Host("cluster2", ["node2", "node3"]),
+    ...     Host("node3", None),
+    ... ])
+    [['node1', 'cluster1', 'cluster2', 'node3'], ['host']]
+    """
+    groups: List[List[HostName]] = []
+    group_of_file: Dict[HostName, int] = {}
+    for host_config in host_configs:
+        files = host_config.nodes or [host_config.hostname]
+        indices = sorted({group_of_file[f] for f in files if f in group_of_file})
+        if not indices:
+            index = len(groups)
+            groups.append([])
+        else:
+            index = indices[0]
+            # The host connects multiple groups
+            for other in indices[1:]:
+                groups[index].extend(groups[other])
+                groups[other] = []
+                group_of_file.update((f, index) for f, g in group_of_file.items() if g == other)
+
+        groups[index].append(host_config.hostname)
+        group_of_file.update((f, index) for f in files)
+
+    return [group for group in groups if group]
+
+
+class _DiscoveryWorkerConfig(NamedTuple):
+    config_cache: config.ConfigCache
+    mode: str
+    use_caches: bool
+    service_filters: ServiceFilters
+    on_error: str
+
+
+_discovery_worker_config: Optional[_DiscoveryWorkerConfig] = None
+
+
+def _init_discovery_worker(*args: Any) -> None:
+    global _discovery_worker_config
+    _discovery_worker_config = _DiscoveryWorkerConfig(*args)
+
+
+def _discover_on_host_group(
+        hostnames: List[HostName]) -> List[Tuple[HostName, Counter[str], Optional[str]]]:
+    assert _discovery_worker_config is not None
+    worker_config = _discovery_worker_config
+
+    results = []
+    for hostname in hostnames:
+        _set_discovery_timeout(config.discovery_host_timeout)
+        try:
+            counts, error = discover_on_host(
+                worker_config.config_cache,
+                worker_config.config_cache.get_host_config(hostname),
+                worker_config.mode,
+                worker_config.use_caches,
+                worker_config.service_filters,
+                on_error=worker_config.on_error,
+            )
+        except DiscoveryTimeout:
+            counts, error = _empty_counts(), "Timed out after %d seconds" % (
+                config.discovery_host_timeout)
+        finally:
+            _clear_discovery_timeout()
+        results.append((hostname, counts, error))
+    return results
+
+
 def _empty_counts() -> Counter[str]:
     return Counter(
         self_new=0,
@@ -849,18 +991,39 @@ def _set_rediscovery_flag(hostname: HostName) -> None:
     touch(discovery_filename)
 
 
-class DiscoveryTimeout(MKException):
+class DiscoveryTimeout(MKTimeout):
     pass
 
 
-def _handle_discovery_timeout(signum: int, stack_frame: Optional[FrameType]) -> NoReturn:
+# Set while the discovery must not be interrupted, the timeout is raised afterwards
+_discovery_timeout_deferred = False
+_discovery_timeout_pending = False
+
+
+def _handle_discovery_timeout(signum: int, stack_frame: Optional[FrameType]) -> None:
+    global _discovery_timeout_pending
+    if _discovery_timeout_deferred:
+        _discovery_timeout_pending = True
+        return
     raise DiscoveryTimeout()
 
 
-def _set_discovery_timeout() -> None:
+@contextmanager
+def _deferred_discovery_timeout() -> Iterator[None]:
+    global _discovery_timeout_deferred, _discovery_timeout_pending
+    _discovery_timeout_deferred = True
+    try:
+        yield
+    finally:
+        _discovery_timeout_deferred = False
+        timed_out, _discovery_timeout_pending = _discovery_timeout_pending, False
+    if timed_out:
+        raise DiscoveryTimeout()
+
+
+def _set_discovery_timeout(timeout: int) -> None:
     signal.signal(signal.SIGALRM, _handle_discovery_timeout)
-    # Add an additional 10 seconds as grace period
-    signal.alarm(_marked_host_discovery_timeout + 10)
+    signal.alarm(timeout)
 
 
 def _clear_discovery_timeout() -> None:
@@ -894,7 +1057,8 @@ def discover_marked_hosts(core: MonitoringCore) -> None:
     activation_required = False
 
     try:
-        _set_discovery_timeout()
+        # Add an additional 10 seconds as grace period
+        _set_discovery_timeout(_marked_host_discovery_timeout + 10)
         for hostname in hosts:
             host_config = config_cache.get_host_config(hostname)
 
@@ -1514,16 +1678,21 @@ def _get_host_services(
     ipaddress: Optional[HostAddress],
     multi_host_sections: MultiHostSections,
     discovery_parameters: DiscoveryParameters,
+    refreshed_host: Optional[HostName] = None,
 ) -> Tuple[ServicesByTransition, HostLabelDiscoveryResult]:
+    """The services of the host by their transition
 
+    The autochecks of the refreshed host are ignored, as if they had been removed."""
     if host_config.is_cluster:
         services, host_label_discovery_result = _get_cluster_services(host_config, ipaddress,
                                                                       multi_host_sections,
-                                                                      discovery_parameters)
+                                                                      discovery_parameters,
+                                                                      refreshed_host)
     else:
         services, host_label_discovery_result = _get_node_services(host_config, ipaddress,
                                                                    multi_host_sections,
-                                                                   discovery_parameters)
+                                                                   discovery_parameters,
+                                                                   refreshed_host)
 
     # Now add manual and active service and handle ignored services
     return _merge_manual_services(host_config, services,
@@ -1536,12 +1705,14 @@ def _get_node_services(
     ipaddress: Optional[HostAddress],
     multi_host_sections: MultiHostSections,
     discovery_parameters: DiscoveryParameters,
+    refreshed_host: Optional[HostName] = None,
 ) -> Tuple[ServicesTable, HostLabelDiscoveryResult]:
 
     hostname = host_config.hostname
     services, host_label_discovery_result = _get_discovered_services(hostname, ipaddress,
                                                                      multi_host_sections,
-                                                                     discovery_parameters)
+                                                                     discovery_parameters,
+                                                                     refreshed_host)
 
     config_cache = config.get_config_cache()
     # Identify clustered services
@@ -1561,6 +1732,7 @@ def _get_discovered_services(
     ipaddress: Optional[HostAddress],
     multi_host_sections: MultiHostSections,
     discovery_parameters: DiscoveryParameters,
+    refreshed_host: Optional[HostName] = None,
 ) -> Tuple[ServicesTable, HostLabelDiscoveryResult]:
 
     # Handle discovered services -> "new"
@@ -1578,7 +1750,11 @@ def _get_discovered_services(
         services.setdefault(discovered_service.id(), ("new", discovered_service))
 
     # Match with existing items -> "old" and "vanished"
+    config_cache = config.get_config_cache()
     for existing_service in autochecks.parse_autochecks_file(hostname, config.service_description):
+        if refreshed_host is not None and refreshed_host == config_cache.host_of_clustered_service(
+                hostname, existing_service.description):
+            continue  # see config.HostConfig.remove_autochecks()
         check_source = "vanished" if existing_service.id() not in services else "old"
         services[existing_service.id()] = check_source, existing_service
 
@@ -1654,6 +1830,7 @@ def _get_cluster_services(
     ipaddress: Optional[str],
     multi_host_sections: MultiHostSections,
     discovery_parameters: DiscoveryParameters,
+    refreshed_host: Optional[HostName] = None,
 ) -> Tuple[ServicesTable, HostLabelDiscoveryResult]:
     if not host_config.nodes:
         return {}, HostLabelDiscoveryResult(
@@ -1674,6 +1851,7 @@ def _get_cluster_services(
             ip_lookup.lookup_ip_address(node_config),
             multi_host_sections,
             discovery_parameters,
+            refreshed_host,
         )
         cluster_host_labels.update(host_label_discovery_result.labels)
         for check_source, discovered_service in services.values():
@@ -32,6 +32,8 @@ from cmk.utils.type_defs import (
     SourceType,
 )
 
+from cmk.fetchers.controller import FetcherMessage
+
 import cmk.base.api.agent_based.register as agent_based_register
 import cmk.base.check_api_utils as check_api_utils
 import cmk.base.config as config
@@ -56,6 +58,9 @@ class ActiveInventoryResult(NamedTuple):
     safe_to_write: bool
 
 
+# The IP address, the sources and the data fetched from them
+_FetchedData = Tuple[Optional[HostAddress], Sequence[ABCSource], Sequence[FetcherMessage]]
+
 #.
 #   .--Inventory-----------------------------------------------------------.
 #   |            ___                      _                                |
@@ -73,24 +78,56 @@ def do_inv(hostnames: List[HostName]) -> None:
     store.makedirs(cmk.utils.paths.inventory_output_dir)
     store.makedirs(cmk.utils.paths.inventory_archive_dir)
 
+    host_sources: Dict[HostName, Tuple[config.HostConfig, Optional[HostAddress],
+                                       Sequence[ABCSource]]] = {}
     for hostname in hostnames:
-        section.section_begin(hostname)
         try:
             host_config = config.HostConfig.make_host_config(hostname)
-            inv_result = _do_active_inventory_for(host_config)
-
-            _run_inventory_export_hooks(host_config, inv_result.trees.inventory)
-            # TODO: inv_results.source_results is completely ignored here.
-            # We should process the results to make errors visible on the console
-            _show_inventory_results_on_console(inv_result.trees)
+            if host_config.is_cluster:
+                _show_active_inventory_for(host_config)
+                continue
 
+            ipaddress = ip_lookup.lookup_ip_address(host_config)
+            sources = _make_sources_for_inv(host_config, ipaddress)
         except Exception as e:
             if cmk.utils.debug.enabled():
                 raise
-
+            section.section_begin(hostname)
             section.section_error("%s" % e)
-        finally:
-            cmk.utils.cleanup.cleanup_globals()
+            continue
+        host_sources[hostname] = host_config, ipaddress, sources
+
+    # Fetch the data of all hosts at once and process the hosts in the order their data arrives
+    fetched = checkers.fetch_concurrently(
+        ((host_config, sources) for host_config, _ipaddress, sources in host_sources.values()),
+        max_cachefile_age=None,
+        selected_raw_sections=None,
+    )
+    for hostname, fetcher_messages in fetched:
+        host_config, ipaddress, sources = host_sources.pop(hostname)
+        _show_active_inventory_for(host_config, (ipaddress, sources, fetcher_messages))
+
+
+def _show_active_inventory_for(
+    host_config: config.HostConfig,
+    fetched: Optional[_FetchedData] = None,
+) -> None:
+    section.section_begin(host_config.hostname)
+    try:
+        inv_result = _do_active_inventory_for(host_config, fetched)
+
+        _run_inventory_export_hooks(host_config, inv_result.trees.inventory)
+        # TODO: inv_results.source_results is completely ignored here.
+        # We should process the results to make errors visible on the console
+        _show_inventory_results_on_console(inv_result.trees)
+
+    except Exception as e:
+        if cmk.utils.debug.enabled():
+            raise
+
+        section.section_error("%s" % e)
+    finally:
+        cmk.utils.cleanup.cleanup_globals()
 
 
 def _show_inventory_results_on_console(trees: InventoryTrees) -> None:
@@ -173,7 +210,10 @@ def do_inv_check(
     return status, infotexts, long_infotexts, []
 
 
-def _do_active_inventory_for(host_config: config.HostConfig,) -> ActiveInventoryResult:
+def _do_active_inventory_for(
+    host_config: config.HostConfig,
+    fetched: Optional[_FetchedData] = None,
+) -> ActiveInventoryResult:
     if host_config.is_cluster:
         return ActiveInventoryResult(
             trees=_do_inv_for_cluster(host_config),
@@ -181,11 +221,21 @@ def _do_active_inventory_for(host_config: config.HostConfig,) -> ActiveInventory
             safe_to_write=True,
         )
 
-    ipaddress = ip_lookup.lookup_ip_address(host_config)
+    if fetched is None:
+        ipaddress = ip_lookup.lookup_ip_address(host_config)
+        sources = _make_sources_for_inv(host_config, ipaddress)
+        fetcher_messages: Optional[Sequence[FetcherMessage]] = None
+    else:
+        ipaddress, sources, fetcher_messages = fetched
     config_cache = config.get_config_cache()
 
     multi_host_sections, source_results = _fetch_multi_host_sections_for_inv(
-        config_cache, host_config, ipaddress)
+        config_cache,
+        host_config,
+        ipaddress,
+        sources,
+        fetcher_messages,
+    )
 
     return ActiveInventoryResult(
         trees=_do_inv_for_realhost(
@@ -198,14 +248,10 @@ def _do_active_inventory_for(host_config: config.HostConfig,) -> ActiveInventory
     )
 
 
-def _fetch_multi_host_sections_for_inv(
-    config_cache: config.ConfigCache,
+def _make_sources_for_inv(
     host_config: config.HostConfig,
     ipaddress: Optional[HostAddress],
-) -> Tuple[MultiHostSections, Sequence[SourceResult]]:
-    if host_config.is_cluster:
-        return MultiHostSections(), []
-
+) -> Sequence[ABCSource]:
     sources = checkers.make_sources(
         host_config,
         ipaddress,
@@ -213,6 +259,18 @@ def _fetch_multi_host_sections_for_inv(
     )
     for source in sources:
         _configure_source_for_inv(source)
+    return sources
+
+
+def _fetch_multi_host_sections_for_inv(
+    config_cache: config.ConfigCache,
+    host_config: config.HostConfig,
+    ipaddress: Optional[HostAddress],
+    sources: Sequence[ABCSource],
+    fetcher_messages: Optional[Sequence[FetcherMessage]],
+) -> Tuple[MultiHostSections, Sequence[SourceResult]]:
+    if host_config.is_cluster:
+        return MultiHostSections(), []
 
     multi_host_sections = MultiHostSections()
     results = checkers.update_host_sections(
@@ -227,6 +285,7 @@ def _fetch_multi_host_sections_for_inv(
         max_cachefile_age=host_config.max_cachefile_age,
         selected_raw_sections=None,
         host_config=host_config,
+        fetcher_messages=fetcher_messages,
     )
 
     return multi_host_sections, results
@@ -10,18 +10,25 @@ tation of rates from two succeeding counter values. This is done
 via the helper function get_rate(). Averaging is another example
 and done by get_average().
 
-While a host is being checked this memory is kept in _cached_item_states.
-That is a dictionary. The keys are unique to one check type and
-item. The value is free form.
+While a host is being checked this memory is kept in _cached_item_states,
+partitioned by service: The keys are unique to one check type and item.
+The value is free form.
 
 Note: The item state is kept in tmpfs and not reboot-persistant.
 Do not store long-time things here. Also do not store complex
 structures like log files or stuff.
 """
 
+import ast
+import fcntl
+import marshal
 import os
+import shutil
+import struct
+import time
 import traceback
-from typing import Any, AnyStr, Dict, List, Optional, Tuple, Union
+import zlib
+from typing import Any, AnyStr, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
 
 import cmk.utils.cleanup
 import cmk.utils.paths
@@ -42,6 +49,8 @@ g_suppress_on_wrap = True  # Suppress check on wrap (raise an exception)
 ItemStateKeyElement = Optional[AnyStr]
 ItemStateKey = Tuple[ItemStateKeyElement, ...]
 ItemStates = Dict[ItemStateKey, Any]
+# The item states and the removed keys of the modified services by their prefixes
+ModifiedItemStates = Dict[ItemStateKey, Tuple[Dict[Any, Any], Set[Any]]]
 OnWrap = Union[None, bool, float]
 
 
@@ -49,105 +58,517 @@ class MKCounterWrapped(MKException):
     pass
 
 
+# The item states of a host are stored in a binary file which consists of a
+# header followed by frames. Each frame is the length prefixed marshal dump of
+# the updated and the removed item states. The first frame contains all item
+# states of the host, further frames are appended by the following checks.
+_FILE_MAGIC = b"\x00CMKIS1\n"
+_FRAME_HEADER = struct.Struct("<I")
+
+
+def _encode_frame(updated: ItemStates, removed: Iterable[ItemStateKey]) -> bytes:
+    payload = marshal.dumps((updated, list(removed)))
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _decode_item_states(content: bytes) -> Tuple[ItemStates, int, int]:
+    """Returns the item states, the size of the first frame and the size of the complete frames
+
+    Legacy files (repr() of the item states dict) are also decoded. In this
+    case the size of the first frame is 0 to trigger the rewrite."""
+    if not content:
+        return {}, 0, 0
+
+    if not content.startswith(_FILE_MAGIC):
+        return ast.literal_eval(content.decode("utf-8")), 0, len(content)
+
+    item_states: ItemStates = {}
+    snapshot_size = 0
+    data = memoryview(content)
+    offset = len(_FILE_MAGIC)
+    while offset + _FRAME_HEADER.size <= len(data):
+        length, = _FRAME_HEADER.unpack_from(data, offset)
+        end = offset + _FRAME_HEADER.size + length
+        if end > len(data):
+            break  # Incomplete frame of an interrupted write
+
+        updated, removed = marshal.loads(data[offset + _FRAME_HEADER.size:end])
+        for key in removed:
+            item_states.pop(key, None)
+        item_states.update(updated)
+
+        if not snapshot_size:
+            snapshot_size = end
+        offset = end
+    return item_states, snapshot_size, offset
+
+
+def _is_open_file(fd: int, path: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fd_stat = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (fd_stat.st_dev, fd_stat.st_ino)
+
+
+class ShardedItemStateDB:
+    """Site wide store of the item states of all hosts
+
+    Instead of one file per host, the hosts are distributed to a fixed number
+    of shard files by a hash of their names. A shard is a log of records, each
+    containing the host name and a frame of the updated and removed item states.
+
+    Writers only append single records to the shards. These appends are atomic,
+    so concurrent processes don't need to serialize their writes. They only hold
+    a shared lock while appending, which prevents the records from getting lost
+    during a compaction of the shard.
+
+    A shard is compacted by the writer which makes it grow beyond twice its size
+    after the last compaction: The records are merged to a single one per host
+    and the result replaces the shard. The compacting writer waits for the
+    exclusive lock of the shard, a separate lock file keeps the other writers
+    from compacting the shard at the same time.
+
+    The shards are not synced to disk on each write. This is done for all shards
+    written by the current process once the sync interval has passed and during
+    the compaction.
+
+    The shards are kept in a directory per number of shards. After changing the
+    number, the first process using the database moves the records of the other
+    directories to the new one. Records written by processes still using the
+    previous number of shards after this are lost.
+    """
+    _MAGIC = b"\x00CMKSH1\n"
+    # Magic followed by the size of the shard after the last compaction
+    _HEADER = struct.Struct("<8sQ")
+    # Length of the host name and the frame
+    _RECORD_HEADER = struct.Struct("<HI")
+    # Don't compact small shards, even if they grew a lot
+    _MIN_COMPACTION_SIZE = 64 * 1024
+
+    def __init__(self, base_dir: str, num_shards: int, sync_interval: float = 60.0) -> None:
+        super(ShardedItemStateDB, self).__init__()
+        self._shards_dir = os.path.join(base_dir, "%d" % num_shards)
+        self._num_shards = num_shards
+        self._sync_interval = sync_interval
+        self._last_sync = time.time()
+        self._unsynced_shards: Set[str] = set()
+        if not os.path.exists(self._shards_dir):
+            self._migrate(base_dir)
+
+    def shard_path(self, hostname: HostName) -> str:
+        shard = zlib.crc32(hostname.encode("utf-8")) % self._num_shards
+        return os.path.join(self._shards_dir, "%04d" % shard)
+
+    def load(self, hostname: HostName) -> Optional[ItemStates]:
+        """Returns the item states of the host or None in case there are no records of the host"""
+        try:
+            with open(self.shard_path(hostname), "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return self._decode_shard(content, hostname).get(hostname)
+
+    def save(self, hostname: HostName, updated: ItemStates,
+             removed: Optional[Iterable[ItemStateKey]]) -> None:
+        """Appends the modifications of the item states of the host to its shard
+
+        All item states of the host are removed in case removed is None."""
+        path = self.shard_path(hostname)
+        fd = self._open_shard(path)
+        try:
+            os.write(fd, self._encode_record(hostname, updated, removed))
+            self._unsynced_shards.add(path)
+            needs_compaction = self._needs_compaction(fd)
+        finally:
+            os.close(fd)
+
+        if needs_compaction:
+            self.compact(path)
+
+        if time.time() - self._last_sync >= self._sync_interval:
+            self.sync()
+
+    def remove(self, hostname: HostName) -> None:
+        if self.load(hostname) is not None:
+            self.save(hostname, {}, None)
+
+    def rename(self, oldname: HostName, newname: HostName) -> bool:
+        """Moves the item states of a host to a new host name
+
+        Returns False in case there are no item states of the host."""
+        item_states = self.load(oldname)
+        if item_states is None:
+            return False
+        # Written before removing the old records: A crash in between must not lose them
+        self.remove(newname)
+        self.save(newname, item_states, [])
+        self.save(oldname, {}, None)
+        return True
+
+    def sync(self) -> None:
+        """Syncs all shards written by this process since the last sync to disk"""
+        for path in self._unsynced_shards:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._unsynced_shards.clear()
+        self._last_sync = time.time()
+
+    def compact(self, path: str) -> None:
+        """Merges the records of the shard to a single record per host
+
+        Skipped in case an other process is currently compacting the shard."""
+        lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o660)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                return
+            try:
+                # The writers only hold their shared locks for a single append
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if not _is_open_file(fd, path) or not self._needs_compaction(fd):
+                    return  # Already replaced by an other compaction
+
+                with os.fdopen(os.dup(fd), "rb") as f:
+                    content = f.read()
+                self._write_shard(path, self._compacted_records(self._decode_shard(content)))
+                self._unsynced_shards.discard(path)
+            finally:
+                os.close(fd)
+        finally:
+            os.close(lock_fd)
+
+    def _compacted_records(self, host_item_states: Dict[HostName, ItemStates]) -> bytes:
+        return b"".join(
+            self._encode_record(hostname, item_states, [])
+            for hostname, item_states in host_item_states.items()
+            if item_states)
+
+    def _migrate(self, base_dir: str) -> None:
+        """Moves the records of the shards of other numbers to the current shards directory"""
+        store.makedirs(base_dir)
+        lock_fd = os.open(os.path.join(base_dir, "migrate.lock"), os.O_RDWR | os.O_CREAT, 0o660)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            if os.path.exists(self._shards_dir):
+                return  # Migrated by an other process
+
+            old_dirs = [
+                os.path.join(base_dir, name)
+                for name in os.listdir(base_dir)
+                if name.isdigit() and os.path.isdir(os.path.join(base_dir, name))
+            ]
+            if not old_dirs:
+                return
+
+            shards: Dict[str, Dict[HostName, ItemStates]] = {}
+            for old_dir in old_dirs:
+                for name in os.listdir(old_dir):
+                    if not name.isdigit():
+                        continue  # Lock files and temporary files
+                    with open(os.path.join(old_dir, name), "rb") as f:
+                        host_item_states = self._decode_shard(f.read())
+                    for hostname, item_states in host_item_states.items():
+                        shards.setdefault(self.shard_path(hostname), {})[hostname] = item_states
+
+            tmp_dir = "%s.new%d" % (self._shards_dir, os.getpid())
+            store.makedirs(tmp_dir)
+            for path, host_item_states in shards.items():
+                self._write_shard(os.path.join(tmp_dir, os.path.basename(path)),
+                                  self._compacted_records(host_item_states))
+            os.rename(tmp_dir, self._shards_dir)
+
+            for old_dir in old_dirs:
+                shutil.rmtree(old_dir)
+        finally:
+            os.close(lock_fd)
+
+    def _open_shard(self, path: str) -> int:
+        """Opens the shard for appending and acquires a shared lock on it"""
+        while True:
+            if not os.path.exists(path):
+                self._create_shard(path)
+
+            fd = os.open(path, os.O_RDWR | os.O_APPEND)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            # A compaction may have replaced the shard in the meantime
+            if _is_open_file(fd, path):
+                return fd
+            os.close(fd)
+
+    def _create_shard(self, path: str) -> None:
+        store.makedirs(self._shards_dir)
+        tmp_path = "%s.new%d" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(self._HEADER.pack(self._MAGIC, self._HEADER.size))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass  # Created by an other process
+        finally:
+            os.unlink(tmp_path)
+
+    def _write_shard(self, path: str, records: bytes) -> None:
+        tmp_path = "%s.new%d" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(self._HEADER.pack(self._MAGIC, self._HEADER.size + len(records)))
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+
+    def _needs_compaction(self, fd: int) -> bool:
+        size = os.fstat(fd).st_size
+        if size < self._MIN_COMPACTION_SIZE:
+            return False
+        _magic, compacted_size = self._HEADER.unpack(os.pread(fd, self._HEADER.size, 0))
+        return size > 2 * compacted_size
+
+    def _encode_record(self, hostname: HostName, updated: ItemStates,
+                       removed: Optional[Iterable[ItemStateKey]]) -> bytes:
+        host = hostname.encode("utf-8")
+        payload = marshal.dumps((updated, None if removed is None else list(removed)))
+        return self._RECORD_HEADER.pack(len(host), len(payload)) + host + payload
+
+    def _decode_shard(self,
+                      content: bytes,
+                      only_host: Optional[HostName] = None) -> Dict[HostName, ItemStates]:
+        """The item states of the hosts in the shard, optionally only the ones of a single host"""
+        if not content.startswith(self._MAGIC):
+            raise MKGeneralException("Invalid item state shard")
+
+        only_host_name = None if only_host is None else only_host.encode("utf-8")
+        host_item_states: Dict[HostName, ItemStates] = {}
+        data = memoryview(content)
+        offset = self._HEADER.size
+        while offset + self._RECORD_HEADER.size <= len(data):
+            host_length, payload_length = self._RECORD_HEADER.unpack_from(data, offset)
+            payload_offset = offset + self._RECORD_HEADER.size + host_length
+            end = payload_offset + payload_length
+            if end > len(data):
+                break  # Incomplete record of an interrupted write
+
+            host_name = data[offset + self._RECORD_HEADER.size:payload_offset]
+            if only_host_name is not None and host_name != only_host_name:
+                offset = end
+                continue  # Don't unmarshal the item states of the other hosts
+
+            hostname = bytes(host_name).decode("utf-8")
+            updated, removed = marshal.loads(data[payload_offset:end])
+            if removed is None:
+                host_item_states.pop(hostname, None)
+            else:
+                item_states = host_item_states.setdefault(hostname, {})
+                for key in removed:
+                    item_states.pop(key, None)
+                item_states.update(updated)
+            offset = end
+        return host_item_states
+
+
+def _partition(item_states: ItemStates) -> Dict[ItemStateKey, Dict[Any, Any]]:
+    """The item states by service (the prefix of the key) and the key of the user"""
+    service_item_states: Dict[ItemStateKey, Dict[Any, Any]] = {}
+    for key, value in item_states.items():
+        service_item_states.setdefault(key[:-1], {})[key[-1]] = value
+    return service_item_states
+
+
 class CachedItemStates:
+    """The item states of the host being checked
+
+    The item states are kept per service, identified by the item state prefix.
+    Only the services whose item states were modified are written on save.
+    """
     def __init__(self) -> None:
         self._logger = logger
         super(CachedItemStates, self).__init__()
         self.reset()
 
     def reset(self) -> None:
-        self._item_states: ItemStates = {}
+        self._item_states: Dict[ItemStateKey, Dict[Any, Any]] = {}
         self._item_state_prefix: ItemStateKey = ()
-        # timestamp of last modification
-        self._last_mtime: Optional[float] = None
-        self._removed_item_state_keys: List[ItemStateKey] = []
-        self._updated_item_states: ItemStates = {}
+        # size of the full item states in the file, 0 in case it needs to be rewritten
+        self._snapshot_size = 0
+        # size of the file after the last load or save
+        self._file_size = 0
+        # The keys removed from the modified services
+        self._modified_services: Dict[ItemStateKey, Set[Any]] = {}
+        self._db: Optional[ShardedItemStateDB] = None
 
     def clear_all_item_states(self) -> None:
-        removed_item_state_keys = list(self._item_states.keys())
+        item_states = self._item_states
         self.reset()
-        self._removed_item_state_keys = removed_item_state_keys
+        self._modified_services = {
+            prefix: set(service_item_states) for prefix, service_item_states in item_states.items()
+        }
 
-    def load(self, hostname: HostName) -> None:
+    def load(self, hostname: HostName, db: Optional[ShardedItemStateDB] = None) -> None:
         self._logger.debug("Loading item states")
         filename = cmk.utils.paths.counters_dir + "/" + hostname
+        if db is not None:
+            self._db = db
+            item_states = db.load(hostname)
+            if item_states is not None or not os.path.exists(filename):
+                self._item_states = _partition(item_states or {})
+                return
+
         try:
-            # TODO: refactoring. put these two values into a named tuple
-            self._item_states = store.load_object_from_file(
-                filename,
-                default={},
-                lock=True,
-            )
-            self._last_mtime = os.stat(filename).st_mtime
+            item_states, self._snapshot_size, self._file_size = _decode_item_states(
+                store.load_bytes_from_file(filename, lock=True))
         finally:
             store.release_lock(filename)
+        self._item_states = _partition(item_states)
+
+        if db is not None:
+            # Move the item states of the host file to the database on the next save
+            self._modified_services = {prefix: set() for prefix in self._item_states}
+
+    def _modifications(self) -> Tuple[ItemStates, Set[ItemStateKey]]:
+        updated: ItemStates = {}
+        removed: Set[ItemStateKey] = set()
+        for prefix, removed_keys in self._modified_services.items():
+            service_item_states = self._item_states.get(prefix, {})
+            updated.update((prefix + (key,), value) for key, value in service_item_states.items())
+            removed.update(
+                prefix + (key,) for key in removed_keys if key not in service_item_states)
+        return updated, removed
 
-    # TODO: self._last_mtime needs be updated accordingly after the save_object_to_file operation
-    #       right now, the current mechanism is sufficient enough, since the save() function is only
-    #       called as the final operation, just before the lifecycle of the CachedItemState ends
     def save(self, hostname: HostName) -> None:
         """ The job of the save function is to update the item state on disk.
-        It simply returns, if it detects that the data wasn't changed at all since the last loading
-        If the data on disk has been changed in the meantime, the cached data is updated from disk.
-        Afterwards only the actual modifications (update/remove) are applied to the updated cached
-        data before it is written back to disk.
+        It simply returns, if it detects that the data wasn't changed at all since the last loading.
+        Otherwise only the item states of the modified services are appended to the file.
+
+        Once the appended modifications outgrow the full item states, the file is rewritten: The
+        current data on disk is loaded, the modifications are applied and the result is written
+        back to disk. This also converts files of the legacy repr() format.
+
+        An incomplete frame at the end of the file (interrupted write) is cut off before
+        appending, the following frames would not be readable otherwise.
         """
         self._logger.debug("Saving item states")
         filename = cmk.utils.paths.counters_dir + "/" + hostname
-        if not self._removed_item_state_keys and not self._updated_item_states:
+        if not self._modified_services:
             return
 
-        try:
-            if not os.path.exists(cmk.utils.paths.counters_dir):
-                os.makedirs(cmk.utils.paths.counters_dir)
+        updated, removed = self._modifications()
+        if self._db is not None:
+            self._save_to_db(hostname, self._db, updated, removed)
+            return
 
+        try:
             store.aquire_lock(filename)
-            last_mtime = os.stat(filename).st_mtime
-            if last_mtime != self._last_mtime:
-                self._item_states = store.load_object_from_file(filename, default={})
-
-                # Remove obsolete keys
-                for key in self._removed_item_state_keys:
-                    try:
-                        del self._item_states[key]
-                    except KeyError:
-                        pass
-
-                # Add updated keys
-                self._item_states.update(self._updated_item_states)
-
-            store.save_object_to_file(filename, self._item_states, pretty=False)
+            frame = _encode_frame(updated, removed)
+            size = os.stat(filename).st_size
+            if size != self._file_size:
+                # Written by an other process in the meantime, maybe interrupted
+                _item_states, self._snapshot_size, complete_size = _decode_item_states(
+                    store.load_bytes_from_file(filename))
+                if self._snapshot_size and complete_size < size:
+                    os.truncate(filename, complete_size)
+                size = complete_size
+
+            if self._snapshot_size and size + len(frame) <= 2 * self._snapshot_size:
+                with open(filename, "ab") as f:
+                    f.write(frame)
+                self._file_size = size + len(frame)
+                return
+
+            item_states, _snapshot_size, _size = _decode_item_states(
+                store.load_bytes_from_file(filename))
+            for key in removed:
+                item_states.pop(key, None)
+            item_states.update(updated)
+
+            snapshot = _FILE_MAGIC + _encode_frame(item_states, [])
+            store.save_bytes_to_file(filename, snapshot)
+            self._item_states, self._snapshot_size = _partition(item_states), len(snapshot)
+            self._file_size = len(snapshot)
         except Exception:
             raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
         finally:
             store.release_lock(filename)
+            self._modified_services = {}
+
+    def _save_to_db(self, hostname: HostName, db: ShardedItemStateDB, updated: ItemStates,
+                    removed: Set[ItemStateKey]) -> None:
+        filename = cmk.utils.paths.counters_dir + "/" + hostname
+        try:
+            db.save(hostname, updated, removed)
+            if os.path.exists(filename):
+                os.unlink(filename)
+        except Exception:
+            raise MKGeneralException("Cannot write item states of %s: %s" %
+                                     (hostname, traceback.format_exc()))
+        finally:
+            self._modified_services = {}
+
+    def pop_modified_services(self) -> ModifiedItemStates:
+        """The modified services since the last call, they are not saved by this object anymore"""
+        modified = {
+            prefix: (dict(self._item_states.get(prefix, {})), removed_keys)
+            for prefix, removed_keys in self._modified_services.items()
+        }
+        self._modified_services = {}
+        return modified
+
+    def update_services(self, modified: ModifiedItemStates) -> None:
+        """Take over the modified services of an other process (see pop_modified_services())"""
+        for prefix, (service_item_states, removed_keys) in modified.items():
+            if service_item_states:
+                self._item_states[prefix] = service_item_states
+            else:
+                self._item_states.pop(prefix, None)
+            self._modified_services.setdefault(prefix, set()).update(removed_keys)
 
     def clear_item_state(self, user_key: str) -> None:
-        key = self.get_unique_item_state_key(user_key)
-        self.remove_full_key(key)
+        self._remove(self._item_state_prefix, user_key)
 
     def clear_item_states_by_full_keys(self, full_keys: List[ItemStateKey]) -> None:
         for key in full_keys:
             self.remove_full_key(key)
 
     def remove_full_key(self, full_key: ItemStateKey) -> None:
-        try:
-            self._removed_item_state_keys.append(full_key)
-            del self._item_states[full_key]
-        except KeyError:
-            pass
+        self._remove(full_key[:-1], full_key[-1])
+
+    def _remove(self, prefix: ItemStateKey, user_key: Any) -> None:
+        self._modified_services.setdefault(prefix, set()).add(user_key)
+        service_item_states = self._item_states.get(prefix)
+        if service_item_states is None:
+            return
+        service_item_states.pop(user_key, None)
+        if not service_item_states:
+            del self._item_states[prefix]
 
     def get_item_state(self, user_key: str, default: Any = None) -> Any:
-        key = self.get_unique_item_state_key(user_key)
-        return self._item_states.get(key, default)
+        return self._item_states.get(self._item_state_prefix, {}).get(user_key, default)
 
     def set_item_state(self, user_key: str, state: Any) -> None:
-        key = self.get_unique_item_state_key(user_key)
-        self._item_states[key] = state
-        self._updated_item_states[key] = state
+        prefix = self._item_state_prefix
+        self._item_states.setdefault(prefix, {})[user_key] = state
+        self._modified_services.setdefault(prefix, set())
 
     def get_all_item_states(self) -> ItemStates:
-        return self._item_states
+        return {
+            prefix + (key,): value for prefix, service_item_states in self._item_states.items()
+            for key, value in service_item_states.items()
+        }
+
+    def get_service_item_states(self) -> Mapping[Any, Any]:
+        return self._item_states.get(self._item_state_prefix, {})
 
     def get_item_state_prefix(self) -> ItemStateKey:
         return self._item_state_prefix
@@ -161,10 +582,22 @@ class CachedItemStates:
 
 _cached_item_states = CachedItemStates()
 
+_item_state_dbs: Dict[Tuple[str, int], ShardedItemStateDB] = {}
+
 
-def load(hostname: HostName) -> None:
+def get_item_state_db(num_shards: int) -> Optional[ShardedItemStateDB]:
+    """Returns the site wide item state database or None when using the files per host"""
+    if not num_shards:
+        return None
+    db_id = cmk.utils.paths.counter_shards_dir, num_shards
+    if db_id not in _item_state_dbs:
+        _item_state_dbs[db_id] = ShardedItemStateDB(*db_id)
+    return _item_state_dbs[db_id]
+
+
+def load(hostname: HostName, num_shards: int = 0) -> None:
     _cached_item_states.reset()
-    _cached_item_states.load(hostname)
+    _cached_item_states.load(hostname, get_item_state_db(num_shards))
 
 
 def save(hostname: HostName) -> None:
@@ -192,6 +625,23 @@ def get_all_item_states() -> ItemStates:
     return _cached_item_states.get_all_item_states()
 
 
+def get_service_item_states() -> Mapping[Any, Any]:
+    """Returns the stored items of the current service (item state prefix) by their user keys"""
+    return _cached_item_states.get_service_item_states()
+
+
+def pop_modified_item_states() -> ModifiedItemStates:
+    """Returns the item states of the services modified since the last call
+
+    Used by worker processes to hand over their modifications, see update_item_states()."""
+    return _cached_item_states.pop_modified_services()
+
+
+def update_item_states(modified: ModifiedItemStates) -> None:
+    """Takes over the item states of services modified by an other process"""
+    _cached_item_states.update_services(modified)
+
+
 def clear_item_state(user_key: str) -> None:
     """Deletes a stored matching the given key. This needs to be
     the same key as used with set_item_state().
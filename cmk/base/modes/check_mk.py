@@ -53,6 +53,7 @@ import cmk.base.discovery as discovery
 import cmk.base.dump_host
 import cmk.base.inventory as inventory
 import cmk.base.ip_lookup as ip_lookup
+import cmk.base.item_state as item_state
 import cmk.base.localize
 import cmk.base.obsolete_output as out
 import cmk.base.packaging
@@ -530,6 +531,8 @@ def mode_paths() -> None:
         (cmk.utils.paths.precompiled_hostchecks_dir, directory, data, "Precompiled host checks"),
         (cmk.utils.paths.snmpwalks_dir, directory, data, "Stored snmpwalks (output of --snmpwalk)"),
         (cmk.utils.paths.counters_dir, directory, data, "Current state of performance counters"),
+        (cmk.utils.paths.counter_shards_dir, directory, data,
+         "Current state of performance counters (item_state_shards)"),
         (cmk.utils.paths.tcp_cache_dir, directory, data, "Cached output from agents"),
         (cmk.utils.paths.logwatch_dir, directory, data,
          "Unacknowledged logfiles of logwatch extension"),
@@ -982,6 +985,12 @@ def mode_flush(hosts: List[HostName]) -> None:
         except OSError:
             pass
 
+        item_state_db = item_state.get_item_state_db(config.item_state_shards)
+        if item_state_db is not None and item_state_db.load(host):
+            item_state_db.remove(host)
+            out.output(tty.bold + tty.blue + " counters")
+            flushed = True
+
         # cache files
         d = 0
         cache_dir = cmk.utils.paths.tcp_cache_dir
@@ -1580,7 +1589,6 @@ CheckingOptions = TypedDict(
 
 def mode_check(options: CheckingOptions, args: List[str]) -> None:
     import cmk.base.checking as checking  # pylint: disable=import-outside-toplevel
-    import cmk.base.item_state as item_state  # pylint: disable=import-outside-toplevel
     try:
         import cmk.base.cee.keepalive as keepalive  # pylint: disable=import-outside-toplevel
     except ImportError:
@@ -1654,6 +1662,53 @@ modes.register(
              ),
          ]))
 
+#.
+#   .--check-helpers-------------------------------------------------------.
+#   |          _               _        _          _                       |
+#   |      ___| |__   ___  ___| | __   | |__   ___| |_ __   ___ _ __ ___   |
+#   |     / __| '_ \ / _ \/ __| |/ /___| '_ \ / _ \ | '_ \ / _ \ '__/ __|  |
+#   |    | (__| | | |  __/ (__|   <____| | | |  __/ | |_) |  __/ |  \__ \  |
+#   |     \___|_| |_|\___|\___|_|\_\   |_| |_|\___|_| .__/ \___|_|  |___/  |
+#   |                                               |_|                    |
+#   '----------------------------------------------------------------------'
+
+
+def mode_check_helpers(options: Dict, num_helpers: int) -> None:
+    import cmk.base.check_helpers as check_helpers  # pylint: disable=import-outside-toplevel
+    check_helpers.CheckHelperPool(
+        num_helpers=num_helpers,
+        socket_path=Path(cmk.utils.paths.check_helpers_socket),
+        timeout=options.get("timeout", 60),
+    ).run()
+
+
+modes.register(
+    Mode(long_option="check-helpers",
+         handler_function=mode_check_helpers,
+         argument=True,
+         argument_descr="N",
+         argument_conv=int,
+         needs_config=False,
+         short_help="Run a pool of N persistent check helpers (Nagios core)",
+         long_help=[
+             "Starts N check helper processes which keep the check plugins and the "
+             "packed configuration of the latest activated configuration loaded. "
+             "They execute the Check_MK service of hosts requested via the UNIX socket "
+             "tmp/run/cmk-check-helpers. The Nagios core can use them through "
+             "the command bin/cmk-check-helper instead of the precompiled host checks.",
+             "The helpers are restarted automatically once a new configuration has "
+             "been activated.",
+         ],
+         sub_options=[
+             Option(
+                 long_option="timeout",
+                 argument=True,
+                 argument_descr="S",
+                 argument_conv=int,
+                 short_help="Abort the check of a single host after S seconds. Defaults to 60.",
+             ),
+         ]))
+
 #.
 #   .--version-------------------------------------------------------------.
 #   |                                     _                                |
@@ -30,6 +30,7 @@ from cmk.base.api.agent_based.checking_classes import (
     State,
 )
 from cmk.base.api.agent_based.inventory_classes import Attributes, TableRow
+from cmk.base.api.agent_based.item_index import get_item_index
 from cmk.base.api.agent_based.type_defs import SNMPTree
 from cmk.base.api.agent_based.utils import (
     all_of,
@@ -79,6 +80,7 @@ __all__ = [
     "check_levels_predictive",
     "clusterize",
     "get_average",
+    "get_item_index",
     "get_rate",
     "get_value_store",
     "HostLabel",
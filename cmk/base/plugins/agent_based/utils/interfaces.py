@@ -29,6 +29,7 @@ from ..agent_based_api.v1 import (
     check_levels,
     check_levels_predictive,
     get_average,
+    get_item_index,
     get_rate,
     get_value_store,
     IgnoreResults,
@@ -216,6 +217,25 @@ def item_matches(
             or item == "%s %s" % (ifDescr, ifIndex)
 
 
+def _item_keys(interface: Interface) -> Iterable[str]:
+    """The items matching the interface, without leading zeroes (see item_matches)"""
+    yield interface.index
+    if saveint(interface.index) == 0:
+        yield ""  # items consisting of zeroes only
+    yield interface.alias
+    yield interface.descr
+    yield "%s %s" % (interface.alias, interface.index)
+    yield "%s %s" % (interface.descr, interface.index)
+
+
+def _matching_interfaces(item: str, section: Section) -> List[Interface]:
+    return [
+        interface
+        for interface in get_item_index(section, _item_keys).lookup(item, item.lstrip("0"))
+        if item_matches(item, interface.index, interface.alias, interface.descr)
+    ]
+
+
 # Pads port numbers with zeroes, so that items
 # nicely sort alphabetically
 def pad_with_zeroes(
@@ -653,27 +673,26 @@ def _check_ungrouped_ifs(
     max_out_traffic = -1.
     ignore_res_error = None
 
-    for interface in section:
-        if item_matches(item, interface.index, interface.alias, interface.descr):
-            try:
-                last_results = list(
-                    check_single_interface(
-                        item,
-                        params,
-                        interface,
-                        timestamp=timestamp,
-                        input_is_rate=input_is_rate,
-                    ))
-            except IgnoreResultsError as excpt:
-                ignore_res_error = excpt
-                continue
-            for result in last_results:
-                if isinstance(
-                        result,
-                        Metric,
-                ) and result.name == 'out' and result.value > max_out_traffic:
-                    max_out_traffic = result.value
-                    results_from_fastest_interface = last_results
+    for interface in _matching_interfaces(item, section):
+        try:
+            last_results = list(
+                check_single_interface(
+                    item,
+                    params,
+                    interface,
+                    timestamp=timestamp,
+                    input_is_rate=input_is_rate,
+                ))
+        except IgnoreResultsError as excpt:
+            ignore_res_error = excpt
+            continue
+        for result in last_results:
+            if isinstance(
+                    result,
+                    Metric,
+            ) and result.name == 'out' and result.value > max_out_traffic:
+                max_out_traffic = result.value
+                results_from_fastest_interface = last_results
 
     if results_from_fastest_interface is not None:
         yield from results_from_fastest_interface
@@ -34,6 +34,10 @@ def default_config() -> Dict[str, Any]:
         "actions": [],
         "debug_rules": False,
         "rule_optimizer": True,
+        # Number of processes parsing the incoming messages, 0 parses them in the event server.
+        # The messages of a sender are parsed by the same process and processed in the order
+        # they were received, messages of different senders may be processed in another order.
+        "ingestion_workers": 0,
         "log_level": {
             "cmk.mkeventd": logging.INFO,
             "cmk.mkeventd.EventServer": logging.INFO,
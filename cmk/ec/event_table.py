@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""The current events of the Event Console
+
+The events are kept by their IDs in the order they have been added. Secondary
+indexes by host, core host, rule ID and phase and an index by the time the
+event is due for housekeeping avoid scanning all events when looking for a few
+of them.
+
+An event is due once its delay or livetime is over. The due time of counting
+events depends on their rule, it is set by the housekeeping with schedule().
+Counting events without a due time are due immediately, e.g. new ones or ones
+that have been counted up.
+
+The events are plain dicts that are modified in many places. After changing
+an event in the table, update() has to be called for it: The indexed fields (or
+the fields the due time depends on) may have changed and the table keeps track
+of the changed events for saving them (see take_changes()).
+"""
+
+import heapq
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+__all__ = ["EventTable", "INDEXED_FIELDS"]
+
+# TODO: Improve type!
+Event = Dict[str, Any]
+
+INDEXED_FIELDS = ("host", "core_host", "rule_id", "phase")
+# Events not having an indexed field are indexed under this value. It is the default
+# of the status table columns, so the indexed queries find the same events as the
+# filters applied to the rows.
+_MISSING_VALUE = ""
+
+# The values of the indexed fields and the due time
+_Keys = Tuple[Any, ...]
+
+# The events by their ID per value of an indexed field
+_Index = Dict[Any, Dict[int, Event]]
+
+
+class EventTable:
+    def __init__(self, events: Iterable[Event] = ()) -> None:
+        super().__init__()
+        self._events: Dict[int, Event] = {}
+        # The position of the events in the table, the indexes are not ordered
+        self._positions: Dict[int, int] = {}
+        self._next_position = 0
+        self._keys_by_id: Dict[int, _Keys] = {}
+        self._indexes: Dict[str, _Index] = {field: {} for field in INDEXED_FIELDS}
+        # Heap of due times and event IDs, entries of removed events or outdated
+        # due times are skipped when popping them.
+        self._due_times: List[Tuple[float, int]] = []
+        # Events which are due, they stay here until removed or updated
+        self._due_events: Dict[int, Event] = {}
+        # The due times of counting events set by schedule()
+        self._scheduled: Dict[int, Optional[float]] = {}
+        # The IDs of the events added, changed or removed since take_changes()
+        self._changed: Set[int] = set()
+        for event in events:
+            self.add(event)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[Event]:
+        """The events in the order they have been added"""
+        return iter(list(self._events.values()))
+
+    def get(self, event_id: int) -> Optional[Event]:
+        return self._events.get(event_id)
+
+    def oldest(self, field: Optional[str] = None, value: Any = None) -> Optional[Event]:
+        """The event added first, optionally of the ones having the value in an indexed field"""
+        if field is None:
+            return next(iter(self._events.values()), None)
+        events = self.select({field: (value,)})
+        return events[0] if events else None
+
+    def add(self, event: Event) -> None:
+        event_id = event["id"]
+        if event_id in self._events:
+            self.remove(self._events[event_id])
+        self._events[event_id] = event
+        self._changed.add(event_id)
+        self._positions[event_id] = self._next_position
+        self._next_position += 1
+        self._index(event_id, event, self._keys(event))
+
+    def remove(self, event: Event) -> None:
+        """Remove the event, raises KeyError in case it is not in the table"""
+        event_id = event["id"]
+        if self._events.get(event_id) is not event:
+            raise KeyError(event_id)
+        self._unindex(event_id, self._keys_by_id.pop(event_id))
+        del self._events[event_id]
+        self._changed.add(event_id)
+        del self._positions[event_id]
+        self._due_events.pop(event_id, None)
+        self._scheduled.pop(event_id, None)
+
+    def update(self, event: Event) -> None:
+        """Update the indexes after the event has been changed
+
+        A counting event is due immediately afterwards."""
+        if self._events.get(event["id"]) is not event:
+            return  # Not (yet) in the table
+        self._changed.add(event["id"])
+        self._scheduled.pop(event["id"], None)
+        self._reindex(event)
+
+    def schedule(self, event: Event, due_time: Optional[float]) -> None:
+        """Set the due time of a counting event, None if it never gets due"""
+        if self._events.get(event["id"]) is not event:
+            return
+        self._changed.add(event["id"])
+        self._scheduled[event["id"]] = due_time
+        self._reindex(event)
+
+    def take_changes(self) -> Dict[int, Optional[Event]]:
+        """The events added or changed since the last call by their IDs, None if removed"""
+        changes = {event_id: self._events.get(event_id) for event_id in self._changed}
+        self._changed = set()
+        return changes
+
+    def unschedule(self) -> None:
+        """Make all counting events due, e.g. after their rules have changed"""
+        for event in self.select({"phase": ["counting"]}):
+            self.update(event)
+
+    def _reindex(self, event: Event) -> None:
+        event_id = event["id"]
+        old_keys = self._keys_by_id[event_id]
+        new_keys = self._keys(event)
+        if new_keys == old_keys:
+            return
+        self._unindex(event_id, old_keys)
+        if new_keys[-1] != old_keys[-1]:
+            self._due_events.pop(event_id, None)
+        self._index(event_id, event, new_keys, push_due_time=new_keys[-1] != old_keys[-1])
+
+    def _index(self, event_id: int, event: Event, keys: _Keys, push_due_time: bool = True) -> None:
+        self._keys_by_id[event_id] = keys
+        for field, value in zip(INDEXED_FIELDS, keys):
+            self._indexes[field].setdefault(value, {})[event_id] = event
+        due_time = keys[-1]
+        if push_due_time and due_time is not None:
+            heapq.heappush(self._due_times, (due_time, event_id))
+            if len(self._due_times) > 2 * len(self._events) + 100:
+                self._compact_due_times()
+
+    def _unindex(self, event_id: int, keys: _Keys) -> None:
+        for field, value in zip(INDEXED_FIELDS, keys):
+            index = self._indexes[field]
+            events = index[value]
+            del events[event_id]
+            if not events:
+                del index[value]
+
+    def _compact_due_times(self) -> None:
+        self._due_times = [(keys[-1], event_id)
+                           for event_id, keys in self._keys_by_id.items()
+                           if keys[-1] is not None and event_id not in self._due_events]
+        heapq.heapify(self._due_times)
+
+    def select(self, criteria: Mapping[str, Collection[Any]]) -> List[Event]:
+        """The events having one of the given values in each of the indexed fields
+
+        The events are returned in the order they have been added."""
+        candidates: Optional[Dict[int, Event]] = None
+        for field, values in criteria.items():
+            index = self._indexes[field]
+            events: Dict[int, Event] = {}
+            for value in values:
+                events.update(index.get(value, {}))
+            if candidates is None or len(events) < len(candidates):
+                candidates = events
+        if candidates is None:
+            return list(self._events.values())
+
+        # The smallest set of candidates has been selected, check the other fields
+        positions = self._positions
+        return [
+            event for event_id, event in sorted(candidates.items(), key=lambda e: positions[e[0]])
+            if all(_indexed_value(event, field) in values for field, values in criteria.items())
+        ]
+
+    def due(self, now: float) -> List[Event]:
+        """The events to be looked at by the housekeeping, in the order they have been added
+
+        An event stays due until it is removed or its due time changes."""
+        while self._due_times and self._due_times[0][0] <= now:
+            due_time, event_id = heapq.heappop(self._due_times)
+            keys = self._keys_by_id.get(event_id)
+            if keys is not None and keys[-1] == due_time:
+                self._due_events[event_id] = self._events[event_id]
+        positions = self._positions
+        return [
+            event
+            for event_id, event in sorted(self._due_events.items(), key=lambda e: positions[e[0]])
+        ]
+
+    def _keys(self, event: Event) -> _Keys:
+        keys = tuple(_indexed_value(event, field) for field in INDEXED_FIELDS)
+        return keys + (self._due_time(event),)
+
+    def _due_time(self, event: Event) -> Optional[float]:
+        phase = event.get("phase")
+        if phase == "counting":
+            return self._scheduled.get(event["id"], 0)
+        if phase == "delayed":
+            return event.get("delay_until", 0)
+        return event.get("live_until")
+
+
+def _indexed_value(event: Event, field: str) -> Any:
+    return event.get(field, _MISSING_VALUE)
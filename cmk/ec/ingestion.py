@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Parse incoming messages in worker processes
+
+The received data is put into the parse queue of a worker process. The worker
+parses it with a given function and puts the results into the match queue. A
+thread of the event server process takes them from the match queue and handles
+them one after the other, i.e. everything depending on the state of the event
+server is serialized.
+
+The data of a sender (the host of its address) always goes to the same worker,
+so the results of its messages are handled in the order they were received.
+Messages of different senders may be handled in a different order.
+
+The workers are forked from the event server, the parse function can use its
+state at that time (e.g. the configuration and the rules). After changing it,
+the pipeline has to be replaced by a new one.
+
+The parse queues are fed by the thread receiving the data, it must not block:
+Data not fitting into a parse queue is dropped. The workers wait for some
+time when the match queue is full, then they drop their results.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from logging import Logger
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .main import Perfcounters
+
+__all__ = ["IngestionPipeline"]
+
+# The received data and the address of the sender
+Message = Tuple[bytes, Any]
+
+# Number of messages resp. lists of results per queue
+_QUEUE_SIZE = 10000
+# Seconds a worker waits for room in the match queue
+_MATCH_QUEUE_TIMEOUT = 1.0
+
+
+class IngestionPipeline:
+    def __init__(self, logger: Logger, perfcounters: 'Perfcounters', num_workers: int,
+                 parse: Callable[[bytes, Any], List[Any]], handle: Callable[[Any], None]) -> None:
+        super().__init__()
+        self._logger = logger
+        self._perfcounters = perfcounters
+        context = multiprocessing.get_context("fork")
+        self._parse_queues = [context.Queue(_QUEUE_SIZE) for _nr in range(num_workers)]
+        self._match_queue = context.Queue(_QUEUE_SIZE)
+        # Results dropped by the workers, not yet added to the performance counters
+        self._match_drops = context.Value("i", 0)
+        self._workers = [
+            context.Process(target=_work,
+                            name="EventServer-ingestion-%d" % nr,
+                            args=(logger, parse, parse_queue, self._match_queue, self._match_drops,
+                                  os.getpid()),
+                            daemon=True) for nr, parse_queue in enumerate(self._parse_queues)
+        ]
+        self._handle = handle
+        self._consumer = threading.Thread(target=self._consume,
+                                          name="EventServer-ingestion",
+                                          daemon=True)
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._consumer.start()
+        self._logger.info("Started %d ingestion workers" % len(self._workers))
+
+    def stop(self) -> None:
+        """Stop the workers after they have parsed the queued messages and handle their results"""
+        for parse_queue in self._parse_queues:
+            parse_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._match_queue.put(None)
+        self._consumer.join()
+        for parse_queue in self._parse_queues:
+            parse_queue.close()
+        self._match_queue.close()
+        self._logger.info("Stopped %d ingestion workers" % len(self._workers))
+
+    def submit(self, messages: List[Message]) -> None:
+        """Queue the messages for parsing, they are dropped in case the queue is full
+
+        The messages of a sender are queued for the same worker to keep their order."""
+        messages_by_queue: Dict[int, List[Message]] = {}
+        for message in messages:
+            messages_by_queue.setdefault(self._queue_index(message[1]), []).append(message)
+
+        for index, queue_messages in messages_by_queue.items():
+            try:
+                self._parse_queues[index].put_nowait(queue_messages)
+            except queue.Full:
+                self._perfcounters.count("parse_drops", len(queue_messages))
+
+    def _queue_index(self, address: Any) -> int:
+        # Messages from the local sockets and the spool directory have no address
+        sender = address[0] if isinstance(address, tuple) else address
+        return hash(sender) % len(self._parse_queues)
+
+    def _consume(self) -> None:
+        while True:
+            try:
+                results = self._match_queue.get(timeout=1)
+            except queue.Empty:
+                results = []
+            if results is None:
+                break
+
+            for result in results:
+                try:
+                    self._handle(result)
+                except Exception as e:
+                    self._logger.exception("Exception handling a parsed message: %s" % e)
+            self._update_perfcounters()
+        self._update_perfcounters()
+
+    def _update_perfcounters(self) -> None:
+        self._perfcounters.set_gauge("parse_queue_length",
+                                     sum(parse_queue.qsize() for parse_queue in self._parse_queues))
+        self._perfcounters.set_gauge("match_queue_length", self._match_queue.qsize())
+        with self._match_drops.get_lock():
+            match_drops, self._match_drops.value = self._match_drops.value, 0
+        if match_drops:
+            self._perfcounters.count("match_drops", match_drops)
+
+
+def _work(logger: Logger, parse: Callable[[bytes, Any], List[Any]], parse_queue: Any,
+          match_queue: Any, match_drops: Any, parent_pid: int) -> None:
+    # The event server handles reloads and Ctrl-C, it stops the workers
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGQUIT, signal.SIG_DFL)
+
+    while True:
+        try:
+            messages: Optional[List[Message]] = parse_queue.get(timeout=1)
+        except queue.Empty:
+            if os.getppid() != parent_pid:
+                break  # The event server is gone
+            continue
+        if messages is None:
+            break
+
+        results: List[Any] = []
+        for data, address in messages:
+            try:
+                results += parse(data, address)
+            except Exception as e:
+                logger.exception("Exception parsing a message (skipping this one): %s" % e)
+        if not results:
+            continue
+
+        try:
+            match_queue.put(results, timeout=_MATCH_QUEUE_TIMEOUT)
+        except queue.Full:
+            with match_drops.get_lock():
+                match_drops.value += len(results)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Persistence of the event status
+
+The status (next event ID, events, rule statistics and interval starts) is
+stored in a snapshot and a journal of the changes since the snapshot:
+
+* snapshot (status): header with the generation of the snapshot, followed by
+  the marshal dump of the status.
+* journal (status.journal): header with the generation of the snapshot it
+  belongs to, followed by length prefixed frames. A frame contains the changed
+  and the deleted events of a save and the rest of the status.
+
+The caller keeps track of the events changed since the previous save, only
+these are dumped and appended to the journal. Once the journal outgrows the
+snapshot, a new snapshot of all events is written and the journal starts over. Loading
+replays the journal on top of the snapshot, the first save afterwards writes a
+new snapshot. A journal of an other snapshot generation (interrupted
+compaction) and an incomplete trailing frame (interrupted save) are ignored.
+
+Status files of the old repr() format are still loaded, they are replaced by a
+snapshot on the next save.
+"""
+
+import ast
+import gc
+import marshal
+import os
+import struct
+from logging import Logger
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+__all__ = ["StatusJournal"]
+
+# TODO: Improve type!
+Event = Dict[str, Any]
+
+_SNAPSHOT_MAGIC = b"\x00ECSNAP1"
+_JOURNAL_MAGIC = b"\x00ECJRNL2"
+# magic, generation
+_HEADER = struct.Struct("<8sQ")
+_FRAME_HEADER = struct.Struct("<I")
+
+
+class StatusJournal:
+    def __init__(self, path: Path, logger: Logger) -> None:
+        super().__init__()
+        self.path = path
+        self.journal_path = path.with_name(path.name + ".journal")
+        self._logger = logger
+        self._generation = 0
+        # 0: The next save writes a snapshot
+        self._snapshot_size = 0
+        self._journal_size = 0
+
+    def reset(self) -> None:
+        """Write a snapshot on the next save"""
+        self._snapshot_size = 0
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """The saved status, None in case nothing has been saved yet"""
+        try:
+            content = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        self.reset()
+        if not content.startswith(_SNAPSHOT_MAGIC):
+            return ast.literal_eval(content.decode("utf-8"))
+
+        # The garbage collector would run over and over again while creating the events
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            _magic, self._generation = _HEADER.unpack_from(content)
+            status = marshal.loads(memoryview(content)[_HEADER.size:])
+            events = {event["id"]: event for event in status["events"]}
+            self._replay_journal(status, events)
+            status["events"] = list(events.values())
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return status
+
+    def _replay_journal(self, status: Dict[str, Any], events: Dict[int, Dict[str, Any]]) -> None:
+        try:
+            content = self.journal_path.read_bytes()
+        except FileNotFoundError:
+            return
+
+        header = _HEADER.unpack_from(content) if len(content) >= _HEADER.size else None
+        if header != (_JOURNAL_MAGIC, self._generation):
+            self._logger.info("Ignoring journal %s of an other snapshot", self.journal_path)
+            return
+
+        data = memoryview(content)
+        offset = _HEADER.size
+        num_frames = 0
+        while offset < len(data):
+            if offset + _FRAME_HEADER.size > len(data):
+                break
+            length, = _FRAME_HEADER.unpack_from(data, offset)
+            end = offset + _FRAME_HEADER.size + length
+            if end > len(data):
+                break
+
+            changed, deleted, meta = marshal.loads(data[offset + _FRAME_HEADER.size:end])
+            # New events are added at the end, changed ones keep their position
+            for event in changed:
+                events[event["id"]] = event
+            for event_id in deleted:
+                events.pop(event_id, None)
+            status.update(meta)
+            num_frames += 1
+            offset = end
+
+        self._logger.info("Replayed %d changes of the event status from %s", num_frames,
+                          self.journal_path)
+        if offset < len(data):
+            self._logger.warning("Ignoring incomplete change at the end of %s", self.journal_path)
+
+    def save(self, status: Dict[str, Any], changes: Mapping[int, Optional[Event]]) -> None:
+        """Save the status, changes are the events changed since the previous save
+
+        The changes map the IDs of the new, changed and deleted (None) events to
+        the events, they have to be complete: The events not in there are not saved
+        unless a snapshot is written.
+        """
+        try:
+            if not self._snapshot_size or self._journal_size > self._snapshot_size:
+                self._write_snapshot(status)
+            else:
+                self._append_frame(status, changes)
+        except Exception:
+            self.reset()  # The changes would be missing in the journal
+            raise
+
+    def _append_frame(self, status: Dict[str, Any], changes: Mapping[int, Optional[Event]]) -> None:
+        changed = [event for event in changes.values() if event is not None]
+        deleted = [event_id for event_id, event in changes.items() if event is None]
+        payload = marshal.dumps((changed, deleted, _meta(status)))
+        with self.journal_path.open("ab") as f:
+            f.write(_FRAME_HEADER.pack(len(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_size += _FRAME_HEADER.size + len(payload)
+
+    def _write_snapshot(self, status: Dict[str, Any]) -> None:
+        generation = self._generation + 1
+        content = _HEADER.pack(_SNAPSHOT_MAGIC, generation) + marshal.dumps(status)
+        _write_atomically(self.path, content)
+        # A crash before this point leaves a journal of the previous generation, which
+        # is ignored on load.
+        _write_atomically(self.journal_path, _HEADER.pack(_JOURNAL_MAGIC, generation))
+        self._generation = generation
+        self._snapshot_size = len(content)
+        self._journal_size = _HEADER.size
+
+
+def _meta(status: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in status.items() if key != "events"}
+
+
+def _write_atomically(path: Path, content: bytes) -> None:
+    path_new = path.parent / (path.name + ".new")
+    with path_new.open(mode="wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    path_new.rename(path)
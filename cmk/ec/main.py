@@ -14,6 +14,7 @@
 import abc
 import ast
 import errno
+import heapq
 import json
 from logging import Logger, getLogger
 import os
@@ -28,7 +29,7 @@ import threading
 import time
 import traceback
 from types import FrameType
-from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type, Union
 
 from six import ensure_binary
 
@@ -49,8 +50,12 @@ import livestatus
 
 from .actions import do_notify, do_event_action, do_event_actions, event_has_opened
 from .crash_reporting import ECCrashReport, CrashReportStore
+from .event_table import EventTable, INDEXED_FIELDS
+from .ingestion import IngestionPipeline, Message
 from .history import ActiveHistoryPeriod, History, scrub_string, quote_tab, get_logfile
+from .journal import StatusJournal
 from .query import MKClientError, Query, QueryGET
+from .rule_prefilter import RulePrefilter
 from .rule_packs import load_config as load_config_using
 from .settings import FileDescriptor, PortNumber, Settings, settings as create_settings
 from .snmp import SNMPTrapEngine
@@ -489,6 +494,15 @@ class Perfcounters:
         "overflows",
         "events",
         "connects",
+        # Messages dropped before resp. after parsing them in the ingestion pipeline
+        "parse_drops",
+        "match_drops",
+    ]
+
+    # Current lengths of the queues of the ingestion pipeline
+    _gauge_names = [
+        "parse_queue_length",
+        "match_queue_length",
     ]
 
     # Average processing times
@@ -509,13 +523,18 @@ class Perfcounters:
         self._rates: Dict[str, float] = {}
         self._average_rates: Dict[str, float] = {}
         self._times: Dict[str, float] = {}
+        self._gauges = {n: 0 for n in self._gauge_names}
         self._last_statistics: Optional[float] = None
 
         self._logger = logger.getChild("Perfcounters")
 
-    def count(self, counter: str) -> None:
+    def count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def set_gauge(self, gauge: str, value: int) -> None:
         with self._lock:
-            self._counters[counter] += 1
+            self._gauges[gauge] = value
 
     def count_time(self, counter: str, ptime: float) -> None:
         with self._lock:
@@ -557,6 +576,9 @@ class Perfcounters:
         for name in cls._weights:
             columns.append(("status_average_%s_time" % name, 0.0))
 
+        for name in cls._gauge_names:
+            columns.append(("status_" + name, 0))
+
         return columns
 
     def get_status(self) -> List[float]:
@@ -571,6 +593,9 @@ class Perfcounters:
             for name in self._weights:
                 row.append(self._times.get(name, 0.0))
 
+            for name in self._gauge_names:
+                row.append(self._gauges[name])
+
             return row
 
 
@@ -627,9 +652,26 @@ class EventServer(ECServerThread):
 
         # TODO: Improve type!
         self._rules: List[Any] = []
+        self._rule_by_id: Dict[str, Any] = {}
+        # The housekeeping has to look at all counting events and expecting rules again
+        self._rules_changed = True
+        # Deadlines of the expecting rules, computed again when the interval starts
+        # of the event status have been replaced (see EventStatus.interval_starts_version)
+        self._expected_messages_schedule: Optional[List[Tuple[float, int, Any]]] = None
+        self._expected_messages_version = 0
         self._hash_stats = []
         for _unused_facility in range(32):
             self._hash_stats.append([0] * 8)
+        self._rule_prefilter: Optional[RulePrefilter] = None
+        # Rules looked at by the prefilter and the ones it let pass
+        self._prefilter_stats = [0, 0]
+        # Incremented after compiling the rules, the ingestion workers parse with the
+        # configuration and rules of the generation they have been started with
+        self._rules_generation = 0
+        self._ingestion: Optional[IngestionPipeline] = None
+        self._ingestion_generation = 0
+        # Serializes the processing of events from the ingestion pipeline and the SNMP traps
+        self._processing_lock = threading.Lock()
 
         self.host_config = HostConfig(self._logger)
         self._perfcounters = perfcounters
@@ -846,6 +888,11 @@ class EventServer(ECServerThread):
         client_sockets: Dict[int, Tuple[socket.socket, Any, bytes]] = {}
         select_timeout = 1
         while not self._terminate_event.is_set():
+            # The ingestion pipeline keeps running in case of exceptions, it is restarted after
+            # changes of the configuration or the rules and stopped at termination.
+            if self._ingestion_generation != self._rules_generation:
+                self._restart_ingestion()
+
             try:
                 readable = select.select(listen_list + list(client_sockets.keys()), [], [],
                                          select_timeout)[0]
@@ -888,14 +935,14 @@ class EventServer(ECServerThread):
                         # Do we have any complete messages?
                         if b'\n' in data:
                             complete, rest = data.rsplit(b"\n", 1)
-                            self.process_raw_lines(complete + b"\n", address)
+                            self._ingest([(complete + b"\n", address)])
                         else:
                             rest = data  # keep for next time
 
                     # Only complete messages
                     else:
                         if data:
-                            self.process_raw_lines(data, address)
+                            self._ingest([(data, address)])
                         rest = b""
 
                     # Connection still open?
@@ -918,11 +965,11 @@ class EventServer(ECServerThread):
                         if data[-1:] != b'\n':
                             if b'\n' in data:  # at least one complete message contained
                                 messages, pipe_fragment = data.rsplit(b'\n', 1)
-                                self.process_raw_lines(messages + b'\n')  # got lost in split
+                                self._ingest([(messages + b'\n', None)])  # got lost in split
                             else:
                                 pipe_fragment = data  # keep beginning of message, wait for \n
                         else:
-                            self.process_raw_lines(data)
+                            self._ingest([(data, None)])
                     else:  # EOF
                         os.close(pipe)
                         pipe = self.open_pipe()
@@ -938,7 +985,7 @@ class EventServer(ECServerThread):
 
             # Read events from builtin syslog server
             if self._syslog is not None and self._syslog.fileno() in readable:
-                self.process_raw_lines(*self._syslog.recvfrom(4096))
+                self._ingest(self._receive_datagrams(self._syslog))
 
             # Read events from builtin snmptrap server
             if self._snmptrap is not None and self._snmptrap.fileno() in readable:
@@ -954,12 +1001,57 @@ class EventServer(ECServerThread):
             try:
                 # process the first spool file we get
                 spool_file = next(self.settings.paths.spool_dir.value.glob('[!.]*'))
-                self.process_raw_lines(spool_file.read_bytes())
+                self._ingest([(spool_file.read_bytes(), None)])
                 spool_file.unlink()
                 select_timeout = 0  # enable fast processing to process further files
             except StopIteration:
                 select_timeout = 1  # restore default select timeout
 
+        self._stop_ingestion()
+
+    def _receive_datagrams(self, sock: socket.socket) -> List[Message]:
+        """Receive the datagrams waiting at the socket, but not more than 100 at once"""
+        messages: List[Message] = []
+        while len(messages) < 100:
+            try:
+                messages.append(sock.recvfrom(4096, socket.MSG_DONTWAIT))
+            except BlockingIOError:
+                break
+        return messages
+
+    def _ingest(self, messages: List[Message]) -> None:
+        """Process the received data, in the ingestion pipeline if there is one"""
+        if self._ingestion is not None:
+            self._ingestion.submit(messages)
+            return
+        for data, address in messages:
+            self.process_raw_lines(data, address)
+
+    def _restart_ingestion(self) -> None:
+        """Replace the ingestion pipeline by one for the current configuration and rules"""
+        old_ingestion = self._ingestion
+        # The workers are forked, they must not see half compiled rules
+        with self._lock_configuration:
+            self._ingestion_generation = self._rules_generation
+            num_workers = self._config["ingestion_workers"]
+            if num_workers:
+                self._ingestion = IngestionPipeline(self._logger, self._perfcounters, num_workers,
+                                                    self._parse_raw_lines,
+                                                    self._process_parsed_event)
+                self._ingestion.start()
+            else:
+                self._ingestion = None
+        # The old workers may still have messages to parse, they need the configuration lock to
+        # be processed
+        if old_ingestion is not None:
+            old_ingestion.stop()
+
+    def _stop_ingestion(self) -> None:
+        if self._ingestion is not None:
+            self._ingestion.stop()
+            self._ingestion = None
+        self._ingestion_generation = 0
+
     # Processes incoming data, just a wrapper between the real data and the
     # handler function to record some statistics etc.
     def process_raw_data(self, handler):
@@ -967,7 +1059,8 @@ class EventServer(ECServerThread):
         before = time.time()
         # In replication slave mode (when not took over), ignore all events
         if not is_replication_slave(self._config) or self._slave_status["mode"] != "sync":
-            handler()
+            with self._processing_lock:
+                handler()
         elif self.settings.options.debug:
             self._logger.info("Replication: we are in slave mode, ignoring event")
         elapsed = time.time() - before
@@ -989,6 +1082,38 @@ class EventServer(ECServerThread):
                     self._logger.exception('Exception handling a log line (skipping this one): %s' %
                                            e)
 
+    def _parse_raw_lines(self, data: bytes,
+                         address: Optional[Any]) -> List[Tuple[Any, int, Optional[Set[int]]]]:
+        """Create the events of the lines and do everything not depending on the event status
+
+        This is done by the ingestion workers. The events are processed by
+        _process_parsed_event() afterwards."""
+        parsed = []
+        for line_bytes in data.splitlines():
+            line = scrub_and_decode(line_bytes.rstrip())
+            if not line:
+                continue
+            try:
+                event = self._create_event(line, address)
+                self.do_translate_hostname(event)
+                passing_rules = (self._rule_prefilter.passing_rules(event)
+                                 if self._rule_prefilter else None)
+            except Exception as e:
+                self._logger.exception('Exception handling a log line (skipping this one): %s' % e)
+                continue
+            parsed.append((event, self._rules_generation, passing_rules))
+        return parsed
+
+    def _process_parsed_event(self, parsed: Tuple[Any, int, Optional[Set[int]]]) -> None:
+        event, rules_generation, passing_rules = parsed
+        if rules_generation != self._rules_generation:
+            passing_rules = None  # Parsed with the rules before the last reload
+
+        def handler():
+            self._process_translated_event(event, passing_rules)
+
+        self.process_raw_data(handler)
+
     def do_housekeeping(self) -> None:
         with self._event_status.lock:
             with self._lock_configuration:
@@ -1026,9 +1151,15 @@ class EventServer(ECServerThread):
         #    time is elapsed.
         # 2. Automatically delete all events that are in state "open"
         #    and whose livetime is elapsed.
+        # Only the events which are due are looked at. The due times of counting events
+        # depend on their rules, they are set below.
+        if self._rules_changed:
+            self._event_status.unschedule_counting_events()
+            self._rules_changed = False
+
         events_to_delete = []
-        events = self._event_status.events()
         now = time.time()
+        events = self._event_status.get_due_events(now)
         for nr, event in enumerate(events):
             rule = self._rule_by_id.get(event["rule_id"])
 
@@ -1055,12 +1186,7 @@ class EventServer(ECServerThread):
                     count = rule["count"]
                     if count.get("algorithm") in ["tokenbucket", "dynabucket"]:
                         last_token = event.get("last_token", event["first"])
-                        secs_per_token = count["period"] / float(count["count"])
-                        if count["algorithm"] == "dynabucket":  # get fewer tokens if count is lower
-                            if event["count"] <= 1:
-                                secs_per_token = count["period"]
-                            else:
-                                secs_per_token *= (float(count["count"]) / float(event["count"]))
+                        secs_per_token = _secs_per_token(count, event)
                         elapsed_secs = now - last_token
                         new_tokens = int(elapsed_secs / secs_per_token)
                         if new_tokens:
@@ -1089,6 +1215,9 @@ class EventServer(ECServerThread):
                             self._history.add(event, "COUNTFAILED")
                             events_to_delete.append(nr)
 
+                if event["phase"] == "counting" and rule is not None:
+                    self._event_status.schedule_event(event, _counting_deadline(rule, event))
+
             # Handle delayed actions
             elif event["phase"] == "delayed":
                 delay_until = event.get("delay_until", 0)  # should always be present
@@ -1108,6 +1237,7 @@ class EventServer(ECServerThread):
                     else:
                         self._logger.info("Cannot do rule action: rule %s not present anymore." %
                                           event["rule_id"])
+                    self._event_status.update_event(event)
 
             # Handle events with a limited lifetime
             elif "live_until" in event:
@@ -1138,59 +1268,80 @@ class EventServer(ECServerThread):
         #    more than one occurrance is required.
         # 2. No event at all exists.
         #    in that case.
-        for rule in self._rules:
-            if "expect" in rule:
-
-                if not self._rule_matcher.event_rule_matches_site(rule, event=None):
-                    continue
+        # The rules are looked at when their current interval is over.
+        schedule = self._expected_messages_schedule
+        if schedule is None or \
+                self._event_status.interval_starts_version != self._expected_messages_version:
+            schedule = self._schedule_expected_messages()
+
+        due_rules = []
+        while schedule and schedule[0][0] <= now:
+            due_rules.append(heapq.heappop(schedule))
+
+        for _deadline, nr, rule in due_rules:
+            self._check_expected_messages(rule, now)
+            heapq.heappush(schedule, (self._expected_messages_deadline(rule), nr, rule))
+
+    def _schedule_expected_messages(self) -> List[Tuple[float, int, Any]]:
+        self._expected_messages_version = self._event_status.interval_starts_version
+        self._expected_messages_schedule = [
+            (self._expected_messages_deadline(rule), nr, rule)
+            for nr, rule in enumerate(self._rules)
+            if "expect" in rule and self._rule_matcher.event_rule_matches_site(rule, event=None)
+        ]
+        heapq.heapify(self._expected_messages_schedule)
+        return self._expected_messages_schedule
+
+    def _expected_messages_deadline(self, rule: Any) -> float:
+        interval = rule["expect"]["interval"]
+        interval_start = self._event_status.interval_start(rule["id"], interval)
+        return self._event_status.next_interval_start(interval, interval_start)
+
+    def _check_expected_messages(self, rule: Any, now: float) -> None:
+        # Interval is either a number of seconds, or pair of a number of seconds
+        # (e.g. 86400, meaning one day) and a timezone offset relative to UTC in hours.
+        interval = rule["expect"]["interval"]
+        expected_count = rule["expect"]["count"]
+
+        interval_start = self._event_status.interval_start(rule["id"], interval)
+        if interval_start >= now:
+            return
 
-                # Interval is either a number of seconds, or pair of a number of seconds
-                # (e.g. 86400, meaning one day) and a timezone offset relative to UTC in hours.
-                interval = rule["expect"]["interval"]
-                expected_count = rule["expect"]["count"]
+        next_interval_start = self._event_status.next_interval_start(interval, interval_start)
+        if next_interval_start > now:
+            return
 
-                interval_start = self._event_status.interval_start(rule["id"], interval)
-                if interval_start >= now:
-                    continue
+        # Interval has been elapsed. Now comes the truth: do we have enough
+        # rule matches?
 
-                next_interval_start = self._event_status.next_interval_start(
-                    interval, interval_start)
-                if next_interval_start > now:
-                    continue
+        # First do not forget to switch to next interval
+        self._event_status.start_next_interval(rule["id"], interval)
 
-                # Interval has been elapsed. Now comes the truth: do we have enough
-                # rule matches?
-
-                # First do not forget to switch to next interval
-                self._event_status.start_next_interval(rule["id"], interval)
-
-                # First look for case 1: rule that already have at least one hit
-                # and this events in the state "counting" exist.
-                events_to_delete = []
-                events = self._event_status.events()
-                for nr, event in enumerate(events):
-                    if event["rule_id"] == rule["id"] and event["phase"] == "counting":
-                        # time has elapsed. Now lets see if we have reached
-                        # the neccessary count:
-                        if event["count"] < expected_count:  # no -> trigger alarm
-                            self._handle_absent_event(rule, event["count"], expected_count,
-                                                      event["last"])
-                        else:  # yes -> everything is fine. Just log.
-                            self._logger.info(
-                                "Rule %s/%s has reached %d occurrances (%d required). "
-                                "Starting next period." %
-                                (rule["pack"], rule["id"], event["count"], expected_count))
-                            self._history.add(event, "COUNTREACHED")
-                        # Counting event is no longer needed.
-                        events_to_delete.append(nr)
-                        break
+        # First look for case 1: rule that already have at least one hit
+        # and this events in the state "counting" exist.
+        events_to_delete = []
+        events = self._event_status.get_events({"rule_id": [rule["id"]], "phase": ["counting"]})
+        for nr, event in enumerate(events):
+            if event["rule_id"] == rule["id"] and event["phase"] == "counting":
+                # time has elapsed. Now lets see if we have reached
+                # the neccessary count:
+                if event["count"] < expected_count:  # no -> trigger alarm
+                    self._handle_absent_event(rule, event["count"], expected_count, event["last"])
+                else:  # yes -> everything is fine. Just log.
+                    self._logger.info("Rule %s/%s has reached %d occurrances (%d required). "
+                                      "Starting next period." %
+                                      (rule["pack"], rule["id"], event["count"], expected_count))
+                    self._history.add(event, "COUNTREACHED")
+                # Counting event is no longer needed.
+                events_to_delete.append(nr)
+                break
 
-                # Ou ou, no event found at all.
-                else:
-                    self._handle_absent_event(rule, 0, expected_count, interval_start)
+        # Ou ou, no event found at all.
+        else:
+            self._handle_absent_event(rule, 0, expected_count, interval_start)
 
-                for nr in events_to_delete[::-1]:
-                    self._event_status.remove_event(events[nr])
+        for nr in events_to_delete[::-1]:
+            self._event_status.remove_event(events[nr])
 
     def _handle_absent_event(self, rule, event_count, expected_count, interval_start):
         now = time.time()
@@ -1206,7 +1357,7 @@ class EventServer(ECServerThread):
         merge_event = None
         merge = rule["expect"].get("merge", "open")
         if merge != "never":
-            for event in self._event_status.events():
+            for event in self._event_status.get_events({"rule_id": [rule["id"]]}):
                 if event["rule_id"] == rule["id"] and \
                         (event["phase"] == "open" or
                          (event["phase"] == "ack" and merge == "acked")):
@@ -1222,6 +1373,7 @@ class EventServer(ECServerThread):
             # Better rewrite (again). Rule might have changed. Also we have changed
             # the text and the user might have his own text added via set_text.
             self.rewrite_event(rule, merge_event, {}, set_first=False)
+            self._event_status.update_event(merge_event)
             self._history.add(merge_event, "COUNTFAILED")
         else:
             # Create artifical event from scratch. Make sure that all important
@@ -1252,6 +1404,7 @@ class EventServer(ECServerThread):
             self._history.add(event, "COUNTFAILED")
             event_has_opened(self._history, self.settings, self._config, self._logger, self,
                              self._event_columns, rule, event)
+            self._event_status.update_event(event)
             if rule.get("autodelete"):
                 event["phase"] = "closed"
                 self._history.add(event, "AUTODELETE")
@@ -1267,6 +1420,9 @@ class EventServer(ECServerThread):
     # Precompile regular expressions and similar stuff. Also convert legacy
     # "rules" parameter into new "rule_packs" parameter
     def compile_rules(self, legacy_rules, rule_packs):
+        self._rules_changed = True
+        self._expected_messages_schedule = None
+        self._expected_messages_version = 0
         self._rules = []
         self._rule_by_id = {}
         # Speedup-Hash for rule execution
@@ -1347,6 +1503,14 @@ class EventServer(ECServerThread):
                         stats.append("%s(%d)" % (SyslogPriority(prio), len(entries)))
                     self._logger.info(" %-12s: %s" % (SyslogFacility(facility), " ".join(stats)))
 
+            self._rule_prefilter = RulePrefilter(self._rules)
+            self._logger.info("Rule prefilter: %d rules - %d with literals to look for" %
+                              (len(self._rules), self._rule_prefilter.num_filtered_rules))
+        else:
+            self._rule_prefilter = None
+
+        self._rules_generation += 1
+
     @staticmethod
     def _compile_matching_value(key, val):
         value = val.strip()
@@ -1409,8 +1573,17 @@ class EventServer(ECServerThread):
             self._logger.info("  %s/%s - %d (%.2f%%)" %
                               (SyslogFacility(facility), SyslogPriority(priority), count,
                                (100.0 * count / float(total_count))))
+        self._logger.info("Rule prefilter: %s" % self._prefilter_hit_ratio())
+
+    def _prefilter_hit_ratio(self):
+        checked, passed = self._prefilter_stats
+        ratio = 100.0 * passed / checked if checked else 0.0
+        return "%d of %d rules passed (%.2f%%)" % (passed, checked, ratio)
 
     def process_line(self, line, address):
+        self.process_event(self._create_event(line, address))
+
+    def _create_event(self, line, address):
         line = line.rstrip()
         if self._config["debug_rules"]:
             if address:
@@ -1418,12 +1591,14 @@ class EventServer(ECServerThread):
             else:
                 self._logger.info(u"Processing message '%s'" % line)
 
-        event = self._event_creator.create_event_from_line(line, address)
-        self.process_event(event)
+        return self._event_creator.create_event_from_line(line, address)
 
     def process_event(self, event):
         self.do_translate_hostname(event)
+        self._process_translated_event(event)
 
+    # passing_rules are the rules passing the prefilter, in case it has already been applied
+    def _process_translated_event(self, event, passing_rules=None):
         # Log all incoming messages into a syslog-like text file if that is enabled
         if self._config["log_messages"]:
             self.log_message(event)
@@ -1435,6 +1610,15 @@ class EventServer(ECServerThread):
         else:
             rule_candidates = self._rules
 
+        # Skip the rules whose patterns need texts that are not in the event
+        if self._rule_prefilter:
+            self._prefilter_stats[0] += len(rule_candidates)
+            rule_candidates = self._rule_prefilter.select(rule_candidates, event, passing_rules)
+            self._prefilter_stats[1] += len(rule_candidates)
+            if self._config["debug_rules"]:
+                self._logger.info("Rule prefilter: %d rules may match, overall %s" %
+                                  (len(rule_candidates), self._prefilter_hit_ratio()))
+
         skip_pack = None
         for rule in rule_candidates:
             if skip_pack and rule["pack"] == skip_pack:
@@ -1517,6 +1701,8 @@ class EventServer(ECServerThread):
                             event_has_opened(self._history, self.settings, self._config,
                                              self._logger, self, self._event_columns, rule,
                                              existing_event)
+                        with self._event_status.lock:
+                            self._event_status.update_event(existing_event)
 
                         self._history.add(existing_event, "COUNTREACHED")
 
@@ -1541,6 +1727,8 @@ class EventServer(ECServerThread):
                         if event["phase"] == "open":
                             event_has_opened(self._history, self.settings, self._config,
                                              self._logger, self, self._event_columns, rule, event)
+                            with self._event_status.lock:
+                                self._event_status.update_event(event)
                             if rule.get("autodelete"):
                                 event["phase"] = "closed"
                                 self._history.add(event, "AUTODELETE")
@@ -1920,6 +2108,27 @@ class EventServer(ECServerThread):
         return new_event
 
 
+def _secs_per_token(count: Dict[str, Any], event: Dict[str, Any]) -> float:
+    secs_per_token = count["period"] / float(count["count"])
+    if count["algorithm"] == "dynabucket":  # get fewer tokens if count is lower
+        if event["count"] <= 1:
+            secs_per_token = count["period"]
+        else:
+            secs_per_token *= (float(count["count"]) / float(event["count"]))
+    return secs_per_token
+
+
+def _counting_deadline(rule: Dict[str, Any], event: Dict[str, Any]) -> Optional[float]:
+    """The time at which the housekeeping has to look at the counting event again"""
+    count = rule.get("count")
+    if count is None:
+        return None  # Expecting rules are handled by hk_check_expected_messages()
+    if count.get("algorithm") in ["tokenbucket", "dynabucket"]:
+        # The time the next token is got
+        return event.get("last_token", event["first"]) + _secs_per_token(count, event)
+    return event["first"] + count["period"]
+
+
 class EventCreator:
     def __init__(self, logger: Logger, config: Dict[str, Any]) -> None:
         super().__init__()
@@ -2597,12 +2806,23 @@ class StatusTableEvents(StatusTable):
         self._event_status = event_status
 
     def _enumerate(self, query: QueryGET) -> Iterable[List[Any]]:
-        for event in self._event_status.get_events():
-            # Optimize filters that are set by the check_mkevents active check. Since users
-            # may have a lot of those checks running, it is a good idea to optimize this.
-            if query.only_host and event["host"] not in query.only_host:
-                continue
+        # Use the indexes for the = and in filters, e.g. the ones set by the check_mkevents active
+        # check. Since users may have a lot of those checks running, this is worth it.
+        criteria = {}
+        for field in INDEXED_FIELDS:
+            values = query.column_values("event_" + field)
+            if values is not None:
+                criteria[field] = values
+
+        event_id = query.column_values("event_id")
+        if event_id is not None:
+            events = [
+                event for event in map(self._event_status.event, event_id) if event is not None
+            ]
+        else:
+            events = self._event_status.get_events(criteria)
 
+        for event in events:
             row = []
             for column_name in self.column_names:
                 try:
@@ -2955,6 +3175,7 @@ class StatusServer(ECServerThread):
             event["contact"] = contact
         if user:
             event["owner"] = user
+        self._event_status.update_event(event)
         self._history.add(event, "UPDATE", user)
 
     def handle_command_create(self, arguments: List[str]) -> None:
@@ -2974,6 +3195,7 @@ class StatusServer(ECServerThread):
         event["state"] = int(newstate)
         if user:
             event["owner"] = user
+        self._event_status.update_event(event)
         self._history.add(event, "CHANGESTATE", user)
 
     def handle_command_reload(self) -> None:
@@ -3015,6 +3237,7 @@ class StatusServer(ECServerThread):
         event = self._event_status.event(int(event_id))
         if user:
             event["owner"] = user
+            self._event_status.update_event(event)
 
         if action_id == "@NOTIFY":
             do_notify(self._event_server, self._logger, event, user, is_cancelling=False)
@@ -3155,19 +3378,22 @@ class EventStatus:
         self.lock = threading.Lock()
         self._history = history
         self._logger = logger
+        self._journal = StatusJournal(settings.paths.status_file.value, logger)
+        self.interval_starts_version = 0
         self.flush()
 
     def reload_configuration(self, config: Dict[str, Any]) -> None:
         self._config = config
 
     def flush(self) -> None:
-        # TODO: Improve types!
-        self._events: List[Any] = []
+        self._events = EventTable()
         self._next_event_id = 1
         self._rule_stats: Dict[str, int] = {}
         # needed for expecting rules
         self._interval_starts: Dict[str, int] = {}
+        self._replaced_interval_starts()
         self._initialize_event_limit_status()
+        self._journal.reset()
 
         # TODO: might introduce some performance counters, like:
         # - number of received messages
@@ -3176,12 +3402,25 @@ class EventStatus:
 
     def events(self) -> List[Any]:
         # TODO: Improve type!
-        return self._events
+        return list(self._events)
 
     def event(self, eid):
-        for event in self._events:
-            if event["id"] == eid:
-                return event
+        return self._events.get(eid)
+
+    def update_event(self, event):
+        """Needs to be called after changing an event, see EventTable"""
+        self._events.update(event)
+
+    def schedule_event(self, event, due_time):
+        """Set the time at which the housekeeping has to look at the counting event again"""
+        self._events.schedule(event, due_time)
+
+    def unschedule_counting_events(self):
+        self._events.unschedule()
+
+    def _replaced_interval_starts(self):
+        # The starts of the intervals are not only changed by start_next_interval()
+        self.interval_starts_version += 1
 
     # Return beginning of current expectation interval. For new rules
     # we start with the next interval in future.
@@ -3224,28 +3463,24 @@ class EventStatus:
     def pack_status(self):
         return {
             "next_event_id": self._next_event_id,
-            "events": self._events,
+            "events": list(self._events),
             "rule_stats": self._rule_stats,
             "interval_starts": self._interval_starts,
         }
 
     def unpack_status(self, status):
         self._next_event_id = status["next_event_id"]
-        self._events = status["events"]
+        self._events = EventTable(status["events"])
         self._rule_stats = status["rule_stats"]
         self._interval_starts = status["interval_starts"]
+        self._replaced_interval_starts()
+        self._journal.reset()
 
     def save_status(self):
         now = time.time()
-        status = self.pack_status()
         path = self.settings.paths.status_file.value
-        path_new = path.parent / (path.name + '.new')
-        # Believe it or not: cPickle is more than two times slower than repr()
-        with path_new.open(mode='wb') as f:
-            f.write((repr(status) + "\n").encode("utf-8"))
-            f.flush()
-            os.fsync(f.fileno())
-        path_new.rename(path)
+        # Only the changes since the last save are appended to the journal
+        self._journal.save(self.pack_status(), self._events.take_changes())
         elapsed = time.time() - now
         self._logger.log(VERBOSE, "Saved event state to %s in %.3fms.", path, elapsed * 1000)
 
@@ -3259,25 +3494,27 @@ class EventStatus:
 
     def load_status(self, event_server):
         path = self.settings.paths.status_file.value
-        if path.exists():
-            try:
-                status = ast.literal_eval(path.read_text(encoding="utf-8"))
-                self._next_event_id = status["next_event_id"]
-                self._events = status["events"]
-                self._rule_stats = status["rule_stats"]
-                self._interval_starts = status.get("interval_starts", {})
-                self._logger.info("Loaded event state from %s." % path)
-            except Exception as e:
-                self._logger.exception("Error loading event state from %s: %s" % (path, e))
-                raise
+        try:
+            status = self._journal.load()
+        except Exception as e:
+            self._logger.exception("Error loading event state from %s: %s" % (path, e))
+            raise
 
-        # Add new columns
-        for event in self._events:
-            event.setdefault("ipaddress", "")
+        if status is not None:
+            # Add new columns
+            for event in status["events"]:
+                event.setdefault("ipaddress", "")
+
+                if "core_host" not in event:
+                    event_server.add_core_host_to_event(event)
+                    event["host_in_downtime"] = False
 
-            if "core_host" not in event:
-                event_server.add_core_host_to_event(event)
-                event["host_in_downtime"] = False
+            self._next_event_id = status["next_event_id"]
+            self._events = EventTable(status["events"])
+            self._rule_stats = status["rule_stats"]
+            self._interval_starts = status.get("interval_starts", {})
+            self._replaced_interval_starts()
+            self._logger.info("Loaded event state from %s." % path)
 
         # core_host is needed to initialize the status
         self._initialize_event_limit_status()
@@ -3316,7 +3553,7 @@ class EventStatus:
         self._perfcounters.count("events")
         event["id"] = self._next_event_id
         self._next_event_id += 1
-        self._events.append(event)
+        self._events.add(event)
         self.num_existing_events += 1
         self._count_event_add(event)
         self._history.add(event, "NEW")
@@ -3332,19 +3569,14 @@ class EventStatus:
         try:
             self._events.remove(event)
             self._count_event_remove(event)
-        except ValueError:
+        except KeyError:
             self._logger.exception("Cannot remove event %d: not present" % event["id"])
 
-    # protected by self.lock
-    def _remove_event_by_nr(self, index):
-        event = self._events.pop(index)
-        self._count_event_remove(event)
-
     # protected by self.lock
     def remove_oldest_event(self, ty, event):
         if ty == "overall":
             self._logger.log(VERBOSE, "  Removing oldest event")
-            self._remove_event_by_nr(0)
+            self._remove_oldest_event_of(None, None)
         elif ty == "by_rule":
             self._logger.log(VERBOSE, "  Removing oldest event of rule \"%s\"", event["rule_id"])
             self._remove_oldest_event_of_rule(event["rule_id"])
@@ -3354,17 +3586,17 @@ class EventStatus:
 
     # protected by self.lock
     def _remove_oldest_event_of_rule(self, rule_id):
-        for event in self._events:
-            if event["rule_id"] == rule_id:
-                self.remove_event(event)
-                return
+        self._remove_oldest_event_of("rule_id", rule_id)
 
     # protected by self.lock
     def _remove_oldest_event_of_host(self, hostname):
-        for event in self._events:
-            if event["host"] == hostname:
-                self.remove_event(event)
-                return
+        self._remove_oldest_event_of("host", hostname)
+
+    # protected by self.lock
+    def _remove_oldest_event_of(self, field, value):
+        event = self._events.oldest(field, value)
+        if event is not None:
+            self.remove_event(event)
 
     # protected by self.lock
     def get_num_existing_events_by(self, ty, event):
@@ -3381,7 +3613,7 @@ class EventStatus:
     def cancel_events(self, event_server, event_columns, new_event, match_groups, rule):
         with self.lock:
             to_delete = []
-            for nr, event in enumerate(self._events):
+            for event in self._events.select({"rule_id": [rule["id"]]}):
                 if event["rule_id"] == rule["id"]:
                     if self.cancelling_match(match_groups, new_event, event, rule):
                         # Fill a few fields of the cancelled event with data from
@@ -3418,10 +3650,10 @@ class EventStatus:
                                                  event,
                                                  is_cancelling=True)
 
-                        to_delete.append(nr)
+                        to_delete.append(event)
 
-            for nr in to_delete[::-1]:
-                self._remove_event_by_nr(nr)
+            for event in to_delete:
+                self.remove_event(event)
 
     def cancelling_match(self, match_groups, new_event, event, rule):
         debug = self._config["debug_rules"]
@@ -3516,9 +3748,10 @@ class EventStatus:
                 preserve["contact"] = found["contact"]
         found.update(event)
         found.update(preserve)
+        self._events.update(found)
 
     def count_expected_event(self, event_server, event):
-        for ev in self._events:
+        for ev in self._events.select({"rule_id": [event["rule_id"]], "phase": ["counting"]}):
             if ev["rule_id"] == event["rule_id"] and ev["phase"] == "counting":
                 self.count_event_up(ev, event)
                 return
@@ -3534,7 +3767,7 @@ class EventStatus:
         # we do never modify events that are already in the state "open"
         # since the event has been created because the count was too
         # low in the specified period of time.
-        for ev in self._events:
+        for ev in self._events.select({"rule_id": [event["rule_id"]]}):
             if ev["rule_id"] == event["rule_id"]:
                 if ev["phase"] == "ack" and not count["count_ack"]:
                     continue  # skip acknowledged events
@@ -3568,23 +3801,28 @@ class EventStatus:
         # Did we just count the event that was just one too much?
         if found["phase"] == "counting" and found["count"] >= count["count"]:
             found["phase"] = "open"
+            self._events.update(found)
             return found  # do event action, return found copy of event
         return False  # do not do event action
 
     # locked with self.lock
     def delete_event(self, event_id, user):
-        for nr, event in enumerate(self._events):
-            if event["id"] == event_id:
-                event["phase"] = "closed"
-                if user:
-                    event["owner"] = user
-                self._history.add(event, "DELETE", user)
-                self._remove_event_by_nr(nr)
-                return
-        raise MKClientError("No event with id %s" % event_id)
+        event = self._events.get(event_id)
+        if event is None:
+            raise MKClientError("No event with id %s" % event_id)
+        event["phase"] = "closed"
+        if user:
+            event["owner"] = user
+        self._history.add(event, "DELETE", user)
+        self.remove_event(event)
+
+    def get_events(self, criteria=None):
+        """The events having one of the given values in each of the indexed fields"""
+        return self._events.select(criteria or {})
 
-    def get_events(self):
-        return self._events
+    def get_due_events(self, now):
+        """The events which have to be looked at by the housekeeping"""
+        return self._events.due(now)
 
     def get_rule_stats(self):
         return sorted(self._rule_stats.items(), key=lambda x: x[0])
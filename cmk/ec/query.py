@@ -75,8 +75,6 @@ class QueryGET(Query):
         # NOTE: history's _get_mongodb and _get_files access filters and limits directly.
         self.filters: List[Tuple[str, str, Callable, str]] = []
         self.limit: Optional[int] = None
-        # NOTE: StatusTableEvents uses only_host for optimization.
-        self.only_host: Optional[Set[Any]] = None
         self._parse_header_lines(raw_query, logger)
 
     def _parse_header_lines(self, raw_query: List[str], logger: Logger) -> None:
@@ -97,9 +95,6 @@ class QueryGET(Query):
             self.requested_columns = argument.split(" ")
         elif header == "Filter":
             column_name, operator_name, predicate, argument = self._parse_filter(argument)
-            # Needed for later optimization (check_mkevents)
-            if column_name == "event_host" and operator_name == 'in':
-                self.only_host = set(argument)
             self.filters.append((column_name, operator_name, predicate, argument))
         elif header == "Limit":
             self.limit = int(argument)
@@ -142,6 +137,16 @@ class QueryGET(Query):
             for column_name in self.requested_columns
         ]
 
+    def column_values(self, column_name: str) -> Optional[Set[Any]]:
+        """The values the = and in filters allow for the column, None if they do not restrict it"""
+        values: Optional[Set[Any]] = None
+        for filter_column_name, operator_name, _predicate, argument in self.filters:
+            if filter_column_name != column_name or operator_name not in ("=", "in"):
+                continue
+            allowed = set(argument) if operator_name == "in" else {argument}
+            values = allowed if values is None else values & allowed
+        return values
+
     def filter_row(self, row: List[Any]) -> bool:
         return all(
             predicate(row[self.table.column_indices[column_name]])
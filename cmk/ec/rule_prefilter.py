@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Skip rules whose text patterns can not match an event
+
+Most rules match the message text, host or application of an event with a
+pattern that needs some literal text to be present, e.g. "disk full" or
+"^sshd\\[\\d+\\]: Failed password". These literals are extracted from the
+compiled patterns of the rules. For each event, all literals are looked up at
+once: The literals are indexed by one of their three character substrings
+(trigrams), only the literals indexed by the trigrams of the event texts are
+searched for. A rule is only evaluated when each of its patterns has a literal
+in the event.
+
+Rules with inverted matching and patterns without a usable literal (e.g. only
+character classes) are always evaluated.
+"""
+
+import re
+import sre_parse  # pylint: disable=deprecated-module
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Sequence, Set, Tuple, Union
+
+__all__ = ["RulePrefilter"]
+
+# TODO: Improve type!
+Rule = Dict[str, Any]
+# The patterns of the rules, as compiled by EventServer._compile_matching_value()
+MatchingValue = Union[str, Pattern[str]]
+
+# The event fields and the rule keys matching them. A field matches in case one of the patterns
+# matches.
+_FIELDS = [
+    ("text", ("match", "match_ok")),
+    ("host", ("match_host",)),
+    ("application", ("match_application", "cancel_application")),
+]
+
+_GRAM_LENGTH = 3
+
+# Characters which are equal to ASCII characters when ignoring case, but whose lower case is not
+# ASCII. The literals only contain ASCII characters.
+_NORMALIZE = str.maketrans({"ı": "i", "ſ": "s", "̇": None})
+
+# One of the literals has to be contained in a field
+_Condition = FrozenSet[str]
+# trigram -> literals containing it -> the positions of the rules needing them
+_Anchors = Dict[str, Dict[str, Set[int]]]
+
+
+class RulePrefilter:
+    def __init__(self, rules: List[Rule]) -> None:
+        super().__init__()
+        self._rules = rules
+        # The positions of the rules that have to be evaluated in any case
+        self._always: Set[int] = set()
+        # The positions of the rules by the fields their patterns need literals in
+        self._rules_by_fields: Dict[Tuple[str, ...], Set[int]] = {}
+        # The literals of the patterns per field
+        self._anchors: Dict[str, _Anchors] = {field: {} for field, _keys in _FIELDS}
+        # The positions of the candidate rules (see select()) and of the ones to be evaluated in
+        # any case, by the ID of the candidate list
+        self._candidates: Dict[int, Tuple[List[Rule], FrozenSet[int], FrozenSet[int]]] = {}
+
+        conditions: Dict[str, List[Tuple[int, _Condition]]] = {field: [] for field, _ in _FIELDS}
+        for position, rule in enumerate(rules):
+            fields = []
+            if not rule.get("invert_matching"):
+                for field, keys in _FIELDS:
+                    condition = _rule_condition(rule, keys)
+                    if condition is not None:
+                        conditions[field].append((position, condition))
+                        fields.append(field)
+            if fields:
+                self._rules_by_fields.setdefault(tuple(fields), set()).add(position)
+            else:
+                self._always.add(position)
+
+        for field, field_conditions in conditions.items():
+            self._index_literals(self._anchors[field], field_conditions)
+
+    @staticmethod
+    def _index_literals(anchors: _Anchors, conditions: List[Tuple[int, _Condition]]) -> None:
+        rules_by_literal: Dict[str, Set[int]] = {}
+        for position, condition in conditions:
+            for literal in condition:
+                rules_by_literal.setdefault(literal, set()).add(position)
+
+        # Index each literal by its least common trigram to keep the lookups short
+        frequencies: Dict[str, int] = {}
+        for literal in rules_by_literal:
+            for gram in _grams(literal):
+                frequencies[gram] = frequencies.get(gram, 0) + 1
+        for literal, positions in rules_by_literal.items():
+            gram = min(_grams(literal), key=lambda g: (frequencies[g], g))
+            anchors.setdefault(gram, {})[literal] = positions
+
+    @property
+    def num_filtered_rules(self) -> int:
+        return len(self._rules) - len(self._always)
+
+    def select(self,
+               candidates: List[Rule],
+               event: Dict[str, Any],
+               passing_rules: Optional[Set[int]] = None) -> List[Rule]:
+        """The candidate rules whose patterns may match the event, in the order of the rules
+
+        The candidates have to be the rules given to the prefilter or a sub list of
+        them which does not change, e.g. the ones of the rule hash. The result of
+        passing_rules() for the event can be given in case it is already known."""
+        cached = self._candidates.get(id(candidates))
+        if cached is None or cached[0] is not candidates:
+            if candidates is self._rules:
+                positions = frozenset(range(len(self._rules)))
+            else:
+                rule_ids = {id(rule) for rule in candidates}
+                positions = frozenset(
+                    position for position, rule in enumerate(self._rules) if id(rule) in rule_ids)
+            cached = candidates, positions, positions.intersection(self._always)
+            self._candidates[id(candidates)] = cached
+        _candidates, positions, always = cached
+
+        if passing_rules is None:
+            passing_rules = self.passing_rules(event)
+        passing = always.union(passing_rules.intersection(positions))
+        return [self._rules[position] for position in sorted(passing)]
+
+    def passing_rules(self, event: Dict[str, Any]) -> Set[int]:
+        """The positions of the rules with literals whose patterns may match the event
+
+        This only depends on the rules and the event, select() can be called
+        with the result later, e.g. in an other process."""
+        hits = {field: self._hits(field, event.get(field, "")) for field, _keys in _FIELDS}
+        passing: Set[int] = set()
+        for fields, positions in self._rules_by_fields.items():
+            passing.update(positions.intersection(*(hits[field] for field in fields)))
+        return passing
+
+    def _hits(self, field: str, text: str) -> Set[int]:
+        """The rules having a literal in the text of the field"""
+        anchors = self._anchors[field]
+        hits: Set[int] = set()
+        if not anchors:
+            return hits
+        text = text.lower().translate(_NORMALIZE)
+        grams = {text[i:i + _GRAM_LENGTH] for i in range(len(text) - _GRAM_LENGTH + 1)}
+        for gram in grams.intersection(anchors):
+            for literal, positions in anchors[gram].items():
+                if literal in text:
+                    hits.update(positions)
+        return hits
+
+
+def _grams(literal: str) -> List[str]:
+    return [literal[i:i + _GRAM_LENGTH] for i in range(len(literal) - _GRAM_LENGTH + 1)]
+
+
+def _rule_condition(rule: Rule, keys: Sequence[str]) -> Optional[_Condition]:
+    """The literals one of which is needed by the patterns of the rule, None if not restricted"""
+    if keys[0] not in rule:
+        # Without the (normal) pattern any text matches, even with a cancelling pattern
+        return None
+    literals: Set[str] = set()
+    for key in keys:
+        if key not in rule:
+            continue
+        condition = _pattern_condition(rule[key])
+        if condition is None:
+            return None
+        literals.update(condition)
+    return frozenset(literals)
+
+
+def _pattern_condition(pattern: MatchingValue) -> Optional[_Condition]:
+    if isinstance(pattern, str):
+        # Matched against the lower case text
+        return _best_condition([frozenset([run]) for run in _ascii_runs(pattern)])
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, RecursionError):
+        return None
+    return _sequence_condition(parsed.data)
+
+
+def _ascii_runs(text: str) -> List[str]:
+    return re.findall(r"[\x00-\x7f]{%d,}" % _GRAM_LENGTH, text.lower())
+
+
+def _sequence_condition(items: List[Tuple[Any, Any]]) -> Optional[_Condition]:
+    """The best of the conditions that all need to be fulfilled for the parsed regex"""
+    conditions: List[_Condition] = []
+    run: List[str] = []
+
+    def end_run() -> None:
+        for literal in _ascii_runs("".join(run)):
+            conditions.append(frozenset([literal]))
+        del run[:]
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        end_run()
+        condition: Optional[_Condition] = None
+        if op is sre_parse.SUBPATTERN:
+            condition = _sequence_condition(list(av[-1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            condition = _sequence_condition(list(av[2]))
+        elif op is sre_parse.BRANCH:
+            condition = _branch_condition(av[1])
+        if condition is not None:
+            conditions.append(condition)
+    end_run()
+    return _best_condition(conditions)
+
+
+def _branch_condition(branches: List[Any]) -> Optional[_Condition]:
+    literals: Set[str] = set()
+    for branch in branches:
+        condition = _sequence_condition(list(branch))
+        if condition is None:
+            return None
+        literals.update(condition)
+    return frozenset(literals)
+
+
+def _best_condition(conditions: List[_Condition]) -> Optional[_Condition]:
+    """Prefer the fewest alternatives, then the longest literals"""
+    if not conditions:
+        return None
+    return min(conditions, key=lambda c: (len(c), -min(len(literal) for literal in c)))
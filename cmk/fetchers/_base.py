@@ -213,16 +213,9 @@ class ABCFetcher(Generic[TRawData], metaclass=abc.ABCMeta):
         raise NotImplementedError()
 
     def _fetch(self, mode: Mode) -> TRawData:
-        self._logger.debug("[%s] Fetch with cache settings: %r, Cache enabled: %r",
-                           self.__class__.__name__, self.file_cache.to_json(),
-                           self._is_cache_enabled(mode))
-
-        # TODO(ml): EAFP would significantly simplify the code.
-        if self.file_cache.simulation or self._is_cache_enabled(mode):
-            raw_data = self._fetch_from_cache()
-            if raw_data:
-                self._logger.log(VERBOSE, "[%s] Use cached data", self.__class__.__name__)
-                return raw_data
+        raw_data = self._fetch_from_enabled_cache(mode)
+        if raw_data:
+            return raw_data
 
         self._logger.log(VERBOSE, "[%s] Execute data source", self.__class__.__name__)
         raw_data = self._fetch_from_io(mode)
@@ -234,6 +227,19 @@ class ABCFetcher(Generic[TRawData], metaclass=abc.ABCMeta):
         """Override this method to contact the source and return the raw data."""
         raise NotImplementedError()
 
+    def _fetch_from_enabled_cache(self, mode: Mode) -> Optional[TRawData]:
+        self._logger.debug("[%s] Fetch with cache settings: %r, Cache enabled: %r",
+                           self.__class__.__name__, self.file_cache.to_json(),
+                           self._is_cache_enabled(mode))
+
+        # TODO(ml): EAFP would significantly simplify the code.
+        if self.file_cache.simulation or self._is_cache_enabled(mode):
+            raw_data = self._fetch_from_cache()
+            if raw_data:
+                self._logger.log(VERBOSE, "[%s] Use cached data", self.__class__.__name__)
+                return raw_data
+        return None
+
     def _fetch_from_cache(self) -> Optional[TRawData]:
         return self.file_cache.read()
 
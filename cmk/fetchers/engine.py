@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Fetch the data of many hosts concurrently
+
+The fetchers deal with a single host. Executed one host after another, fetching
+the data of hundreds of hosts is bound by the sum of all network latencies. The
+engine fetches the data of many hosts at the same time instead:
+
+* The agents are queried with asyncio (see `TCPFetcher.fetch_async()`).
+* The SNMP devices using the native backend are polled with asyncio as well
+  (see `SNMPFetcher.fetch_async()`). Their requests share a small pool of UDP
+  sockets (see `SNMPPoller`).
+* All other fetchers are blocking and not thread safe (the SNMP caches, for
+  example). They are executed in a pool of worker processes, which is possible
+  because the fetchers are configured with their JSON configuration.
+
+The results of a host are delivered as soon as all fetchers of the host are done.
+"""
+
+import asyncio
+import concurrent.futures
+import copy
+import itertools
+import logging
+import sys
+from typing import (
+    Any,
+    AsyncGenerator,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import cmk.utils.cleanup
+import cmk.utils.debug
+from cmk.utils.exceptions import MKTimeout
+from cmk.utils.type_defs import HostName, result
+
+from . import FetcherType
+from .controller import FetcherMessage, L3Stats, run_fetcher
+from .snmp import SNMPFetcher
+from .snmp_poller import SNMPPoller
+from .tcp import TCPFetcher
+from .type_defs import Mode
+
+__all__ = ["FetchJob", "FetcherEngine"]
+
+HostFetcherMessages = Tuple[HostName, Sequence[FetcherMessage]]
+
+
+class FetchJob(NamedTuple):
+    host_name: HostName
+    # The entries of the fetcher configuration of the host, see `run_fetcher()`
+    fetchers: Sequence[Dict[str, Any]]
+    mode: Mode
+
+
+def _run_fetcher_in_worker(entry: Dict[str, Any], mode: Mode) -> bytes:
+    try:
+        return bytes(run_fetcher(entry, mode))
+    finally:
+        # The worker process is reused for other hosts
+        cmk.utils.cleanup.cleanup_globals()
+
+
+class FetcherEngine:
+    """Fetch the data of many hosts with bounded concurrency
+
+    Args:
+        max_concurrency: Maximum number of hosts fetched at the same time.
+        timeout: Maximum time in seconds for fetching the data of a single host.
+        max_processes: Number of worker processes for the blocking fetchers
+            (defaults to the number of CPUs).
+        snmp_sockets: Number of UDP sockets shared by all SNMP devices.
+        snmp_max_parallel_requests: Maximum number of SNMP requests in flight
+            per device.
+        snmp_max_request_rate: Maximum number of SNMP requests per second and
+            device (0: no limit).
+
+    """
+    def __init__(
+        self,
+        *,
+        max_concurrency: int,
+        timeout: float,
+        max_processes: Optional[int] = None,
+        snmp_sockets: int = 4,
+        snmp_max_parallel_requests: int = 1,
+        snmp_max_request_rate: float = 0.0,
+    ) -> None:
+        super().__init__()
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1: %r" % max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_processes = max_processes
+        self.snmp_sockets = snmp_sockets
+        self.snmp_max_parallel_requests = snmp_max_parallel_requests
+        self.snmp_max_request_rate = snmp_max_request_rate
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._poller: Optional[SNMPPoller] = None
+        self._logger = logging.getLogger("cmk.fetchers.engine")
+
+    def fetch(self, jobs: Iterable[FetchJob]) -> Iterator[HostFetcherMessages]:
+        """Fetch the data of all jobs and yield the results in the order they arrive
+
+        The event loop only runs while the caller waits for the next result, no
+        fetcher code is executed in the thread of the caller while it processes a
+        result.
+        """
+        loop = asyncio.new_event_loop()
+        results = self.fetch_async(jobs)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
+
+    async def fetch_async(self,
+                          jobs: Iterable[FetchJob]) -> AsyncGenerator[HostFetcherMessages, None]:
+        pending: Set["asyncio.Future[HostFetcherMessages]"] = set()
+        remaining_jobs = iter(jobs)
+        try:
+            while True:
+                for job in itertools.islice(remaining_jobs, self.max_concurrency - len(pending)):
+                    pending.add(asyncio.ensure_future(self._fetch_host(job)))
+                if not pending:
+                    return
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            self._shutdown_executor()
+            self._close_poller()
+
+    async def _fetch_host(self, job: FetchJob) -> HostFetcherMessages:
+        self._logger.debug("[%s] Fetching data of %d fetchers", job.host_name, len(job.fetchers))
+        # All fetchers of a host run concurrently, so each of them gets the full timeout
+        messages = await asyncio.gather(
+            *(self._fetch_with_timeout(job.host_name, entry, job.mode) for entry in job.fetchers))
+        self._logger.debug("[%s] Fetched data", job.host_name)
+        return job.host_name, messages
+
+    async def _fetch_with_timeout(
+        self,
+        host_name: HostName,
+        entry: Dict[str, Any],
+        mode: Mode,
+    ) -> FetcherMessage:
+        fetcher_type = FetcherType[entry["fetcher_type"]]
+        try:
+            return await asyncio.wait_for(self._fetch(fetcher_type, entry, mode), self.timeout)
+        except asyncio.TimeoutError:
+            self._logger.debug("[%s] %s fetcher timed out", host_name, fetcher_type.name)
+            raw_data: result.Result = result.Error(
+                MKTimeout("Fetcher timed out after %s seconds" % self.timeout))
+        except Exception as exc:
+            if cmk.utils.debug.enabled():
+                raise
+            raw_data = result.Error(exc)
+        return FetcherMessage.from_raw_data(raw_data, L3Stats({}), fetcher_type)
+
+    async def _fetch(
+        self,
+        fetcher_type: FetcherType,
+        entry: Dict[str, Any],
+        mode: Mode,
+    ) -> FetcherMessage:
+        if fetcher_type is FetcherType.TCP:
+            # from_json() consumes the serialized data
+            fetcher = TCPFetcher.from_json(copy.deepcopy(entry["fetcher_params"]))
+            return FetcherMessage.from_raw_data(
+                await fetcher.fetch_async(mode),
+                L3Stats({}),
+                fetcher_type,
+            )
+
+        if fetcher_type is FetcherType.SNMP:
+            snmp_fetcher = SNMPFetcher.from_json(copy.deepcopy(entry["fetcher_params"]))
+            if snmp_fetcher.supports_async():
+                return FetcherMessage.from_raw_data(
+                    await snmp_fetcher.fetch_async(mode, self._get_poller()),
+                    L3Stats({}),
+                    fetcher_type,
+                )
+
+        # A timed out worker can not be interrupted, its result is dropped. The engine
+        # does not wait for it when shutting down the pool (see `_shutdown_executor()`).
+        return FetcherMessage.from_bytes(await asyncio.get_event_loop().run_in_executor(
+            self._get_executor(),
+            _run_fetcher_in_worker,
+            entry,
+            mode,
+        ))
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_processes)
+        return self._executor
+
+    def _get_poller(self) -> SNMPPoller:
+        if self._poller is None:
+            self._poller = SNMPPoller(
+                num_sockets=self.snmp_sockets,
+                max_parallel_requests=self.snmp_max_parallel_requests,
+                max_request_rate=self.snmp_max_request_rate,
+            )
+        return self._poller
+
+    def _close_poller(self) -> None:
+        if self._poller is not None:
+            self._poller.close()
+            self._poller = None
+
+    def _shutdown_executor(self) -> None:
+        """Drop the queued jobs and let the running ones finish in the background"""
+        if self._executor is None:
+            return
+        if sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self._executor.shutdown(wait=False)
+        self._executor = None
@@ -9,7 +9,7 @@ import logging
 
 from cmk.snmplib.type_defs import ABCSNMPBackend, SNMPHostConfig
 
-from .snmp_backend import ClassicSNMPBackend, StoredWalkSNMPBackend
+from .snmp_backend import ClassicSNMPBackend, NativeSNMPBackend, StoredWalkSNMPBackend
 try:
     from .cee.snmp_backend import pysnmp_backend  # type: ignore[import]
 except ImportError:
@@ -50,4 +50,7 @@ def backend(snmp_config: SNMPHostConfig,
     if snmp_config.snmp_backend == "pysnmp":
         return pysnmp_backend.PySNMPBackend(snmp_config, logger)
 
+    if snmp_config.snmp_backend == "native":
+        return NativeSNMPBackend(snmp_config, logger)
+
     return ClassicSNMPBackend(snmp_config, logger)
@@ -9,11 +9,16 @@ import logging
 from functools import partial
 from typing import Any, cast, Collection, Dict, Final, Iterable, List, Mapping, Optional, Set, Tuple
 
-from cmk.utils.type_defs import SectionName
+import cmk.utils.debug
+from cmk.utils.type_defs import result, SectionName
 
 import cmk.snmplib.snmp_table as snmp_table
-from cmk.snmplib.snmp_scan import gather_available_raw_section_names
+from cmk.snmplib.snmp_scan import (
+    gather_available_raw_section_names,
+    gather_available_raw_section_names_async,
+)
 from cmk.snmplib.type_defs import (
+    ABCSNMPBackend,
     SNMPDetectAtom,
     SNMPDetectSpec,
     SNMPHostConfig,
@@ -24,6 +29,8 @@ from cmk.snmplib.type_defs import (
 
 from . import factory
 from ._base import ABCFetcher, ABCFileCache, verify_ipaddress
+from .snmp_backend import NativeSNMPBackend
+from .snmp_poller import SNMPDevice, SNMPPoller
 from .type_defs import Mode
 
 __all__ = ["SNMPFetcher", "SNMPFileCache"]
@@ -56,6 +63,7 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
         on_error: str,
         missing_sys_description: bool,
         use_snmpwalk_cache: bool,
+        scan_cache_max_age: int,
         snmp_config: SNMPHostConfig,
     ) -> None:
         super().__init__(file_cache, logging.getLogger("cmk.fetchers.snmp"))
@@ -66,6 +74,7 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
         self.on_error: Final = on_error
         self.missing_sys_description: Final = missing_sys_description
         self.use_snmpwalk_cache: Final = use_snmpwalk_cache
+        self.scan_cache_max_age: Final = scan_cache_max_age
         self.snmp_config: Final = snmp_config
         self._backend = factory.backend(self.snmp_config, self._logger)
 
@@ -101,6 +110,7 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
             on_error=serialized["on_error"],
             missing_sys_description=serialized["missing_sys_description"],
             use_snmpwalk_cache=serialized["use_snmpwalk_cache"],
+            scan_cache_max_age=serialized["scan_cache_max_age"],
             snmp_config=SNMPHostConfig(**serialized["snmp_config"]),
         )
 
@@ -117,6 +127,7 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
             "on_error": self.on_error,
             "missing_sys_description": self.missing_sys_description,
             "use_snmpwalk_cache": self.use_snmpwalk_cache,
+            "scan_cache_max_age": self.scan_cache_max_age,
             "snmp_config": self.snmp_config._asdict(),
         }
 
@@ -124,30 +135,75 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
         verify_ipaddress(self.snmp_config.ipaddress)
 
     def close(self) -> None:
-        pass
+        self._backend.close()
+
+    def supports_async(self) -> bool:
+        """Whether the fetcher can be used with `fetch_async()`"""
+        return isinstance(self._backend, NativeSNMPBackend)
+
+    async def fetch_async(
+        self,
+        mode: Mode,
+        poller: SNMPPoller,
+    ) -> result.Result[SNMPRawData, Exception]:
+        """Return the data from the cache or the device without blocking the event loop
+
+        This is the asynchronous counterpart to using the fetcher as context manager and
+        calling `fetch()`. It is used to poll many devices at the same time and is only
+        available for the native backend (see `supports_async()`).
+        """
+        try:
+            raw_data = self._fetch_from_enabled_cache(mode)
+            if not raw_data:
+                verify_ipaddress(self.snmp_config.ipaddress)
+                raw_data = await self._fetch_from_io_async(mode, poller.device(self.snmp_config))
+                self.file_cache.write(raw_data)
+            return result.OK(raw_data)
+        except Exception as exc:
+            if cmk.utils.debug.enabled():
+                raise
+            return result.Error(exc)
 
     def _detect(
         self,
         *,
         restrict_to: Optional[Collection[SectionName]] = None,
     ) -> Set[SectionName]:
-        if restrict_to is None:
-            # TODO: disabled sections must be considered here, once
-            # snmp_section_detects is a global configuration.
-            sections: Collection[Tuple[SectionName,
-                                       SNMPDetectSpec]] = self.snmp_section_detects.items()
-        else:
-            sections = [(n, self.snmp_section_detects[n])
-                        for n in restrict_to
-                        if n in self.snmp_section_detects]
-
         return gather_available_raw_section_names(
-            sections=sections,
+            sections=self._detect_sections(restrict_to),
             on_error=self.on_error,
             missing_sys_description=self.missing_sys_description,
             backend=self._backend,
+            scan_cache_max_age=self.scan_cache_max_age,
+        )
+
+    async def _detect_async(
+        self,
+        device: SNMPDevice,
+        *,
+        restrict_to: Optional[Collection[SectionName]] = None,
+    ) -> Set[SectionName]:
+        return await gather_available_raw_section_names_async(
+            sections=self._detect_sections(restrict_to),
+            on_error=self.on_error,
+            missing_sys_description=self.missing_sys_description,
+            get_single_oid=device.get_single_oid,
+            snmp_config=device.config,
+            scan_cache_max_age=self.scan_cache_max_age,
         )
 
+    def _detect_sections(
+        self,
+        restrict_to: Optional[Collection[SectionName]],
+    ) -> Collection[Tuple[SectionName, SNMPDetectSpec]]:
+        if restrict_to is None:
+            # TODO: disabled sections must be considered here, once
+            # snmp_section_detects is a global configuration.
+            return self.snmp_section_detects.items()
+        return [
+            (n, self.snmp_section_detects[n]) for n in restrict_to if n in self.snmp_section_detects
+        ]
+
     def _is_cache_enabled(self, mode: Mode) -> bool:
         """Decide whether to try to read data from cache
 
@@ -165,8 +221,49 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
                              (self.configured_snmp_sections |
                               self._detect(restrict_to=self.structured_data_snmp_sections)))
 
+        section_names = list(self._sort_section_names(selected_sections))
+        return self._get_tables(
+            section_names,
+            snmp_table.PlannedSNMPBackend(self._plan(section_names), backend=self._backend),
+        )
+
+    async def _fetch_from_io_async(self, mode: Mode, device: SNMPDevice) -> SNMPRawData:
+        if mode in (Mode.DISCOVERY, Mode.CACHED_DISCOVERY):
+            selected_sections = await self._detect_async(device)
+        else:
+            selected_sections = self.configured_snmp_sections | await self._detect_async(
+                device, restrict_to=self.structured_data_snmp_sections)
+
+        section_names = list(self._sort_section_names(selected_sections))
+        plan = self._plan(section_names)
+        # All walks are done concurrently, the tables are assembled afterwards
+        walks = await device.fetch_walks(plan)
+        return self._get_tables(
+            section_names,
+            snmp_table.PlannedSNMPBackend(plan, backend=self._backend, walks=walks),
+        )
+
+    def _plan(self, section_names: Iterable[SectionName]) -> snmp_table.SNMPFetchPlan:
+        plan = snmp_table.SNMPFetchPlan(
+            {section_name: self.snmp_section_trees[section_name] for section_name in section_names},
+            self.snmp_config,
+            use_snmpwalk_cache=self.use_snmpwalk_cache,
+        )
+        self._logger.debug(
+            "Fetch plan: %d walks in %d requests (%d walks saved)",
+            plan.num_walks,
+            len(plan.walks),
+            plan.walks_saved,
+        )
+        return plan
+
+    def _get_tables(
+        self,
+        section_names: Iterable[SectionName],
+        backend: ABCSNMPBackend,
+    ) -> SNMPRawData:
         fetched_data: SNMPRawData = {}
-        for section_name in self._sort_section_names(selected_sections):
+        for section_name in section_names:
             if self.use_snmpwalk_cache:
                 walk_cache_msg = "SNMP walk cache is enabled: Use any locally cached information"
             else:
@@ -179,7 +276,7 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
             # and fetches a separate snmp table.
             get_snmp = partial(snmp_table.get_snmp_table_cached
                                if self.use_snmpwalk_cache else snmp_table.get_snmp_table,
-                               backend=self._backend)
+                               backend=backend)
             # branch: List[SNMPTree]
             fetched_section_data: List[SNMPTable] = []
             for entry in oid_info:
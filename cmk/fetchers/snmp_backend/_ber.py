@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Minimal BER codec for the SNMP messages of the native backend.
+
+Only the subset of ASN.1 used by SNMP is supported. The decoder works on the
+complete message and returns absolute positions, which is needed to verify the
+authentication parameters of SNMPv3 messages in place.
+"""
+
+from typing import List, NamedTuple, Sequence, Tuple
+
+__all__ = [
+    "BERError",
+    "decode_integer",
+    "decode_oid",
+    "decode_sequence",
+    "decode_tlv",
+    "decode_unsigned",
+    "decode_pdu",
+    "encode_integer",
+    "encode_null",
+    "encode_octet_string",
+    "encode_oid",
+    "encode_pdu",
+    "encode_sequence",
+    "encode_tlv",
+    "PDU",
+    "VarBind",
+]
+
+# Universal types
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+
+# SNMP application types (RFC 2578)
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+
+# Exceptions in the variable bindings (RFC 3416)
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# PDU types
+GET_REQUEST = 0xa0
+GET_NEXT_REQUEST = 0xa1
+GET_RESPONSE = 0xa2
+GET_BULK_REQUEST = 0xa5
+REPORT = 0xa8
+
+
+class BERError(ValueError):
+    pass
+
+
+class VarBind(NamedTuple):
+    oid: str
+    tag: int
+    value: bytes
+
+
+class PDU(NamedTuple):
+    tag: int
+    request_id: int
+    # non-repeaters for GETBULK requests
+    error_status: int
+    # max-repetitions for GETBULK requests
+    error_index: int
+    varbinds: Sequence[VarBind]
+
+
+def encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes((length,))
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((0x80 | len(encoded),)) + encoded
+
+
+def encode_tlv(tag: int, value: bytes) -> bytes:
+    return bytes((tag,)) + encode_length(len(value)) + value
+
+
+def encode_integer(value: int, tag: int = INTEGER) -> bytes:
+    """
+    >>> encode_integer(0).hex(), encode_integer(128).hex(), encode_integer(-1).hex()
+    ('020100', '02020080', '0201ff')
+    """
+    return encode_tlv(tag, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def encode_octet_string(value: bytes) -> bytes:
+    return encode_tlv(OCTET_STRING, value)
+
+
+def encode_null() -> bytes:
+    return encode_tlv(NULL, b"")
+
+
+def encode_oid(oid: str) -> bytes:
+    """
+    >>> encode_oid(".1.3.6.1.4.1.2021").hex()
+    '06072b060104018f65'
+    """
+    try:
+        arcs = [int(arc) for arc in oid.strip(".").split(".")]
+    except ValueError:
+        raise BERError("Invalid OID: %r" % oid)
+    if len(arcs) < 2:
+        arcs.append(0)
+
+    encoded = bytearray()
+    for arc in [arcs[0] * 40 + arcs[1]] + arcs[2:]:
+        chunk = [arc & 0x7f]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7f))
+            arc >>= 7
+        encoded.extend(reversed(chunk))
+    return encode_tlv(OBJECT_IDENTIFIER, bytes(encoded))
+
+
+def encode_sequence(*items: bytes, tag: int = SEQUENCE) -> bytes:
+    return encode_tlv(tag, b"".join(items))
+
+
+def encode_pdu(pdu: PDU) -> bytes:
+    return encode_sequence(
+        encode_integer(pdu.request_id),
+        encode_integer(pdu.error_status),
+        encode_integer(pdu.error_index),
+        encode_sequence(*(encode_sequence(encode_oid(vb.oid), encode_tlv(vb.tag, vb.value))
+                          for vb in pdu.varbinds)),
+        tag=pdu.tag,
+    )
+
+
+def decode_tlv(data: bytes, pos: int, end: int) -> Tuple[int, int, int]:
+    """Decode the header of the element at pos
+
+    Returns the tag and the positions of the start and the end of the value.
+    """
+    if pos + 2 > end:
+        raise BERError("Truncated element at %d" % pos)
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        num_bytes = length & 0x7f
+        if not num_bytes or pos + num_bytes > end:
+            raise BERError("Invalid length at %d" % pos)
+        length = int.from_bytes(data[pos:pos + num_bytes], "big")
+        pos += num_bytes
+    if pos + length > end:
+        raise BERError("Truncated element at %d" % pos)
+    return tag, pos, pos + length
+
+
+def decode_sequence(data: bytes, start: int, end: int) -> List[Tuple[int, int, int]]:
+    elements = []
+    while start < end:
+        tag, value_start, value_end = decode_tlv(data, start, end)
+        elements.append((tag, value_start, value_end))
+        start = value_end
+    return elements
+
+
+def decode_integer(value: bytes) -> int:
+    return int.from_bytes(value, "big", signed=True)
+
+
+def decode_unsigned(value: bytes) -> int:
+    # Some agents encode the unsigned application types without the leading
+    # zero byte, so do not interpret the sign bit.
+    return int.from_bytes(value, "big")
+
+
+def decode_oid(value: bytes) -> str:
+    """
+    >>> decode_oid(bytes.fromhex("2b060104018f65"))
+    '.1.3.6.1.4.1.2021'
+    """
+    if not value:
+        raise BERError("Empty OID")
+    arcs = []
+    arc = 0
+    for byte in value:
+        arc = (arc << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    first = arcs[0]
+    head = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    return "." + ".".join(str(a) for a in head + arcs[1:])
+
+
+def decode_pdu(data: bytes, tag: int, start: int, end: int) -> PDU:
+    """Decode the PDU with the given tag and the value between start and end"""
+    try:
+        request_id, error_status, error_index, varbind_list = decode_sequence(data, start, end)
+    except ValueError:
+        raise BERError("Invalid PDU")
+
+    varbinds = []
+    for vb_tag, vb_start, vb_end in decode_sequence(data, varbind_list[1], varbind_list[2]):
+        if vb_tag != SEQUENCE:
+            raise BERError("Invalid variable binding")
+        try:
+            (oid_tag, oid_start, oid_end), (value_tag, value_start,
+                                            value_end) = decode_sequence(data, vb_start, vb_end)
+        except ValueError:
+            raise BERError("Invalid variable binding")
+        if oid_tag != OBJECT_IDENTIFIER:
+            raise BERError("Invalid variable binding")
+        varbinds.append(
+            VarBind(decode_oid(data[oid_start:oid_end]), value_tag, data[value_start:value_end]))
+
+    return PDU(
+        tag=tag,
+        request_id=decode_integer(data[request_id[1]:request_id[2]]),
+        error_status=decode_integer(data[error_status[1]:error_status[2]]),
+        error_index=decode_integer(data[error_index[1]:error_index[2]]),
+        varbinds=varbinds,
+    )
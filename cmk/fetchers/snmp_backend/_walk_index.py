@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""On-disk OID index of stored SNMP walks.
+
+The index maps the OIDs of a walk file to the positions of their lines. Both
+files are memory mapped, a lookup bisects the index and only touches the
+lines that are really needed.
+
+Layout of the index file (all numbers little endian):
+
+* header: magic, size and mtime of the walk file, number of entries
+* entries: offset and length of the key, offset and length of the line
+* keys: the OIDs of the entries, encoded by `oid_key()`
+
+The entries are sorted by their keys. The size and mtime of the walk file are
+used to detect a changed walk, the index is rebuilt in that case.
+"""
+
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import cmk.utils.store as store
+from cmk.utils.exceptions import MKGeneralException
+
+__all__ = ["WalkIndex", "oid_key"]
+
+_MAGIC = b"CMKWIDX\x01"
+_HEADER = struct.Struct("<8sQqQ")
+_ENTRY = struct.Struct("<QIQI")
+
+
+def oid_key(oid: str) -> bytes:
+    """Encode an OID, so that the byte order is the order of the OIDs
+
+    Every arc is prefixed by its length. A prefix of an OID is a prefix of
+    its key.
+
+    >>> oid_key(".1.3.6") < oid_key(".1.3.10") < oid_key(".1.3.10.1") < oid_key(".1.4")
+    True
+    >>> oid_key("1.3.6.1").startswith(oid_key("1.3.6"))
+    True
+    """
+    key = bytearray()
+    try:
+        for arc in map(int, oid.strip(".").split(".")):
+            length = max(1, (arc.bit_length() + 7) // 8)
+            key.append(length)
+            key += arc.to_bytes(length, "big")
+    except (ValueError, OverflowError):
+        raise MKGeneralException("Invalid OID %s" % oid)
+    return bytes(key)
+
+
+class _Stat(NamedTuple):
+    size: int
+    mtime_ns: int
+
+
+def _stat(path: Path) -> _Stat:
+    st = path.stat()
+    return _Stat(st.st_size, st.st_mtime_ns)
+
+
+def _map(path: Path) -> Optional[mmap.mmap]:
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None  # Empty files can not be mapped
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class WalkIndex:
+    """A walk file and its index"""
+    def __init__(self, walk_path: Path, index_path: Path) -> None:
+        super().__init__()
+        self.walk_path = walk_path
+        self.index_path = index_path
+        self.stat = _stat(walk_path)
+        self._walk: Optional[mmap.mmap] = None
+        self._index: Optional[mmap.mmap] = None
+        self._num_entries = 0
+
+        if not self._load():
+            self._build()
+            if not self._load():
+                raise MKGeneralException("Cannot load the index %s" % index_path)
+
+    def close(self) -> None:
+        for mapped in (self._walk, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._walk = self._index = None
+
+    def is_outdated(self) -> bool:
+        try:
+            return _stat(self.walk_path) != self.stat
+        except OSError:
+            return True
+
+    def _load(self) -> bool:
+        try:
+            index = _map(self.index_path)
+        except OSError:
+            return False
+        if index is None or len(index) < _HEADER.size:
+            return False
+        magic, size, mtime_ns, num_entries = _HEADER.unpack_from(index)
+        if magic != _MAGIC or _Stat(size, mtime_ns) != self.stat:
+            index.close()
+            return False
+
+        self._index = index
+        self._num_entries = num_entries
+        self._walk = _map(self.walk_path)
+        return True
+
+    def _build(self) -> None:
+        entries: List[Tuple[bytes, int, int]] = []
+        walk = _map(self.walk_path)
+        try:
+            offset = 0
+            size = len(walk) if walk is not None else 0
+            while offset < size:
+                assert walk is not None
+                end = walk.find(b"\n", offset)
+                if end == -1:
+                    end = size
+                # Lines of values including newlines do not start with an OID
+                if walk[offset:offset + 1] == b".":
+                    oid = walk[offset:end].split(None, 1)[0].decode("ascii", "replace")
+                    try:
+                        entries.append((oid_key(oid), offset, end - offset))
+                    except MKGeneralException:
+                        pass
+                offset = end + 1
+        finally:
+            if walk is not None:
+                walk.close()
+
+        entries.sort(key=lambda e: e[0])
+        keys_offset = _HEADER.size + _ENTRY.size * len(entries)
+        header = _HEADER.pack(_MAGIC, self.stat.size, self.stat.mtime_ns, len(entries))
+        table = bytearray()
+        keys = bytearray()
+        for key, line_offset, line_length in entries:
+            table += _ENTRY.pack(keys_offset + len(keys), len(key), line_offset, line_length)
+            keys += key
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        store.save_bytes_to_file(self.index_path, header + bytes(table) + bytes(keys))
+
+    def _entry(self, index: int) -> Tuple[bytes, int, int]:
+        assert self._index is not None
+        key_offset, key_length, line_offset, line_length = _ENTRY.unpack_from(
+            self._index, _HEADER.size + index * _ENTRY.size)
+        return self._index[key_offset:key_offset + key_length], line_offset, line_length
+
+    def lines(self, oid_prefix: str) -> Iterator[bytes]:
+        """The lines of the prefix and all OIDs below it, in the order of the OIDs"""
+        if self._walk is None:
+            return
+        prefix = oid_key(oid_prefix)
+        low, high = 0, self._num_entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < prefix:
+                low = middle + 1
+            else:
+                high = middle
+
+        for index in range(low, self._num_entries):
+            key, line_offset, line_length = self._entry(index)
+            if not key.startswith(prefix):
+                break
+            yield self._walk[line_offset:line_offset + line_length]
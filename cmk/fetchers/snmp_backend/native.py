@@ -0,0 +1,737 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""SNMP backend speaking SNMP v1, v2c and v3 in-process
+
+The classic backend forks one snmpwalk per OID column and parses its text
+output. This backend sends the requests itself over a single UDP socket per
+host, walks with GETBULK (max-repetitions: "Bulk walk: Number of OIDs per
+bulk") if the host is a bulk walk host and decodes the responses directly
+to the raw values.
+
+The values are formatted like the classic backend formats them, so that the
+sections do not notice a difference.
+"""
+
+import abc
+import hashlib
+import hmac
+import itertools
+import logging
+import os
+import random
+import socket
+import time
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from Cryptodome.Cipher import AES, DES
+
+from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.log import console
+from cmk.utils.type_defs import CheckPluginNameStr
+
+from cmk.snmplib.type_defs import (
+    ABCSNMPBackend,
+    OID,
+    SNMPContextName,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
+
+from . import _ber as ber
+
+__all__ = ["NativeSNMPBackend"]
+
+_T = TypeVar("_T")
+
+# Decodes a datagram, None if it is not the response to the request
+Decoder = Callable[[bytes], Optional[Any]]
+# The requests of a session yield the datagram and the decoder for the response
+Step = Tuple[bytes, Decoder]
+Steps = Generator[Step, Any, _T]
+
+_MAX_MESSAGE_SIZE = 65507
+
+# https://tools.ietf.org/html/rfc3416#section-3
+_ERROR_STATUS = [
+    "noError",
+    "tooBig",
+    "noSuchName",
+    "badValue",
+    "readOnly",
+    "genErr",
+    "noAccess",
+    "wrongType",
+    "wrongLength",
+    "wrongEncoding",
+    "wrongValue",
+    "noCreation",
+    "inconsistentValue",
+    "resourceUnavailable",
+    "commitFailed",
+    "undoFailed",
+    "authorizationError",
+    "notWritable",
+    "inconsistentName",
+]
+_TOO_BIG = 1
+_NO_SUCH_NAME = 2
+
+# https://tools.ietf.org/html/rfc3414#section-5
+_USM_STATS = {
+    ".1.3.6.1.6.3.15.1.1.1.0": "Unsupported security level",
+    ".1.3.6.1.6.3.15.1.1.2.0": "Not in time window",
+    ".1.3.6.1.6.3.15.1.1.3.0": "Unknown user name",
+    ".1.3.6.1.6.3.15.1.1.4.0": "Unknown engine ID",
+    ".1.3.6.1.6.3.15.1.1.5.0": "Authentication failure (incorrect password, community or key)",
+    ".1.3.6.1.6.3.15.1.1.6.0": "Decryption error",
+}
+_NOT_IN_TIME_WINDOW = ".1.3.6.1.6.3.15.1.1.2.0"
+
+
+class NativeSNMPBackend(ABCSNMPBackend):
+    def __init__(self, snmp_config: SNMPHostConfig, logger: logging.Logger) -> None:
+        super().__init__(snmp_config, logger)
+        self._session: Optional[Session] = None
+        self._transport: Optional[_Transport] = None
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def get(self,
+            oid: OID,
+            context_name: Optional[SNMPContextName] = None) -> Optional[SNMPRawValue]:
+        return run_steps(self._get_session().get(oid, context_name), self._get_transport().exchange)
+
+    def walk(self,
+             oid: OID,
+             check_plugin_name: Optional[CheckPluginNameStr] = None,
+             table_base_oid: Optional[OID] = None,
+             context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
+        return run_steps(self._get_session().walk(oid, context_name),
+                         self._get_transport().exchange)
+
+    def walk_many(self,
+                  oids: Sequence[OID],
+                  check_plugin_name: Optional[CheckPluginNameStr] = None,
+                  table_base_oid: Optional[OID] = None,
+                  context_name: Optional[SNMPContextName] = None) -> List[SNMPRowInfo]:
+        return run_steps(self._get_session().walk_many(oids, context_name),
+                         self._get_transport().exchange)
+
+    def _get_session(self) -> "Session":
+        if self._session is None:
+            self._session = make_session(self.config)
+        return self._session
+
+    def _get_transport(self) -> "_Transport":
+        if self._transport is None:
+            self._transport = _Transport(
+                self.config.ipaddress,
+                self.config.port,
+                family=address_family(self.config),
+                timeout=timeout(self.config),
+                retries=retries(self.config),
+            )
+        return self._transport
+
+
+def run_steps(steps: "Steps[_T]", exchange: Callable[[bytes, Decoder], Any]) -> _T:
+    """Execute the steps of a request with a blocking exchange function"""
+    try:
+        step = next(steps)
+        while True:
+            try:
+                response = exchange(*step)
+            except MKSNMPError as e:
+                step = steps.throw(e)
+            else:
+                step = steps.send(response)
+    except StopIteration as e:
+        return e.value
+
+
+def address_family(snmp_config: SNMPHostConfig) -> socket.AddressFamily:
+    return socket.AF_INET6 if snmp_config.is_ipv6_primary else socket.AF_INET
+
+
+def timeout(snmp_config: SNMPHostConfig) -> float:
+    # Same defaults as the Net-SNMP command line tools
+    return float(snmp_config.timing.get("timeout", 1))
+
+
+def retries(snmp_config: SNMPHostConfig) -> int:
+    return int(snmp_config.timing.get("retries", 5))
+
+
+def _normalize_oid(oid: OID) -> OID:
+    return "." + oid.strip(".")
+
+
+def _error_status_name(error_status: int) -> str:
+    try:
+        return _ERROR_STATUS[error_status]
+    except IndexError:
+        return "Unknown error status %d" % error_status
+
+
+def _raw_value(varbind: ber.VarBind) -> SNMPRawValue:
+    """Format the value like the command line tools with "-OQ -OU -On -Ot" do
+
+    The octet strings are returned as they are. All other types are
+    formatted as text.
+
+    >>> _raw_value(ber.VarBind(".1", ber.INTEGER, b"\\xff"))
+    b'-1'
+    >>> _raw_value(ber.VarBind(".1", ber.GAUGE32, b"\\xff"))
+    b'255'
+    >>> _raw_value(ber.VarBind(".1", ber.IP_ADDRESS, b"\\x7f\\x00\\x00\\x01"))
+    b'127.0.0.1'
+    """
+    if varbind.tag in (ber.OCTET_STRING, ber.OPAQUE):
+        return varbind.value
+    if varbind.tag == ber.INTEGER:
+        return b"%d" % ber.decode_integer(varbind.value)
+    if varbind.tag in (ber.COUNTER32, ber.GAUGE32, ber.TIMETICKS, ber.COUNTER64):
+        return b"%d" % ber.decode_unsigned(varbind.value)
+    if varbind.tag == ber.IP_ADDRESS:
+        return ".".join("%d" % b for b in varbind.value).encode("ascii")
+    if varbind.tag == ber.OBJECT_IDENTIFIER:
+        return ber.decode_oid(varbind.value).encode("ascii")
+    if varbind.tag == ber.NULL:
+        return b""
+    return varbind.value
+
+
+class _Transport:
+    """One connected UDP socket for all requests to a host"""
+    def __init__(self, address: str, port: int, *, family: socket.AddressFamily, timeout: float,
+                 retries: int) -> None:
+        super().__init__()
+        self.address = address
+        self._port = port
+        self._family = family
+        self._timeout = timeout
+        self._retries = retries
+        self._socket: Optional[socket.socket] = None
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def exchange(self, request: bytes, decode: Decoder) -> Any:
+        """Send the request until decode accepts a response or all retries failed
+
+        decode returns None for all datagrams not belonging to the request, e.g. late
+        responses to a previous request.
+        """
+        sock = self._get_socket()
+        for _attempt in range(self._retries + 1):
+            sock.send(request)
+            deadline = time.monotonic() + self._timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data = sock.recv(_MAX_MESSAGE_SIZE)
+                except socket.timeout:
+                    break
+                except ConnectionRefusedError:
+                    # ICMP port unreachable from a previous datagram: Keep waiting
+                    # like the command line tools do.
+                    continue
+                try:
+                    response = decode(data)
+                except (ValueError, IndexError):
+                    continue  # Not a valid SNMP message
+                if response is not None:
+                    return response
+
+        raise MKSNMPError("SNMP Error on %s: Timeout: No Response from %s" %
+                          (self.address, self.address))
+
+    def _get_socket(self) -> socket.socket:
+        if self._socket is None:
+            self._socket = socket.socket(self._family, socket.SOCK_DGRAM)
+            try:
+                self._socket.connect((self.address, self._port))
+            except OSError as e:
+                self.close()
+                raise MKSNMPError("SNMP Error on %s: %s" % (self.address, e))
+        return self._socket
+
+
+def make_session(snmp_config: SNMPHostConfig) -> "Session":
+    if snmp_config.is_snmpv3_host:
+        return _USMSession(snmp_config)
+    return _CommunitySession(snmp_config)
+
+
+class Session(metaclass=abc.ABCMeta):
+    """The SNMP requests to one host, independent of the transport
+
+    The requests are generators (see Steps): They yield the datagram to send together
+    with a function decoding the matching response, which is sent back into the
+    generator. A timeout is thrown into the generator as MKSNMPError. This way the
+    blocking backend and the asynchronous poller share the protocol implementation.
+    """
+    def __init__(self, snmp_config: SNMPHostConfig) -> None:
+        super().__init__()
+        self.config = snmp_config
+        self._request_ids = itertools.count(random.randint(1, 2**30))
+
+    def _next_id(self) -> int:
+        return next(self._request_ids) % 2**31
+
+    def get(self, oid: OID,
+            context_name: Optional[SNMPContextName]) -> "Steps[Optional[SNMPRawValue]]":
+        if oid.endswith(".*"):
+            oid_prefix = _normalize_oid(oid[:-2])
+            tag = ber.GET_NEXT_REQUEST
+        else:
+            oid_prefix = _normalize_oid(oid)
+            tag = ber.GET_REQUEST
+
+        try:
+            pdu = yield from self.request(tag, [oid_prefix], context_name)
+        except MKSNMPError as e:
+            console.verbose("%s\n" % e)
+            return None
+
+        if pdu.error_status or not pdu.varbinds:
+            return None
+
+        varbind = pdu.varbinds[0]
+        if varbind.tag in (ber.NO_SUCH_OBJECT, ber.NO_SUCH_INSTANCE, ber.END_OF_MIB_VIEW):
+            return None
+
+        # In case of .*, check if prefix is the one we are looking for
+        if tag == ber.GET_NEXT_REQUEST and not varbind.oid.startswith(oid_prefix + "."):
+            return None
+
+        value = _raw_value(varbind)
+        console.vverbose("SNMP answer: ==> [%r]\n" % value)
+        return value
+
+    def walk(self, oid: OID, context_name: Optional[SNMPContextName]) -> "Steps[SNMPRowInfo]":
+        return (yield from self.walk_many([oid], context_name))[0]
+
+    def walk_many(self, oids: Sequence[OID],
+                  context_name: Optional[SNMPContextName]) -> "Steps[List[SNMPRowInfo]]":
+        """Walk the OIDs side by side, with one varbind per OID in each request
+
+        For the columns of a table, each response contains complete rows.
+        """
+        prefixes = [_normalize_oid(oid) for oid in oids]
+        use_bulk = self.config.is_bulkwalk_host
+        max_repetitions = self.config.bulk_walk_size_of
+        console.vverbose("Walking %s (%s)\n" %
+                         (", ".join(prefixes), "GETBULK" if use_bulk else "GETNEXT"))
+
+        rowinfos: List[SNMPRowInfo] = [[] for _prefix in prefixes]
+        seen: List[Set[OID]] = [set() for _prefix in prefixes]
+        next_oids = list(prefixes)
+        # The columns still walked, in the order of the varbinds of the next request
+        active = list(range(len(prefixes)))
+        while active:
+            request_oids = [next_oids[column] for column in active]
+            if use_bulk:
+                pdu = yield from self.request(ber.GET_BULK_REQUEST,
+                                              request_oids,
+                                              context_name,
+                                              max_repetitions=max_repetitions)
+            else:
+                pdu = yield from self.request(ber.GET_NEXT_REQUEST, request_oids, context_name)
+
+            if pdu.error_status == _NO_SUCH_NAME and not use_bulk:
+                # SNMPv1 end of the MIB view, the error index is the varbind concerned
+                if not 0 < pdu.error_index <= len(active):
+                    break
+                del active[pdu.error_index - 1]
+                continue
+            if pdu.error_status == _TOO_BIG and use_bulk and max_repetitions > 1:
+                max_repetitions //= 2
+                continue
+            if pdu.error_status:
+                raise MKSNMPError("SNMP Error on %s: %s" %
+                                  (self.config.ipaddress, _error_status_name(pdu.error_status)))
+
+            done: Set[int] = set()
+            progress = False
+            # The varbinds of GETBULK responses are ordered row by row
+            for position, varbind in enumerate(pdu.varbinds):
+                column = active[position % len(active)]
+                if column in done:
+                    continue
+                # Like "snmpwalk -Cc" we do not require increasing OIDs, but we stop on
+                # loops, which are the reason for this check.
+                if (varbind.tag == ber.END_OF_MIB_VIEW or
+                        not varbind.oid.startswith(prefixes[column] + ".") or
+                        varbind.oid in seen[column]):
+                    done.add(column)
+                    continue
+                progress = True
+                seen[column].add(varbind.oid)
+                next_oids[column] = varbind.oid
+                if varbind.tag in (ber.NO_SUCH_OBJECT, ber.NO_SUCH_INSTANCE):
+                    continue
+                rowinfos[column].append((varbind.oid, _raw_value(varbind)))
+
+            if not progress:
+                break
+            active = [column for column in active if column not in done]
+
+        for prefix, rowinfo in zip(prefixes, rowinfos):
+            if not rowinfo:
+                # Like snmpwalk: The OID may be a scalar itself
+                value = yield from self.get(prefix, context_name)
+                if value is not None:
+                    rowinfo.append((prefix, value))
+
+        return rowinfos
+
+    @abc.abstractmethod
+    def request(self,
+                tag: int,
+                oids: Iterable[OID],
+                context_name: Optional[SNMPContextName],
+                max_repetitions: int = 0) -> "Steps[ber.PDU]":
+        raise NotImplementedError()
+
+    def _make_pdu(self, tag: int, oids: Iterable[OID], max_repetitions: int) -> ber.PDU:
+        return ber.PDU(
+            tag=tag,
+            request_id=self._next_id(),
+            error_status=0,
+            error_index=max_repetitions if tag == ber.GET_BULK_REQUEST else 0,
+            varbinds=[ber.VarBind(oid, ber.NULL, b"") for oid in oids],
+        )
+
+
+class _CommunitySession(Session):
+    """SNMPv1 and SNMPv2c"""
+    def __init__(self, snmp_config: SNMPHostConfig) -> None:
+        super().__init__(snmp_config)
+        if not isinstance(snmp_config.credentials, str):
+            raise TypeError()
+        self._community = snmp_config.credentials.encode("utf-8")
+        self._version = (1 if snmp_config.is_bulkwalk_host or
+                         snmp_config.is_snmpv2or3_without_bulkwalk_host else 0)
+
+    def request(self,
+                tag: int,
+                oids: Iterable[OID],
+                context_name: Optional[SNMPContextName],
+                max_repetitions: int = 0) -> "Steps[ber.PDU]":
+        if tag == ber.GET_BULK_REQUEST and self._version == 0:
+            raise MKGeneralException("GETBULK is not supported by SNMPv1")
+        pdu = self._make_pdu(tag, oids, max_repetitions)
+        request = ber.encode_sequence(
+            ber.encode_integer(self._version),
+            ber.encode_octet_string(self._community),
+            ber.encode_pdu(pdu),
+        )
+        return (yield request, lambda data: self._decode(data, pdu.request_id))
+
+    def _decode(self, data: bytes, request_id: int) -> Optional[ber.PDU]:
+        _tag, start, end = ber.decode_tlv(data, 0, len(data))
+        (_t, vs, ve), _community, (pdu_tag, ps, pe) = ber.decode_sequence(data, start, end)
+        if ber.decode_integer(data[vs:ve]) != self._version:
+            return None
+        pdu = ber.decode_pdu(data, pdu_tag, ps, pe)
+        if pdu.tag != ber.GET_RESPONSE or pdu.request_id != request_id:
+            return None
+        return pdu
+
+
+class _AuthProtocol(NamedTuple):
+    hash_function: Callable
+    mac_length: int
+
+
+# https://tools.ietf.org/html/rfc3414 and https://tools.ietf.org/html/rfc7860
+_AUTH_PROTOCOLS = {
+    "md5": _AuthProtocol(hashlib.md5, 12),
+    "sha": _AuthProtocol(hashlib.sha1, 12),
+    "SHA-224": _AuthProtocol(hashlib.sha224, 16),
+    "SHA-256": _AuthProtocol(hashlib.sha256, 24),
+    "SHA-384": _AuthProtocol(hashlib.sha384, 32),
+    "SHA-512": _AuthProtocol(hashlib.sha512, 48),
+}
+
+_FLAG_AUTH = 0x01
+_FLAG_PRIV = 0x02
+_FLAG_REPORTABLE = 0x04
+
+_SECURITY_LEVELS = {
+    "noAuthNoPriv": 0,
+    "authNoPriv": _FLAG_AUTH,
+    "authPriv": _FLAG_AUTH | _FLAG_PRIV,
+}
+
+
+def _password_to_key(auth_protocol: _AuthProtocol, password: bytes, engine_id: bytes) -> bytes:
+    """Derive the localized key from a password (RFC 3414, A.2)
+
+    >>> _password_to_key(_AUTH_PROTOCOLS["md5"], b"maplesyrup", bytes(11) + b"\\x02").hex()
+    '526f5eed9fcce26f8964c2930787d82b'
+    """
+    if not password:
+        raise MKGeneralException("Empty SNMPv3 password")
+    repeated = password * (1048576 // len(password) + 1)
+    key = auth_protocol.hash_function(repeated[:1048576]).digest()
+    return auth_protocol.hash_function(key + engine_id + key).digest()
+
+
+class _Engine(NamedTuple):
+    engine_id: bytes
+    boots: int
+    # Engine time at the local reference time
+    time: int
+    reference: float
+
+    def current_time(self) -> int:
+        return self.time + int(time.monotonic() - self.reference)
+
+
+class _USMMessage(NamedTuple):
+    engine: _Engine
+    pdu: ber.PDU
+
+
+class _USMSession(Session):
+    """SNMPv3 with the user based security model (RFC 3414)"""
+    def __init__(self, snmp_config: SNMPHostConfig) -> None:
+        super().__init__(snmp_config)
+        credentials = snmp_config.credentials
+        if not (isinstance(credentials, tuple) and len(credentials) in (2, 4, 6)):
+            raise MKGeneralException("Invalid SNMP credentials '%r' for host %s: must be "
+                                     "string, 2-tuple, 4-tuple or 6-tuple" %
+                                     (credentials, snmp_config.hostname))
+
+        if credentials[0] not in _SECURITY_LEVELS:
+            raise MKGeneralException("Invalid SNMP security level: %s" % credentials[0])
+        self._flags = _SECURITY_LEVELS[credentials[0]]
+        self._auth_protocol: Optional[_AuthProtocol] = None
+        self._auth_password = b""
+        self._priv_protocol = ""
+        self._priv_password = b""
+        if len(credentials) == 2:
+            self._user = credentials[1].encode("utf-8")
+        else:
+            if credentials[1] not in _AUTH_PROTOCOLS:
+                raise MKGeneralException("Invalid SNMP auth protocol: %s" % credentials[1])
+            self._auth_protocol = _AUTH_PROTOCOLS[credentials[1]]
+            self._user = credentials[2].encode("utf-8")
+            self._auth_password = credentials[3].encode("utf-8")
+            if len(credentials) == 6:
+                if credentials[4] not in ("DES", "AES"):
+                    raise MKGeneralException("Invalid SNMP priv protocol: %s" % credentials[4])
+                self._priv_protocol = credentials[4]
+                self._priv_password = credentials[5].encode("utf-8")
+
+        if self._flags & _FLAG_AUTH and self._auth_protocol is None:
+            raise MKGeneralException("Security level %s requires an auth protocol" % credentials[0])
+        if self._flags & _FLAG_PRIV and not self._priv_protocol:
+            raise MKGeneralException("Security level %s requires a priv protocol" % credentials[0])
+
+        self._engine: Optional[_Engine] = None
+        self._auth_key = b""
+        self._priv_key = b""
+        self._salt = itertools.count(int.from_bytes(os.urandom(4), "big"))
+
+    def request(self,
+                tag: int,
+                oids: Iterable[OID],
+                context_name: Optional[SNMPContextName],
+                max_repetitions: int = 0) -> "Steps[ber.PDU]":
+        oids = list(oids)
+        if self._engine is None:
+            yield from self._discover_engine()
+
+        for _attempt in range(2):
+            assert self._engine is not None
+            pdu = self._make_pdu(tag, oids, max_repetitions)
+            message = yield from self._exchange(pdu, (context_name or "").encode("utf-8"),
+                                                self._flags, self._engine)
+            self._engine = message.engine
+            if message.pdu.tag != ber.REPORT:
+                return message.pdu
+            report = message.pdu.varbinds[0].oid if message.pdu.varbinds else ""
+            if report != _NOT_IN_TIME_WINDOW:
+                break
+            # The engine time is now synchronized, try again
+
+        raise MKSNMPError("SNMP Error on %s: %s" %
+                          (self.config.ipaddress, _USM_STATS.get(report, "Report %s" % report)))
+
+    def _discover_engine(self) -> "Steps[None]":
+        """Learn the engine ID, boots and time of the agent (RFC 3414, 4)
+
+        Concurrent requests may discover the engine at the same time, so the
+        engine is only set once it is known.
+        """
+        message = yield from self._exchange(self._make_pdu(ber.GET_REQUEST, [], 0), b"", 0,
+                                            _Engine(b"", 0, 0, time.monotonic()))
+        if not message.engine.engine_id:
+            raise MKSNMPError("SNMP Error on %s: Failed to discover the engine ID" %
+                              self.config.ipaddress)
+        self._engine = message.engine
+        if self._auth_protocol is not None:
+            self._auth_key = _password_to_key(self._auth_protocol, self._auth_password,
+                                              self._engine.engine_id)
+            if self._priv_protocol:
+                self._priv_key = _password_to_key(self._auth_protocol, self._priv_password,
+                                                  self._engine.engine_id)
+
+    def _exchange(self, pdu: ber.PDU, context_name: bytes, flags: int,
+                  engine: _Engine) -> "Steps[_USMMessage]":
+        msg_id = self._next_id()
+        scoped_pdu = ber.encode_sequence(
+            ber.encode_octet_string(engine.engine_id),
+            ber.encode_octet_string(context_name),
+            ber.encode_pdu(pdu),
+        )
+        request = self._encode_message(msg_id, scoped_pdu, flags, engine)
+        return (yield request, lambda data: self._decode(data, msg_id, pdu))
+
+    def _encode_message(self, msg_id: int, scoped_pdu: bytes, flags: int, engine: _Engine) -> bytes:
+        engine_time = engine.current_time() if flags else 0
+        engine_boots = engine.boots if flags else 0
+
+        if flags & _FLAG_PRIV:
+            encrypted, priv_params = self._encrypt(scoped_pdu, engine_boots, engine_time)
+            msg_data = ber.encode_octet_string(encrypted)
+        else:
+            msg_data, priv_params = scoped_pdu, b""
+
+        mac_length = self._auth_protocol.mac_length if (flags & _FLAG_AUTH and
+                                                        self._auth_protocol) else 0
+        encoded_priv_params = ber.encode_octet_string(priv_params)
+        security_params = ber.encode_sequence(
+            ber.encode_octet_string(engine.engine_id if flags else b""),
+            ber.encode_integer(engine_boots),
+            ber.encode_integer(engine_time),
+            ber.encode_octet_string(self._user if flags else b""),
+            ber.encode_octet_string(bytes(mac_length)),
+            encoded_priv_params,
+        )
+        message = ber.encode_sequence(
+            ber.encode_integer(3),
+            ber.encode_sequence(
+                ber.encode_integer(msg_id),
+                ber.encode_integer(_MAX_MESSAGE_SIZE),
+                ber.encode_octet_string(bytes((flags | _FLAG_REPORTABLE,))),
+                ber.encode_integer(3),  # USM
+            ),
+            ber.encode_octet_string(security_params),
+            msg_data,
+        )
+        if not mac_length:
+            return message
+
+        # The authentication parameters are followed by the privacy parameters and the data
+        mac_end = len(message) - len(msg_data) - len(encoded_priv_params)
+        return message[:mac_end - mac_length] + self._mac(message) + message[mac_end:]
+
+    def _mac(self, message: bytes) -> bytes:
+        assert self._auth_protocol is not None
+        return hmac.new(self._auth_key, message,
+                        self._auth_protocol.hash_function).digest()[:self._auth_protocol.mac_length]
+
+    def _decode(self, data: bytes, msg_id: int, request: ber.PDU) -> Optional[_USMMessage]:
+        _tag, start, end = ber.decode_tlv(data, 0, len(data))
+        (_t, vs, ve), (_t, hs, he), (_t, ss, se), (msg_data_tag, ds,
+                                                   de) = ber.decode_sequence(data, start, end)
+        if ber.decode_integer(data[vs:ve]) != 3:
+            return None
+
+        (_t, is_, ie), _max_size, (_t, fs, fe), _model = ber.decode_sequence(data, hs, he)
+        if ber.decode_integer(data[is_:ie]) != msg_id or fe - fs != 1:
+            return None
+        flags = data[fs]
+
+        # The security parameters are an encoded sequence in an octet string
+        _tag, ss, se = ber.decode_tlv(data, ss, se)
+        ((_t, es, ee), (_t, bs, be), (_t, ts, te), _user, (_t, as_, ae),
+         (_t, ps, pe)) = ber.decode_sequence(data, ss, se)
+        engine = _Engine(
+            engine_id=data[es:ee],
+            boots=ber.decode_integer(data[bs:be]),
+            time=ber.decode_integer(data[ts:te]),
+            reference=time.monotonic(),
+        )
+
+        if flags & _FLAG_AUTH:
+            if not self._auth_key or ae - as_ != len(self._mac(b"")):
+                return None
+            if not hmac.compare_digest(data[as_:ae],
+                                       self._mac(data[:as_] + bytes(ae - as_) + data[ae:])):
+                return None
+
+        if flags & _FLAG_PRIV:
+            if msg_data_tag != ber.OCTET_STRING:
+                return None
+            data = self._decrypt(data[ds:de], data[ps:pe], engine.boots, engine.time)
+            # The decrypted data may be padded
+            _tag, ds, de = ber.decode_tlv(data, 0, len(data))
+        elif msg_data_tag != ber.SEQUENCE:
+            return None
+
+        _context_engine_id, _context_name, (pdu_tag, pdu_start,
+                                            pdu_end) = ber.decode_sequence(data, ds, de)
+        pdu = ber.decode_pdu(data, pdu_tag, pdu_start, pdu_end)
+        if pdu.tag == ber.REPORT:
+            return _USMMessage(engine, pdu)
+        if pdu.tag != ber.GET_RESPONSE or pdu.request_id != request.request_id:
+            return None
+        return _USMMessage(engine, pdu)
+
+    def _encrypt(self, scoped_pdu: bytes, engine_boots: int,
+                 engine_time: int) -> Tuple[bytes, bytes]:
+        salt = next(self._salt) % 2**32
+        if self._priv_protocol == "DES":
+            # https://tools.ietf.org/html/rfc3414#section-8.1.1.1
+            priv_params = engine_boots.to_bytes(4, "big") + salt.to_bytes(4, "big")
+            iv = bytes(a ^ b for a, b in zip(self._priv_key[8:16], priv_params))
+            padded = scoped_pdu + bytes(-len(scoped_pdu) % 8)
+            return DES.new(self._priv_key[:8], DES.MODE_CBC, iv).encrypt(padded), priv_params
+
+        # https://tools.ietf.org/html/rfc3826#section-3.1.2.1
+        priv_params = salt.to_bytes(8, "big")
+        iv = engine_boots.to_bytes(4, "big") + engine_time.to_bytes(4, "big") + priv_params
+        cipher = AES.new(self._priv_key[:16], AES.MODE_CFB, iv, segment_size=128)
+        return cipher.encrypt(scoped_pdu), priv_params
+
+    def _decrypt(self, encrypted: bytes, priv_params: bytes, engine_boots: int,
+                 engine_time: int) -> bytes:
+        if len(priv_params) != 8:
+            raise ber.BERError("Invalid privacy parameters")
+        if self._priv_protocol == "DES":
+            if len(encrypted) % 8:
+                raise ber.BERError("Invalid encrypted data")
+            iv = bytes(a ^ b for a, b in zip(self._priv_key[8:16], priv_params))
+            return DES.new(self._priv_key[:8], DES.MODE_CBC, iv).decrypt(encrypted)
+
+        iv = engine_boots.to_bytes(4, "big") + engine_time.to_bytes(4, "big") + priv_params
+        return AES.new(self._priv_key[:16], AES.MODE_CFB, iv, segment_size=128).decrypt(encrypted)
@@ -3,25 +3,59 @@
 # Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
-"""Abstract classes and types."""
+"""Backend for simulation hosts: SNMP data from stored walks.
 
-from typing import List, Optional, Tuple
+The walk files are accessed via an index, see `WalkIndex`.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
 
 from six import ensure_binary, ensure_str
 
 import cmk.utils.agent_simulator as agent_simulator
+import cmk.utils.cleanup
 import cmk.utils.paths
-from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.exceptions import MKSNMPError
 from cmk.utils.log import console
-from cmk.utils.type_defs import CheckPluginNameStr
+from cmk.utils.type_defs import CheckPluginNameStr, HostName
 
-import cmk.snmplib.snmp_cache as snmp_cache
 from cmk.snmplib.type_defs import ABCSNMPBackend, OID, SNMPContextName, SNMPRawValue, SNMPRowInfo
 
 from ._utils import strip_snmp_value
+from ._walk_index import WalkIndex
 
 __all__ = ["StoredWalkSNMPBackend"]
 
+_g_walk_indexes: Dict[HostName, WalkIndex] = {}
+
+
+def cleanup_walk_indexes() -> None:
+    for index in _g_walk_indexes.values():
+        index.close()
+    _g_walk_indexes.clear()
+
+
+cmk.utils.cleanup.register_cleanup(cleanup_walk_indexes)
+
+
+def _walk_index(hostname: HostName) -> WalkIndex:
+    index = _g_walk_indexes.get(hostname)
+    if index is not None and not index.is_outdated():
+        return index
+    if index is not None:
+        index.close()
+        del _g_walk_indexes[hostname]
+
+    path = Path(cmk.utils.paths.snmpwalks_dir, hostname)
+    console.vverbose("  Loading %s\n" % path)
+    try:
+        index = WalkIndex(path, Path(cmk.utils.paths.snmpwalk_index_dir, hostname))
+    except OSError:
+        raise MKSNMPError("No snmpwalk file %s" % path)
+    _g_walk_indexes[hostname] = index
+    return index
+
 
 class StoredWalkSNMPBackend(ABCSNMPBackend):
     def get(self,
@@ -51,90 +85,19 @@ class StoredWalkSNMPBackend(ABCSNMPBackend):
             oid_prefix = oid
             dot_star = False
 
-        if snmp_cache.host_cache_contains(self.config.hostname):
-            lines = snmp_cache.host_cache_get(self.config.hostname)
-        else:
-            path = cmk.utils.paths.snmpwalks_dir + "/" + self.config.hostname
-            console.vverbose("  Loading %s from %s\n" % (oid, path))
-            try:
-                lines = open(path).readlines()
-            except IOError:
-                raise MKSNMPError("No snmpwalk file %s" % path)
-            snmp_cache.host_cache_set(self.config.hostname, lines)
-
-        begin = 0
-        end = len(lines)
-        hit = None
-        while end - begin > 0:
-            current = (begin + end) // 2
-            # skip over values including newlines to the next oid
-            while not lines[current].startswith(".") and current < end:
-                current += 1
-            parts = lines[current].split(None, 1)
-            comp = parts[0]
-            hit = StoredWalkSNMPBackend._compare_oids(oid_prefix, comp)
-            if hit == 0:
-                break
-            if hit == 1:  # we are too low
-                begin = current + 1
+        rowinfo: SNMPRowInfo = []
+        for line in _walk_index(self.config.hostname).lines(oid_prefix):
+            parts = ensure_str(line).split(None, 1)
+            o = parts[0][1:]
+            if not (o == oid or o.startswith(oid_prefix + ".")):
+                continue
+            if len(parts) > 1:
+                # FIXME: This encoding ping-pong os horrible...
+                value = ensure_str(agent_simulator.process(ensure_binary(parts[1])))
             else:
-                end = current
-
-        if hit != 0:
-            return []  # not found
-
-        rowinfo = StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current, -1)
-        rowinfo.reverse()
-        rowinfo += StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current + 1, 1)
-
-        if dot_star:
-            return [rowinfo[0]]
+                value = ""
+            rowinfo.append(('.' + o, strip_snmp_value(value)))
+            if dot_star:
+                break
 
         return rowinfo
-
-    @staticmethod
-    def _compare_oids(a: OID, b: OID) -> int:
-        aa = StoredWalkSNMPBackend._to_bin_string(a)
-        bb = StoredWalkSNMPBackend._to_bin_string(b)
-        if len(aa) <= len(bb) and bb[:len(aa)] == aa:
-            result = 0
-        else:
-            result = (aa > bb) - (aa < bb)
-        return result
-
-    @staticmethod
-    def _to_bin_string(oid: OID) -> Tuple[int, ...]:
-        try:
-            return tuple(map(int, oid.strip(".").split(".")))
-        except Exception:
-            raise MKGeneralException("Invalid OID %s" % oid)
-
-    @staticmethod
-    def _collect_until(oid: OID, oid_prefix: OID, lines: List[str], index: int,
-                       direction: int) -> SNMPRowInfo:
-        rows = []
-        # Handle case, where we run after the end of the lines list
-        if index >= len(lines):
-            if direction > 0:
-                return []
-            index -= 1
-        while True:
-            line = lines[index]
-            parts = line.split(None, 1)
-            o = parts[0]
-            if o.startswith('.'):
-                o = o[1:]
-            if o == oid or o.startswith(oid_prefix + "."):
-                if len(parts) > 1:
-                    # FIXME: This encoding ping-pong os horrible...
-                    value = ensure_str(agent_simulator.process(ensure_binary(parts[1])))
-                else:
-                    value = ""
-                # Fix for missing starting oids
-                rows.append(('.' + o, strip_snmp_value(value)))
-                index += direction
-                if index < 0 or index >= len(lines):
-                    break
-            else:
-                break
-        return rows
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Poll the SNMP data of many devices concurrently
+
+Most of the time needed for polling a device is spent waiting for the UDP
+round trips. The poller multiplexes the requests to many devices over a small
+pool of shared UDP sockets with asyncio and uses the protocol implementation of
+the native backend (see `NativeSNMPBackend`).
+
+The requests to a single device are limited, many devices do not cope well
+with many requests at the same time:
+
+* max_parallel_requests: Number of requests in flight per device.
+* max_request_rate: Requests per second and device (0: no limit).
+
+The walks of a fetch plan (see `SNMPFetchPlan`) are done concurrently, the
+tables are assembled from them by `get_snmp_table()` as usual.
+"""
+
+import asyncio
+import ipaddress
+import itertools
+import logging
+import socket
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
+
+import cmk.snmplib.snmp_table as snmp_table
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.type_defs import SectionName
+
+from cmk.snmplib.type_defs import (
+    OID,
+    SNMPContextName,
+    SNMPDecodedString,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
+
+from .snmp_backend import native
+
+__all__ = ["SNMPDevice", "SNMPPoller"]
+
+_PeerKey = Tuple[str, int]
+
+
+def _peer_key(address: str, port: int) -> _PeerKey:
+    # Compare the addresses in the same notation, especially for IPv6
+    return ipaddress.ip_address(address.split("%", 1)[0]).compressed, port
+
+
+class _Endpoint(asyncio.DatagramProtocol):
+    """One UDP socket shared by many devices
+
+    The responses are dispatched to the waiting requests by the address of the
+    device and the decoder of the request, which matches the request ID.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._waiters: Dict[_PeerKey, List[Tuple[native.Decoder, "asyncio.Future[Any]"]]] = {}
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = cast(asyncio.DatagramTransport, transport)
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        for decode, future in self._waiters.get(_peer_key(addr[0], addr[1]), []):
+            if future.done():
+                continue
+            try:
+                response = decode(data)
+            except (ValueError, IndexError):
+                return  # Not a valid SNMP message
+            if response is not None:
+                future.set_result(response)
+                return
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors: Keep waiting for the timeout like the blocking backend
+        pass
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def exchange(
+        self,
+        address: Tuple[str, int],
+        request: bytes,
+        decode: native.Decoder,
+        timeout: float,
+    ) -> Optional[Any]:
+        """Send the request once, None if there was no response in time"""
+        assert self._transport is not None
+        key = _peer_key(*address)
+        waiter = (decode, asyncio.get_event_loop().create_future())
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            self._transport.sendto(request, address)
+            return await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters[key].remove(waiter)
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+
+class SNMPPoller:
+    """Shared sockets and limits for polling many devices"""
+    def __init__(
+        self,
+        *,
+        num_sockets: int = 4,
+        max_parallel_requests: int = 1,
+        max_request_rate: float = 0.0,
+    ) -> None:
+        super().__init__()
+        if num_sockets < 1:
+            raise ValueError("num_sockets must be at least 1: %r" % num_sockets)
+        if max_parallel_requests < 1:
+            raise ValueError("max_parallel_requests must be at least 1: %r" % max_parallel_requests)
+        self.num_sockets = num_sockets
+        self.max_parallel_requests = max_parallel_requests
+        self.max_request_rate = max_request_rate
+        # The endpoints of an address family are created by the first request, the
+        # concurrent requests wait for them.
+        self._endpoints: Dict[socket.AddressFamily, "asyncio.Future[List[_Endpoint]]"] = {}
+        self._next_endpoint = itertools.count()
+        self._logger = logging.getLogger("cmk.fetchers.snmp_poller")
+
+    def device(self, snmp_config: SNMPHostConfig) -> "SNMPDevice":
+        """Create a device, the requests of one device always use the same socket"""
+        return SNMPDevice(self, snmp_config, next(self._next_endpoint) % self.num_sockets)
+
+    def close(self) -> None:
+        for future in self._endpoints.values():
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled() and future.exception() is None:
+                for endpoint in future.result():
+                    endpoint.close()
+        self._endpoints.clear()
+
+    async def _endpoint(self, family: socket.AddressFamily, index: int) -> _Endpoint:
+        future = self._endpoints.get(family)
+        if future is None:
+            future = self._endpoints[family] = asyncio.ensure_future(self._create_endpoints(family))
+        try:
+            # A cancelled request must not cancel the creation for the others
+            endpoints = await asyncio.shield(future)
+        except OSError:
+            if self._endpoints.get(family) is future:
+                del self._endpoints[family]  # Try again with the next request
+            raise
+        return endpoints[index]
+
+    async def _create_endpoints(self, family: socket.AddressFamily) -> List[_Endpoint]:
+        endpoints: List[_Endpoint] = []
+        try:
+            for _nr in range(self.num_sockets):
+                _transport, endpoint = await asyncio.get_event_loop().create_datagram_endpoint(
+                    _Endpoint, family=family)
+                endpoints.append(endpoint)
+        except BaseException:
+            for endpoint in endpoints:
+                endpoint.close()
+            raise
+        return endpoints
+
+
+class SNMPDevice:
+    """The asynchronous counterpart of NativeSNMPBackend"""
+    def __init__(self, poller: SNMPPoller, snmp_config: SNMPHostConfig, endpoint: int) -> None:
+        super().__init__()
+        self.config = snmp_config
+        self._poller = poller
+        self._endpoint = endpoint
+        self._session = native.make_session(snmp_config)
+        self._semaphore = asyncio.Semaphore(poller.max_parallel_requests)
+        self._interval = 1.0 / poller.max_request_rate if poller.max_request_rate > 0 else 0.0
+        self._next_send = 0.0
+        self._single_oid_cache: Dict[OID, Optional[SNMPDecodedString]] = {}
+        self.num_requests = 0
+
+    async def get(self,
+                  oid: OID,
+                  context_name: Optional[SNMPContextName] = None) -> Optional[SNMPRawValue]:
+        return await self._run(self._session.get(oid, context_name))
+
+    async def walk(self, oid: OID, context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
+        return await self._run(self._session.walk(oid, context_name))
+
+    async def get_single_oid(self, oid: OID,
+                             section_name: Optional[SectionName]) -> Optional[SNMPDecodedString]:
+        """Same as snmp_modes.get_single_oid(), cached per device"""
+        if not oid.startswith("."):
+            oid = "." + oid
+        if oid in self._single_oid_cache:
+            return self._single_oid_cache[oid]
+
+        value = None
+        for context_name in self.config.snmpv3_contexts_of(section_name):
+            value = await self.get(oid, context_name)
+            if value is not None:
+                break  # Use first received answer in case of multiple contextes
+
+        decoded = None if value is None else self.config.ensure_str(value)
+        self._single_oid_cache[oid] = decoded
+        return decoded
+
+    async def walk_many(self, oids: Sequence[OID],
+                        context_name: Optional[SNMPContextName]) -> List[SNMPRowInfo]:
+        return await self._run(self._session.walk_many(oids, context_name))
+
+    async def fetch_walks(self,
+                          plan: snmp_table.SNMPFetchPlan) -> Dict[snmp_table.WalkKey, SNMPRowInfo]:
+        """Do all walks of the plan concurrently, limited by the limits of the device"""
+        rowinfos = await asyncio.gather(
+            *(self.walk_many(walk.oids, walk.context_name) for walk in plan.walks))
+        walks: Dict[snmp_table.WalkKey, SNMPRowInfo] = {}
+        for walk, walk_rowinfos in zip(plan.walks, rowinfos):
+            for oid, rowinfo in zip(walk.oids, walk_rowinfos):
+                walks[(oid, walk.context_name)] = rowinfo
+        return walks
+
+    async def _run(self, steps: native.Steps) -> Any:
+        """Execute the steps of a request, see native.run_steps()"""
+        try:
+            step = next(steps)
+            while True:
+                try:
+                    response = await self._exchange(*step)
+                except MKSNMPError as e:
+                    step = steps.throw(e)
+                else:
+                    step = steps.send(response)
+        except StopIteration as e:
+            return e.value
+
+    async def _exchange(self, request: bytes, decode: native.Decoder) -> Any:
+        endpoint = await self._poller._endpoint(native.address_family(self.config), self._endpoint)
+        address = (self.config.ipaddress, self.config.port)
+        async with self._semaphore:
+            for _attempt in range(native.retries(self.config) + 1):
+                await self._throttle()
+                self.num_requests += 1
+                response = await endpoint.exchange(address, request, decode,
+                                                   native.timeout(self.config))
+                if response is not None:
+                    return response
+
+        raise MKSNMPError("SNMP Error on %s: Timeout: No Response from %s" %
+                          (self.config.ipaddress, self.config.ipaddress))
+
+    async def _throttle(self) -> None:
+        if not self._interval:
+            return
+        now = time.monotonic()
+        delay = self._next_send - now
+        self._next_send = max(now, self._next_send) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
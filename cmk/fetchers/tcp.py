@@ -4,6 +4,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import asyncio
 import logging
 import socket
 from hashlib import md5, sha256
@@ -12,7 +13,7 @@ from typing import Any, Dict, Final, List, Mapping, Optional, Tuple
 from Cryptodome.Cipher import AES
 
 import cmk.utils.debug
-from cmk.utils.type_defs import AgentRawData, HostAddress
+from cmk.utils.type_defs import AgentRawData, HostAddress, result
 
 from . import MKFetcherError
 from ._base import verify_ipaddress
@@ -120,6 +121,71 @@ class TCPFetcher(AgentFetcher):
                 raise
             raise MKFetcherError("Communication failed: %s" % e)
 
+    async def fetch_async(self, mode: Mode) -> result.Result[AgentRawData, Exception]:
+        """Return the data from the cache or the agent without blocking the event loop
+
+        This is the asynchronous counterpart to using the fetcher as context manager and
+        calling `fetch()`. It is used to query many agents at the same time.
+        """
+        try:
+            raw_data = self._fetch_from_enabled_cache(mode)
+            if not raw_data:
+                raw_data = await self._fetch_from_io_async()
+                self.file_cache.write(raw_data)
+            return result.OK(raw_data)
+        except Exception as exc:
+            if cmk.utils.debug.enabled():
+                raise
+            return result.Error(exc)
+
+    async def _fetch_from_io_async(self) -> AgentRawData:
+        if self.use_only_cache:
+            raise MKFetcherError("Got no data: No usable cache file present at %s" %
+                                 self.file_cache.path)
+
+        verify_ipaddress(self.address[0])
+        self._logger.debug(
+            "Connecting via TCP to %s:%d (%ss timeout)",
+            self.address[0],
+            self.address[1],
+            self.timeout,
+        )
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.address, family=self.family),
+                self.timeout,
+            )
+        except asyncio.TimeoutError:
+            raise MKFetcherError("Communication failed: timed out")
+        except socket.error as e:
+            if cmk.utils.debug.enabled():
+                raise
+            raise MKFetcherError("Communication failed: %s" % e)
+
+        try:
+            self._logger.debug("Reading data from agent")
+            buffer: List[bytes] = []
+            while True:
+                # Like the socket timeout of the synchronous fetcher, every read is limited
+                data = await asyncio.wait_for(reader.read(4096), self.timeout)
+                if not data:
+                    break
+                buffer.append(data)
+            return self._decrypt(b"".join(buffer))
+        except asyncio.TimeoutError:
+            raise MKFetcherError("Communication failed: timed out")
+        except socket.error as e:
+            if cmk.utils.debug.enabled():
+                raise
+            raise MKFetcherError("Communication failed: %s" % e)
+        finally:
+            self._logger.debug("Closing TCP connection to %s:%d", self.address[0], self.address[1])
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except socket.error:
+                pass
+
     def _decrypt(self, output: AgentRawData) -> AgentRawData:
         if output.startswith(b"<<<"):
             self._logger.debug("Output is not encrypted")
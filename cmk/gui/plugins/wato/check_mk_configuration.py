@@ -2478,6 +2478,7 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                     ("classic", _("Use Classic SNMP Backend")),
                     ("inline", _("Use Inline SNMP Backend")),
                     ("pysnmp", _("Use PySNMP Backend")),
+                    ("native", _("Use Native SNMP Backend")),
                 ],
                 help=
                 _("By default Checkmk uses command line calls of Net-SNMP tools like snmpget or "
@@ -2486,7 +2487,8 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                   "which calls the respective libraries directly via its python bindings. This "
                   "should increase the performance of SNMP checks in a significant way. Both "
                   "SNMP modes are featurse which improve the performance for large installations and are "
-                  "only available via our subscription."),
+                  "only available via our subscription. The Native SNMP Backend sends the SNMP "
+                  "requests itself without any external tools or libraries."),
             ),
             forth=lambda x: "inline" if x is True else ("classic" if x is False else x),
         )
@@ -4473,6 +4475,7 @@ def _valuespec_snmp_backend():
                 ("inline", _("Use Inline SNMP Backend")),
                 ("pysnmp", _("Use PySNMP Backend")),
                 ("classic", _("Use Classic Backend")),
+                ("native", _("Use Native Backend")),
             ],
         ),
         forth=lambda x: "classic" if x is True else ("inline" if x is False else x),
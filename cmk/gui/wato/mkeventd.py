@@ -3360,6 +3360,30 @@ class ConfigVariableEventConsoleRuleOptimizer(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableEventConsoleIngestionWorkers(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupEventConsoleGeneric
+
+    def domain(self):
+        return ConfigDomainEventConsole
+
+    def ident(self):
+        return "ingestion_workers"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Processes for parsing incoming messages"),
+            help=_("The Event Console can parse incoming messages, translate their host names "
+                   "and preselect the rules to check in several processes. This helps to "
+                   "handle high rates of incoming messages on systems with several CPU cores. "
+                   "Matching the rules and updating the events is still done one message "
+                   "after the other. With 0, everything is done in the main process."),
+            minvalue=0,
+            unit=_("processes"),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableEventConsoleActions(ConfigVariable):
     def group(self):
@@ -1414,7 +1414,7 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
 
             # Save newly found host instance to cache
             folder_lookup_cache[host_name] = host_instance.folder().path()
-            store.save_object_to_file(cache_path, folder_lookup_cache, pretty=False)
+            store.save_object_to_file(cache_path, folder_lookup_cache, binary=True)
             return host_instance
         except RequestTimeout:
             raise
@@ -1430,7 +1430,7 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         folder_lookup = {}
         for host_name, host in Folder.root_folder().all_hosts_recursively().items():
             folder_lookup[host_name] = host.folder().path()
-        store.save_object_to_file(cache_path, folder_lookup, pretty=False)
+        store.save_object_to_file(cache_path, folder_lookup, binary=True)
 
     @staticmethod
     def delete_host_lookup_cache():
@@ -1447,7 +1447,7 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         folder_lookup_cache = store.load_object_from_file(cache_path, {}, lock=True)
         for (hostname, folder_path) in host2path_list:
             folder_lookup_cache[hostname] = folder_path
-        store.save_object_to_file(cache_path, folder_lookup_cache, pretty=False)
+        store.save_object_to_file(cache_path, folder_lookup_cache, binary=True)
 
     @staticmethod
     def delete_hosts_from_lookup_cache(hostnames):
@@ -1458,7 +1458,7 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
                 del folder_lookup_cache[hostname]
             except KeyError:
                 pass
-        store.save_object_to_file(cache_path, folder_lookup_cache, pretty=False)
+        store.save_object_to_file(cache_path, folder_lookup_cache, binary=True)
 
     def _user_needs_permission(self, how: str) -> None:
         if how == "write" and config.user.may("wato.all_folders"):
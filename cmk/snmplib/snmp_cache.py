@@ -6,12 +6,13 @@
 """SNMP caching"""
 
 import os
-from typing import Dict, List, Optional
+import time
+from typing import Collection, Dict, Optional, Set
 
 import cmk.utils.cleanup
 import cmk.utils.paths
 import cmk.utils.store as store
-from cmk.utils.type_defs import HostAddress, HostName
+from cmk.utils.type_defs import HostAddress, HostName, SectionName
 
 from .type_defs import OID, SNMPDecodedString, SNMPHostConfig
 
@@ -19,8 +20,6 @@ from .type_defs import OID, SNMPDecodedString, SNMPHostConfig
 _g_single_oid_hostname: Optional[HostName] = None
 _g_single_oid_ipaddress: Optional[HostAddress] = None
 _g_single_oid_cache: Optional[Dict[OID, Optional[SNMPDecodedString]]] = None
-# TODO: Move to StoredWalkSNMPBackend?
-_g_walk_cache: Dict[str, List[str]] = {}
 
 
 def initialize_single_oid_cache(snmp_config: SNMPHostConfig, from_disk: bool = False) -> None:
@@ -44,7 +43,7 @@ def write_single_oid_cache(snmp_config: SNMPHostConfig) -> None:
     if not os.path.exists(cache_dir):
         os.makedirs(cache_dir)
     cache_path = "%s/%s.%s" % (cache_dir, snmp_config.hostname, snmp_config.ipaddress)
-    store.save_object_to_file(cache_path, _g_single_oid_cache, pretty=False)
+    store.save_object_to_file(cache_path, _g_single_oid_cache, binary=True)
 
 
 def set_single_oid_cache(oid: OID, value: Optional[SNMPDecodedString]) -> None:
@@ -68,25 +67,46 @@ def _load_single_oid_cache(snmp_config: SNMPHostConfig) -> Dict[OID, Optional[SN
     return store.load_object_from_file(cache_path, default={})
 
 
-def cleanup_host_caches() -> None:
-    global _g_walk_cache
-    _g_walk_cache = {}
-    _clear_other_hosts_oid_cache(None)
+def _scan_result_path(snmp_config: SNMPHostConfig) -> str:
+    return "%s/%s.%s.sections" % (cmk.utils.paths.snmp_scan_cache_dir, snmp_config.hostname,
+                                  snmp_config.ipaddress)
 
 
-cmk.utils.cleanup.register_cleanup(cleanup_host_caches)
+def load_scan_result(snmp_config: SNMPHostConfig, fingerprint: str,
+                     max_age: int) -> Optional[Set[SectionName]]:
+    """The sections detected by a previous scan with the same fingerprint"""
+    cache_path = _scan_result_path(snmp_config)
+    try:
+        if time.time() - os.stat(cache_path).st_mtime > max_age:
+            return None
+    except OSError:
+        return None
 
+    scan_result = store.load_object_from_file(cache_path, default={})
+    if scan_result.get("fingerprint") != fingerprint:
+        return None
+    return {SectionName(name) for name in scan_result["sections"]}
 
-def host_cache_contains(name: HostName) -> bool:
-    return name in _g_walk_cache
+
+def save_scan_result(snmp_config: SNMPHostConfig, fingerprint: str,
+                     sections: Collection[SectionName]) -> None:
+    cache_dir = cmk.utils.paths.snmp_scan_cache_dir
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    store.save_object_to_file(
+        _scan_result_path(snmp_config),
+        {
+            "fingerprint": fingerprint,
+            "sections": sorted(str(name) for name in sections),
+        },
+    )
 
 
-def host_cache_get(name: HostName) -> List[str]:
-    return _g_walk_cache[name]
+def cleanup_host_caches() -> None:
+    _clear_other_hosts_oid_cache(None)
 
 
-def host_cache_set(name: HostName, contents: List[str]) -> None:
-    _g_walk_cache[name] = contents
+cmk.utils.cleanup.register_cleanup(cleanup_host_caches)
 
 
 def _clear_other_hosts_oid_cache(hostname: Optional[str]) -> None:
@@ -5,7 +5,20 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import functools
-from typing import Collection, Iterable, Tuple, Set
+import hashlib
+from typing import (
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import cmk.utils.tty as tty
 from cmk.utils.exceptions import MKGeneralException, MKSNMPError
@@ -14,10 +27,19 @@ from cmk.utils.type_defs import SectionName
 
 import cmk.snmplib.snmp_cache as snmp_cache
 import cmk.snmplib.snmp_modes as snmp_modes
-from cmk.snmplib.type_defs import ABCSNMPBackend, SNMPDetectSpec
+from cmk.snmplib.type_defs import (
+    ABCSNMPBackend,
+    OID,
+    SNMPDecodedString,
+    SNMPDetectAtom,
+    SNMPDetectSpec,
+    SNMPHostConfig,
+)
 from cmk.snmplib.utils import evaluate_snmp_detection
 
 SNMPScanSection = Tuple[SectionName, SNMPDetectSpec]
+AsyncSingleOIDGetter = Callable[[OID, Optional[SectionName]],
+                                Awaitable[Optional[SNMPDecodedString]]]
 
 
 # gather auto_discovered check_plugin_names for this host
@@ -27,7 +49,14 @@ def gather_available_raw_section_names(
     *,
     missing_sys_description: bool,
     backend: ABCSNMPBackend,
+    scan_cache_max_age: int = 0,
 ) -> Set[SectionName]:
+    """Detect the sections of the device
+
+    With a scan_cache_max_age the result is reused for this long (in seconds), as
+    long as the system description and object and the detection specifications
+    are unchanged.
+    """
     if not sections:
         return set()
 
@@ -37,6 +66,7 @@ def gather_available_raw_section_names(
             on_error=on_error,
             missing_sys_description=missing_sys_description,
             backend=backend,
+            scan_cache_max_age=scan_cache_max_age,
         )
     except Exception as e:
         if on_error == "raise":
@@ -57,6 +87,7 @@ def _snmp_scan(
     *,
     missing_sys_description: bool,
     backend: ABCSNMPBackend,
+    scan_cache_max_age: int = 0,
 ) -> Set[SectionName]:
     snmp_cache.initialize_single_oid_cache(backend.config)
     console.vverbose("  SNMP scan:\n")
@@ -66,11 +97,26 @@ def _snmp_scan(
     else:
         _prefetch_description_object(backend=backend)
 
-    found_sections = _find_sections(
-        sections,
-        on_error=on_error,
-        backend=backend,
-    )
+    sections = list(sections)
+    sys_descr = snmp_cache.get_oid_from_single_oid_cache(OID_SYS_DESCR)
+    sys_obj = snmp_cache.get_oid_from_single_oid_cache(OID_SYS_OBJ)
+    fingerprint = _scan_fingerprint(sections, sys_descr, sys_obj)
+
+    found_sections = (snmp_cache.load_scan_result(backend.config, fingerprint, scan_cache_max_age)
+                      if scan_cache_max_age else None)
+    if found_sections is None:
+        failed: List[SectionName] = []
+        found_sections = _find_sections(
+            DetectIndex(sections).candidates(sys_descr, sys_obj),
+            on_error=on_error,
+            backend=backend,
+            failed=failed,
+        )
+        if scan_cache_max_age and not failed:
+            snmp_cache.save_scan_result(backend.config, fingerprint, found_sections)
+    else:
+        console.vverbose("   Using cached SNMP scan result\n")
+
     _output_snmp_check_plugins("SNMP scan found", found_sections)
     snmp_cache.write_single_oid_cache(backend.config)
     return found_sections
@@ -89,10 +135,14 @@ def _prefetch_description_object(
             backend=backend,
         )
         if value is None:
-            raise MKSNMPError(
-                "Cannot fetch %s OID %s. Please check your SNMP "
-                "configuration. Possible reason might be: Wrong credentials, "
-                "wrong SNMP version, Firewall rules, etc." % (name, oid),)
+            raise _missing_description_object(oid, name)
+
+
+def _missing_description_object(oid: OID, name: str) -> MKSNMPError:
+    return MKSNMPError(
+        "Cannot fetch %s OID %s. Please check your SNMP "
+        "configuration. Possible reason might be: Wrong credentials, "
+        "wrong SNMP version, Firewall rules, etc." % (name, oid),)
 
 
 def _fake_description_object() -> None:
@@ -112,20 +162,66 @@ def _find_sections(
     *,
     on_error: str,
     backend: ABCSNMPBackend,
+    failed: Optional[List[SectionName]] = None,
 ) -> Set[SectionName]:
+    steps = _find_sections_steps(sections, {}, on_error=on_error, failed=failed)
+    try:
+        oid, name = next(steps)
+        while True:
+            try:
+                value = snmp_modes.get_single_oid(oid, section_name=name, backend=backend)
+            except Exception as e:
+                oid, name = steps.throw(e)
+            else:
+                oid, name = steps.send(value)
+    except StopIteration as e:
+        return e.value
+
+
+class _OIDNotFetched(Exception):
+    def __init__(self, oid: OID) -> None:
+        super().__init__(oid)
+        self.oid = oid
+
+
+# Yields the OIDs (and the section they are needed for) whose values are
+# missing for the detection, they have to be sent back.
+_FindSectionsSteps = Generator[Tuple[OID, SectionName], Optional[SNMPDecodedString],
+                               Set[SectionName]]
+
+
+def _find_sections_steps(
+    sections: Iterable[SNMPScanSection],
+    values: Dict[OID, Optional[SNMPDecodedString]],
+    *,
+    on_error: str,
+    failed: Optional[List[SectionName]] = None,
+) -> _FindSectionsSteps:
+    """Evaluate the detection specifications without doing any I/O
+
+    The values are cached in values by the normalized OID (see get_single_oid()).
+    """
+    def oid_value_getter(oid: OID) -> Optional[SNMPDecodedString]:
+        key = oid if oid.startswith(".") else "." + oid
+        if key not in values:
+            raise _OIDNotFetched(oid)
+        return values[key]
+
     found_sections: Set[SectionName] = set()
     for name, specs in sections:
-        oid_value_getter = functools.partial(
-            snmp_modes.get_single_oid,
-            section_name=name,
-            backend=backend,
-        )
         try:
-            if evaluate_snmp_detection(
-                    detect_spec=specs,
-                    oid_value_getter=oid_value_getter,
-            ):
-                found_sections.add(name)
+            # Evaluate the specification until all OIDs it needs are fetched
+            while True:
+                try:
+                    if evaluate_snmp_detection(
+                            detect_spec=specs,
+                            oid_value_getter=oid_value_getter,
+                    ):
+                        found_sections.add(name)
+                    break
+                except _OIDNotFetched as e:
+                    value = yield e.oid, name
+                    values[e.oid if e.oid.startswith(".") else "." + e.oid] = value
         except MKGeneralException:
             # some error messages which we explicitly want to show to the user
             # should be raised through this
@@ -135,9 +231,205 @@ def _find_sections(
                 console.warning("   Exception in SNMP scan function of %s" % name)
             elif on_error == "raise":
                 raise
+            if failed is not None:
+                failed.append(name)
+    return found_sections
+
+
+async def gather_available_raw_section_names_async(
+    sections: Collection[SNMPScanSection],
+    on_error: str,
+    *,
+    missing_sys_description: bool,
+    get_single_oid: AsyncSingleOIDGetter,
+    snmp_config: SNMPHostConfig,
+    scan_cache_max_age: int = 0,
+) -> Set[SectionName]:
+    """The asynchronous counterpart to gather_available_raw_section_names()
+
+    The values of the OIDs are fetched with get_single_oid, which has to cache them.
+    """
+    if not sections:
+        return set()
+
+    try:
+        found_sections = await _find_sections_async(
+            sections,
+            on_error=on_error,
+            missing_sys_description=missing_sys_description,
+            get_single_oid=get_single_oid,
+            snmp_config=snmp_config,
+            scan_cache_max_age=scan_cache_max_age,
+        )
+        _output_snmp_check_plugins("SNMP scan found", found_sections)
+        return found_sections
+    except Exception as e:
+        if on_error == "raise":
+            raise
+        if on_error == "warn":
+            console.error("SNMP scan failed: %s\n" % e)
+
+    return set()
+
+
+async def _find_sections_async(
+    sections: Iterable[SNMPScanSection],
+    *,
+    on_error: str,
+    missing_sys_description: bool,
+    get_single_oid: AsyncSingleOIDGetter,
+    snmp_config: SNMPHostConfig,
+    scan_cache_max_age: int,
+) -> Set[SectionName]:
+    # Same normalization as the single OID cache of get_single_oid()
+    values: Dict[OID, Optional[SNMPDecodedString]] = {}
+    if missing_sys_description:
+        values.update({OID_SYS_DESCR: "", OID_SYS_OBJ: ""})
+    else:
+        for oid, description in [
+            (OID_SYS_DESCR, "system description"),
+            (OID_SYS_OBJ, "system object"),
+        ]:
+            values[oid] = await get_single_oid(oid, None)
+            if values[oid] is None:
+                raise _missing_description_object(oid, description)
+
+    sections = list(sections)
+    fingerprint = _scan_fingerprint(sections, values[OID_SYS_DESCR], values[OID_SYS_OBJ])
+    if scan_cache_max_age:
+        cached_sections = snmp_cache.load_scan_result(snmp_config, fingerprint, scan_cache_max_age)
+        if cached_sections is not None:
+            console.vverbose("   Using cached SNMP scan result\n")
+            return cached_sections
+
+    failed: List[SectionName] = []
+    steps = _find_sections_steps(
+        DetectIndex(sections).candidates(values[OID_SYS_DESCR], values[OID_SYS_OBJ]),
+        values,
+        on_error=on_error,
+        failed=failed,
+    )
+    try:
+        oid, name = next(steps)
+        while True:
+            try:
+                value = await get_single_oid(oid, name)
+            except Exception as e:
+                oid, name = steps.throw(e)
+            else:
+                oid, name = steps.send(value)
+    except StopIteration as e:
+        found_sections: Set[SectionName] = e.value
+
+    if scan_cache_max_age and not failed:
+        snmp_cache.save_scan_result(snmp_config, fingerprint, found_sections)
     return found_sections
 
 
+def _scan_fingerprint(
+    sections: Iterable[SNMPScanSection],
+    sys_descr: Optional[SNMPDecodedString],
+    sys_obj: Optional[SNMPDecodedString],
+) -> str:
+    """Identifies the device and the detection specifications for the scan cache"""
+    return hashlib.sha256(
+        repr((
+            sys_descr,
+            sys_obj,
+            sorted((str(name), spec) for name, spec in sections),
+        )).encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _literal_prefix(pattern: str) -> Optional[str]:
+    """The start every value matching the pattern has, if known
+
+    >>> _literal_prefix(r"\\.1\\.3\\.6\\.1\\.4\\.1\\.9\\..*")
+    '.1.3.6.1.4.1.9.'
+    >>> _literal_prefix("Linux")
+    'Linux'
+    >>> _literal_prefix("Linux.*") == _literal_prefix("Linux?.*") + "x"
+    True
+    >>> _literal_prefix(".*Linux.*") is _literal_prefix("Linux|Windows") is None
+    True
+    """
+    if "|" in pattern:
+        return None
+
+    prefix = ""
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\" and index + 1 < len(pattern) and not pattern[index + 1].isalnum():
+            prefix += pattern[index + 1]
+            index += 2
+            continue
+        if char in ".^$*+?{}[]()\\":
+            if char in "*+?{":
+                # The quantifier applies to the last character
+                prefix = prefix[:-1]
+            break
+        prefix += char
+        index += 1
+
+    if not prefix or not prefix.isascii():
+        return None
+    return prefix
+
+
+def _index_key(alternative: Sequence[SNMPDetectAtom]) -> Optional[Tuple[OID, str]]:
+    for oid, pattern, flag in alternative:
+        if not oid.startswith("."):
+            oid = "." + oid
+        if oid not in (OID_SYS_DESCR, OID_SYS_OBJ) or not flag:
+            continue
+        prefix = _literal_prefix(pattern)
+        if prefix is not None:
+            return oid, prefix.lower()
+    return None
+
+
+class DetectIndex:
+    """Index of the detection specifications by the start of sysDescr and sysObjectID
+
+    Most specifications require the system description or object to start with
+    something (or to be something). Only the sections with an alternative that
+    may match the values of the device are evaluated at all.
+    """
+    def __init__(self, sections: Iterable[SNMPScanSection]) -> None:
+        super().__init__()
+        self._sections = list(sections)
+        self._unindexed: Set[SectionName] = set()
+        self._by_prefix: Dict[Tuple[OID, str], Set[SectionName]] = {}
+        self._max_prefix_length = 0
+        for name, spec in self._sections:
+            for alternative in spec:
+                key = _index_key(alternative)
+                if key is None:
+                    self._unindexed.add(name)
+                else:
+                    self._by_prefix.setdefault(key, set()).add(name)
+                    self._max_prefix_length = max(self._max_prefix_length, len(key[1]))
+
+    def candidates(
+        self,
+        sys_descr: Optional[SNMPDecodedString],
+        sys_obj: Optional[SNMPDecodedString],
+    ) -> List[SNMPScanSection]:
+        """The sections that can be detected on a device with these values"""
+        candidates = set(self._unindexed)
+        for oid, value in ((OID_SYS_DESCR, sys_descr), (OID_SYS_OBJ, sys_obj)):
+            if value is None:
+                continue
+            if not value.isascii():
+                # Case insensitive matching of non ASCII characters is too special
+                return self._sections
+            value = value.lower()
+            for length in range(1, min(len(value), self._max_prefix_length) + 1):
+                candidates.update(self._by_prefix.get((oid, value[:length]), ()))
+        return [(name, spec) for name, spec in self._sections if name in candidates]
+
+
 def _output_snmp_check_plugins(
     title: str,
     collection: Iterable[SectionName],
@@ -4,8 +4,21 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import logging
 import os
-from typing import Callable, List, Optional, Set, Tuple, Union
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from six import ensure_binary
 
@@ -13,7 +26,7 @@ import cmk.utils.debug
 import cmk.utils.store as store
 from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import console
-from cmk.utils.type_defs import HostName, SectionName
+from cmk.utils.type_defs import CheckPluginNameStr, HostName, SectionName
 
 from .type_defs import (
     ABCSNMPBackend,
@@ -26,6 +39,7 @@ from .type_defs import (
     OIDBytes,
     OIDCached,
     OIDSpec,
+    SNMPContextName,
     SNMPDecodedValues,
     SNMPHostConfig,
     SNMPRawValue,
@@ -38,6 +52,7 @@ from .type_defs import (
 ResultColumnsUnsanitized = List[Tuple[OID, SNMPRowInfo, SNMPValueEncoding]]
 ResultColumnsSanitized = List[Tuple[List[SNMPRawValue], SNMPValueEncoding]]
 ResultColumnsDecoded = List[List[SNMPDecodedValues]]
+WalkKey = Tuple[OID, Optional[SNMPContextName]]
 
 
 def get_snmp_table(section_name: Optional[SectionName], oid_info: SNMPTree, *,
@@ -328,6 +343,167 @@ def _construct_snmp_table_of_rows(columns: ResultColumnsDecoded) -> SNMPTable:
     return new_info
 
 
+class PlannedWalk(NamedTuple):
+    """The OIDs walked together, usually the columns of one table"""
+    context_name: Optional[SNMPContextName]
+    section_name: SectionName
+    table_base_oid: OID
+    oids: Sequence[OID]
+
+
+class SNMPFetchPlan:
+    """The walks needed for the tables of many sections of a host
+
+    get_snmp_table() walks every column on its own. The plan merges the columns
+    of all sections instead:
+
+    * Columns needed by several sections (e.g. if, if64 and inv_if) are walked once.
+    * Columns in the subtree of another walked OID are taken from that walk.
+    * The columns of a table are walked together, which backends may do with
+      one request for all columns (see ABCSNMPBackend.walk_many()).
+
+    The walks are planned in the order of the sections.
+    """
+    def __init__(
+        self,
+        section_trees: Mapping[SectionName, Sequence[SNMPTree]],
+        snmp_config: SNMPHostConfig,
+        *,
+        use_snmpwalk_cache: bool,
+    ) -> None:
+        super().__init__()
+        # Number of walks done by get_snmp_table() without the plan
+        self.num_column_walks = 0
+
+        # context -> OID -> (section, table base), in the order of the sections
+        columns: Dict[Optional[SNMPContextName], Dict[OID, Tuple[SectionName, OID]]] = {}
+        for section_name, trees in section_trees.items():
+            contexts = snmp_config.snmpv3_contexts_of(section_name)
+            for tree in trees:
+                for column in tree.oids:
+                    if column in SPECIAL_COLUMNS:
+                        continue
+                    fetchoid = "%s.%s" % (tree.base, column)
+                    if (use_snmpwalk_cache and isinstance(column, OIDCached) and
+                            os.path.exists(_snmpwalk_cache_path(snmp_config.hostname, fetchoid))):
+                        continue  # Taken from the walk cache
+                    self.num_column_walks += len(contexts)
+                    for context_name in contexts:
+                        columns.setdefault(context_name,
+                                           {}).setdefault(_normalize_oid(fetchoid),
+                                                          (section_name, str(tree.base)))
+
+        # The OID each column is taken from
+        self._sources: Dict[WalkKey, OID] = {}
+        tables: Dict[Tuple[Optional[SNMPContextName], OID], Tuple[SectionName, List[OID]]] = {}
+        for context_name, context_columns in columns.items():
+            walked = _outermost_oids(context_columns)
+            for oid in context_columns:
+                self._sources[(oid, context_name)] = walked[oid]
+            for oid in context_columns:
+                if walked[oid] != oid:
+                    continue
+                section_name, table_base_oid = context_columns[oid]
+                tables.setdefault((context_name, table_base_oid), (section_name, []))[1].append(oid)
+
+        self.walks = [
+            PlannedWalk(context_name, section_name, table_base_oid, oids)
+            for (context_name, table_base_oid), (section_name, oids) in tables.items()
+        ]
+
+    @property
+    def num_walks(self) -> int:
+        return sum(len(walk.oids) for walk in self.walks)
+
+    @property
+    def walks_saved(self) -> int:
+        return self.num_column_walks - self.num_walks
+
+    def source(self, oid: OID, context_name: Optional[SNMPContextName]) -> Optional[OID]:
+        """The walked OID containing the given OID, None if it is not planned"""
+        return self._sources.get((_normalize_oid(oid), context_name))
+
+    def fetch(self, walk: PlannedWalk, *, backend: ABCSNMPBackend) -> Dict[WalkKey, SNMPRowInfo]:
+        rows = backend.walk_many(
+            walk.oids,
+            check_plugin_name=str(walk.section_name),
+            table_base_oid=walk.table_base_oid,
+            context_name=walk.context_name,
+        )
+        return {(oid, walk.context_name): rowinfo for oid, rowinfo in zip(walk.oids, rows)}
+
+
+def _normalize_oid(oid: OID) -> OID:
+    return "." + oid.strip(".")
+
+
+def _outermost_oids(oids: Iterable[OID]) -> Dict[OID, OID]:
+    """Map the OIDs to the OID whose subtree contains them
+
+    >>> _outermost_oids([".1.2.3", ".1.2", ".1.20", ".1.2.3.4"])
+    {'.1.2': '.1.2', '.1.2.3': '.1.2', '.1.2.3.4': '.1.2', '.1.20': '.1.20'}
+    """
+    outermost: Dict[OID, OID] = {}
+    current: Optional[OID] = None
+    # The subtree of an OID directly follows the OID in this order
+    for oid in sorted(oids, key=lambda oid: _oid_to_intlist(oid.lstrip('.'))):
+        if current is None or not (oid + ".").startswith(current + "."):
+            current = oid
+        outermost[oid] = current
+    return outermost
+
+
+class PlannedSNMPBackend(ABCSNMPBackend):
+    """Walk the columns as planned for get_snmp_table()
+
+    The planned walks are fetched the first time one of their columns is needed.
+    All other requests are passed to the backend.
+    """
+    def __init__(
+        self,
+        plan: SNMPFetchPlan,
+        *,
+        backend: ABCSNMPBackend,
+        walks: Optional[Mapping[WalkKey, SNMPRowInfo]] = None,
+    ) -> None:
+        super().__init__(backend.config, logging.getLogger("cmk.snmplib.snmp_table"))
+        self._plan = plan
+        self._backend = backend
+        self._walks: Dict[WalkKey, SNMPRowInfo] = dict(walks or {})
+
+    def get(self,
+            oid: OID,
+            context_name: Optional[SNMPContextName] = None) -> Optional[SNMPRawValue]:
+        return self._backend.get(oid, context_name=context_name)
+
+    def walk(self,
+             oid: OID,
+             check_plugin_name: Optional[CheckPluginNameStr] = None,
+             table_base_oid: Optional[OID] = None,
+             context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
+        source = self._plan.source(oid, context_name)
+        if source is None:
+            return self._backend.walk(
+                oid,
+                check_plugin_name=check_plugin_name,
+                table_base_oid=table_base_oid,
+                context_name=context_name,
+            )
+
+        if (source, context_name) not in self._walks:
+            for walk in self._plan.walks:
+                if walk.context_name == context_name and source in walk.oids:
+                    self._walks.update(self._plan.fetch(walk, backend=self._backend))
+
+        rowinfo = self._walks[(source, context_name)]
+        oid = _normalize_oid(oid)
+        if oid == source:
+            # get_snmp_table() sorts the rows in place
+            return list(rowinfo)
+        return [row for row in rowinfo if row[0].startswith(oid + ".")
+               ] or [row for row in rowinfo if row[0] == oid]
+
+
 def _get_cached_snmpwalk(hostname: HostName, fetchoid: OID) -> Optional[SNMPRowInfo]:
     path = _snmpwalk_cache_path(hostname, fetchoid)
     try:
@@ -347,7 +523,7 @@ def _save_snmpwalk_cache(hostname: HostName, fetchoid: OID, rowinfo: SNMPRowInfo
         os.makedirs(os.path.dirname(path))
 
     console.vverbose("  Saving walk of %s to walk cache %s\n" % (fetchoid, path))
-    store.save_object_to_file(path, rowinfo, pretty=False)
+    store.save_object_to_file(path, rowinfo, binary=True)
 
 
 def _snmpwalk_cache_path(hostname: HostName, fetchoid: OID) -> str:
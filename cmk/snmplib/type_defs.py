@@ -17,6 +17,7 @@ from typing import (
     List,
     NamedTuple,
     Optional,
+    Sequence,
     Tuple,
     TypeVar,
     Union,
@@ -147,6 +148,9 @@ class ABCSNMPBackend(metaclass=abc.ABCMeta):
     def address(self) -> _HostAddress:
         return self.config.ipaddress
 
+    def close(self) -> None:
+        """Release the resources of the backend, e.g. open sockets"""
+
     @abc.abstractmethod
     def get(self,
             oid: OID,
@@ -165,6 +169,25 @@ class ABCSNMPBackend(metaclass=abc.ABCMeta):
              context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
         return []
 
+    def walk_many(self,
+                  oids: Sequence[OID],
+                  check_plugin_name: Optional[_CheckPluginName] = None,
+                  table_base_oid: Optional[OID] = None,
+                  context_name: Optional[SNMPContextName] = None) -> List[SNMPRowInfo]:
+        """Walk several OIDs, usually the columns of a table
+
+        Backends able to walk the OIDs at the same time (e.g. with one GETBULK
+        request for all columns) override this.
+        """
+        return [
+            self.walk(
+                oid,
+                check_plugin_name=check_plugin_name,
+                table_base_oid=table_base_oid,
+                context_name=context_name,
+            ) for oid in oids
+        ]
+
 
 OID_END = 0  # Suffix-part of OID that was not specified
 OID_STRING = -1  # Complete OID as string ".1.3.6.1.4.1.343...."
@@ -43,10 +43,13 @@ core_helper_config_dir = Path(_omd_path("var/check_mk/core/helper_config"))
 autochecks_dir = base_autochecks_dir
 precompiled_hostchecks_dir = _omd_path("var/check_mk/precompiled")
 snmpwalks_dir = _omd_path("var/check_mk/snmpwalks")
+snmpwalk_index_dir = _omd_path("tmp/check_mk/snmpwalk_index")
 counters_dir = _omd_path("tmp/check_mk/counters")
+counter_shards_dir = _omd_path("tmp/check_mk/counter_shards")
 tcp_cache_dir = _omd_path("tmp/check_mk/cache")
 data_source_cache_dir = _omd_path("tmp/check_mk/data_source_cache")
 snmp_scan_cache_dir = _omd_path("tmp/check_mk/snmp_scan_cache")
+parsed_sections_cache_dir = _omd_path("tmp/check_mk/parsed_sections_cache")
 include_cache_dir = _omd_path("tmp/check_mk/check_includes")
 tmp_dir = _omd_path("tmp/check_mk")
 logwatch_dir = _omd_path("var/check_mk/logwatch")
@@ -61,6 +64,7 @@ nagios_binary = _omd_path("bin/nagios")
 apache_config_dir = _omd_path("etc/apache")
 htpasswd_file = _omd_path("etc/htpasswd")
 livestatus_unix_socket = _omd_path("tmp/run/live")
+check_helpers_socket = _omd_path("tmp/run/cmk-check-helpers")
 pnp_rraconf_dir = _omd_path("share/check_mk/pnp-rraconf")
 livebackendsdir = _omd_path("share/check_mk/livestatus")
 inventory_output_dir = _omd_path("var/check_mk/inventory")
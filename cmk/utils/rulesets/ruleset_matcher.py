@@ -5,7 +5,10 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """This module provides generic Check_MK ruleset processing functionality"""
 
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Pattern, Set, Tuple
+import marshal
+from pathlib import Path
+from typing import (TYPE_CHECKING, Any, Dict, Generator, Iterable, List, Optional, Pattern,
+                    Sequence, Set, Tuple)
 
 from cmk.utils.rulesets.tuple_rulesets import (
     ALL_HOSTS,
@@ -76,6 +79,7 @@ class RulesetMatcher:
         all_configured_hosts: Set[HostName],
         clusters_of: Dict[HostName, List[HostName]],
         nodes_of: Dict[HostName, List[HostName]],
+        matching_hosts_cache_path: Optional[Path] = None,
     ) -> None:
         super(RulesetMatcher, self).__init__()
 
@@ -89,6 +93,7 @@ class RulesetMatcher:
             all_configured_hosts,
             clusters_of,
             nodes_of,
+            matching_hosts_cache_path,
         )
 
         self._service_match_cache: Dict = {}
@@ -164,19 +169,59 @@ class RulesetMatcher:
                                    is_binary: bool) -> Generator:
         """Returns a generator of the values of the matched rules
         Replaces service_extra_conf"""
-        self.tuple_transformer.transform_in_place(ruleset, is_service=True, is_binary=is_binary)
-
-        with_foreign_hosts = match_object.host_name not in \
-                                self.ruleset_optimizer.all_processed_hosts()
-        optimized_ruleset = self.ruleset_optimizer.get_service_ruleset(ruleset,
-                                                                       with_foreign_hosts,
-                                                                       is_binary=is_binary)
+        if match_object.service_description is None:
+            return
 
-        for value, hosts, service_labels_condition, service_labels_condition_cache_id, service_description_condition in optimized_ruleset:
-            if match_object.service_description is None:
-                continue
+        compiled_ruleset = self._get_compiled_service_ruleset(match_object.host_name, ruleset,
+                                                              is_binary)
+        host_rules = (rule_nr for rule_nr, rule in enumerate(compiled_ruleset.rules)
+                      if match_object.host_name in rule[1])
+        yield from self._matching_service_rule_values(compiled_ruleset, host_rules, match_object)
+
+    def get_service_ruleset_values_of_services(self, host_name: HostName,
+                                               match_objects: Sequence[RulesetMatchObject],
+                                               ruleset: List,
+                                               is_binary: bool) -> List[List[RuleValue]]:
+        """Returns the values of the matched rules for a batch of services of one host
+
+        This is the same as calling get_service_ruleset_values for each of the match objects,
+        but the rules not matching the host are only sorted out once for the whole batch."""
+        compiled_ruleset = self._get_compiled_service_ruleset(host_name, ruleset, is_binary)
+        host_rules = [
+            rule_nr for rule_nr, rule in enumerate(compiled_ruleset.rules) if host_name in rule[1]
+        ]
+        return [
+            list(self._matching_service_rule_values(compiled_ruleset, host_rules, match_object))
+            if match_object.service_description is not None else []
+            for match_object in match_objects
+        ]
+
+    def _get_compiled_service_ruleset(self, host_name: Optional[HostName], ruleset: List,
+                                      is_binary: bool) -> 'CompiledServiceRuleset':
+        self.tuple_transformer.transform_in_place(ruleset, is_service=True, is_binary=is_binary)
 
-            if match_object.host_name not in hosts:
+        with_foreign_hosts = host_name not in self.ruleset_optimizer.all_processed_hosts()
+        return self.ruleset_optimizer.get_service_ruleset(ruleset,
+                                                          with_foreign_hosts,
+                                                          is_binary=is_binary)
+
+    def _matching_service_rule_values(self, compiled_ruleset: 'CompiledServiceRuleset',
+                                      host_rules: Iterable[int],
+                                      match_object: RulesetMatchObject) -> Generator:
+        # Only the candidate rules need to be checked with their regex. All other patterns can not
+        # match the service description, which is the same as a failed regex match.
+        assert match_object.service_description is not None
+        candidates = compiled_ruleset.candidates(match_object.service_description)
+
+        for rule_nr in host_rules:
+            (value, _hosts, service_labels_condition, service_labels_condition_cache_id,
+             service_description_condition) = compiled_ruleset.rules[rule_nr]
+
+            if rule_nr not in candidates:
+                negate = service_description_condition[0]
+                if negate and (not service_labels_condition or matches_labels(
+                        match_object.service_labels, service_labels_condition)):
+                    yield value
                 continue
 
             service_cache_id = (match_object.service_cache_id, service_description_condition,
@@ -254,10 +299,15 @@ class RulesetMatcher:
 class RulesetOptimizer:
     """Performs some precalculations on the configured rulesets to improve the
     processing performance"""
-    def __init__(self, ruleset_matcher: RulesetMatcher, host_tag_lists: Dict[HostName, TagList],
-                 host_paths: Dict[HostName, str], labels: 'LabelManager',
-                 all_configured_hosts: Set[HostName], clusters_of: Dict[HostName, List[HostName]],
-                 nodes_of: Dict[HostName, List[HostName]]) -> None:
+    def __init__(self,
+                 ruleset_matcher: RulesetMatcher,
+                 host_tag_lists: Dict[HostName, TagList],
+                 host_paths: Dict[HostName, str],
+                 labels: 'LabelManager',
+                 all_configured_hosts: Set[HostName],
+                 clusters_of: Dict[HostName, List[HostName]],
+                 nodes_of: Dict[HostName, List[HostName]],
+                 matching_hosts_cache_path: Optional[Path] = None) -> None:
         super(RulesetOptimizer, self).__init__()
         self._ruleset_matcher = ruleset_matcher
         self._labels = labels
@@ -298,6 +348,12 @@ class RulesetOptimizer:
         # TODO: Clean this one up?
         self._initialize_host_lookup()
 
+        # Matching hosts of the host conditions, persisted across processes
+        self._matching_hosts_cache: Optional[MatchingHostsCache] = None
+        if matching_hosts_cache_path is not None:
+            self._matching_hosts_cache = MatchingHostsCache(matching_hosts_cache_path,
+                                                            self._host_fingerprints())
+
     def clear_host_ruleset_cache(self) -> None:
         self._host_ruleset_cache.clear()
 
@@ -305,6 +361,10 @@ class RulesetOptimizer:
         self._host_ruleset_cache.clear()
         self._all_matching_hosts_match_cache.clear()
 
+    def save_matching_hosts_cache(self) -> None:
+        if self._matching_hosts_cache is not None:
+            self._matching_hosts_cache.save()
+
     def all_processed_hosts(self) -> Set[HostName]:
         """Returns a set of all processed hosts"""
         return self._all_processed_hosts
@@ -374,7 +434,7 @@ class RulesetOptimizer:
         return host_values
 
     def get_service_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
-                            is_binary: bool) -> PreprocessedServiceRuleset:
+                            is_binary: bool) -> 'CompiledServiceRuleset':
         cache_id = id(ruleset), with_foreign_hosts
 
         if cache_id in self._service_ruleset_cache:
@@ -387,8 +447,9 @@ class RulesetOptimizer:
         return cached_ruleset
 
     def _convert_service_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
-                                 is_binary: bool) -> PreprocessedServiceRuleset:
+                                 is_binary: bool) -> 'CompiledServiceRuleset':
         new_rules: PreprocessedServiceRuleset = []
+        rule_prefixes: List[Optional[Set[str]]] = []
         for rule in ruleset:
             if "options" in rule and "disabled" in rule["options"]:
                 continue
@@ -404,10 +465,12 @@ class RulesetOptimizer:
                 for label_id, label_spec in service_labels_condition.items())
 
             # And now preprocess the configured patterns in the servlist
+            service_description_condition = rule["condition"].get("service_description")
             new_rules.append(
                 (rule["value"], hosts, service_labels_condition, service_labels_condition_cache_id,
-                 self._convert_pattern_list(rule["condition"].get("service_description"))))
-        return new_rules
+                 self._convert_pattern_list(service_description_condition)))
+            rule_prefixes.append(self._pattern_list_prefixes(service_description_condition))
+        return CompiledServiceRuleset(new_rules, rule_prefixes)
 
     def _convert_pattern_list(self, patterns: List[str]) -> PreprocessedPattern:
         """Compiles a list of service match patterns to a to a single regex
@@ -419,15 +482,26 @@ class RulesetOptimizer:
             return False, regex(u"")  # Match everything
 
         negate, patterns = parse_negated_condition_list(patterns)
+        return negate, regex("(?:%s)" % "|".join("(?:%s)" % p for p in _pattern_parts(patterns)))
 
-        pattern_parts = []
-        for p in patterns:
-            if isinstance(p, dict):
-                pattern_parts.append(p["$regex"])
-            else:
-                pattern_parts.append(p)
+    def _pattern_list_prefixes(self, patterns: List[str]) -> Optional[Set[str]]:
+        """Returns the literal prefixes of the service match patterns
 
-        return negate, regex("(?:%s)" % "|".join("(?:%s)" % p for p in pattern_parts))
+        Each service description matched by one of the patterns starts with one of the prefixes.
+        None is returned in case a pattern has no usable prefix (or there is no pattern at all).
+        """
+        if not patterns:
+            return None
+
+        _negate, patterns = parse_negated_condition_list(patterns)
+
+        prefixes = set()
+        for pattern in _pattern_parts(patterns):
+            prefix = _literal_prefix(pattern)
+            if not prefix:
+                return None
+            prefixes.add(prefix)
+        return prefixes
 
     def _all_matching_hosts(self, condition: Dict[str, Any],
                             with_foreign_hosts: bool) -> Set[HostName]:
@@ -455,9 +529,45 @@ class RulesetOptimizer:
         valid_hosts = self.get_hosts_within_folder(rule_path,
                                                    with_foreign_hosts).intersection(valid_hosts)
 
+        # Host labels are computed using rulesets themselves. Conditions on them
+        # are not persisted, because the host fingerprints only cover tags and folders.
+        if self._matching_hosts_cache is not None and not labels:
+            matching = self._persisted_matching_hosts(cache_id[0], hostlist, tags,
+                                                      rule_path).intersection(valid_hosts)
+        else:
+            matching = self._compute_matching_hosts(valid_hosts, hostlist, tags, labels)
+
+        self._all_matching_hosts_match_cache[cache_id] = matching
+        return matching
+
+    def _persisted_matching_hosts(self, condition_id: Tuple, hostlist: Any, tags: Dict,
+                                  rule_path: str) -> Set[HostName]:
+        """Returns the hosts matching the condition out of all configured hosts
+
+        Only the hosts which have been changed since the results have been persisted
+        are evaluated again."""
+        assert self._matching_hosts_cache is not None
+        hosts_in_folder = self.get_hosts_within_folder(rule_path, with_foreign_hosts=True)
+
+        cached = self._matching_hosts_cache.get(condition_id)
+        if cached is None:
+            matching = self._compute_matching_hosts(hosts_in_folder, hostlist, tags, {})
+        else:
+            matching, hosts_to_check = cached
+            if not hosts_to_check:
+                return matching
+            matching = matching.union(
+                self._compute_matching_hosts(hosts_to_check.intersection(hosts_in_folder), hostlist,
+                                             tags, {}))
+
+        self._matching_hosts_cache.set(condition_id, matching)
+        return matching
+
+    def _compute_matching_hosts(self, valid_hosts: Set[HostName], hostlist: Any, tags: Dict,
+                                labels: Dict) -> Set[HostName]:
         if tags and hostlist is None and not labels:
             # TODO: Labels could also be optimized like the tags
-            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tags)
+            matched_by_tags = self._match_hosts_by_tags(valid_hosts, tags)
             if matched_by_tags is not None:
                 return matched_by_tags
 
@@ -499,7 +609,6 @@ class RulesetOptimizer:
 
                 matching.add(hostname)
 
-        self._all_matching_hosts_match_cache[cache_id] = matching
         return matching
 
     def matches_host_name(self, host_entries, hostname):
@@ -530,24 +639,14 @@ class RulesetOptimizer:
         return True
 
     def _condition_cache_id(self, hostlist, tags, labels, rule_path):
-        host_parts: List[str] = []
-
-        if hostlist is not None:
-            negate, hostlist = parse_negated_condition_list(hostlist)
-            if negate:
-                host_parts.append("!")
-
-            for h in hostlist:
-                if isinstance(h, dict):
-                    if "$regex" not in h:
-                        raise NotImplementedError()
-                    host_parts.append("~%s" % h["$regex"])
-                    continue
-
-                host_parts.append(h)
+        if hostlist is None:
+            # No host restriction. Needs to differ from the empty host list, which matches nothing.
+            host_parts_id = None
+        else:
+            host_parts_id = tuple(sorted(self._host_parts(hostlist)))
 
         return (
-            tuple(sorted(host_parts)),
+            host_parts_id,
             tuple(
                 (tag_id, _tags_or_labels_cache_id(tag_spec)) for tag_id, tag_spec in tags.items()),
             tuple((label_id, _tags_or_labels_cache_id(label_spec))
@@ -555,9 +654,26 @@ class RulesetOptimizer:
             rule_path,
         )
 
+    def _host_parts(self, hostlist) -> List[str]:
+        host_parts: List[str] = []
+        negate, hostlist = parse_negated_condition_list(hostlist)
+        if negate:
+            host_parts.append("!")
+
+        for h in hostlist:
+            if isinstance(h, dict):
+                if "$regex" not in h:
+                    raise NotImplementedError()
+                host_parts.append("~%s" % h["$regex"])
+                continue
+
+            host_parts.append(h)
+
+        return host_parts
+
     # TODO: Generalize this optimization: Build some kind of key out of the tag conditions
     # (positive, negative, ...). Make it work with the new tag group based "$or" handling.
-    def _match_hosts_by_tags(self, cache_id, valid_hosts, tags):
+    def _match_hosts_by_tags(self, valid_hosts, tags):
         matching = set()
         negative_match_tags = set()
         positive_match_tags = set()
@@ -586,8 +702,6 @@ class RulesetOptimizer:
                 if not positive_match_tags - host_tags:
                     if not negative_match_tags.intersection(host_tags):
                         matching.add(hostname)
-
-            self._all_matching_hosts_match_cache[cache_id] = matching
             return matching
 
         # With shared folders
@@ -603,8 +717,6 @@ class RulesetOptimizer:
             if not positive_match_tags - tags:
                 if not negative_match_tags.intersection(tags):
                     matching.update(hosts_with_same_tag)
-
-        self._all_matching_hosts_match_cache[cache_id] = matching
         return matching
 
     def _filter_hosts_with_same_tags_as_host(self, hostname, hosts):
@@ -643,6 +755,143 @@ class RulesetOptimizer:
             self._hosts_grouped_by_tags.setdefault(group_ref, set()).add(hostname)
             self._host_grouped_ref[hostname] = group_ref
 
+    def _host_fingerprints(self) -> Dict[HostName, Tuple]:
+        """Everything besides the host name the host conditions (without labels) depend on"""
+        fingerprints: Dict[HostName, Tuple] = {}
+        for hostname in self._all_configured_hosts:
+            fingerprints[hostname] = (tuple(sorted(self._host_tag_lists[hostname])),
+                                      self._host_paths.get(hostname, "/"))
+        return fingerprints
+
+
+class CompiledServiceRuleset:
+    """A preprocessed service ruleset together with an index of its service conditions
+
+    Most service patterns start with some literal text, like "Interface " or "Filesystem /var".
+    The rules are indexed by these prefixes, which makes it possible to find the few rules whose
+    pattern may match a service description with some dictionary lookups instead of executing
+    the regexes of all rules.
+    """
+    def __init__(self, rules: PreprocessedServiceRuleset,
+                 rule_prefixes: List[Optional[Set[str]]]) -> None:
+        super(CompiledServiceRuleset, self).__init__()
+        self.rules = rules
+
+        # Rules which need to be checked for every service description
+        self._unindexed_rules: Set[int] = set()
+        self._rules_by_prefix: Dict[str, Set[int]] = {}
+        for rule_nr, prefixes in enumerate(rule_prefixes):
+            if prefixes is None:
+                self._unindexed_rules.add(rule_nr)
+                continue
+            for prefix in prefixes:
+                self._rules_by_prefix.setdefault(prefix, set()).add(rule_nr)
+
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._rules_by_prefix})
+
+    def candidates(self, service_description: ServiceName) -> Set[int]:
+        """Returns the numbers of the rules whose pattern may match the service description"""
+        if not self._rules_by_prefix:
+            return self._unindexed_rules
+
+        candidates = set(self._unindexed_rules)
+        for length in self._prefix_lengths:
+            if length > len(service_description):
+                break
+            candidates.update(self._rules_by_prefix.get(service_description[:length], ()))
+        return candidates
+
+
+class MatchingHostsCache:
+    """Persists the hosts matching host conditions of rules across processes
+
+    Computing the matching hosts of all rules takes several seconds in large setups.
+    The result only depends on the condition and on the names, tags and folders of
+    the hosts. The results are stored together with a fingerprint of every host.
+    When loading the results, the hosts whose fingerprint changed are removed from
+    the results and only these hosts have to be evaluated again. Conditions of rules
+    which have been changed have a different condition ID and are computed from
+    scratch.
+    """
+    _VERSION = 1
+
+    def __init__(self, path: Path, host_fingerprints: Dict[HostName, Tuple]) -> None:
+        super(MatchingHostsCache, self).__init__()
+        self._path = path
+        self._host_fingerprints = host_fingerprints
+
+        self._matching_hosts: Dict[Tuple, Set[HostName]] = {}
+        # Hosts which are new or have a changed fingerprint
+        self._outdated_hosts: Set[HostName] = set()
+        # Hosts which can not be part of the persisted results anymore
+        self._invalid_hosts: Set[HostName] = set()
+        # Conditions whose results are up to date with the current host fingerprints
+        self._up_to_date: Set[Tuple] = set()
+        self._changed = False
+
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with self._path.open("rb") as f:
+                version, host_fingerprints, matching_hosts = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            self._changed = True
+            return
+
+        if version != self._VERSION:
+            self._changed = True
+            return
+
+        self._outdated_hosts = {
+            hostname for hostname, fingerprint in self._host_fingerprints.items()
+            if host_fingerprints.get(hostname) != fingerprint
+        }
+        self._invalid_hosts = self._outdated_hosts.union(
+            set(host_fingerprints).difference(self._host_fingerprints))
+        self._matching_hosts = matching_hosts
+        self._changed = bool(self._invalid_hosts)
+
+    def get(self, condition_id: Tuple) -> Optional[Tuple[Set[HostName], Set[HostName]]]:
+        """Returns the known matching hosts and the hosts that need to be evaluated again"""
+        matching = self._matching_hosts.get(condition_id)
+        if matching is None:
+            return None
+
+        if condition_id in self._up_to_date or not self._invalid_hosts:
+            return matching, set()
+
+        return matching.difference(self._invalid_hosts), self._outdated_hosts
+
+    def set(self, condition_id: Tuple, matching: Set[HostName]) -> None:
+        self._matching_hosts[condition_id] = matching
+        self._up_to_date.add(condition_id)
+        self._changed = True
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+
+        if self._outdated_hosts:
+            # Results of conditions not used by this process lack the outdated hosts
+            matching_hosts = {
+                condition_id: hosts
+                for condition_id, hosts in self._matching_hosts.items()
+                if condition_id in self._up_to_date
+            }
+        else:
+            matching_hosts = {
+                condition_id: hosts.difference(self._invalid_hosts)
+                for condition_id, hosts in self._matching_hosts.items()
+            }
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.parent / (self._path.name + ".new")
+        with tmp_path.open("wb") as f:
+            marshal.dump((self._VERSION, self._host_fingerprints, matching_hosts), f)
+        tmp_path.rename(self._path)
+        self._changed = False
+
 
 def _tags_or_labels_cache_id(tag_or_label_spec):
     if isinstance(tag_or_label_spec, dict):
@@ -702,6 +951,37 @@ def matches_labels(object_labels, required_labels) -> bool:
     return True
 
 
+def _pattern_parts(patterns: List) -> List[str]:
+    return [p["$regex"] if isinstance(p, dict) else p for p in patterns]
+
+
+_REGEX_SPECIAL_CHARS = frozenset(".^$*+?{}[]\\|()")
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Returns the literal text every string matched by the pattern starts with
+
+    >>> _literal_prefix("Interface 1$")
+    'Interface 1'
+    >>> _literal_prefix("Filesystems?/var")
+    'Filesystem'
+    >>> _literal_prefix("CPU|Memory")
+    ''
+    """
+    if "|" in pattern:
+        # Top level alternatives would need a real regex parser. Don't optimize them.
+        return ""
+
+    prefix: List[str] = []
+    for char in pattern:
+        if char in _REGEX_SPECIAL_CHARS:
+            if char in "*?{" and prefix:
+                prefix.pop()  # The quantifier makes the previous character optional
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+
 def parse_negated_condition_list(entries):
     negate = False
     if isinstance(entries, dict) and "$nor" in entries:
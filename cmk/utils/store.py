@@ -12,6 +12,7 @@ from contextlib import contextmanager
 import errno
 import fcntl
 import logging
+import marshal
 import os
 from pathlib import Path
 import pprint
@@ -184,10 +185,23 @@ def save_to_mk_file(path: Union[Path, str],
 # directly read via file/open and then parsed using eval.
 # TODO: Consolidate with load_mk_file?
 def load_object_from_file(path: Union[Path, str], default: Any = None, lock: bool = False) -> Any:
-    content = cast(str, _load_data_from_file(path, lock=lock, encoding="utf-8"))
+    """Loads a python data structure written by save_object_to_file()
+
+    Both, the repr() and the binary format are detected automatically."""
+    content = cast(bytes, _load_data_from_file(path, lock=lock))
     if not content:
         return default
-    return ast.literal_eval(content)
+
+    if content.startswith(_BINARY_OBJECT_MAGIC):
+        return marshal.loads(memoryview(content)[len(_BINARY_OBJECT_MAGIC):])
+
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if lock:
+            release_lock(path)
+        raise MKGeneralException(_("Cannot read file \"%s\": %s") % (path, e))
+    return ast.literal_eval(text)
 
 
 def load_text_from_file(path: Union[Path, str], default: str = u"", lock: bool = False) -> str:
@@ -238,9 +252,27 @@ def _load_data_from_file(path: Union[Path, str],
         raise MKGeneralException(_("Cannot read file \"%s\": %s") % (path, e))
 
 
+# Header of the files written by save_object_to_file() in the binary format. A repr() can
+# not start with a NUL byte, so both formats can be distinguished while loading.
+_BINARY_OBJECT_MAGIC = b"\x00CMKOBJ1\n"
+
+
 # A simple wrapper for cases where you want to store a python data
 # structure that is then read by load_data_from_file() again
-def save_object_to_file(path: Union[Path, str], data: Any, pretty: bool = False) -> None:
+def save_object_to_file(path: Union[Path, str],
+                        data: Any,
+                        pretty: bool = False,
+                        binary: bool = False) -> None:
+    """Saves a python data structure to a file
+
+    The data is written using repr() by default, which keeps the file human readable. The binary
+    format (marshal) is much faster to load and save, especially for large files. It supports
+    the same data types as the repr() format (no subclasses of them, like OrderedDict).
+    """
+    if binary:
+        save_bytes_to_file(path, _BINARY_OBJECT_MAGIC + marshal.dumps(data))
+        return
+
     if pretty:
         try:
             formatted_data = pprint.pformat(data)
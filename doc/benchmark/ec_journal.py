@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measures saving and loading the status of the Event Console
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. python3 doc/benchmark/ec_journal.py [--repr] [NUM_EVENTS...]
+
+For each number of events (default: 10000, 100000 and 500000) the following is
+measured with the StatusJournal:
+
+    snapshot: Save the status with all events
+    append:   Save the changes of a typical save interval: 100 new, 100 updated and
+              100 deleted events (mean of 10 saves)
+    load:     Load the snapshot and replay the 10 appended changes
+
+With --repr the former format (repr() of the status, parsed with literal_eval()) is
+measured as well. This takes a lot of time and memory with many events.
+"""
+
+import argparse
+import ast
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cmk.ec.journal import StatusJournal
+
+NUM_SAVES = 10
+NUM_CHANGES = 100
+
+logger = logging.getLogger("cmk.mkeventd")
+
+
+def make_event(event_id):
+    return {
+        "id": event_id,
+        "count": 1,
+        "text": "Message %d from some application" % event_id,
+        "phase": "open",
+        "host": "host%d" % (event_id % 1000),
+        "core_host": "host%d" % (event_id % 1000),
+        "rule_id": "rule%d" % (event_id % 100),
+        "time": 1600000000.0 + event_id,
+        "first": 1600000000.0 + event_id,
+        "last": 1600000000.0 + event_id,
+        "priority": 3,
+        "facility": 1,
+        "state": 2,
+        "sl": 0,
+        "application": "app",
+        "pid": 0,
+        "comment": "",
+        "owner": "",
+        "contact": "",
+        "match_groups": ("a", "b"),
+        "ipaddress": "10.0.0.1",
+        "host_in_downtime": False,
+    }
+
+
+def make_status(num_events):
+    return {
+        "next_event_id": num_events + 1,
+        "events": [make_event(event_id) for event_id in range(1, num_events + 1)],
+        "rule_stats": {"rule%d" % num: num_events // 100 for num in range(100)},
+        "interval_starts": {},
+    }
+
+
+def change_status(status, events, changes):
+    """Add, update and delete some events like the event server does between two saves"""
+    for _nr in range(NUM_CHANGES):
+        event = make_event(status["next_event_id"])
+        status["next_event_id"] += 1
+        events[event["id"]] = event
+        changes[event["id"]] = event
+
+    event_ids = list(events)
+    for event_id in event_ids[:NUM_CHANGES]:
+        del events[event_id]
+        changes[event_id] = None
+    for event_id in event_ids[NUM_CHANGES:2 * NUM_CHANGES]:
+        events[event_id]["count"] += 1
+        changes[event_id] = events[event_id]
+    status["events"] = list(events.values())
+
+
+def measure_journal(path, num_events):
+    status = make_status(num_events)
+    events = {event["id"]: event for event in status["events"]}
+    journal = StatusJournal(path, logger)
+
+    before = time.perf_counter()
+    journal.save(status, {})
+    snapshot_duration = time.perf_counter() - before
+
+    append_duration = 0.0
+    for _nr in range(NUM_SAVES):
+        changes = {}
+        change_status(status, events, changes)
+        before = time.perf_counter()
+        journal.save(status, changes)
+        append_duration += time.perf_counter() - before
+
+    before = time.perf_counter()
+    loaded = StatusJournal(path, logger).load()
+    load_duration = time.perf_counter() - before
+
+    if loaded is None or loaded["events"] != status["events"]:
+        raise Exception("Loaded status differs")
+    return snapshot_duration, append_duration / NUM_SAVES, load_duration
+
+
+def measure_repr(path, num_events):
+    status = make_status(num_events)
+
+    before = time.perf_counter()
+    with path.open("w", encoding="utf-8") as f:
+        f.write(repr(status) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    save_duration = time.perf_counter() - before
+
+    before = time.perf_counter()
+    loaded = ast.literal_eval(path.read_text(encoding="utf-8"))
+    load_duration = time.perf_counter() - before
+
+    if len(loaded["events"]) != num_events:
+        raise Exception("Loaded status differs")
+    return save_duration, load_duration
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repr", action="store_true", help="Measure the former format as well")
+    parser.add_argument("num_events", nargs="*", type=int, default=[10000, 100000, 500000])
+    options = parser.parse_args(args)
+
+    tmp_dir = tempfile.mkdtemp(prefix="ec_journal_bench_")
+    try:
+        print("%10s %-8s %10s %10s %10s" % ("events", "format", "snapshot", "append", "load"))
+        for num_events in options.num_events:
+            path = Path(tmp_dir, "status_%d" % num_events)
+            snapshot_duration, append_duration, load_duration = measure_journal(path, num_events)
+            print("%10d %-8s %8.3f s %8.3f s %8.3f s" %
+                  (num_events, "journal", snapshot_duration, append_duration, load_duration))
+
+            if options.repr:
+                save_duration, load_duration = measure_repr(path.with_suffix(".repr"), num_events)
+                print("%10d %-8s %8.3f s %10s %8.3f s" %
+                      (num_events, "repr", save_duration, "", load_duration))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measures loading and saving the item states (counters) of a host
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. python3 doc/benchmark/item_state.py [NUM_INTERFACES...]
+
+The host has two counters per interface. Each round loads the item states, updates the
+counters of a tenth of the interfaces (changed) or of all of them (all changed) and saves
+them again, like a check of the host does. The mean time of a round is shown for
+
+    repr:    The former format, a repr() of all item states parsed with literal_eval()
+    binary:  The binary per host file (counters_dir/<host>)
+    sharded: The site wide sharded database (counter_shards_dir, item_state_shards)
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import cmk.utils.paths
+import cmk.utils.store as store
+
+from cmk.base import item_state
+
+HOSTNAME = "heute"
+ROUNDS = 20
+NUM_SHARDS = 16
+
+
+def interface_counters(num_interfaces, this_time, step=1):
+    counters = {}
+    for num in range(0, num_interfaces, step):
+        counters[("if", "%d" % num, "in_octets")] = (this_time, num * 1000.0)
+        counters[("if", "%d" % num, "out_octets")] = (this_time, num * 2000.0)
+    return counters
+
+
+def repr_round(counters):
+    path = cmk.utils.paths.counters_dir + "/" + HOSTNAME
+    try:
+        item_states = store.load_object_from_file(path, default={}, lock=True)
+        item_states.update(counters)
+        store.save_object_to_file(path, item_states)
+    finally:
+        store.release_lock(path)
+
+
+def binary_round(counters, db=None):
+    states = item_state.CachedItemStates()
+    states.load(HOSTNAME, db)
+    for key, value in counters.items():
+        states.set_item_state_prefix(key[:-1])
+        states.set_item_state(key[-1], value)
+    states.save(HOSTNAME)
+
+
+def measure(function, num_interfaces, step, *args):
+    function(interface_counters(num_interfaces, 0), *args)
+    before = time.perf_counter()
+    for this_time in range(1, ROUNDS + 1):
+        function(interface_counters(num_interfaces, this_time, step), *args)
+    return (time.perf_counter() - before) / ROUNDS
+
+
+def main(args):
+    sizes = [int(arg) for arg in args] or [100, 1000, 5000]
+
+    print("%10s %-8s %12s %12s" % ("interfaces", "format", "changed", "all changed"))
+    for num_interfaces in sizes:
+        for title in ["repr", "binary", "sharded"]:
+            durations = []
+            for step in (10, 1):
+                base_dir = tempfile.mkdtemp(prefix="item_state_bench_")
+                try:
+                    cmk.utils.paths.counters_dir = base_dir
+                    if title == "repr":
+                        durations.append(measure(repr_round, num_interfaces, step))
+                    elif title == "binary":
+                        durations.append(measure(binary_round, num_interfaces, step))
+                    else:
+                        db = item_state.ShardedItemStateDB(base_dir + "/shards", NUM_SHARDS)
+                        durations.append(measure(binary_round, num_interfaces, step, db))
+                finally:
+                    shutil.rmtree(base_dir)
+            print("%10d %-8s %9.3f ms %9.3f ms" %
+                  (num_interfaces, title, durations[0] * 1000, durations[1] * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
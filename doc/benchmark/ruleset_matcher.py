@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compares the service ruleset matching of the RulesetMatcher with plain regex matching
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. python3 doc/benchmark/ruleset_matcher.py [NUM_SERVICES] [NUM_RULES]
+
+The host has NUM_SERVICES interface and NUM_SERVICES filesystem services, the ruleset
+NUM_RULES rules for each of them. Three ways to compute the matching values of all
+services of one host are timed:
+
+    per service regex: The regex of each rule is executed for each service
+    per service:       RulesetMatcher.get_service_ruleset_values() for each service
+    batch:             RulesetMatcher.get_service_ruleset_values_of_services()
+"""
+
+import re
+import sys
+import time
+
+from cmk.utils.rulesets.ruleset_matcher import RulesetMatcher, RulesetMatchObject
+
+HOSTNAMES = ["host%d" % num for num in range(10)]
+
+
+def make_ruleset(num_rules):
+    interface_rules = [{
+        "value": "interface_%d" % num,
+        "condition": {
+            "host_name": HOSTNAMES[num % 2::2],
+            "service_description": [{
+                "$regex": "Interface %d$" % num
+            }, {
+                "$regex": "Interface 1%d$" % num
+            }],
+        },
+        "options": {},
+    } for num in range(num_rules)]
+    filesystem_rules = [{
+        "value": "filesystem_%d" % num,
+        "condition": {
+            "host_name": HOSTNAMES,
+            "service_description": [{
+                "$regex": "Filesystem /srv/%d" % num
+            }],
+        },
+        "options": {},
+    } for num in range(num_rules)]
+    return interface_rules + filesystem_rules
+
+
+def make_matcher():
+    return RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists={hostname: set() for hostname in HOSTNAMES},
+        host_paths={},
+        labels=None,
+        all_configured_hosts=set(HOSTNAMES),
+        clusters_of={},
+        nodes_of={},
+    )
+
+
+def per_service_regex(ruleset, hostname, service_descriptions):
+    patterns = [
+        re.compile("(?:%s)" % "|".join("(?:%s)" % p["$regex"]
+                                       for p in rule["condition"]["service_description"]))
+        for rule in ruleset
+    ]
+    return [[
+        rule["value"]
+        for rule, pattern in zip(ruleset, patterns)
+        if hostname in rule["condition"]["host_name"] and pattern.match(service_description)
+    ]
+            for service_description in service_descriptions]
+
+
+def per_service(ruleset, hostname, service_descriptions):
+    matcher = make_matcher()
+    result = []
+    for service_description in service_descriptions:
+        match_object = RulesetMatchObject(host_name=hostname,
+                                          service_description=service_description)
+        result.append(
+            list(matcher.get_service_ruleset_values(match_object, ruleset, is_binary=False)))
+    return result
+
+
+def batch(ruleset, hostname, service_descriptions):
+    matcher = make_matcher()
+    return matcher.get_service_ruleset_values_of_services(
+        hostname,
+        [
+            RulesetMatchObject(host_name=hostname, service_description=service_description)
+            for service_description in service_descriptions
+        ],
+        ruleset,
+        is_binary=False,
+    )
+
+
+def main(args):
+    num_services = int(args[0]) if args else 1000
+    num_rules = int(args[1]) if len(args) > 1 else 100
+
+    service_descriptions = ["Interface %d" % num for num in range(num_services)]
+    service_descriptions += ["Filesystem /srv/%d" % num for num in range(num_services)]
+    ruleset = make_ruleset(num_rules)
+
+    print("%d services, %d rules" % (len(service_descriptions), len(ruleset)))
+    expected_result = None
+    for title, function in [
+        ("per service regex", per_service_regex),
+        ("per service", per_service),
+        ("batch", batch),
+    ]:
+        before = time.perf_counter()
+        result = function(ruleset, "host1", service_descriptions)
+        print("%-20s %8.3f sec" % (title, time.perf_counter() - before))
+
+        if expected_result is None:
+            expected_result = result
+        elif result != expected_result:
+            raise Exception("%s: Different result" % title)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compares the repr() and the binary format of save_object_to_file()
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. python3 doc/benchmark/store.py [FILE...]
+
+Saves and loads data like a large autochecks file (interface services) and a large
+hosts.mk (hosts with tags, labels and IP addresses) in both formats. The data is
+generated for different sizes. Files written by save_object_to_file(), e.g. real
+autochecks files, can be given as arguments to measure their content as well.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cmk.utils.store as store
+
+ROUNDS = 3
+
+
+def autochecks_data(num_services):
+    return [{
+        "check_plugin_name": "if64",
+        "item": "%d" % num,
+        "parameters": {
+            "state": ["1"],
+            "speed": 1000000000
+        },
+        "service_labels": {
+            "cmk/interface": "ethernet"
+        },
+    } for num in range(num_services)]
+
+
+def hosts_mk_data(num_hosts):
+    hostnames = ["host%05d" % num for num in range(num_hosts)]
+    return {
+        "all_hosts": hostnames,
+        "host_tags": {
+            hostname: {
+                "site": "heute",
+                "address_family": "ip-v4-only",
+                "ip-v4": "ip-v4",
+                "agent": "cmk-agent",
+                "tcp": "tcp",
+                "snmp_ds": "no-snmp",
+                "piggyback": "auto-piggyback",
+                "criticality": "prod",
+                "networking": "lan",
+            } for hostname in hostnames
+        },
+        "host_labels": {hostname: {
+            "os": "linux"
+        } for hostname in hostnames},
+        "ipaddresses": {
+            hostname: "10.%d.%d.%d" % (num // 65536, num // 256 % 256, num % 256)
+            for num, hostname in enumerate(hostnames)
+        },
+    }
+
+
+def measure(path, data, binary):
+    """Returns the mean save and load time and the file size"""
+    save_duration, load_duration = 0.0, 0.0
+    for _round in range(ROUNDS):
+        before = time.perf_counter()
+        store.save_object_to_file(path, data, binary=binary)
+        save_duration += time.perf_counter() - before
+
+        before = time.perf_counter()
+        loaded = store.load_object_from_file(path)
+        load_duration += time.perf_counter() - before
+        if loaded != data:
+            raise Exception("%s: Different data loaded" % path)
+    return save_duration / ROUNDS, load_duration / ROUNDS, os.stat(path).st_size
+
+
+def main(args):
+    datasets = [("autochecks %d" % num, autochecks_data(num)) for num in (1000, 10000, 50000)]
+    datasets += [("hosts.mk %d" % num, hosts_mk_data(num)) for num in (1000, 10000, 50000)]
+    datasets += [(os.path.basename(path), store.load_object_from_file(path)) for path in args]
+
+    tmp_dir = tempfile.mkdtemp(prefix="store_bench_")
+    try:
+        print("%-20s %-7s %10s %10s %10s" % ("data", "format", "save", "load", "size"))
+        for title, data in datasets:
+            for binary in (False, True):
+                save_duration, load_duration, size = measure(os.path.join(tmp_dir, "data"), data,
+                                                             binary)
+                print("%-20s %-7s %7.1f ms %7.1f ms %7d kB" %
+                      (title, "binary" if binary else "repr", save_duration * 1000,
+                       load_duration * 1000, size // 1024))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -93,6 +93,8 @@ def fake_version_and_paths():
     monkeypatch.setattr("cmk.utils.paths.tmp_dir", os.path.join(tmp_dir, "tmp/check_mk"))
     monkeypatch.setattr("cmk.utils.paths.counters_dir",
                         os.path.join(tmp_dir, "tmp/check_mk/counters"))
+    monkeypatch.setattr("cmk.utils.paths.counter_shards_dir",
+                        os.path.join(tmp_dir, "tmp/check_mk/counter_shards"))
     monkeypatch.setattr("cmk.utils.paths.tcp_cache_dir", os.path.join(tmp_dir,
                                                                       "tmp/check_mk/cache"))
     monkeypatch.setattr("cmk.utils.paths.data_source_cache_dir",
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""A minimal SNMP agent for testing the native SNMP backend"""
+
+# pylint: disable=protected-access
+
+import hmac
+import socket
+import threading
+
+from Cryptodome.Cipher import AES, DES
+
+import cmk.fetchers.snmp_backend._ber as ber
+import cmk.fetchers.snmp_backend.native as native
+
+MIB = {
+    ".1.3.6.1.2.1.1.1.0": (ber.OCTET_STRING, b"Linux switch"),
+    ".1.3.6.1.2.1.1.2.0": (ber.OBJECT_IDENTIFIER, bytes.fromhex("2b060104018f65")),
+    ".1.3.6.1.2.1.1.3.0": (ber.TIMETICKS, b"\x00\xff\xff\xff\xff"),
+    ".1.3.6.1.2.1.2.2.1.1.1": (ber.INTEGER, b"\x01"),
+    ".1.3.6.1.2.1.2.2.1.1.2": (ber.INTEGER, b"\x02"),
+    ".1.3.6.1.2.1.2.2.1.1.10": (ber.INTEGER, b"\x0a"),
+    ".1.3.6.1.2.1.2.2.1.2.1": (ber.OCTET_STRING, b"lo"),
+    ".1.3.6.1.2.1.2.2.1.2.2": (ber.OCTET_STRING, b"eth0"),
+    ".1.3.6.1.2.1.2.2.1.2.10": (ber.OCTET_STRING, b"\xb2\xe0},M\x15"),
+    ".1.3.6.1.2.1.2.2.1.10.1": (ber.COUNTER32, b"\xff\xff\xff\xff"),
+    ".1.3.6.1.2.1.4.20.1.1.127.0.0.1": (ber.IP_ADDRESS, b"\x7f\x00\x00\x01"),
+}
+
+ENGINE_ID = b"\x80\x00\x1f\x88\x80test-engine"
+ENGINE_BOOTS = 7
+ENGINE_TIME = 1234
+
+
+def _oid_key(oid):
+    return tuple(int(arc) for arc in oid.strip(".").split("."))
+
+
+class Agent:
+    """A stand-in for an SNMP agent serving MIB"""
+    def __init__(self, users=None):
+        self.users = users or {}
+        self.drop_requests = 0
+        self.send_stale_responses = False
+        self.max_response_varbinds = 0
+        self.requests = []
+        self.peers = set()
+        self._sorted_oids = sorted(MIB, key=_oid_key)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._socket.close()
+
+    def _serve(self):
+        while True:
+            try:
+                data, peer = self._socket.recvfrom(65535)
+            except OSError:
+                return
+            self.peers.add(peer)
+            if self.drop_requests:
+                self.drop_requests -= 1
+                continue
+            response = self._handle(data)
+            if response is not None:
+                self._socket.sendto(response, peer)
+
+    def _handle(self, data):
+        _tag, start, end = ber.decode_tlv(data, 0, len(data))
+        elements = ber.decode_sequence(data, start, end)
+        version = ber.decode_integer(data[elements[0][1]:elements[0][2]])
+        if version == 3:
+            return self._handle_v3(data, elements)
+
+        _tag, cs, ce = elements[1]
+        if data[cs:ce] != b"public":
+            return None
+        pdu = ber.decode_pdu(data, *elements[2])
+        self.requests.append((version, pdu.tag))
+        response = self._respond(version, pdu)
+        encoded = ber.encode_sequence(ber.encode_integer(version),
+                                      ber.encode_octet_string(b"public"), ber.encode_pdu(response))
+        if self.send_stale_responses:
+            stale = response._replace(
+                request_id=pdu.request_id - 1,
+                varbinds=[ber.VarBind(".1.3.6.1.2.1.1.1.0", ber.OCTET_STRING, b"stale")])
+            self._socket.sendto(
+                ber.encode_sequence(ber.encode_integer(version), ber.encode_octet_string(b"public"),
+                                    ber.encode_pdu(stale)), next(iter(self.peers)))
+        return encoded
+
+    def _next(self, oid):
+        for candidate in self._sorted_oids:
+            if _oid_key(candidate) > _oid_key(oid):
+                return candidate
+        return None
+
+    def _respond(self, version, pdu):
+        varbinds = []
+        if pdu.tag == ber.GET_BULK_REQUEST:
+            oids = [varbind.oid for varbind in pdu.varbinds]
+            for _repetition in range(pdu.error_index):
+                ended = True
+                for index, oid in enumerate(oids):
+                    next_oid = self._next(oid)
+                    if next_oid is None:
+                        varbinds.append(ber.VarBind(oid, ber.END_OF_MIB_VIEW, b""))
+                        continue
+                    ended = False
+                    oids[index] = next_oid
+                    varbinds.append(ber.VarBind(next_oid, *MIB[next_oid]))
+                if ended:
+                    break
+            if self.max_response_varbinds and len(varbinds) > self.max_response_varbinds:
+                return ber.PDU(ber.GET_RESPONSE, pdu.request_id, 1, 0, [])
+        else:
+            for index, varbind in enumerate(pdu.varbinds, 1):
+                oid = varbind.oid if pdu.tag == ber.GET_REQUEST else self._next(varbind.oid)
+                if oid not in MIB:
+                    if version == 0:
+                        return pdu._replace(tag=ber.GET_RESPONSE, error_status=2, error_index=index)
+                    tag = ber.NO_SUCH_OBJECT if pdu.tag == ber.GET_REQUEST else ber.END_OF_MIB_VIEW
+                    varbinds.append(ber.VarBind(varbind.oid, tag, b""))
+                else:
+                    varbinds.append(ber.VarBind(oid, *MIB[oid]))
+        return ber.PDU(ber.GET_RESPONSE, pdu.request_id, 0, 0, varbinds)
+
+    def _handle_v3(self, data, elements):
+        _tag, hs, he = elements[1]
+        (_t, is_, ie), _size, (_t, fs, _fe), _model = ber.decode_sequence(data, hs, he)
+        msg_id = ber.decode_integer(data[is_:ie])
+        flags = data[fs]
+        _tag, ss, se = elements[2]
+        _tag, ss, se = ber.decode_tlv(data, ss, se)
+        ((_t, es, ee), (_t, bs, be), (_t, ts, te), (_t, us, ue), (_t, as_, ae),
+         (_t, ps, pe)) = ber.decode_sequence(data, ss, se)
+        if data[es:ee] != ENGINE_ID:
+            return self._encode_v3(
+                msg_id, 0, b"", 0, None,
+                ber.PDU(ber.REPORT, 0, 0, 0,
+                        [ber.VarBind(".1.3.6.1.6.3.15.1.1.4.0", ber.COUNTER32, b"\x01")]))
+
+        user = self.users[data[us:ue]]
+        auth_key = native._password_to_key(native._AUTH_PROTOCOLS[user["auth"]],
+                                           user["auth_password"], ENGINE_ID)
+        mac = hmac.new(auth_key, data[:as_] + bytes(ae - as_) + data[ae:],
+                       native._AUTH_PROTOCOLS[user["auth"]].hash_function).digest()
+        if not flags & 0x01 or data[as_:ae] != mac[:ae - as_]:
+            return None
+
+        _tag, ss, se = elements[3]
+        scoped_pdu = data
+        if flags & 0x02:
+            boots = ber.decode_integer(data[bs:be])
+            engine_time = ber.decode_integer(data[ts:te])
+            scoped_pdu = self._cipher(user, data[ps:pe], boots, engine_time).decrypt(data[ss:se])
+            _tag, ss, se = ber.decode_tlv(scoped_pdu, 0, len(scoped_pdu))
+        _engine, (_t, cs, ce), pdu_element = ber.decode_sequence(scoped_pdu, ss, se)
+        pdu = ber.decode_pdu(scoped_pdu, *pdu_element)
+        self.requests.append((3, pdu.tag, scoped_pdu[cs:ce]))
+        return self._encode_v3(msg_id, flags, data[us:ue], auth_key, user, self._respond(3, pdu))
+
+    @staticmethod
+    def _cipher(user, priv_params, boots, engine_time):
+        priv_key = native._password_to_key(native._AUTH_PROTOCOLS[user["auth"]],
+                                           user["priv_password"], ENGINE_ID)
+        if user["priv"] == "DES":
+            iv = bytes(a ^ b for a, b in zip(priv_key[8:16], priv_params))
+            return DES.new(priv_key[:8], DES.MODE_CBC, iv)
+        iv = boots.to_bytes(4, "big") + engine_time.to_bytes(4, "big") + priv_params
+        return AES.new(priv_key[:16], AES.MODE_CFB, iv, segment_size=128)
+
+    def _encode_v3(self, msg_id, flags, user_name, auth_key, user, pdu):
+        scoped_pdu = ber.encode_sequence(ber.encode_octet_string(ENGINE_ID),
+                                         ber.encode_octet_string(b""), ber.encode_pdu(pdu))
+        priv_params = b""
+        if flags & 0x02:
+            priv_params = b"12345678"
+            padded = scoped_pdu + bytes(-len(scoped_pdu) % 8)
+            scoped_pdu = ber.encode_octet_string(
+                self._cipher(user, priv_params, ENGINE_BOOTS, ENGINE_TIME).encrypt(padded))
+        mac_length = native._AUTH_PROTOCOLS[user["auth"]].mac_length if flags & 0x01 else 0
+
+        def encode(auth_params):
+            return ber.encode_sequence(
+                ber.encode_integer(3),
+                ber.encode_sequence(ber.encode_integer(msg_id), ber.encode_integer(65507),
+                                    ber.encode_octet_string(bytes((flags & 0x03,))),
+                                    ber.encode_integer(3)),
+                ber.encode_octet_string(
+                    ber.encode_sequence(ber.encode_octet_string(ENGINE_ID),
+                                        ber.encode_integer(ENGINE_BOOTS),
+                                        ber.encode_integer(ENGINE_TIME),
+                                        ber.encode_octet_string(user_name),
+                                        ber.encode_octet_string(auth_params),
+                                        ber.encode_octet_string(priv_params))),
+                scoped_pdu,
+            )
+
+        message = encode(bytes(mac_length))
+        if mac_length:
+            mac = hmac.new(auth_key, message, native._AUTH_PROTOCOLS[user["auth"]].hash_function)
+            message = encode(mac.digest()[:mac_length])
+        return message
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import cmk.base.api.agent_based.item_index as item_index
+
+SECTION = [
+    {
+        "name": "eth0",
+        "alias": "uplink"
+    },
+    {
+        "name": "eth1",
+        "alias": "uplink"
+    },
+    {
+        "name": "lo",
+        "alias": ""
+    },
+]
+
+
+def _item_keys(entry):
+    return [entry["name"], entry["alias"]]
+
+
+def test_lookup():
+    index = item_index.get_item_index(SECTION, _item_keys)
+
+    assert index.lookup("eth1") == [SECTION[1]]
+    assert index.lookup("uplink") == SECTION[:2]
+    assert index.lookup("lo", "eth0", "eth0") == [SECTION[0], SECTION[2]]
+    assert index.lookup("eth2") == []
+
+
+def test_index_per_check_cycle():
+    # No caching outside of the check cycle
+    assert item_index.get_item_index(SECTION, _item_keys) is not item_index.get_item_index(
+        SECTION, _item_keys)
+
+    with item_index.check_cycle():
+        index = item_index.get_item_index(SECTION, _item_keys)
+        assert item_index.get_item_index(SECTION, _item_keys) is index
+        assert item_index.get_item_index(list(SECTION), _item_keys) is not index
+        assert item_index.get_item_index(SECTION, lambda e: [e["name"]]) is not index
+
+    with item_index.check_cycle():
+        assert item_index.get_item_index(SECTION, _item_keys) is not index
+
+
+def test_cached_indexes_are_limited():
+    with item_index.check_cycle():
+        sections = [list(SECTION) for _ in range(item_index._MAX_CACHED_INDEXES + 1)]
+        indexes = [item_index.get_item_index(section, _item_keys) for section in sections]
+
+        assert item_index.get_item_index(sections[-1], _item_keys) is indexes[-1]
+        assert item_index.get_item_index(sections[0], _item_keys) is not indexes[0]
@@ -9,6 +9,7 @@
 import logging
 import os
 import time
+import tracemalloc
 from pathlib import Path
 
 import pytest  # type: ignore[import]
@@ -166,6 +167,90 @@ class TestParser:
             SectionName("section"): (1000, 1050, [["first", "line"], ["second", "line"]]),
         }
 
+    @pytest.mark.usefixtures("scenario")
+    def test_selected_sections(self, hostname, store, logger, monkeypatch):
+        time_time = 1000
+        monkeypatch.setattr(time, "time", lambda: time_time)
+
+        raw_data = b"\n".join((
+            b"<<<check_mk>>>",
+            b"Version: 1.7.0",
+            b"<<<a_section>>>",
+            b"first line",
+            b"<<<ps>>>",
+            b"(root,1,1,0.0/0.0) /sbin/init",
+            b"<<<persisted:persist(%i)>>>" % (time_time + 50),
+            b"first line",
+            b"<<<<piggyback>>>>",
+            b"<<<ps>>>",
+            b"(root,1,1,0.0/0.0) /sbin/init",
+            b"<<<<>>>>",
+            b"second line",
+        ))
+
+        parser = AgentParser(
+            hostname,
+            store,
+            False,
+            logger,
+            selected_sections={SectionName("a_section")},
+        )
+        ahs = parser.parse(raw_data)
+
+        assert ahs.sections == {
+            SectionName("check_mk"): [["Version:", "1.7.0"]],
+            SectionName("a_section"): [["first", "line"]],
+            SectionName("persisted"): [["first", "line"], ["second", "line"]],
+        }
+        assert ahs.piggybacked_raw_data == {
+            "piggyback": [
+                b"<<<ps:cached(1000,90)>>>",
+                b"(root,1,1,0.0/0.0) /sbin/init",
+            ],
+        }
+        assert parser.skipped_sections == {SectionName("ps")}
+
+    @pytest.mark.usefixtures("scenario")
+    def test_selected_sections_perf(self, hostname, store, logger):
+        raw_data = b"\n".join([
+            b"<<<check_mk>>>",
+            b"Version: 1.7.0",
+            b"<<<mem>>>",
+            b"MemTotal:       16307664 kB",
+            b"<<<ps_lnx>>>",
+        ] + [
+            b"(root,225948,9684,00:00:03/05:05:29,%d) /usr/sbin/apache2 -k start" % num
+            for num in range(10000)
+        ] + [
+            b"<<<logwatch>>>",
+            b"[[[/var/log/syslog]]]",
+        ] + [
+            b"W Oct 18 10:00:00 heute kernel: [%d] device eth0 entered promiscuous mode" % num
+            for num in range(10000)
+        ])
+
+        results = {}
+        for selected_sections in (None, {SectionName("mem")}):
+            parser = AgentParser(hostname, store, False, logger, selected_sections)
+
+            before = time.time()
+            parser.parse(raw_data)
+            duration = time.time() - before
+
+            tracemalloc.start()
+            try:
+                parser.parse(raw_data)
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            results[selected_sections is None] = duration, peak_memory
+
+        duration_all, peak_memory_all = results[True]
+        duration_selected, peak_memory_selected = results[False]
+        assert duration_selected < duration_all / 10
+        assert peak_memory_selected < peak_memory_all / 10
+
     @pytest.mark.parametrize(
         "headerline, section_name, section_options",
         [
@@ -269,3 +354,67 @@ class TestAgentSummaryResult:
     @pytest.mark.usefixtures("scenario")
     def test_with_MKTimeout_exception(self, source):
         assert source.summarize(result.Error(MKTimeout())) == (2, "(!!)", [])
+
+
+class TestSelectedRawSections:
+    @pytest.fixture
+    def hostname(self):
+        return "testhost"
+
+    @pytest.fixture
+    def scenario(self, hostname, monkeypatch):
+        ts = Scenario()
+        ts.add_host(hostname)
+        ts.apply(monkeypatch)
+        monkeypatch.setattr(
+            ABCHostSections,
+            "add_persisted_sections",
+            lambda *args, **kwargs: None,
+        )
+        return ts
+
+    @pytest.fixture
+    def raw_data(self):
+        return result.OK(b"\n".join((
+            b"<<<check_mk>>>",
+            b"Version: 2.0.0",
+            b"<<<df>>>",
+            b"/dev/sda1 100 50",
+            b"<<<lnx_if>>>",
+            b"eth0 1 2 3",
+            b"<<<mem>>>",
+            b"MemTotal: 1 kB",
+        )) + b"\n")
+
+    def _source(self, hostname, mode):
+        source = StubSource(
+            hostname,
+            "1.2.3.4",
+            mode=mode,
+            source_type=SourceType.HOST,
+            id_="agent_id",
+            cpu_tracking_id="agent_cpu_id",
+            description="agent description",
+        )
+        # The values (the section plugins) are not relevant for the parser
+        source.selected_raw_sections = {SectionName("df"): None}  # type: ignore[dict-item]
+        return source
+
+    @pytest.mark.usefixtures("scenario")
+    def test_checking_skips_unselected_sections(self, hostname, raw_data):
+        source = self._source(hostname, Mode.CHECKING)
+
+        host_sections = source.parse(raw_data).ok
+
+        assert set(host_sections.sections) == {SectionName("check_mk"), SectionName("df")}
+        assert source.skipped_raw_sections == {SectionName("lnx_if"), SectionName("mem")}
+
+    @pytest.mark.usefixtures("scenario")
+    @pytest.mark.parametrize("mode", [Mode.DISCOVERY, Mode.INVENTORY])
+    def test_other_modes_parse_all_sections(self, hostname, raw_data, mode):
+        source = self._source(hostname, mode)
+
+        host_sections = source.parse(raw_data).ok
+
+        assert len(host_sections.sections) == 4
+        assert not source.skipped_raw_sections
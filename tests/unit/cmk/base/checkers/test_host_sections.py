@@ -7,6 +7,8 @@
 # pylint: disable=protected-access
 
 import collections
+import socketserver
+import threading
 
 import pytest  # type: ignore[import]
 
@@ -29,8 +31,10 @@ import cmk.base.config as config
 import cmk.base.ip_lookup as ip_lookup
 from cmk.base.checkers import (
     _checkers,
+    parsed_sections_cache,
     ABCHostSections,
     ABCSource,
+    fetch_concurrently,
     make_nodes,
     make_sources,
     Mode,
@@ -330,6 +334,35 @@ def test_parse_sections_unsuperseded(monkeypatch):
     assert mhs.get_parsed_section(host_key, ParsedSectionName("parsed")) is not None
 
 
+def test_parsed_sections_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsed_sections_cache, "_MIN_PARSE_TIME", 0)
+    parsed_string_tables = []
+
+    def parse_function(string_table):
+        parsed_string_tables.append(string_table)
+        return {"lines": len(string_table)}
+
+    section = _TestSection(SectionName("one"), ParsedSectionName("parsed"), parse_function, set())
+    monkeypatch.setattr(agent_based_register._config, "get_section_plugin",
+                        {section.name: section}.get)
+    host_key = HostKey("node1", "127.0.0.1", SourceType.HOST)
+
+    def get_parsed_section(string_table, max_age=60):
+        # Every run of a mode has its own sections
+        mhs = MultiHostSections(
+            {host_key: AgentHostSections(sections={section.name: string_table})})
+        mhs.parsed_sections_cache = parsed_sections_cache.ParsedSectionsCache(tmp_path, max_age)
+        return mhs.get_parsed_section(host_key, ParsedSectionName("parsed"))
+
+    assert get_parsed_section(NODE_1) == {"lines": 2}
+    assert get_parsed_section(NODE_1) == {"lines": 2}
+    assert parsed_string_tables == [NODE_1]
+
+    assert get_parsed_section(NODE_1 + NODE_2) == {"lines": 4}
+    assert get_parsed_section(NODE_1 + NODE_2, max_age=-1) == {"lines": 4}
+    assert parsed_string_tables == [NODE_1, NODE_1 + NODE_2, NODE_1 + NODE_2]
+
+
 def test_parse_sections_superseded(monkeypatch):
 
     host_key, mhs = _get_host_section_for_parse_sections_test()
@@ -858,3 +891,54 @@ def test_get_host_sections_cluster(mode, monkeypatch, mocker):
         assert not section.cache_info
         assert not section.piggybacked_raw_data
         assert not section.persisted_sections
+
+
+@pytest.fixture(name="agent_port")
+def _agent_port():
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.sendall(b"<<<check_mk>>>\nVersion: 2.0.0\n<<<uptime>>>\n42\n")
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_concurrently(monkeypatch, agent_port):
+    ipaddress = "127.0.0.1"
+    hostnames = ["host%d" % i for i in range(5)]
+    ts = Scenario()
+    for hostname in hostnames:
+        ts.add_host(hostname, ipaddress=ipaddress)
+    config_cache = ts.apply(monkeypatch)
+
+    host_sources = {}
+    for hostname in hostnames:
+        source = TCPSource(hostname, ipaddress, mode=Mode.DISCOVERY)
+        source.port = agent_port
+        host_sources[hostname] = (config_cache.get_host_config(hostname), [source])
+
+    fetched = dict(
+        fetch_concurrently(
+            host_sources.values(),
+            max_cachefile_age=0,
+            selected_raw_sections=None,
+        ))
+    assert sorted(fetched) == hostnames
+
+    for hostname, (host_config, sources) in host_sources.items():
+        mhs = MultiHostSections()
+        update_host_sections(
+            mhs,
+            make_nodes(config_cache, host_config, ipaddress, Mode.DISCOVERY, sources),
+            max_cachefile_age=0,
+            selected_raw_sections=None,
+            host_config=host_config,
+            fetcher_messages=fetched[hostname],
+        )
+        assert mhs[HostKey(hostname, ipaddress, SourceType.HOST)].sections == {
+            SectionName("check_mk"): [["Version:", "2.0.0"]],
+            SectionName("uptime"): [["42"]],
+        }
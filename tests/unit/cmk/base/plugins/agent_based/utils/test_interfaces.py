@@ -1430,3 +1430,16 @@ def test_cluster_check(monkeypatch, value_store):
             ifaces,
         ))
     assert result_cluster_check == result_check_multiple_interfaces
+
+
+@pytest.mark.parametrize('item', [
+    '1', '01', '001', '6', '0', '00', '', 'lo', 'lo 1', 'docker0', 'docker0 2', 'wlp2s0 6',
+    'wlp2s0 5', 'Lo', '7'
+])
+def test_matching_interfaces(item):
+    section = _create_interfaces(0)
+    section.append(interfaces.Interface('0', 'null', 'wlp2s0', '6'))
+    assert interfaces._matching_interfaces(item, section) == [
+        iface for iface in section
+        if interfaces.item_matches(item, iface.index, iface.alias, iface.descr)
+    ]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+
+import cmk.base.backup as backup
+
+
+@pytest.fixture(name="site_paths")
+def fixture_site_paths(monkeypatch, tmp_path):
+    for name in [
+            "main_config_file",
+            "final_config_file",
+            "check_mk_config_dir",
+            "autochecks_dir",
+            "counters_dir",
+            "counter_shards_dir",
+            "tcp_cache_dir",
+            "logwatch_dir",
+    ]:
+        monkeypatch.setattr(cmk.utils.paths, name, str(tmp_path / "site" / name))
+    return tmp_path / "site"
+
+
+def test_backup_and_restore_counter_shards(site_paths, tmp_path):
+    shard = site_paths / "counter_shards_dir" / "16" / "0001"
+    shard.parent.mkdir(parents=True)
+    shard.write_bytes(b"shard")
+    (site_paths / "main_config_file").write_text(u"all_hosts = []\n")
+
+    backup.do_backup(str(tmp_path / "backup.tar.gz"))
+    shard.write_bytes(b"changed")
+    backup.do_restore(str(tmp_path / "backup.tar.gz"))
+
+    assert shard.read_bytes() == b"shard"
+    # Not backed up, because they did not exist
+    assert not list((site_paths / "counters_dir").iterdir())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import socket
+import sys
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.type_defs import ConfigSerial
+
+import cmk.base.check_helpers as check_helpers
+
+
+def test_current_serial_without_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "core_helper_config_dir", tmp_path)
+    assert check_helpers.current_serial() == ConfigSerial("")
+
+
+def test_current_serial(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "core_helper_config_dir", tmp_path)
+    (tmp_path / "13").mkdir()
+    (tmp_path / "latest").symlink_to("13")
+    assert check_helpers.current_serial() == ConfigSerial("13")
+
+
+def test_parse_request():
+    assert check_helpers.parse_request(b"heute\n") == "heute"
+
+
+@pytest.mark.parametrize("request_", [b"", b"\n", b"../etc/passwd\n", b"a\nb\n"])
+def test_parse_invalid_request(request_):
+    with pytest.raises(MKGeneralException):
+        check_helpers.parse_request(request_)
+
+
+def test_format_response():
+    response = check_helpers.format_response(2, u"CRIT - dääng\n")
+    assert response == b"2\nCRIT - d\xc3\xa4\xc3\xa4ng\n"
+
+
+def test_handle_connection(monkeypatch):
+    def _check_host(hostname):
+        sys.stdout.write("OK - Checked %s\n" % hostname)
+        return 0
+
+    monkeypatch.setattr(check_helpers, "check_host", _check_host)
+
+    server, client = socket.socketpair()
+    with client:
+        client.sendall(b"heute\n")
+        check_helpers._CheckHelper(server, timeout=10)._handle_connection(server)
+        assert client.recv(1024) == b"0\nOK - Checked heute\n"
+
+
+def test_handle_connection_invalid_request():
+    server, client = socket.socketpair()
+    with client:
+        client.sendall(b"../etc/passwd\n")
+        check_helpers._CheckHelper(server, timeout=10)._handle_connection(server)
+        assert client.recv(1024).startswith(b"3\nUNKNOWN - Check helper error: ")
@@ -6,12 +6,22 @@
 
 # pylint: disable=protected-access
 
+import os
+
 # No stub file
 import pytest  # type: ignore[import]
+from testlib.base import Scenario  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.type_defs import CheckPluginName
+
 import cmk.base.core
 import cmk.base.config
 import cmk.base.checking
+import cmk.base.item_state
 from cmk.base.api.agent_based.checking_classes import Result, State as state, Metric
+from cmk.base.check_utils import Service
+from cmk.base.checkers.host_sections import MultiHostSections
 
 
 @pytest.mark.parametrize(
@@ -215,3 +225,108 @@ def _check_timeperiod(timeperiod, active_timeperiods):
 ])
 def test_aggregate_result(subresults, aggregated_results):
     assert cmk.base.checking._aggregate_results(subresults) == aggregated_results
+
+
+def test_execute_checks_in_workers(monkeypatch):
+    config_cache = Scenario().add_host("heute").apply(monkeypatch)
+    monkeypatch.setattr(cmk.base.config, "check_worker_processes", 3)
+    monkeypatch.setattr(cmk.base.config, "check_worker_min_services", 2)
+    monkeypatch.setattr(cmk.base.item_state, "_cached_item_states",
+                        cmk.base.item_state.CachedItemStates())
+    cmk.base.item_state.set_item_state_prefix("test_plugin", "removed")
+    cmk.base.item_state.set_item_state("pid", 0)
+    cmk.base.item_state.pop_modified_item_states()
+
+    def get_aggregated_result(multi_host_sections, host_config, ipaddress, service, plugin,
+                              params_function):
+        cmk.base.item_state.set_item_state_prefix(str(service.check_plugin_name), service.item)
+        if service.item == "removed":
+            cmk.base.item_state.clear_item_state("pid")
+        else:
+            cmk.base.item_state.set_item_state("pid", os.getpid())
+        return True, service.item != "pending", (0, "Item %s" % service.item, [])
+
+    submitted = []
+    monkeypatch.setattr(cmk.base.checking, "get_aggregated_result", get_aggregated_result)
+    monkeypatch.setattr(
+        cmk.base.checking, "_submit_check_result",
+        lambda hostname, description, result, cache_info: submitted.append((description, result)))
+
+    items = ["%d" % i for i in range(20)] + ["removed", "pending"]
+    services = [
+        Service(CheckPluginName("test_plugin"), item, "Test %s" % item, {}) for item in items
+    ]
+    results = list(
+        cmk.base.checking._execute_checks(
+            MultiHostSections(),
+            config_cache.get_host_config("heute"),
+            "127.0.0.1",
+            services,
+        ))
+
+    assert results == [(service, service.item != "pending") for service in services]
+    assert submitted == [("Test %s" % item, (0, "Item %s" % item, [])) for item in items]
+
+    item_states = cmk.base.item_state.get_all_item_states()
+    assert sorted(item_states) == sorted(
+        ("test_plugin", item, "pid") for item in items if item != "removed")
+    assert os.getpid() not in item_states.values()
+    modified = cmk.base.item_state.pop_modified_item_states()
+    assert modified[("test_plugin", "removed")] == ({}, {"pid"})
+    assert len(modified) == len(items)
+
+
+def test_check_result_buffer_batches():
+    read_fd, write_fd = os.pipe()
+    try:
+        buf = cmk.base.checking._CheckResultBuffer(max_write_size=10)
+        for record in [b"aaaa\n", b"bbbb\n", b"cccc\n", b"d" * 20 + b"\n"]:
+            buf.add(record)
+        assert len(buf) == 4
+        assert buf.is_due(max_size=10, max_delay=60)
+        assert not buf.is_due(max_size=100, max_delay=60)
+
+        buf.write(write_fd)
+
+        assert not buf
+        assert os.read(read_fd, 100) == b"aaaa\nbbbb\ncccc\n" + b"d" * 20 + b"\n"
+        assert (buf.results, buf.writes, buf.bytes) == (4, 3, 36)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_submit_via_check_result_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "check_result_path", str(tmp_path))
+    monkeypatch.setattr(cmk.base.checking, "_checkresult_file_buffer",
+                        cmk.base.checking._CheckResultBuffer())
+    monkeypatch.setattr(cmk.base.config, "check_submission_max_delay", 60)
+
+    cmk.base.checking._submit_via_check_result_file("heute", "Service 1", 0, "OK - 1")
+    cmk.base.checking._submit_via_check_result_file("heute", "Service 2", 1, "WARN - 2\nline")
+    assert not list(tmp_path.iterdir())
+
+    cmk.base.checking._flush_check_results()
+    cmk.base.checking._close_checkresult_file()
+
+    result_file, = (p for p in tmp_path.iterdir() if not p.name.endswith(".ok"))
+    content = result_file.read_text()
+    assert "service_description=Service 1\n" in content
+    assert "output=WARN - 2\\nline\n" in content
+    assert tmp_path.joinpath(result_file.name + ".ok").exists()
+    assert cmk.base.checking._checkresult_file_buffer.writes == 1
+
+
+def test_reset_submission_counters(monkeypatch):
+    buf = cmk.base.checking._CheckResultBuffer()
+    monkeypatch.setattr(cmk.base.checking, "_checkresult_file_buffer", buf)
+    buf.results, buf.writes, buf.bytes, buf.blocked_time = 2, 1, 100, 0.5
+
+    cmk.base.checking._reset_submission_counters()
+
+    assert cmk.base.checking.get_submission_counters() == {
+        "results": 0,
+        "writes": 0,
+        "bytes": 0,
+        "blocked_time": 0.0,
+    }
@@ -1555,6 +1555,30 @@ def test_config_cache_contactgroups_of_service(monkeypatch, hostname, result):
     assert config_cache.contactgroups_of_service(hostname, "CPU load") == result
 
 
+def test_config_cache_groups_of_services(monkeypatch):
+    ts = Scenario().add_host("testhost")
+    ts.set_ruleset("service_groups", [
+        ("dingdong", [], ["testhost"], ["CPU load$"], {}),
+        ("if", [], ["testhost"], ["Interface "], {}),
+    ])
+    ts.set_ruleset("service_contactgroups", [
+        ("admins", [], ["testhost"], ["Interface 1$"], {}),
+    ])
+    config_cache = ts.apply(monkeypatch)
+
+    descriptions = ["CPU load", "Interface 1", "Interface 2", "Uptime"]
+    assert config_cache.servicegroups_of_services("testhost", descriptions) == {
+        "CPU load": ["dingdong"],
+        "Interface 1": ["if"],
+        "Interface 2": ["if"],
+        "Uptime": [],
+    }
+    assert config_cache.contactgroups_of_services("testhost", descriptions) == {
+        description: config_cache.contactgroups_of_service("testhost", description)
+        for description in descriptions
+    }
+
+
 @pytest.mark.parametrize("hostname,result", [
     ("testhost1", "24X7"),
     ("testhost2", "workhours"),
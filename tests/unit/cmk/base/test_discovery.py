@@ -6,6 +6,11 @@
 
 # pylint: disable=redefined-outer-name,protected-access
 
+import os
+import signal
+import time
+from pathlib import Path
+
 import pytest  # type: ignore[import]
 from typing import Dict, Set, NamedTuple, Counter, Tuple
 
@@ -13,6 +18,7 @@ from typing import Dict, Set, NamedTuple, Counter, Tuple
 from testlib.base import Scenario  # type: ignore[import]
 from testlib.debug_utils import cmk_debug_enabled  # type: ignore[import]
 
+import cmk.utils.paths
 from cmk.utils.type_defs import CheckPluginName, SectionName, SourceType
 from cmk.utils.labels import DiscoveredHostLabelsStore
 
@@ -943,6 +949,104 @@ def test_do_discovery(monkeypatch):
     assert store.load() == _expected_host_labels
 
 
+def _fake_discover_on_host(config_cache, host_config, mode, use_caches, service_filters, on_error):
+    if host_config.hostname == "slow-host":
+        time.sleep(60)
+    counts = discovery._empty_counts()
+    counts["self_new"] = os.getpid()
+    return counts, None
+
+
+@pytest.mark.parametrize("worker_processes", [1, 2])
+def test_discover_on_hosts(monkeypatch, worker_processes):
+    ts = Scenario()
+    for hostname in ["host1", "host2", "host3"]:
+        ts.add_host(hostname)
+    config_cache = ts.apply(monkeypatch)
+    monkeypatch.setattr(config, "discovery_worker_processes", worker_processes)
+    monkeypatch.setattr(discovery, "discover_on_host", _fake_discover_on_host)
+
+    results = list(
+        discovery.discover_on_hosts(config_cache, ["host1", "host2", "host3"], "new", True,
+                                    (None, None)))
+
+    assert sorted(hostname for hostname, _counts, _error in results) == ["host1", "host2", "host3"]
+    assert all(error is None for _hostname, _counts, error in results)
+    pids = {counts["self_new"] for _hostname, counts, _error in results}
+    if worker_processes == 1:
+        assert pids == {os.getpid()}
+    else:
+        assert os.getpid() not in pids
+
+
+def test_discover_on_hosts_timeout(monkeypatch):
+    ts = Scenario()
+    for hostname in ["host", "slow-host"]:
+        ts.add_host(hostname)
+    config_cache = ts.apply(monkeypatch)
+    monkeypatch.setattr(config, "discovery_worker_processes", 2)
+    monkeypatch.setattr(config, "discovery_host_timeout", 1)
+    monkeypatch.setattr(discovery, "discover_on_host", _fake_discover_on_host)
+
+    def fast_discovery_timeout(timeout):
+        signal.signal(signal.SIGALRM, discovery._handle_discovery_timeout)
+        signal.setitimer(signal.ITIMER_REAL, 0.2)
+
+    monkeypatch.setattr(discovery, "_set_discovery_timeout", fast_discovery_timeout)
+
+    results = {
+        hostname: error for hostname, _counts, error in discovery.discover_on_hosts(
+            config_cache, ["host", "slow-host"], "new", True, (None, None))
+    }
+
+    assert results == {"host": None, "slow-host": "Timed out after 1 seconds"}
+
+
+def test_discover_on_host_refresh_timeout_keeps_autochecks(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "autochecks_dir", str(tmp_path))
+    Path(tmp_path, "host.mk").write_text(
+        "[\n  {'check_plugin_name': 'df', 'item': '/', 'parameters': {}, 'service_labels': {}},\n]\n"
+    )
+    ts = Scenario().add_host("host", ipaddress="127.0.0.1")
+    config_cache = ts.apply(monkeypatch)
+
+    def timeout(*args, **kwargs):
+        raise discovery.DiscoveryTimeout()
+
+    monkeypatch.setattr(discovery.checkers, "update_host_sections", timeout)
+
+    with pytest.raises(discovery.DiscoveryTimeout):
+        discovery.discover_on_host(config_cache, config_cache.get_host_config("host"), "refresh",
+                                   True, (None, None))
+
+    services = autochecks.parse_autochecks_file("host", config.service_description)
+    assert [(s.check_plugin_name, s.item) for s in services] == [(CheckPluginName("df"), "/")]
+
+
+def test_deferred_discovery_timeout():
+    with pytest.raises(discovery.DiscoveryTimeout):
+        with discovery._deferred_discovery_timeout():
+            discovery._handle_discovery_timeout(signal.SIGALRM, None)
+            done = True
+    assert done
+
+    with discovery._deferred_discovery_timeout():
+        pass
+
+
+def test_discover_on_hosts_groups_clusters_with_nodes(monkeypatch):
+    ts = Scenario()
+    for hostname in ["node1", "node2", "host"]:
+        ts.add_host(hostname)
+    ts.add_cluster("cluster", nodes=["node1", "node2"])
+    config_cache = ts.apply(monkeypatch)
+
+    assert discovery._group_by_autochecks_files([
+        config_cache.get_host_config(hostname)
+        for hostname in ["node1", "host", "cluster", "node2"]
+    ]) == [["node1", "cluster", "node2"], ["host"]]
+
+
 RealHostScenario = NamedTuple("RealHostScenario", [
     ("hostname", str),
     ("ipaddress", str),
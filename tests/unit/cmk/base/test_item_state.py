@@ -4,9 +4,15 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-# pylint: disable=protected-access
+# pylint: disable=protected-access,redefined-outer-name
+import marshal
+import multiprocessing
+import os
+
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+
 from cmk.base import item_state
 
 
@@ -68,3 +74,287 @@ def test_get_average(ini_zero, backlog_min, timeseries):
             initialize_zero=ini_zero,
         )
         assert avg == expected_average, "at [%r]: got %r expected %r" % (idx, avg, expected_average)
+
+
+@pytest.fixture
+def counters_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "counters_dir", str(tmp_path))
+    return tmp_path
+
+
+def _interface_counters(num_interfaces, this_time):
+    return {
+        ("if", "%d" % num, "in_octets"): (this_time, num * 1000.0) for num in range(num_interfaces)
+    }
+
+
+def _saved_item_states(hostname, item_states):
+    states = item_state.CachedItemStates()
+    states.load(hostname)
+    for key, value in item_states.items():
+        states.set_item_state_prefix(key[:-1])
+        states.set_item_state(key[-1], value)
+    states.save(hostname)
+
+
+def _loaded_item_states(hostname):
+    states = item_state.CachedItemStates()
+    states.load(hostname)
+    return states.get_all_item_states()
+
+
+def test_save_and_load(counters_dir):
+    _saved_item_states("heute", {("uptime", None, "uptime"): (1, 2.0)})
+    assert (counters_dir / "heute").read_bytes().startswith(item_state._FILE_MAGIC)
+    assert _loaded_item_states("heute") == {("uptime", None, "uptime"): (1, 2.0)}
+
+
+def test_save_appends_modifications(counters_dir):
+    _saved_item_states("heute", _interface_counters(100, 0))
+    size = (counters_dir / "heute").stat().st_size
+
+    # Some other process changing the item states in the meantime
+    states = item_state.CachedItemStates()
+    states.load("heute")
+    _saved_item_states("heute", {("uptime", None, "uptime"): (1, 2.0)})
+
+    states.remove_full_key(("if", "0", "in_octets"))
+    states.set_item_state_prefix(("if", "1"))
+    states.set_item_state("in_octets", (60, 1.0))
+    states.save("heute")
+
+    assert size < (counters_dir / "heute").stat().st_size < 2 * size
+
+    expected_item_states = _interface_counters(100, 0)
+    del expected_item_states[("if", "0", "in_octets")]
+    expected_item_states[("if", "1", "in_octets")] = (60, 1.0)
+    expected_item_states[("uptime", None, "uptime")] = (1, 2.0)
+    assert _loaded_item_states("heute") == expected_item_states
+
+
+def test_save_rewrites_grown_file(counters_dir):
+    _saved_item_states("heute", _interface_counters(100, 0))
+    size = (counters_dir / "heute").stat().st_size
+
+    for this_time in range(1, 4):
+        _saved_item_states("heute", _interface_counters(100, this_time))
+        assert (counters_dir / "heute").stat().st_size <= 2 * size
+
+    assert _loaded_item_states("heute") == _interface_counters(100, 3)
+
+
+def test_save_appends_modified_services_only(counters_dir):
+    _saved_item_states("heute", _interface_counters(100, 0))
+    snapshot = (counters_dir / "heute").read_bytes()
+
+    states = item_state.CachedItemStates()
+    states.load("heute")
+    states.set_item_state_prefix(("if", "1"))
+    states.set_item_state("out_octets", (60, 2.0))
+    states.set_item_state_prefix(("if", "2"))
+    states.clear_item_state("in_octets")
+    states.save("heute")
+
+    appended = (counters_dir / "heute").read_bytes()[len(snapshot):]
+    assert marshal.loads(appended[item_state._FRAME_HEADER.size:]) == (
+        {
+            ("if", "1", "in_octets"): (0, 1000.0),
+            ("if", "1", "out_octets"): (60, 2.0),
+        },
+        [("if", "2", "in_octets")],
+    )
+
+
+def test_service_item_states():
+    states = item_state.CachedItemStates()
+    states.set_item_state_prefix(("if", "1"))
+    states.set_item_state("in_octets", (0, 1.0))
+    states.set_item_state("out_octets", (0, 2.0))
+    states.set_item_state_prefix(("if", "2"))
+    states.set_item_state("in_octets", (0, 3.0))
+
+    assert states.get_service_item_states() == {"in_octets": (0, 3.0)}
+    states.set_item_state_prefix(("if", "1"))
+    assert states.get_service_item_states() == {"in_octets": (0, 1.0), "out_octets": (0, 2.0)}
+
+    states.remove_full_key(("if", "2", "in_octets"))
+    assert states.get_all_item_states() == {
+        ("if", "1", "in_octets"): (0, 1.0),
+        ("if", "1", "out_octets"): (0, 2.0),
+    }
+
+
+def test_load_ignores_incomplete_frame(counters_dir):
+    _saved_item_states("heute", {("uptime", None, "uptime"): (1, 2.0)})
+    frame = item_state._encode_frame({("uptime", None, "uptime"): (2, 3.0)}, [])
+    with (counters_dir / "heute").open("ab") as f:
+        f.write(frame[:-1])
+
+    assert _loaded_item_states("heute") == {("uptime", None, "uptime"): (1, 2.0)}
+
+
+def test_save_after_incomplete_frame(counters_dir):
+    _saved_item_states("heute", _interface_counters(10, 0))
+    path = counters_dir / "heute"
+    complete_size = path.stat().st_size
+    frame = item_state._encode_frame({("if", "0", "in_octets"): (1, 0.0)}, [])
+    with path.open("ab") as f:
+        f.write(frame[:-1])
+
+    # Both appended after cutting off the incomplete frame
+    _saved_item_states("heute", {("if", "1", "in_octets"): (2, 1.0)})
+    _saved_item_states("heute", {("if", "2", "in_octets"): (3, 2.0)})
+    assert path.read_bytes()[complete_size:complete_size + len(frame)] != frame[:-1]
+
+    expected_item_states = _interface_counters(10, 0)
+    expected_item_states[("if", "1", "in_octets")] = (2, 1.0)
+    expected_item_states[("if", "2", "in_octets")] = (3, 2.0)
+    assert _loaded_item_states("heute") == expected_item_states
+
+
+def test_migrate_legacy_format(counters_dir):
+    (counters_dir / "heute").write_text(u"%r\n" % {("uptime", None, "uptime"): (1, 2.0)})
+    assert _loaded_item_states("heute") == {("uptime", None, "uptime"): (1, 2.0)}
+
+    _saved_item_states("heute", {("cpu", None, "util"): (1, 0.5)})
+    assert (counters_dir / "heute").read_bytes().startswith(item_state._FILE_MAGIC)
+    assert _loaded_item_states("heute") == {
+        ("uptime", None, "uptime"): (1, 2.0),
+        ("cpu", None, "util"): (1, 0.5),
+    }
+
+
+def test_load_binary_format_without_literal_eval(monkeypatch, counters_dir):
+    _saved_item_states("heute", _interface_counters(5000, 0))
+
+    def literal_eval(_content):
+        raise AssertionError("literal_eval() used for the binary format")
+
+    monkeypatch.setattr(item_state.ast, "literal_eval", literal_eval)
+    assert _loaded_item_states("heute") == _interface_counters(5000, 0)
+
+
+@pytest.fixture
+def item_state_db(tmp_path):
+    return item_state.ShardedItemStateDB(str(tmp_path / "shards"), 4)
+
+
+def test_item_state_db_save_and_load(item_state_db):
+    assert item_state_db.load("heute") is None
+
+    item_state_db.save("heute", _interface_counters(3, 0), [])
+    item_state_db.save("morgen", {("uptime", None, "uptime"): (1, 2.0)}, [])
+    item_state_db.save("heute", {("if", "1", "in_octets"): (60, 1.0)}, [("if", "2", "in_octets")])
+
+    assert item_state_db.load("heute") == {
+        ("if", "0", "in_octets"): (0, 0.0),
+        ("if", "1", "in_octets"): (60, 1.0),
+    }
+    assert item_state_db.load("morgen") == {("uptime", None, "uptime"): (1, 2.0)}
+
+    item_state_db.remove("heute")
+    assert item_state_db.load("heute") is None
+
+
+def test_item_state_db_load_decodes_only_host(monkeypatch, item_state_db):
+    hostnames = ["host%d" % num for num in range(20)]
+    for hostname in hostnames:
+        item_state_db.save(hostname, {("uptime", None, "uptime"): (1, 2.0)}, [])
+
+    loads = []
+    real_loads = item_state.marshal.loads
+
+    def counting_loads(data):
+        loads.append(data)
+        return real_loads(data)
+
+    monkeypatch.setattr(item_state.marshal, "loads", counting_loads)
+    assert item_state_db.load("host0") == {("uptime", None, "uptime"): (1, 2.0)}
+    assert len(loads) == 1
+
+
+def test_item_state_db_remove_unknown_host(item_state_db):
+    item_state_db.save("heute", _interface_counters(3, 0), [])
+    shard_path = item_state_db.shard_path("heute")
+    size = os.stat(shard_path).st_size
+
+    for hostname in ["morgen", "gestern", "uebermorgen"]:
+        item_state_db.remove(hostname)
+
+    assert os.stat(shard_path).st_size == size
+
+
+def test_item_state_db_rename(item_state_db):
+    item_state_db.save("heute", _interface_counters(3, 0), [])
+    item_state_db.save("morgen", {("uptime", None, "uptime"): (1, 2.0)}, [])
+
+    assert item_state_db.rename("heute", "morgen")
+
+    assert item_state_db.load("heute") is None
+    assert item_state_db.load("morgen") == _interface_counters(3, 0)
+    assert not item_state_db.rename("heute", "gestern")
+    assert item_state_db.load("gestern") is None
+
+
+def test_item_state_db_migrate_shards(tmp_path):
+    db = item_state.ShardedItemStateDB(str(tmp_path / "shards"), 4)
+    hostnames = ["host%d" % num for num in range(20)]
+    for num, hostname in enumerate(hostnames):
+        db.save(hostname, {("uptime", None, "uptime"): (num, 2.0)}, [])
+    db.remove("host0")
+
+    db = item_state.ShardedItemStateDB(str(tmp_path / "shards"), 7)
+
+    assert sorted(os.listdir(str(tmp_path / "shards"))) == ["7", "migrate.lock"]
+    assert db.load("host0") is None
+    for num, hostname in enumerate(hostnames[1:], 1):
+        assert db.load(hostname) == {("uptime", None, "uptime"): (num, 2.0)}
+
+
+def test_item_state_db_compaction(monkeypatch, item_state_db):
+    monkeypatch.setattr(item_state.ShardedItemStateDB, "_MIN_COMPACTION_SIZE", 0)
+    shard_path = item_state_db.shard_path("heute")
+
+    item_state_db.save("heute", _interface_counters(100, 0), [])
+    size = os.stat(shard_path).st_size
+    for this_time in range(1, 5):
+        item_state_db.save("heute", _interface_counters(100, this_time), [])
+        assert os.stat(shard_path).st_size <= 2 * size
+
+    assert item_state_db.load("heute") == _interface_counters(100, 4)
+
+
+def _save_counters(db, hostname):
+    for this_time in range(50):
+        db.save(hostname, {("cpu", None, "util"): (this_time, 1.0)}, [])
+
+
+def test_item_state_db_concurrent_writers(monkeypatch, tmp_path):
+    monkeypatch.setattr(item_state.ShardedItemStateDB, "_MIN_COMPACTION_SIZE", 0)
+    db = item_state.ShardedItemStateDB(str(tmp_path / "shards"), 1)
+    hostnames = ["host%d" % num for num in range(4)]
+
+    processes = [
+        multiprocessing.Process(target=_save_counters, args=(db, hostname))
+        for hostname in hostnames
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    for hostname in hostnames:
+        assert db.load(hostname) == {("cpu", None, "util"): (49, 1.0)}
+
+
+def test_item_state_db_migrate_host_file(counters_dir, item_state_db):
+    _saved_item_states("heute", {("uptime", None, "uptime"): (1, 2.0)})
+
+    states = item_state.CachedItemStates()
+    states.load("heute", item_state_db)
+    assert states.get_all_item_states() == {("uptime", None, "uptime"): (1, 2.0)}
+    states.save("heute")
+
+    assert not (counters_dir / "heute").exists()
+    assert item_state_db.load("heute") == {("uptime", None, "uptime"): (1, 2.0)}
@@ -16,6 +16,7 @@ from testlib import CMKEventConsole
 import cmk.utils.paths
 import cmk.ec.history
 import cmk.ec.main
+import cmk.ec.query
 import cmk.ec.export as ec
 
 
@@ -147,3 +148,163 @@ def test_mkevent_check_query_perf(config, event_status, status_server):
     assert "event_id" in response[0]
 
     assert duration < 0.2
+
+
+@pytest.mark.parametrize("query, expected_ids", [
+    (b"Filter: event_host = heute-1\n", [2]),
+    (b"Filter: event_host in heute-1 heute-2\nFilter: event_rule_id = rule-1\n", [2]),
+    (b"Filter: event_id = 3\n", [3]),
+    (b"Filter: event_id = 3\nFilter: event_host = heute-1\n", []),
+    (b"Filter: event_phase = ack\n", []),
+])
+def test_mkevent_indexed_query(event_status, status_server, query, expected_ids):
+    for num in range(10):
+        event_status.new_event(
+            CMKEventConsole.new_event({
+                "host": "heute-%d" % num,
+                "core_host": "heute-%d" % num,
+                "rule_id": "rule-%d" % (num % 2),
+            }))
+
+    s = FakeStatusSocket(b"GET events\nColumns: event_id\n" + query)
+    status_server.handle_client(s, True, "127.0.0.1")
+
+    response = s.get_response()
+    assert response[0] == ["event_id"]
+    assert [row[0] for row in response[1:]] == expected_ids
+
+
+@pytest.mark.parametrize("query", [
+    b"Filter: event_core_host = \n",
+    b"Filter: event_core_host in heute-1 \n",
+    b"Filter: event_host = heute-2\nFilter: event_core_host = \n",
+])
+def test_mkevent_indexed_query_missing_field(monkeypatch, event_status, status_server, query):
+    for num in range(4):
+        event_status.new_event(
+            CMKEventConsole.new_event({
+                "host": "heute-%d" % num,
+                "core_host": "heute-%d" % num,
+            }))
+    # Events of former versions may lack fields, e.g. core_host
+    for event in list(event_status.events())[::2]:
+        event_status._events.remove(event)
+        del event["core_host"]
+        event_status._events.add(event)
+
+    def query_ids():
+        s = FakeStatusSocket(b"GET events\nColumns: event_id event_core_host\n" + query)
+        status_server.handle_client(s, True, "127.0.0.1")
+        return s.get_response()[1:]
+
+    indexed_rows = query_ids()
+    # Without restricted columns the filters are only applied to the rows
+    monkeypatch.setattr(cmk.ec.query.QueryGET, "column_values", lambda self, name: None)
+    assert indexed_rows == query_ids()
+    assert indexed_rows
+
+
+def test_housekeeping_handles_due_events(event_status, event_server):
+    event_server.compile_rules([], [])
+    now = time.time()
+    for num, (phase, field, due_time) in enumerate([
+        ("open", "live_until", now - 1),
+        ("open", "live_until", now + 3600),
+        ("ack", "live_until", now - 1),
+        ("delayed", "delay_until", now - 1),
+    ]):
+        event_status.new_event(
+            CMKEventConsole.new_event({
+                "host": "heute-%d" % num,
+                "core_host": "heute-%d" % num,
+                "phase": phase,
+                field: due_time,
+            }))
+
+    event_server.hk_handle_event_timeouts()
+
+    assert [(event["id"], event["phase"]) for event in event_status.events()] == [
+        (2, "open"),
+        (3, "ack"),
+        (4, "open"),
+    ]
+    # The acknowledged event is deleted once it gets opened again
+    assert [event["id"] for event in event_status.get_due_events(now)] == [3]
+
+
+def _compile_rules(event_server, *rules):
+    event_server.compile_rules([], [{
+        "id": "pack",
+        "disabled": False,
+        "rules": [dict(rule, state=0, sl={
+            "value": 0,
+            "precedence": "message"
+        }) for rule in rules],
+    }])
+
+
+def test_housekeeping_schedules_counting_events(event_status, event_server):
+    _compile_rules(event_server, {
+        "id": "counting",
+        "count": {
+            "count": 3,
+            "period": 60,
+            "algorithm": "interval",
+        },
+    })
+    now = time.time()
+    event_status.new_event(
+        CMKEventConsole.new_event({
+            "rule_id": "counting",
+            "phase": "counting",
+            "first": now - 10,
+            "core_host": "",
+            "host_in_downtime": False,
+        }))
+    assert [event["id"] for event in event_status.get_due_events(now)] == [1]
+
+    event_server.hk_handle_event_timeouts()
+
+    assert not event_status.get_due_events(now + 49)
+    assert [event["id"] for event in event_status.get_due_events(now + 50)] == [1]
+
+
+def test_housekeeping_checks_expected_messages_when_due(monkeypatch, event_status, event_server):
+    _compile_rules(event_server, {
+        "id": "expecting",
+        "expect": {
+            "count": 1,
+            "interval": 3600,
+        },
+    })
+    now = time.time()
+    event_server.hk_check_expected_messages()
+    assert not event_status.events()
+
+    monkeypatch.setattr(time, "time", lambda: now + 7200)
+    event_server.hk_check_expected_messages()
+
+    assert [(event["rule_id"], event["phase"]) for event in event_status.events()] == [
+        ("expecting", "open"),
+    ]
+    # Not due again before the end of the next interval
+    event_server.hk_check_expected_messages()
+    assert len(event_status.events()) == 1
+
+
+def test_ingestion_workers_parse_messages(config, perfcounters, event_status, event_server):
+    config["ingestion_workers"] = 2
+    config["hostname_translation"] = {"case": "lower"}
+    _compile_rules(event_server, {"id": "disk", "match": "disk full"})
+    event_server._restart_ingestion()
+    event_server._ingest([
+        (b"<78>May 26 13:45:01 HOST1 app: disk full\n", ("127.0.0.1", 514)),
+        (b"<78>May 26 13:45:02 HOST2 app: disk ok\n", ("127.0.0.1", 514)),
+    ])
+    # Waits for the messages to be processed
+    event_server._stop_ingestion()
+
+    assert [(event["host"], event["rule_id"]) for event in event_status.events()] == [
+        ("host1", "disk"),
+    ]
+    assert perfcounters._counters["messages"] == 2
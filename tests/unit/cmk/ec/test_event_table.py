@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+from cmk.ec.event_table import EventTable
+
+
+def _event(event_id, host="host", rule_id="rule", phase="open", **fields):
+    return dict(id=event_id, host=host, core_host=host, rule_id=rule_id, phase=phase, **fields)
+
+
+def _ids(events):
+    return [event["id"] for event in events]
+
+
+@pytest.fixture(name="table")
+def fixture_table():
+    return EventTable([
+        _event(1, host="a", rule_id="r1"),
+        _event(2, host="b", rule_id="r1", phase="counting"),
+        _event(3, host="a", rule_id="r2", phase="ack"),
+        _event(4, host="b", rule_id="r2"),
+    ])
+
+
+def test_get_and_iterate(table):
+    assert table.get(3)["phase"] == "ack"
+    assert table.get(5) is None
+    assert len(table) == 4
+    assert _ids(table) == [1, 2, 3, 4]
+
+
+def test_select(table):
+    assert _ids(table.select({})) == [1, 2, 3, 4]
+    assert _ids(table.select({"host": ["a"]})) == [1, 3]
+    assert _ids(table.select({"host": ["b", "c"], "rule_id": ["r2"]})) == [4]
+    assert _ids(table.select({"phase": ["open", "ack"]})) == [1, 3, 4]
+    assert not table.select({"core_host": ["c"]})
+
+
+def test_select_missing_field(table):
+    event = _event(5)
+    del event["core_host"]
+    table.add(event)
+    assert _ids(table.select({"core_host": [""]})) == [5]
+    assert _ids(table.select({"core_host": ["host"]})) == []
+
+
+def test_update_and_remove(table):
+    event = table.get(1)
+    event["phase"] = "ack"
+    table.update(event)
+    assert _ids(table.select({"phase": ["ack"]})) == [1, 3]
+    assert _ids(table.select({"phase": ["open"]})) == [4]
+
+    table.remove(event)
+    assert _ids(table) == [2, 3, 4]
+    assert _ids(table.select({"host": ["a"]})) == [3]
+    with pytest.raises(KeyError):
+        table.remove(event)
+
+
+def test_oldest(table):
+    assert table.oldest()["id"] == 1
+    assert table.oldest("host", "b")["id"] == 2
+    assert table.oldest("rule_id", "r3") is None
+    assert EventTable().oldest() is None
+
+
+def test_due():
+    table = EventTable([
+        _event(1, phase="delayed", delay_until=20),
+        _event(2, live_until=10),
+        _event(3),
+    ])
+    assert not table.due(5)
+    assert _ids(table.due(10)) == [2]
+    # Not handled yet
+    assert _ids(table.due(20)) == [1, 2]
+
+    event = table.get(1)
+    event["phase"] = "open"
+    event["live_until"] = 30
+    table.update(event)
+    assert _ids(table.due(20)) == [2]
+
+    table.remove(table.get(2))
+    assert not table.due(20)
+    assert _ids(table.due(30)) == [1]
+
+
+def test_due_counting_events():
+    table = EventTable([
+        _event(1, phase="counting", live_until=10),
+        _event(2, phase="counting"),
+    ])
+    # Counting events are due until the housekeeping has scheduled them
+    assert _ids(table.due(0)) == [1, 2]
+    table.schedule(table.get(1), 20)
+    table.schedule(table.get(2), None)
+    assert not table.due(10)
+    assert _ids(table.due(20)) == [1]
+
+    # Counted up
+    event = table.get(2)
+    event["count"] = 2
+    table.update(event)
+    # The first one is still due
+    assert _ids(table.due(0)) == [1, 2]
+
+    table.schedule(table.get(1), 40)
+    table.schedule(table.get(2), 40)
+    table.unschedule()
+    assert _ids(table.due(0)) == [1, 2]
+
+
+def test_due_times_are_compacted():
+    table = EventTable([_event(1, live_until=100)])
+    event = table.get(1)
+    for live_until in range(1000):
+        event["live_until"] = live_until
+        table.update(event)
+
+    assert len(table._due_times) < 200  # pylint: disable=protected-access
+    assert _ids(table.due(998)) == []
+    assert _ids(table.due(999)) == [1]
+
+
+def test_take_changes(table):
+    table.take_changes()
+    assert table.take_changes() == {}
+
+    event = table.get(1)
+    event["comment"] = "changed"
+    table.update(event)
+    table.remove(table.get(2))
+    table.add(_event(5))
+
+    assert table.take_changes() == {1: event, 2: None, 5: table.get(5)}
+    assert table.take_changes() == {}
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access
+
+import logging
+import os
+import time
+
+import cmk.ec.ingestion as ingestion
+from cmk.ec.main import Perfcounters
+
+logger = logging.getLogger("cmk.mkeventd.EventServer")
+
+
+def _parse(data, address):
+    return [(line, address, os.getpid()) for line in data.decode().splitlines()]
+
+
+def test_pipeline_parses_in_workers():
+    perfcounters = Perfcounters(logger)
+    handled = []
+    pipeline = ingestion.IngestionPipeline(logger, perfcounters, 2, _parse, handled.append)
+    pipeline.start()
+    for nr in range(100):
+        pipeline.submit([(b"a%d\nb%d" % (nr, nr), ("127.0.0.1", nr))])
+    pipeline.stop()
+
+    assert sorted(
+        line for line, _address, _pid in handled) == sorted(["a%d" % nr for nr in range(100)] +
+                                                            ["b%d" % nr for nr in range(100)])
+    assert all(address[1] == int(line[1:]) for line, address, _pid in handled)
+    assert os.getpid() not in {pid for _line, _address, pid in handled}
+    assert perfcounters._counters["parse_drops"] == 0
+    assert perfcounters._gauges["parse_queue_length"] == 0
+
+
+def _parse_slowly(data, address):
+    # The messages would overtake each other in case they were parsed by different workers
+    time.sleep(0.01 if int(data[1:]) % 2 else 0)
+    return _parse(data, address)
+
+
+def test_pipeline_keeps_order_of_sender():
+    perfcounters = Perfcounters(logger)
+    handled = []
+    pipeline = ingestion.IngestionPipeline(logger, perfcounters, 4, _parse_slowly, handled.append)
+    pipeline.start()
+    for nr in range(50):
+        pipeline.submit([(b"a%d" % nr, ("10.0.0.%d" % sender, 514)) for sender in range(4)])
+        pipeline.submit([(b"b%d" % nr, None)])
+    pipeline.stop()
+
+    for sender in [("10.0.0.%d" % sender, 514) for sender in range(4)] + [None]:
+        lines = [line for line, address, _pid in handled if address == sender]
+        assert [int(line[1:]) for line in lines] == list(range(50))
+        # All messages of a sender are parsed by the same worker
+        assert len({pid for _line, address, pid in handled if address == sender}) == 1
+
+
+def test_pipeline_drops_messages_not_fitting_into_queue(monkeypatch):
+    monkeypatch.setattr(ingestion, "_QUEUE_SIZE", 2)
+    perfcounters = Perfcounters(logger)
+    handled = []
+    pipeline = ingestion.IngestionPipeline(logger, perfcounters, 1, _parse, handled.append)
+    # Not started yet, nothing is taken from the queue
+    for nr in range(4):
+        pipeline.submit([(b"a%d" % nr, None), (b"b%d" % nr, None)])
+    assert perfcounters._counters["parse_drops"] == 4
+
+    pipeline.start()
+    pipeline.stop()
+    assert [line for line, _address, _pid in handled] == ["a0", "b0", "a1", "b1"]
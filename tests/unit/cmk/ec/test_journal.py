@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access
+
+import copy
+import logging
+import marshal
+
+import pytest  # type: ignore[import]
+
+import cmk.ec.journal as journal_module
+from cmk.ec.journal import StatusJournal
+
+logger = logging.getLogger("cmk.mkeventd.EventStatus")
+
+
+def _event(event_id):
+    return {
+        "id": event_id,
+        "count": 1,
+        "text": "Message %d" % event_id,
+        "phase": "open",
+        "host": "host%d" % (event_id % 100),
+        "core_host": "host%d" % (event_id % 100),
+        "rule_id": "rule%d" % (event_id % 10),
+        "time": 1600000000.0 + event_id,
+        "first": 1600000000.0 + event_id,
+        "last": 1600000000.0 + event_id,
+        "priority": 3,
+        "facility": 1,
+        "state": 2,
+        "sl": 0,
+        "application": "app",
+        "pid": 0,
+        "comment": "",
+        "owner": "",
+        "contact": "",
+        "match_groups": ("a", "b"),
+        "ipaddress": "",
+        "host_in_downtime": False,
+    }
+
+
+def _status(events):
+    return {
+        "next_event_id": max((e["id"] for e in events), default=0) + 1,
+        "events": events,
+        "rule_stats": {
+            "rule0": len(events)
+        },
+        "interval_starts": {},
+    }
+
+
+def _changes(events, deleted=()):
+    changes = {event["id"]: event for event in events}
+    changes.update((event_id, None) for event_id in deleted)
+    return changes
+
+
+def _loaded(path):
+    return StatusJournal(path, logger).load()
+
+
+def test_load_nothing_saved(tmp_path):
+    assert _loaded(tmp_path / "status") is None
+
+
+def test_save_appends_changes(tmp_path):
+    path = tmp_path / "status"
+    journal = StatusJournal(path, logger)
+    status = _status([_event(i) for i in range(1, 6)])
+    journal.save(status, _changes(status["events"]))
+    snapshot = path.read_bytes()
+    journal_size = journal.journal_path.stat().st_size
+
+    status["events"][1]["count"] = 2
+    del status["events"][3]
+    status["events"].append(_event(6))
+    status["next_event_id"] = 8
+    journal.save(status, _changes([status["events"][1], status["events"][-1]], deleted=[4]))
+
+    assert path.read_bytes() == snapshot
+    assert journal.journal_path.stat().st_size > journal_size
+    assert _loaded(path) == status
+
+
+def test_save_compacts_grown_journal(tmp_path):
+    path = tmp_path / "status"
+    journal = StatusJournal(path, logger)
+    status = _status([_event(i) for i in range(1, 11)])
+    journal.save(status, _changes(status["events"]))
+    snapshot = path.read_bytes()
+
+    for count in range(2, 30):
+        for event in status["events"]:
+            event["count"] = count
+        journal.save(status, _changes(status["events"]))
+        assert _loaded(path) == status
+
+    assert path.read_bytes() != snapshot
+    assert journal.journal_path.stat().st_size < len(path.read_bytes())
+
+
+def test_load_ignores_incomplete_change(tmp_path):
+    path = tmp_path / "status"
+    journal = StatusJournal(path, logger)
+    status = _status([_event(1), _event(2)])
+    journal.save(status, _changes(status["events"]))
+    status["events"][0]["phase"] = "ack"
+    journal.save(status, _changes(status["events"][:1]))
+    expected = copy.deepcopy(status)
+
+    status["events"][1]["phase"] = "ack"
+    journal.save(status, _changes(status["events"][1:]))
+    content = journal.journal_path.read_bytes()
+    journal.journal_path.write_bytes(content[:-3])
+
+    journal = StatusJournal(path, logger)
+    assert journal.load() == expected
+    # The journal can not be continued after the incomplete change
+    journal.save(status, {})
+    assert _loaded(path) == status
+
+
+def test_load_ignores_journal_of_other_snapshot(tmp_path):
+    path = tmp_path / "status"
+    journal = StatusJournal(path, logger)
+    status = _status([_event(1), _event(2)])
+    journal.save(status, _changes(status["events"]))
+    status["events"][0]["phase"] = "ack"
+    journal.save(status, _changes(status["events"][:1]))
+    previous_journal = journal.journal_path.read_bytes()
+
+    # Interrupted after writing the snapshot
+    journal.reset()
+    status["events"][0]["phase"] = "open"
+    journal.save(status, _changes(status["events"][:1]))
+    journal.journal_path.write_bytes(previous_journal)
+
+    assert _loaded(path) == status
+
+
+def test_load_legacy_format(tmp_path):
+    path = tmp_path / "status"
+    status = _status([_event(1), _event(2)])
+    path.write_text(repr(status) + "\n")
+
+    journal = StatusJournal(path, logger)
+    assert journal.load() == status
+
+    journal.save(status, {})
+    assert not path.read_bytes().startswith(b"{")
+    assert _loaded(path) == status
+
+
+def test_save_dumps_only_changes(tmp_path):
+    path = tmp_path / "status"
+    journal = StatusJournal(path, logger)
+    status = _status([_event(i) for i in range(1, 1001)])
+    journal.save(status, _changes(status["events"]))
+
+    status["events"][4]["count"] = 2
+    del status["events"][9]
+    journal.save(status, _changes([status["events"][4]], deleted=[10]))
+
+    content = journal.journal_path.read_bytes()
+    frame = content[journal_module._HEADER.size + journal_module._FRAME_HEADER.size:]
+    changed, deleted, _meta = marshal.loads(frame)
+    assert changed == [status["events"][4]]
+    assert deleted == [10]
+    assert _loaded(path) == status
+
+
+def test_failed_save_writes_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "status"
+    journal = StatusJournal(path, logger)
+    status = _status([_event(1), _event(2)])
+    journal.save(status, _changes(status["events"]))
+    snapshot = path.read_bytes()
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    status["events"][0]["phase"] = "ack"
+    monkeypatch.setattr(journal, "_append_frame", fail)
+    with pytest.raises(OSError):
+        journal.save(status, _changes(status["events"][:1]))
+    monkeypatch.undo()
+
+    # The lost change is part of the next snapshot
+    journal.save(status, {})
+    assert path.read_bytes() != snapshot
+    assert _loaded(path) == status
@@ -21,6 +21,22 @@ def test_perfcounters_count():
     assert not [(k, v) for k, v in c._counters.items() if k != "messages" and v > 0]
 
 
+def test_perfcounters_count_amount():
+    c = Perfcounters(logger)
+    c.count("parse_drops", 3)
+    c.count("parse_drops")
+    assert c._counters["parse_drops"] == 4
+
+
+def test_perfcounters_gauges():
+    c = Perfcounters(logger)
+    c.set_gauge("parse_queue_length", 10)
+    c.set_gauge("parse_queue_length", 3)
+    status = dict(zip([n for n, _d in c.status_columns()], c.get_status()))
+    assert status["status_parse_queue_length"] == 3
+    assert status["status_match_queue_length"] == 0
+
+
 def test_perfcounters_count_time():
     c = Perfcounters(logger)
     assert "processing" not in c._times
@@ -123,6 +139,10 @@ def test_perfcounters_correct_status_values():
             counter_name = column_name.split("_")[-2]
             assert column_value == c._rates.get(counter_name, 0.0)
 
+        elif column_name.startswith("status_") and column_name.endswith("_length"):
+            gauge_name = "_".join(column_name.split("_")[1:])
+            assert column_value == c._gauges[gauge_name]
+
         elif column_name.startswith("status_"):
             counter_name = "_".join(column_name.split("_")[1:])
             assert column_value == c._counters[counter_name], "Invalid value %r: %r" % (
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import time
+
+import pytest  # type: ignore[import]
+
+from cmk.ec.main import EventServer, match
+from cmk.ec.rule_prefilter import RulePrefilter
+
+
+def _rule(**patterns):
+    rule = {}
+    for key, pattern in patterns.items():
+        if key == "invert_matching":
+            rule[key] = pattern
+        else:
+            value = EventServer._compile_matching_value(key, pattern)
+            if value is not None:
+                rule[key] = value
+    return rule
+
+
+def _event(text="", host="", application=""):
+    return {"text": text, "host": host, "application": application}
+
+
+def _passes(rule, event):
+    rules = [rule]
+    return RulePrefilter(rules).select(rules, event) == rules
+
+
+@pytest.mark.parametrize(
+    "pattern, text, passes",
+    [
+        ("disk full", "DISK FULL on /var", True),
+        ("disk full", "disk is full", False),
+        ("ab", "xyz", True),  # Too short to look for
+        ("^sshd\\[\\d+\\]: Failed password", "sshd[12]: Failed password for root", True),
+        ("^sshd\\[\\d+\\]: Failed password", "sshd[12]: Accepted password for root", False),
+        ("(?:error|warning): (.*)", "Warning: x", True),
+        ("(?:error|warning): (.*)", "Info: x", False),
+        ("(?:error|wa): (.*)", "Info: x", True),  # An alternative without literal
+        ("foo.*bar", "foo bar", True),
+        ("foo.*bar", "bar", False),
+        ("(abc)+x?", "xABCx", True),
+        ("(abc)*xyz", "xyz", True),
+        ("[a-z]+\\d", "abc1", True),
+        ("Süd-Ost", "süd-ost", True),
+        ("Süd-Ost", "nord", False),
+        ("password", "PAſſWORD", True),
+        ("(?i)IDENTITY", "İDENTITY", True),
+    ])
+def test_message_patterns(pattern, text, passes):
+    rule = _rule(match=pattern)
+    assert _passes(rule, _event(text=text)) is passes
+    if match(rule["match"], text, complete=False) is not False:
+        assert passes
+
+
+def test_cancelling_patterns():
+    rule = _rule(match="disk full", match_ok="disk ok")
+    assert _passes(rule, _event(text="disk ok"))
+    assert _passes(rule, _event(text="disk full"))
+    assert not _passes(rule, _event(text="disk"))
+
+
+def test_cancelling_patterns_without_pattern():
+    # Any text matches without the normal pattern
+    assert _passes(_rule(match_ok="recovered now"), _event(text="disk failure"))
+    rule = _rule(match_application="", cancel_application="sshd")
+    assert _passes(rule, _event(application="kernel"))
+
+
+def test_all_fields_need_a_literal():
+    rule = _rule(match="disk full", match_host="^web\\d+", match_application="kernel")
+    assert _passes(rule, _event("disk full", "web1", "kernel"))
+    assert not _passes(rule, _event("disk full", "db1", "kernel"))
+    assert not _passes(rule, _event("disk full", "web1", "sshd"))
+
+
+def test_rules_without_literals_pass():
+    for rule in [_rule(), _rule(match=".*"), _rule(match="disk", invert_matching=True)]:
+        assert _passes(rule, _event(text="something else"))
+
+
+def test_prefilter_perf():
+    rules = [
+        _rule(match="^app%d\\[\\d+\\]: (error|failure) in module %d" % (nr, nr))
+        for nr in range(3000)
+    ]
+    events = [_event(text="app%d[4711]: error in module %d" % (nr, nr)) for nr in range(100)]
+    prefilter = RulePrefilter(rules)
+
+    before = time.time()
+    for event in events:
+        matching = [
+            rule for rule in prefilter.select(rules, event)
+            if match(rule["match"], event["text"], complete=False) is not False
+        ]
+        assert len(matching) == 1
+    prefilter_duration = time.time() - before
+
+    before = time.time()
+    for event in events:
+        matching = [
+            rule for rule in rules
+            if match(rule["match"], event["text"], complete=False) is not False
+        ]
+        assert len(matching) == 1
+    duration = time.time() - before
+
+    assert prefilter_duration < duration
+
+
+def test_select_keeps_order_of_candidates():
+    rules = [_rule(match="disk full"), _rule(), _rule(match="disk ok"), _rule(match="disk full")]
+    prefilter = RulePrefilter(rules)
+    assert prefilter.num_filtered_rules == 3
+    event = _event(text="disk full")
+    assert prefilter.select(rules, event) == [rules[0], rules[1], rules[3]]
+    candidates = [rules[1], rules[2], rules[3]]
+    assert prefilter.select(candidates, event) == [rules[1], rules[3]]
+    assert prefilter.select(candidates, _event(text="disk ok")) == [rules[1], rules[2]]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import asyncio
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.exceptions import MKTimeout
+
+from cmk.fetchers import FetcherType, MKFetcherError
+from cmk.fetchers.agent import DefaultAgentFileCache
+from cmk.fetchers.engine import FetcherEngine, FetchJob
+from cmk.fetchers.program import ProgramFetcher
+from cmk.fetchers.tcp import TCPFetcher
+from cmk.fetchers.type_defs import Mode
+
+
+def _file_cache():
+    return DefaultAgentFileCache(
+        path=Path(os.devnull),
+        max_age=0,
+        disabled=True,
+        use_outdated=False,
+        simulation=False,
+    )
+
+
+_NO_ENCRYPTION = {"use_regular": "disable"}
+
+
+def _tcp_entry(port, timeout=5.0):
+    return {
+        "fetcher_type": FetcherType.TCP.name,
+        "fetcher_params": TCPFetcher(
+            _file_cache(),
+            family=socket.AF_INET,
+            address=("127.0.0.1", port),
+            timeout=timeout,
+            encryption_settings=_NO_ENCRYPTION,
+            use_only_cache=False,
+        ).to_json(),
+    }
+
+
+def _program_entry(cmdline):
+    return {
+        "fetcher_type": FetcherType.PROGRAM.name,
+        "fetcher_params": ProgramFetcher(
+            _file_cache(),
+            cmdline=cmdline,
+            stdin=None,
+            is_cmc=False,
+        ).to_json(),
+    }
+
+
+@pytest.fixture(name="make_agent")
+def _make_agent():
+    servers = []
+
+    def make_agent(output, delay=0.0, stall=0.0):
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                time.sleep(delay)
+                self.request.sendall(output)
+                time.sleep(stall)
+
+        class Server(socketserver.ThreadingTCPServer):
+            request_queue_size = 128
+
+        server = Server(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1]
+
+    yield make_agent
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_agents(make_agent):
+    port = make_agent(b"<<<check_mk>>>\nVersion: 2.0.0\n")
+    engine = FetcherEngine(max_concurrency=10, timeout=5)
+
+    results = dict(
+        engine.fetch(FetchJob("host%d" % i, [_tcp_entry(port)], Mode.CHECKING) for i in range(20)))
+
+    assert sorted(results) == sorted("host%d" % i for i in range(20))
+    for messages in results.values():
+        assert len(messages) == 1
+        assert messages[0].header.fetcher_type is FetcherType.TCP
+        assert messages[0].raw_data.ok == b"<<<check_mk>>>\nVersion: 2.0.0\n"
+
+
+def test_fetch_results_in_order_of_arrival(make_agent):
+    slow_port = make_agent(b"<<<slow>>>\n", delay=0.5)
+    fast_port = make_agent(b"<<<fast>>>\n")
+    engine = FetcherEngine(max_concurrency=10, timeout=5)
+
+    host_names = [
+        host_name for host_name, _messages in engine.fetch([
+            FetchJob("slow", [_tcp_entry(slow_port)], Mode.CHECKING),
+            FetchJob("fast", [_tcp_entry(fast_port)], Mode.CHECKING),
+        ])
+    ]
+
+    assert host_names == ["fast", "slow"]
+
+
+def test_fetch_concurrently(make_agent):
+    delay = 0.2
+    num_hosts = 40
+    port = make_agent(b"<<<check_mk>>>\n", delay=delay)
+    engine = FetcherEngine(max_concurrency=20, timeout=5)
+
+    start = time.time()
+    results = list(
+        engine.fetch(
+            FetchJob("host%d" % i, [_tcp_entry(port)], Mode.CHECKING) for i in range(num_hosts)))
+    duration = time.time() - start
+
+    assert len(results) == num_hosts
+    assert all(messages[0].raw_data.is_ok() for _host_name, messages in results)
+    # Sequentially this would take 8 seconds, with 20 hosts in parallel 0.4 seconds
+    assert duration < num_hosts * delay / 4
+
+
+def test_fetch_timeout(make_agent):
+    port = make_agent(b"<<<check_mk>>>\n", delay=2.0)
+    engine = FetcherEngine(max_concurrency=10, timeout=0.2)
+
+    jobs = [FetchJob("host", [_tcp_entry(port)], Mode.CHECKING)]
+    ((host_name, (message,)),) = engine.fetch(jobs)
+
+    assert host_name == "host"
+    assert message.header.fetcher_type is FetcherType.TCP
+    assert isinstance(message.raw_data.error, MKTimeout)
+
+
+def test_fetch_connection_refused():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    engine = FetcherEngine(max_concurrency=10, timeout=5)
+
+    jobs = [FetchJob("host", [_tcp_entry(port)], Mode.CHECKING)]
+    ((_host_name, (message,)),) = engine.fetch(jobs)
+
+    assert isinstance(message.raw_data.error, MKFetcherError)
+    assert "Communication failed" in str(message.raw_data.error)
+
+
+def test_tcp_fetch_async_read_timeout(make_agent):
+    port = make_agent(b"<<<check_mk>>>\n", stall=2.0)
+    fetcher = TCPFetcher(
+        _file_cache(),
+        family=socket.AF_INET,
+        address=("127.0.0.1", port),
+        timeout=0.2,
+        encryption_settings=_NO_ENCRYPTION,
+        use_only_cache=False,
+    )
+
+    loop = asyncio.new_event_loop()
+    try:
+        raw_data = loop.run_until_complete(fetcher.fetch_async(Mode.CHECKING))
+    finally:
+        loop.close()
+
+    assert isinstance(raw_data.error, MKFetcherError)
+    assert "timed out" in str(raw_data.error)
+
+
+def test_fetch_blocking_fetchers_in_worker_processes(make_agent):
+    port = make_agent(b"<<<tcp>>>\n")
+    engine = FetcherEngine(max_concurrency=10, timeout=5, max_processes=2)
+
+    ((host_name, messages),) = engine.fetch([
+        FetchJob("host", [
+            _tcp_entry(port),
+            _program_entry("echo '<<<program>>>'"),
+        ], Mode.CHECKING),
+    ])
+
+    assert host_name == "host"
+    assert [m.header.fetcher_type for m in messages] == [FetcherType.TCP, FetcherType.PROGRAM]
+    assert messages[0].raw_data.ok == b"<<<tcp>>>\n"
+    assert messages[1].raw_data.ok == b"<<<program>>>\n"
+
+
+def test_invalid_max_concurrency():
+    with pytest.raises(ValueError):
+        FetcherEngine(max_concurrency=0, timeout=5)
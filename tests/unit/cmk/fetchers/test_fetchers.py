@@ -252,6 +252,7 @@ class ABCTestSNMPFetcher(ABC):
             on_error="raise",
             missing_sys_description=False,
             use_snmpwalk_cache=False,
+            scan_cache_max_age=0,
             snmp_config=SNMPHostConfig(
                 is_ipv6_primary=False,
                 hostname="bob",
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access
+
+import pytest  # type: ignore[import]
+from testlib.snmp_agent import Agent  # type: ignore[import]
+
+from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.log import logger
+
+from cmk.snmplib.type_defs import SNMPHostConfig
+
+import cmk.fetchers.snmp_backend._ber as ber
+import cmk.fetchers.snmp_backend.native as native
+from cmk.fetchers.snmp_backend import NativeSNMPBackend
+
+
+@pytest.fixture(name="agent")
+def _agent():
+    agent = Agent(
+        users={
+            b"aes-user": {
+                "auth": "sha",
+                "auth_password": b"authpass",
+                "priv": "AES",
+                "priv_password": b"privpass",
+            },
+            b"des-user": {
+                "auth": "md5",
+                "auth_password": b"authpass",
+                "priv": "DES",
+                "priv_password": b"privpass",
+            },
+            b"auth-user": {
+                "auth": "SHA-256",
+                "auth_password": b"authpass",
+            },
+        })
+    yield agent
+    agent.close()
+
+
+def _backend(agent, credentials="public", is_bulkwalk_host=False, v2c=False, timing=None):
+    return NativeSNMPBackend(
+        SNMPHostConfig(
+            is_ipv6_primary=False,
+            hostname="switch",
+            ipaddress="127.0.0.1",
+            credentials=credentials,
+            port=agent.port,
+            is_bulkwalk_host=is_bulkwalk_host,
+            is_snmpv2or3_without_bulkwalk_host=v2c,
+            bulk_walk_size_of=4,
+            timing=timing or {
+                "timeout": 1,
+                "retries": 1
+            },
+            oid_range_limits=[],
+            snmpv3_contexts=[],
+            character_encoding=None,
+            is_usewalk_host=False,
+            snmp_backend="native",
+            record_stats=False,
+        ),
+        logger,
+    )
+
+
+IF_TABLE = [
+    (".1.3.6.1.2.1.2.2.1.1.1", b"1"),
+    (".1.3.6.1.2.1.2.2.1.1.2", b"2"),
+    (".1.3.6.1.2.1.2.2.1.1.10", b"10"),
+    (".1.3.6.1.2.1.2.2.1.2.1", b"lo"),
+    (".1.3.6.1.2.1.2.2.1.2.2", b"eth0"),
+    (".1.3.6.1.2.1.2.2.1.2.10", b"\xb2\xe0},M\x15"),
+    (".1.3.6.1.2.1.2.2.1.10.1", b"4294967295"),
+]
+
+
+def test_ber_get_request():
+    request = ber.encode_sequence(
+        ber.encode_integer(0),
+        ber.encode_octet_string(b"public"),
+        ber.encode_pdu(
+            ber.PDU(ber.GET_REQUEST, 1, 0, 0, [ber.VarBind(".1.3.6.1.2.1.1.1.0", ber.NULL, b"")])),
+    )
+    assert request.hex() == ("302602010004067075626c6963a019020101020100020100300e300c06082b"
+                             "060102010101000500")
+
+
+def test_password_to_key():
+    # https://tools.ietf.org/html/rfc3414#appendix-A.3.2
+    assert native._password_to_key(native._AUTH_PROTOCOLS["sha"], b"maplesyrup",
+                                   bytes(11) +
+                                   b"\x02").hex() == ("6695febc9288e36282235fc7151f128497b38f3f")
+
+
+@pytest.mark.parametrize("kwargs, request_type", [
+    ({}, (0, ber.GET_NEXT_REQUEST)),
+    ({
+        "v2c": True
+    }, (1, ber.GET_NEXT_REQUEST)),
+    ({
+        "is_bulkwalk_host": True
+    }, (1, ber.GET_BULK_REQUEST)),
+])
+def test_walk(agent, kwargs, request_type):
+    backend = _backend(agent, **kwargs)
+    assert backend.walk(".1.3.6.1.2.1.2.2.1") == IF_TABLE
+    assert set(agent.requests) == {request_type}
+    backend.close()
+
+
+def test_walk_bulk_requests(agent):
+    backend = _backend(agent, is_bulkwalk_host=True)
+    backend.walk(".1.3.6.1.2.1.2.2.1")
+    # 7 OIDs plus the first OID of the next table with 4 OIDs per request
+    assert len(agent.requests) == 2
+
+
+def test_walk_values(agent):
+    backend = _backend(agent, is_bulkwalk_host=True)
+    assert backend.walk(".1.3.6.1.2.1.1") == [
+        (".1.3.6.1.2.1.1.1.0", b"Linux switch"),
+        (".1.3.6.1.2.1.1.2.0", b".1.3.6.1.4.1.2021"),
+        (".1.3.6.1.2.1.1.3.0", b"4294967295"),
+    ]
+    assert backend.walk(".1.3.6.1.2.1.4.20.1.1") == [
+        (".1.3.6.1.2.1.4.20.1.1.127.0.0.1", b"127.0.0.1"),
+    ]
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"is_bulkwalk_host": True}])
+def test_walk_end_of_mib(agent, kwargs):
+    backend = _backend(agent, **kwargs)
+    assert backend.walk(".1.3.6.1.2.1.4") == [
+        (".1.3.6.1.2.1.4.20.1.1.127.0.0.1", b"127.0.0.1"),
+    ]
+    assert backend.walk(".1.3.6.1.2.1.5") == []
+
+
+IF_COLUMNS = [".1.3.6.1.2.1.2.2.1.1", ".1.3.6.1.2.1.2.2.1.2", ".1.3.6.1.2.1.2.2.1.10"]
+
+
+@pytest.mark.parametrize("kwargs, num_requests", [
+    ({}, 4),
+    ({
+        "v2c": True
+    }, 4),
+    ({
+        "is_bulkwalk_host": True
+    }, 1),
+])
+def test_walk_many(agent, kwargs, num_requests):
+    backend = _backend(agent, **kwargs)
+    assert backend.walk_many(IF_COLUMNS) == [
+        [row for row in IF_TABLE if row[0].startswith(oid + ".")] for oid in IF_COLUMNS
+    ]
+    # One varbind per column in each request
+    assert len(agent.requests) == num_requests
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"is_bulkwalk_host": True}])
+def test_walk_many_end_of_mib(agent, kwargs):
+    backend = _backend(agent, **kwargs)
+    assert backend.walk_many([".1.3.6.1.2.1.4.20.1.1", ".1.3.6.1.2.1.2.2.1.10"]) == [
+        [(".1.3.6.1.2.1.4.20.1.1.127.0.0.1", b"127.0.0.1")],
+        [(".1.3.6.1.2.1.2.2.1.10.1", b"4294967295")],
+    ]
+
+
+def test_walk_many_too_big(agent):
+    agent.max_response_varbinds = 6
+    backend = _backend(agent, is_bulkwalk_host=True)
+    assert backend.walk_many(IF_COLUMNS[:2]) == [
+        [row for row in IF_TABLE if row[0].startswith(oid + ".")] for oid in IF_COLUMNS[:2]
+    ]
+
+
+def test_walk_scalar(agent):
+    backend = _backend(agent, v2c=True)
+    assert backend.walk(".1.3.6.1.2.1.1.1.0") == [(".1.3.6.1.2.1.1.1.0", b"Linux switch")]
+
+
+def test_get(agent):
+    backend = _backend(agent, v2c=True)
+    assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux switch"
+    assert backend.get(".1.3.6.1.2.1.1.9.0") is None
+    assert backend.get(".1.3.6.1.2.1.1.2.*") == b".1.3.6.1.4.1.2021"
+    assert backend.get(".1.3.6.1.2.1.1.9.*") is None
+
+
+def test_one_socket_per_host(agent):
+    backend = _backend(agent, is_bulkwalk_host=True)
+    backend.get(".1.3.6.1.2.1.1.1.0")
+    backend.walk(".1.3.6.1.2.1.1")
+    backend.walk(".1.3.6.1.2.1.2.2.1")
+    assert len(agent.requests) > 3
+    assert len(agent.peers) == 1
+
+
+def test_retries(agent):
+    agent.drop_requests = 1
+    backend = _backend(agent, v2c=True, timing={"timeout": 0.2, "retries": 1})
+    assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux switch"
+
+
+def test_ignore_stale_responses(agent):
+    agent.send_stale_responses = True
+    backend = _backend(agent, v2c=True)
+    assert backend.walk(".1.3.6.1.2.1.2.2.1") == IF_TABLE
+
+
+def test_timeout(agent):
+    backend = _backend(agent, credentials="wrong", timing={"timeout": 0.1, "retries": 1})
+    with pytest.raises(MKSNMPError, match="Timeout"):
+        backend.walk(".1.3.6.1.2.1.1")
+    assert backend.get(".1.3.6.1.2.1.1.1.0") is None
+
+
+@pytest.mark.parametrize("credentials", [
+    ("authPriv", "sha", "aes-user", "authpass", "AES", "privpass"),
+    ("authPriv", "md5", "des-user", "authpass", "DES", "privpass"),
+    ("authNoPriv", "SHA-256", "auth-user", "authpass"),
+])
+def test_snmpv3(agent, credentials):
+    backend = _backend(agent, credentials=credentials, is_bulkwalk_host=True)
+    assert backend.walk(".1.3.6.1.2.1.2.2.1", context_name="vlan-1") == IF_TABLE
+    assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux switch"
+    assert (3, ber.GET_BULK_REQUEST, b"vlan-1") in agent.requests
+    assert len(agent.peers) == 1
+
+
+def test_snmpv3_wrong_password(agent):
+    backend = _backend(agent,
+                       credentials=("authNoPriv", "SHA-256", "auth-user", "wrong"),
+                       timing={
+                           "timeout": 0.1,
+                           "retries": 0
+                       })
+    with pytest.raises(MKSNMPError):
+        backend.walk(".1.3.6.1.2.1.1")
+
+
+def test_snmpv3_invalid_credentials(agent):
+    with pytest.raises(MKGeneralException, match="auth protocol"):
+        _backend(agent, credentials=("authNoPriv", "md4", "user", "pass"))._get_session()
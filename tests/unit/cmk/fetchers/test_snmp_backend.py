@@ -4,9 +4,18 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
+
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.log import logger
+
+from cmk.snmplib.type_defs import SNMPHostConfig
+
 import cmk.fetchers.snmp_backend._utils as utils
+import cmk.fetchers.snmp_backend.stored_walk as stored_walk
 from cmk.fetchers.snmp_backend import StoredWalkSNMPBackend
 
 
@@ -20,15 +29,71 @@ def test_strip_snmp_value(value, expected):
     assert utils.strip_snmp_value(value) == expected
 
 
-class TestStoredWalkSNMPBackend:
-    @pytest.mark.parametrize("a, b, result", [
-        ("1.2.3", "1.2.3", 0),
-        ("1.2.3", ".1.2.3", 0),
-        (".1.2.3", "1.2.3", 0),
-        (".1.2.3", ".1.2.3", 0),
-        ("1.2.3", "1.2.3.4", 0),
-        ("1.2.3.4", "1.2.3", 1),
-        ("1.2.3", "4.5.6", -1),
-    ])
-    def test_compare_oids(self, a, b, result):
-        assert StoredWalkSNMPBackend._compare_oids(a, b) == result
+WALK = """\
+.1.3.6.1.2.1.1.1.0 Linux switch
+.1.3.6.1.2.1.1.2.0 .1.3.6.1.4.1.8072.3.2.10
+.1.3.6.1.2.1.2.2.1.2.1 lo
+.1.3.6.1.2.1.2.2.1.2.10 "B2 E0 7D 2C 4D 15 "
+.1.3.6.1.2.1.2.2.1.2.2 eth0
+continued
+.1.3.6.1.2.1.2.2.1.20.1 0
+"""
+
+
+class TestStoredWalkIndex:
+    @pytest.fixture(name="backend")
+    def _backend(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path / "walks"))
+        monkeypatch.setattr(cmk.utils.paths, "snmpwalk_index_dir", str(tmp_path / "index"))
+        (tmp_path / "walks").mkdir()
+        (tmp_path / "walks" / "switch").write_text(WALK)
+        yield StoredWalkSNMPBackend(
+            SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="switch",
+                ipaddress="1.2.3.4",
+                credentials="public",
+                port=161,
+                is_bulkwalk_host=False,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=10,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=[],
+                character_encoding=None,
+                is_usewalk_host=True,
+                snmp_backend="classic",
+                record_stats=False,
+            ), logger)
+        stored_walk.cleanup_walk_indexes()
+
+    def test_walk(self, backend, tmp_path):
+        assert backend.walk(".1.3.6.1.2.1.2.2.1.2") == [
+            (".1.3.6.1.2.1.2.2.1.2.1", b"lo"),
+            (".1.3.6.1.2.1.2.2.1.2.2", b"eth0"),
+            (".1.3.6.1.2.1.2.2.1.2.10", b"\xb2\xe0},M\x15"),
+        ]
+        assert backend.walk(".1.3.6.1.2.1.2.2.1.2.1") == [(".1.3.6.1.2.1.2.2.1.2.1", b"lo")]
+        assert backend.walk(".1.3.6.1.2.1.3") == []
+        assert (tmp_path / "index" / "switch").exists()
+
+    def test_get(self, backend):
+        assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux switch"
+        assert backend.get(".1.3.6.1.2.1.1.*") == b"Linux switch"
+        assert backend.get(".1.3.6.1.2.1.1") is None
+        assert backend.get(".1.3.6.1.2.1.1.3.0") is None
+
+    def test_rebuild_changed_walk(self, backend, tmp_path):
+        assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux switch"
+
+        walk_path = tmp_path / "walks" / "switch"
+        walk_path.write_text(".1.3.6.1.2.1.1.1.0 Linux router\n")
+        os.utime(walk_path, ns=(0, 0))
+
+        assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux router"
+        assert backend.walk(".1.3.6.1.2.1.2") == []
+
+    def test_missing_walk(self, backend, tmp_path):
+        (tmp_path / "walks" / "switch").unlink()
+        with pytest.raises(MKSNMPError):
+            backend.walk(".1.3.6.1.2.1.1")
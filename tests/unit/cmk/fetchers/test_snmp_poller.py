@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import pytest  # type: ignore[import]
+from testlib.snmp_agent import Agent  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.log import logger
+from cmk.utils.type_defs import SectionName
+
+import cmk.snmplib.snmp_table as snmp_table
+from cmk.snmplib.type_defs import OIDEnd, SNMPDetectSpec, SNMPHostConfig, SNMPTree
+
+from cmk.fetchers import FetcherType
+from cmk.fetchers.engine import FetcherEngine, FetchJob
+from cmk.fetchers.snmp import SNMPFetcher, SNMPFileCache
+from cmk.fetchers.snmp_backend import NativeSNMPBackend
+import cmk.fetchers.snmp_poller as snmp_poller
+from cmk.fetchers.snmp_poller import SNMPPoller
+from cmk.fetchers.type_defs import Mode
+
+IF_TREE = SNMPTree(base=".1.3.6.1.2.1.2.2.1", oids=[OIDEnd(), "2", "10"])
+IP_TREE = SNMPTree(base=".1.3.6.1.2.1.4.20.1", oids=["1"])
+
+
+@pytest.fixture(name="agent")
+def _agent():
+    agent = Agent(users={
+        b"auth-user": {
+            "auth": "SHA-256",
+            "auth_password": b"authpass",
+        },
+    })
+    yield agent
+    agent.close()
+
+
+def _snmp_config(agent, credentials="public", timing=None):
+    return SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname="switch",
+        ipaddress="127.0.0.1",
+        credentials=credentials,
+        port=agent.port,
+        is_bulkwalk_host=True,
+        is_snmpv2or3_without_bulkwalk_host=False,
+        bulk_walk_size_of=4,
+        timing=timing or {
+            "timeout": 1,
+            "retries": 1
+        },
+        oid_range_limits=[],
+        snmpv3_contexts=[],
+        character_encoding=None,
+        is_usewalk_host=False,
+        snmp_backend="native",
+        record_stats=False,
+    )
+
+
+def _poll(poller, coro):
+    async def run():
+        try:
+            return await coro
+        finally:
+            poller.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("credentials", [
+    "public",
+    ("authNoPriv", "SHA-256", "auth-user", "authpass"),
+])
+def test_fetch_walks(agent, credentials):
+    backend = NativeSNMPBackend(_snmp_config(agent, credentials=credentials), logger)
+    plan = snmp_table.SNMPFetchPlan(
+        {
+            SectionName("if"): [IF_TREE],
+            SectionName("ip"): [IP_TREE],
+        },
+        backend.config,
+        use_snmpwalk_cache=False,
+    )
+    poller = SNMPPoller()
+    device = poller.device(backend.config)
+
+    walks = _poll(poller, device.fetch_walks(plan))
+    num_requests = len(agent.requests)
+    planned_backend = snmp_table.PlannedSNMPBackend(plan, backend=backend, walks=walks)
+
+    assert snmp_table.get_snmp_table(SectionName("if"), IF_TREE, backend=planned_backend) == [
+        ["1", "lo", "4294967295"],
+        ["2", "eth0", ""],
+        ["10", "²à},M\x15", ""],
+    ]
+    assert snmp_table.get_snmp_table(SectionName("ip"), IP_TREE, backend=planned_backend) == [
+        ["127.0.0.1"],
+    ]
+    assert len(agent.requests) == num_requests
+    backend.close()
+
+
+def test_get_single_oid(agent):
+    poller = SNMPPoller()
+    device = poller.device(_snmp_config(agent))
+
+    async def get_twice():
+        return [await device.get_single_oid("1.3.6.1.2.1.1.1.0", None) for _ in range(2)]
+
+    assert _poll(poller, get_twice()) == ["Linux switch", "Linux switch"]
+    assert device.num_requests == 1
+
+
+def test_devices_share_sockets(agent):
+    poller = SNMPPoller(num_sockets=2)
+    devices = [poller.device(_snmp_config(agent)) for _ in range(20)]
+
+    async def walk_all():
+        return await asyncio.gather(*(device.walk(".1.3.6.1.2.1.1") for device in devices))
+
+    results = _poll(poller, walk_all())
+
+    assert len(results) == 20
+    assert all(rows == results[0] for rows in results)
+    assert len(results[0]) == 3
+    assert len(agent.peers) == 2
+
+
+def test_sockets_are_created_once(agent, monkeypatch):
+    created = []
+
+    class Endpoint(snmp_poller._Endpoint):
+        def __init__(self):
+            super().__init__()
+            created.append(self)
+
+    monkeypatch.setattr(snmp_poller, "_Endpoint", Endpoint)
+    poller = SNMPPoller(num_sockets=2)
+    devices = [poller.device(_snmp_config(agent)) for _ in range(10)]
+
+    async def get_all():
+        return await asyncio.gather(*(device.get(".1.3.6.1.2.1.1.1.0") for device in devices))
+
+    assert _poll(poller, get_all()) == [b"Linux switch"] * 10
+    assert len(created) == 2
+
+
+def test_max_request_rate(agent):
+    poller = SNMPPoller(max_parallel_requests=4, max_request_rate=20)
+    device = poller.device(_snmp_config(agent))
+
+    async def get_all():
+        return await asyncio.gather(*(device.get(".1.3.6.1.2.1.1.1.0") for _ in range(5)))
+
+    start = time.monotonic()
+    assert _poll(poller, get_all()) == [b"Linux switch"] * 5
+    # The first request is sent immediately, the others every 50 ms
+    assert time.monotonic() - start >= 0.2
+
+
+def test_retries(agent):
+    agent.drop_requests = 1
+    poller = SNMPPoller()
+    device = poller.device(_snmp_config(agent, timing={"timeout": 0.2, "retries": 1}))
+
+    assert _poll(poller, device.get(".1.3.6.1.2.1.1.1.0")) == b"Linux switch"
+    assert device.num_requests == 2
+
+
+def test_timeout(agent):
+    poller = SNMPPoller()
+    device = poller.device(_snmp_config(agent, "wrong", timing={"timeout": 0.1, "retries": 1}))
+
+    with pytest.raises(MKSNMPError, match="Timeout"):
+        _poll(poller, device.walk(".1.3.6.1.2.1.1"))
+    assert device.num_requests == 2
+
+
+def test_invalid_poller_settings():
+    with pytest.raises(ValueError):
+        SNMPPoller(num_sockets=0)
+    with pytest.raises(ValueError):
+        SNMPPoller(max_parallel_requests=0)
+
+
+def _fetcher(agent):
+    return SNMPFetcher(
+        SNMPFileCache(
+            path=Path(os.devnull),
+            max_age=0,
+            disabled=True,
+            use_outdated=False,
+            simulation=False,
+        ),
+        snmp_section_trees={
+            SectionName("if"): [IF_TREE],
+            SectionName("ip"): [IP_TREE],
+            SectionName("ups"): [SNMPTree(base=".1.3.6.1.2.1.33.1.1", oids=["1"])],
+        },
+        snmp_section_detects={
+            SectionName("if"): SNMPDetectSpec([[(".1.3.6.1.2.1.1.1.0", "linux.*", True)]]),
+            SectionName("ip"): SNMPDetectSpec([[("1.3.6.1.2.1.1.3.0", ".*", True)]]),
+            SectionName("ups"): SNMPDetectSpec([[
+                (".1.3.6.1.2.1.1.2.0", ".1.3.6.1.4.1.534", True),
+            ]]),
+        },
+        configured_snmp_sections=set(),
+        structured_data_snmp_sections=set(),
+        on_error="raise",
+        missing_sys_description=False,
+        use_snmpwalk_cache=False,
+        scan_cache_max_age=0,
+        snmp_config=_snmp_config(agent),
+    )
+
+
+def test_fetcher_fetch_async(agent, monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "snmp_scan_cache_dir", str(tmp_path))
+    fetcher = _fetcher(agent)
+    poller = SNMPPoller()
+
+    assert fetcher.supports_async()
+    raw_data = _poll(poller, fetcher.fetch_async(Mode.DISCOVERY, poller))
+
+    with fetcher:
+        assert raw_data.ok == fetcher.fetch(Mode.DISCOVERY).ok
+    assert raw_data.ok == {
+        SectionName("if"): [[
+            ["1", "lo", "4294967295"],
+            ["2", "eth0", ""],
+            ["10", "²à},M\x15", ""],
+        ]],
+        SectionName("ip"): [[["127.0.0.1"]]],
+    }
+
+
+def test_engine_polls_snmp_devices(agent):
+    entry = {
+        "fetcher_type": FetcherType.SNMP.name,
+        "fetcher_params": _fetcher(agent).to_json(),
+    }
+    engine = FetcherEngine(max_concurrency=10, timeout=5, snmp_sockets=1)
+
+    results = dict(engine.fetch(FetchJob("host%d" % i, [entry], Mode.DISCOVERY) for i in range(10)))
+
+    assert len(results) == 10
+    for (message,) in results.values():
+        assert message.header.fetcher_type is FetcherType.SNMP
+        assert sorted(message.raw_data.ok) == [SectionName("if"), SectionName("ip")]
+    # All hosts were polled in this process via the same socket
+    assert len(agent.peers) == 1
@@ -108,6 +108,7 @@ def test_registered_configvars():
         'hostname_translation',
         'housekeeping_interval',
         'http_proxies',
+        'ingestion_workers',
         'inventory_check_autotrigger',
         'inventory_check_do_scan',
         'inventory_check_interval',
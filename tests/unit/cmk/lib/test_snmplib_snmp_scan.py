@@ -13,6 +13,7 @@ import pytest  # type: ignore[import]
 # No stub file
 from testlib.base import Scenario  # type: ignore[import]
 
+import cmk.utils.paths
 from cmk.utils.log import logger
 from cmk.utils.type_defs import SectionName
 
@@ -22,6 +23,7 @@ from cmk.snmplib.type_defs import ABCSNMPBackend, SNMPHostConfig
 from cmk.snmplib.utils import evaluate_snmp_detection
 
 import cmk.base.api.agent_based.register as agent_based_register
+import cmk.base.api.agent_based.utils as utils
 from cmk.base.api.agent_based.register.section_plugins_legacy.convert_scan_functions import (
     create_detect_spec,)
 
@@ -272,3 +274,115 @@ def test_gather_available_raw_section_names_defaults(backend, mocker):
         SectionName("snmp_os"),
         SectionName("snmp_uptime"),
     }
+
+
+DETECT_SECTIONS = [
+    (SectionName("cisco"), utils.startswith(snmp_scan.OID_SYS_OBJ, ".1.3.6.1.4.1.9.")),
+    (SectionName("cisco_descr"),
+     utils.all_of(
+         utils.exists(".1.3.6.1.4.1.9.9.13.1.3.1.3.*"),
+         utils.contains(snmp_scan.OID_SYS_DESCR, "cisco"),
+     )),
+    (SectionName("linux"),
+     utils.any_of(
+         utils.startswith(snmp_scan.OID_SYS_DESCR, "Linux"),
+         utils.equals(snmp_scan.OID_SYS_OBJ, ".1.3.6.1.4.1.8072.3.2.10"),
+     )),
+    (SectionName("hp"),
+     utils.all_of(
+         utils.exists(".1.3.6.1.4.1.11.2.3.7.11.*"),
+         utils.startswith(snmp_scan.OID_SYS_OBJ, ".1.3.6.1.4.1.11."),
+     )),
+    (SectionName("uptime"), utils.exists(".1.3.6.1.2.1.1.3.0")),
+]
+
+
+@pytest.mark.parametrize("sys_descr, sys_obj, expected", [
+    ("Linux switch", ".1.3.6.1.4.1.8072.3.2.10", ["cisco_descr", "linux", "uptime"]),
+    ("Cisco IOS", ".1.3.6.1.4.1.9.1.525", ["cisco", "cisco_descr", "uptime"]),
+    ("HP ProCurve", ".1.3.6.1.4.1.11.2.3.7.11.4", ["cisco_descr", "hp", "uptime"]),
+    ("LINUX", "", ["cisco_descr", "linux", "uptime"]),
+    ("", "", ["cisco_descr", "uptime"]),
+    ("Linux über", ".1.3.6.1.4.1.9.1.525", [str(n) for n, _s in DETECT_SECTIONS]),
+])
+def test_detect_index_candidates(sys_descr, sys_obj, expected):
+    candidates = snmp_scan.DetectIndex(DETECT_SECTIONS).candidates(sys_descr, sys_obj)
+    assert [str(name) for name, _spec in candidates] == expected
+
+
+@pytest.mark.parametrize("sys_descr, sys_obj", [
+    ("Linux switch", ".1.3.6.1.4.1.8072.3.2.10"),
+    ("cisco", ".1.3.6.1.4.1.9.1.525"),
+    ("HP", ".1.3.6.1.4.1.11.2.3.7.11.4"),
+    ("", ".1.3.6.1.4.1.11"),
+])
+def test_detect_index_keeps_detected_sections(sys_descr, sys_obj):
+    values = {
+        snmp_scan.OID_SYS_DESCR: sys_descr,
+        snmp_scan.OID_SYS_OBJ: sys_obj,
+        ".1.3.6.1.4.1.9.9.13.1.3.1.3.*": "42",
+        ".1.3.6.1.4.1.11.2.3.7.11.*": "42",
+        ".1.3.6.1.2.1.1.3.0": "42",
+    }
+    candidates = snmp_scan.DetectIndex(DETECT_SECTIONS).candidates(sys_descr, sys_obj)
+
+    for name, spec in DETECT_SECTIONS:
+        if evaluate_snmp_detection(detect_spec=spec, oid_value_getter=values.get):
+            assert name in dict(candidates)
+
+
+class MIBBackend(ABCSNMPBackend):
+    def __init__(self, mib):
+        super().__init__(SNMPConfig, logger)
+        self.mib = mib
+        self.requested = []
+
+    def get(self, oid, context_name=None):
+        self.requested.append(oid)
+        return self.mib.get(oid)
+
+    def walk(self, oid, check_plugin_name=None, table_base_oid=None, context_name=None):
+        raise NotImplementedError("walk")
+
+
+def test_scan_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "snmp_scan_cache_dir", str(tmp_path))
+    backend = MIBBackend({
+        snmp_scan.OID_SYS_DESCR: b"Linux switch",
+        snmp_scan.OID_SYS_OBJ: b".1.3.6.1.4.1.8072.3.2.10",
+        ".1.3.6.1.2.1.1.3.0": b"42",
+    })
+
+    def scan():
+        # Every scan is done by a new process
+        snmp_cache._clear_other_hosts_oid_cache(None)
+        backend.requested.clear()
+        return snmp_scan.gather_available_raw_section_names(
+            DETECT_SECTIONS,
+            on_error="raise",
+            missing_sys_description=False,
+            backend=backend,
+            scan_cache_max_age=60,
+        )
+
+    expected = {SectionName("linux"), SectionName("uptime")}
+    assert scan() == expected
+    assert ".1.3.6.1.2.1.1.3.0" in backend.requested
+
+    # The device is not probed again
+    assert scan() == expected
+    assert backend.requested == [snmp_scan.OID_SYS_DESCR, snmp_scan.OID_SYS_OBJ]
+
+    # Unless it has changed
+    backend.mib[snmp_scan.OID_SYS_OBJ] = b".1.3.6.1.4.1.9.1.525"
+    assert scan() == {SectionName("cisco"), SectionName("linux"), SectionName("uptime")}
+    assert ".1.3.6.1.2.1.1.3.0" in backend.requested
+
+    # ... or the detection specifications have changed
+    assert snmp_scan.gather_available_raw_section_names(
+        DETECT_SECTIONS[:1],
+        on_error="raise",
+        missing_sys_description=False,
+        backend=backend,
+        scan_cache_max_age=60,
+    ) == {SectionName("cisco")}
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.log import logger
+from cmk.utils.type_defs import SectionName
+
+import cmk.snmplib.snmp_table as snmp_table
+from cmk.snmplib.type_defs import ABCSNMPBackend, OIDEnd, SNMPHostConfig, SNMPTree
+
+MIB = {
+    ".1.3.6.1.2.1.2.2.1.1.1": b"1",
+    ".1.3.6.1.2.1.2.2.1.1.2": b"2",
+    ".1.3.6.1.2.1.2.2.1.2.1": b"lo",
+    ".1.3.6.1.2.1.2.2.1.2.2": b"eth0",
+    ".1.3.6.1.2.1.2.2.1.8.1": b"1",
+    ".1.3.6.1.2.1.2.2.1.8.2": b"2",
+    ".1.3.6.1.2.1.31.1.1.1.1.1": b"lo",
+    ".1.3.6.1.2.1.31.1.1.1.1.2": b"eth0",
+    ".1.3.6.1.2.1.31.1.1.1.6.1": b"42",
+    ".1.3.6.1.2.1.31.1.1.1.6.2": b"4711",
+}
+
+IF_TREE = SNMPTree(base=".1.3.6.1.2.1.2.2.1", oids=[OIDEnd(), "1", "2", "8"])
+IF64_TREES = [
+    SNMPTree(base=".1.3.6.1.2.1.2.2.1", oids=[OIDEnd(), "1", "2", "8"]),
+    SNMPTree(base=".1.3.6.1.2.1.31.1.1.1", oids=[OIDEnd(), "1", "6"]),
+]
+INV_IF_TREE = SNMPTree(base=".1.3.6.1.2.1.2.2.1", oids=["1", "8"])
+
+
+class Backend(ABCSNMPBackend):
+    def __init__(self, credentials="public", snmpv3_contexts=None):
+        super().__init__(
+            SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="switch",
+                ipaddress="1.2.3.4",
+                credentials=credentials,
+                port=161,
+                is_bulkwalk_host=True,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=10,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=snmpv3_contexts or [],
+                character_encoding=None,
+                is_usewalk_host=False,
+                snmp_backend="classic",
+                record_stats=False,
+            ), logger)
+        self.walks = []
+
+    def get(self, oid, context_name=None):
+        return MIB.get(oid)
+
+    def walk(self, oid, check_plugin_name=None, table_base_oid=None, context_name=None):
+        self.walks.append((oid, context_name))
+        return [(o, v) for o, v in sorted(MIB.items()) if o.startswith(oid + ".")]
+
+
+def _tables(section_trees, backend):
+    tables = {}
+    for section_name, trees in section_trees.items():
+        tables[section_name] = [
+            snmp_table.get_snmp_table(section_name, tree, backend=backend) for tree in trees
+        ]
+    return tables
+
+
+def test_plan_deduplicates_columns():
+    plan = snmp_table.SNMPFetchPlan(
+        {
+            SectionName("if"): [IF_TREE],
+            SectionName("if64"): IF64_TREES,
+            SectionName("inv_if"): [INV_IF_TREE],
+        },
+        Backend().config,
+        use_snmpwalk_cache=False,
+    )
+
+    assert plan.num_column_walks == 10
+    assert plan.num_walks == 5
+    assert plan.walks_saved == 5
+    assert plan.walks == [
+        snmp_table.PlannedWalk(
+            None,
+            SectionName("if"),
+            ".1.3.6.1.2.1.2.2.1",
+            [".1.3.6.1.2.1.2.2.1.1", ".1.3.6.1.2.1.2.2.1.2", ".1.3.6.1.2.1.2.2.1.8"],
+        ),
+        snmp_table.PlannedWalk(
+            None,
+            SectionName("if64"),
+            ".1.3.6.1.2.1.31.1.1.1",
+            [".1.3.6.1.2.1.31.1.1.1.1", ".1.3.6.1.2.1.31.1.1.1.6"],
+        ),
+    ]
+
+
+def test_plan_takes_columns_from_enclosing_walk():
+    plan = snmp_table.SNMPFetchPlan(
+        {
+            SectionName("if"): [IF_TREE],
+            SectionName("if_table"): [SNMPTree(base=".1.3.6.1.2.1.2.2", oids=["1"])],
+        },
+        Backend().config,
+        use_snmpwalk_cache=False,
+    )
+
+    assert plan.num_walks == 1
+    assert plan.walks_saved == 3
+    assert plan.source(".1.3.6.1.2.1.2.2.1.8", None) == ".1.3.6.1.2.1.2.2.1"
+
+
+def test_plan_per_context():
+    backend = Backend(credentials=("noAuthNoPriv", "user"), snmpv3_contexts=[(None, ["a", "b"])])
+    plan = snmp_table.SNMPFetchPlan(
+        {
+            SectionName("if"): [IF_TREE],
+            SectionName("inv_if"): [INV_IF_TREE],
+        },
+        backend.config,
+        use_snmpwalk_cache=False,
+    )
+
+    assert plan.num_column_walks == 10
+    assert [walk.context_name for walk in plan.walks] == ["a", "b"]
+    assert plan.num_walks == 6
+
+
+@pytest.mark.parametrize("section_trees", [
+    {
+        SectionName("if"): [IF_TREE],
+        SectionName("if64"): IF64_TREES,
+        SectionName("inv_if"): [INV_IF_TREE],
+    },
+    {
+        SectionName("if"): [IF_TREE],
+        SectionName("if_table"): [SNMPTree(base=".1.3.6.1.2.1.2.2", oids=["1"])],
+    },
+])
+def test_planned_backend_same_tables(section_trees):
+    backend = Backend()
+    expected = _tables(section_trees, backend)
+    num_walks = len(backend.walks)
+
+    backend.walks.clear()
+    plan = snmp_table.SNMPFetchPlan(section_trees, backend.config, use_snmpwalk_cache=False)
+    planned_backend = snmp_table.PlannedSNMPBackend(plan, backend=backend)
+
+    assert _tables(section_trees, planned_backend) == expected
+    assert len(backend.walks) == plan.num_walks == num_walks - plan.walks_saved
+
+
+def test_planned_backend_walks_on_demand():
+    backend = Backend()
+    plan = snmp_table.SNMPFetchPlan(
+        {
+            SectionName("if"): [IF_TREE],
+            SectionName("if64"): IF64_TREES,
+        },
+        backend.config,
+        use_snmpwalk_cache=False,
+    )
+    planned_backend = snmp_table.PlannedSNMPBackend(plan, backend=backend)
+    assert not backend.walks
+
+    snmp_table.get_snmp_table(SectionName("if"), IF_TREE, backend=planned_backend)
+    assert [oid for oid, _context in backend.walks] == plan.walks[0].oids
+
+    # Not planned: Passed to the backend
+    assert planned_backend.walk(".1.3.6.1.2.1.1") == []
+    assert backend.walks[-1] == (".1.3.6.1.2.1.1", None)
+
+
+def test_planned_backend_uses_prefetched_walks():
+    backend = Backend()
+    plan = snmp_table.SNMPFetchPlan({SectionName("if"): [IF_TREE]},
+                                    backend.config,
+                                    use_snmpwalk_cache=False)
+    walks = plan.fetch(plan.walks[0], backend=backend)
+    backend.walks.clear()
+
+    planned_backend = snmp_table.PlannedSNMPBackend(plan, backend=backend, walks=walks)
+
+    assert snmp_table.get_snmp_table(SectionName("if"), IF_TREE, backend=planned_backend) == [
+        ["1", "1", "lo", "1"],
+        ["2", "2", "eth0", "2"],
+    ]
+    assert not backend.walks
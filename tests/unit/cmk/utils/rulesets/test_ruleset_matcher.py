@@ -5,13 +5,15 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 # pylint: disable=redefined-outer-name
+import re
+
 import pytest  # type: ignore[import]
 from testlib.base import Scenario
 
 from cmk.utils.type_defs import CheckPluginName
 from cmk.base.check_utils import Service
 from cmk.base.discovered_labels import DiscoveredServiceLabels, ServiceLabel
-from cmk.utils.rulesets.ruleset_matcher import RulesetMatchObject
+from cmk.utils.rulesets.ruleset_matcher import RulesetMatcher, RulesetMatchObject, RulesetOptimizer
 
 
 def test_ruleset_match_object_no_conditions():
@@ -514,3 +516,270 @@ def test_ruleset_matcher_get_service_ruleset_values_labels(monkeypatch, hostname
             hostname, service_description),
                                            ruleset=service_label_ruleset,
                                            is_binary=False)) == expected_result
+
+
+def _persisting_matcher(cache_path, host_tag_lists):
+    return RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists=host_tag_lists,
+        host_paths={},
+        labels=None,
+        all_configured_hosts=set(host_tag_lists),
+        clusters_of={},
+        nodes_of={},
+        matching_hosts_cache_path=cache_path,
+    )
+
+
+def _tag_ruleset_values(matcher):
+    return {
+        hostname: list(
+            matcher.get_host_ruleset_values(RulesetMatchObject(host_name=hostname,
+                                                               service_description=None),
+                                            ruleset=tag_ruleset,
+                                            is_binary=False))
+        for hostname in sorted(matcher.ruleset_optimizer.all_processed_hosts())
+    }
+
+
+_persisting_host_tags = {
+    "host1": {"prod", "cmk-agent", "lan"},
+    "host2": {"test", "wan"},
+    "host3": {"test", "dmz"},
+}
+
+
+def test_ruleset_matcher_persisted_matching_hosts(tmp_path):
+    cache_path = tmp_path / "matching_hosts"
+    expected_result = {
+        "host1": ["crit_prod", "prod_cmk-agent", "wan_or_lan", "BLA"],
+        "host2": ["not_lan", "wan_or_lan", "BLA"],
+        "host3": ["not_lan", "not_wan_and_not_lan", "BLA"],
+    }
+
+    matcher = _persisting_matcher(cache_path, _persisting_host_tags)
+    assert _tag_ruleset_values(matcher) == expected_result
+    matcher.ruleset_optimizer.save_matching_hosts_cache()
+    assert cache_path.exists()
+
+    matcher = _persisting_matcher(cache_path, _persisting_host_tags)
+    assert _tag_ruleset_values(matcher) == expected_result
+
+
+def test_ruleset_matcher_persisted_matching_hosts_changed_host(monkeypatch, tmp_path):
+    cache_path = tmp_path / "matching_hosts"
+    matcher = _persisting_matcher(cache_path, _persisting_host_tags)
+    _tag_ruleset_values(matcher)
+    matcher.ruleset_optimizer.save_matching_hosts_cache()
+
+    evaluated_hosts = set()
+    orig_matches_host_name = RulesetOptimizer.matches_host_name
+
+    def matches_host_name(self, host_entries, hostname):
+        evaluated_hosts.add(hostname)
+        return orig_matches_host_name(self, host_entries, hostname)
+
+    monkeypatch.setattr(RulesetOptimizer, "matches_host_name", matches_host_name)
+
+    host_tags = dict(_persisting_host_tags, host2={"prod", "lan"}, host4={"test", "wan"})
+    del host_tags["host3"]
+    matcher = _persisting_matcher(cache_path, host_tags)
+
+    assert _tag_ruleset_values(matcher) == {
+        "host1": ["crit_prod", "prod_cmk-agent", "wan_or_lan", "BLA"],
+        "host2": ["crit_prod", "wan_or_lan", "BLA"],
+        "host4": ["not_lan", "wan_or_lan", "BLA"],
+    }
+    assert evaluated_hosts == {"host2", "host4"}
+
+
+service_description_ruleset = [
+    {
+        "value": "if_prefix",
+        "condition": {
+            "service_description": [{
+                "$regex": "Interface "
+            }],
+        },
+        "options": {},
+    },
+    {
+        "value": "if_exact",
+        "condition": {
+            "host_name": ["host1"],
+            "service_description": [{
+                "$regex": "Interface 2$"
+            }, {
+                "$regex": "Interface 10$"
+            }],
+        },
+        "options": {},
+    },
+    {
+        "value": "not_fs",
+        "condition": {
+            "service_description": {
+                "$nor": [{
+                    "$regex": "Filesystem /"
+                }]
+            },
+        },
+        "options": {},
+    },
+    {
+        "value": "fs_optional_char",
+        "condition": {
+            "service_description": [{
+                "$regex": "Filesystems? /var"
+            }],
+        },
+        "options": {},
+    },
+    {
+        "value": "alternative",
+        "condition": {
+            "service_description": [{
+                "$regex": "CPU|Memory"
+            }],
+        },
+        "options": {},
+    },
+    {
+        "value": "unindexed",
+        "condition": {
+            "service_description": [{
+                "$regex": ".*load"
+            }],
+        },
+        "options": {},
+    },
+    {
+        "value": "all",
+        "condition": {},
+        "options": {},
+    },
+]
+
+
+def _service_description_matcher():
+    return RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists={
+            "host1": set(),
+            "host2": set()
+        },
+        host_paths={},
+        labels=None,
+        all_configured_hosts={"host1", "host2"},
+        clusters_of={},
+        nodes_of={},
+    )
+
+
+@pytest.mark.parametrize("hostname,service_description,expected_result", [
+    ("host1", "Interface 2", ["if_prefix", "if_exact", "not_fs", "all"]),
+    ("host1", "Interface 20", ["if_prefix", "not_fs", "all"]),
+    ("host2", "Interface 2", ["if_prefix", "not_fs", "all"]),
+    ("host1", "Filesystem /var", ["fs_optional_char", "all"]),
+    ("host1", "Filesystems /var", ["not_fs", "fs_optional_char", "all"]),
+    ("host1", "Memory", ["not_fs", "alternative", "all"]),
+    ("host1", "CPU load", ["not_fs", "alternative", "unindexed", "all"]),
+    ("host1", "Uptime", ["not_fs", "all"]),
+])
+def test_ruleset_matcher_get_service_ruleset_values_description(hostname, service_description,
+                                                                expected_result):
+    matcher = _service_description_matcher()
+    assert list(
+        matcher.get_service_ruleset_values(RulesetMatchObject(
+            host_name=hostname, service_description=service_description),
+                                           ruleset=service_description_ruleset,
+                                           is_binary=False)) == expected_result
+
+
+def test_ruleset_matcher_get_service_ruleset_values_of_services():
+    service_descriptions = [
+        "Interface 2", "Interface 10", "Interface 20", "Filesystem /var", "Filesystems /var",
+        "Memory", "CPU load", "Uptime"
+    ]
+
+    for hostname in ["host1", "host2"]:
+        matcher = _service_description_matcher()
+        match_objects = [
+            RulesetMatchObject(host_name=hostname, service_description=service_description)
+            for service_description in service_descriptions
+        ]
+        assert matcher.get_service_ruleset_values_of_services(
+            hostname, match_objects, service_description_ruleset, is_binary=False) == [
+                list(_service_description_matcher().get_service_ruleset_values(
+                    match_object, service_description_ruleset, is_binary=False))
+                for match_object in match_objects
+            ]
+
+
+def _matching_values_per_service(ruleset_, hostname, service_descriptions):
+    """The straight forward way: Execute the regex of each rule for each service"""
+    patterns = [
+        re.compile("(?:%s)" % "|".join("(?:%s)" % p["$regex"]
+                                       for p in rule["condition"]["service_description"]))
+        for rule in ruleset_
+    ]
+    return [[
+        rule["value"]
+        for rule, pattern in zip(ruleset_, patterns)
+        if hostname in rule["condition"]["host_name"] and pattern.match(service_description)
+    ]
+            for service_description in service_descriptions]
+
+
+def test_ruleset_matcher_get_service_ruleset_values_many_rules():
+    hostnames = ["host%d" % num for num in range(10)]
+    service_descriptions = ["Interface %d" % num for num in range(1000)]
+    service_descriptions += ["Filesystem /srv/%d" % num for num in range(1000)]
+
+    interface_rules = [{
+        "value": "interface_%d" % num,
+        "condition": {
+            "host_name": hostnames[num % 2::2],
+            "service_description": [{
+                "$regex": "Interface %d$" % num
+            }, {
+                "$regex": "Interface 1%d$" % num
+            }],
+        },
+        "options": {},
+    } for num in range(100)]
+    filesystem_rules = [{
+        "value": "filesystem_%d" % num,
+        "condition": {
+            "host_name": hostnames,
+            "service_description": [{
+                "$regex": "Filesystem /srv/%d" % num
+            }],
+        },
+        "options": {},
+    } for num in range(100)]
+    ruleset_ = interface_rules + filesystem_rules
+
+    matcher = RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists={hostname: set() for hostname in hostnames},
+        host_paths={},
+        labels=None,
+        all_configured_hosts=set(hostnames),
+        clusters_of={},
+        nodes_of={},
+    )
+
+    match_objects = [
+        RulesetMatchObject(host_name="host1", service_description=service_description)
+        for service_description in service_descriptions
+    ]
+    expected_result = _matching_values_per_service(ruleset_, "host1", service_descriptions)
+    assert [
+        list(matcher.get_service_ruleset_values(match_object, ruleset_, is_binary=False))
+        for match_object in match_objects
+    ] == expected_result
+    assert matcher.get_service_ruleset_values_of_services("host1",
+                                                          match_objects,
+                                                          ruleset_,
+                                                          is_binary=False) == expected_result
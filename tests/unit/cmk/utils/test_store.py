@@ -171,6 +171,94 @@ def test_save_data_to_file(tmp_path, path_type, data):
     assert store.load_object_from_file(path) == data
 
 
+@pytest.mark.parametrize("path_type", [str, Path])
+@pytest.mark.parametrize("data", [
+    None,
+    [2, 3],
+    [u"föö"],
+    [b'foob\xc3\xa4r'],
+    {
+        ("if", u"ä"): {1.5, None, True}
+    },
+])
+def test_save_data_to_file_binary(tmp_path, path_type, data):
+    path = path_type(tmp_path / "lala")
+    store.save_object_to_file(path, data, binary=True)
+    assert Path(path).read_bytes().startswith(b"\x00")
+    assert store.load_object_from_file(path) == data
+
+
+def test_load_data_from_file_detects_format(tmp_path):
+    path = tmp_path / "lala"
+    store.save_object_to_file(path, {"a": 1})
+    assert store.load_object_from_file(path) == {"a": 1}
+
+    store.save_object_to_file(path, {"a": 2}, binary=True)
+    assert store.load_object_from_file(path) == {"a": 2}
+
+    store.save_object_to_file(path, {"a": 3})
+    assert store.load_object_from_file(path) == {"a": 3}
+
+
+def _autochecks_data(num_services):
+    return [{
+        "check_plugin_name": "if64",
+        "item": "%d" % num,
+        "parameters": {
+            "state": ["1"],
+            "speed": 1000000000
+        },
+        "service_labels": {
+            "cmk/interface": "ethernet"
+        },
+    } for num in range(num_services)]
+
+
+_HOST_LABELS = {"os": "linux"}
+
+
+def _hosts_mk_data(num_hosts):
+    hostnames = ["host%05d" % num for num in range(num_hosts)]
+    return {
+        "all_hosts": hostnames,
+        "host_tags": {
+            hostname: {
+                "site": "heute",
+                "address_family": "ip-v4-only",
+                "ip-v4": "ip-v4",
+                "agent": "cmk-agent",
+                "tcp": "tcp",
+                "snmp_ds": "no-snmp",
+                "piggyback": "auto-piggyback",
+                "criticality": "prod",
+                "networking": "lan",
+            } for hostname in hostnames
+        },
+        "host_labels": {hostname: dict(_HOST_LABELS) for hostname in hostnames},
+        "ipaddresses": {
+            hostname: "10.0.%d.%d" % (num // 256, num % 256)
+            for num, hostname in enumerate(hostnames)
+        },
+    }
+
+
+@pytest.mark.parametrize("data", [
+    _autochecks_data(100),
+    _hosts_mk_data(100),
+],
+                         ids=["autochecks", "hosts_mk"])
+def test_load_object_binary_format(tmp_path, monkeypatch, data):
+    path = tmp_path / "binary"
+    store.save_object_to_file(path, data, binary=True)
+
+    def literal_eval(_content):
+        raise AssertionError("literal_eval() used for the binary format")
+
+    monkeypatch.setattr(store.ast, "literal_eval", literal_eval)
+    assert store.load_bytes_from_file(path).startswith(store._BINARY_OBJECT_MAGIC)
+    assert store.load_object_from_file(path) == data
+
+
 @pytest.mark.parametrize("path_type", [str, Path])
 @pytest.mark.parametrize("data", [
     u"föö",